@@ -0,0 +1,630 @@
+#!/usr/bin/env python3
+"""
+bench_receiver.py
+
+Benchmark suite for the pc_receiver.py hot paths.
+
+Benchmarks (select with --only):
+    parse       parse_payload() cold (cache cleared) and warm, AdvParser.parse
+    window      window_peaks() over 100 ms windows of raw events
+    tracker     DeviceTracker.process_event() with N concurrent devices
+                (--sizes, default 10,100,500,1000), then at the same size:
+                snapshot(), _association_map_locked() and
+                localize_track_to_grid() for every track
+    sse         SSE fan-out: enqueue_stream_event_realtime() + queue get, and
+                the per-client "data: <json>" encoding for 1 and 4 clients
+    replay      the recorded main/*.json sessions through
+                offline_tracker.run_offline() (first --replay-events events)
+    memory      tracemalloc bytes per DeviceTrack / AliasTrack with
+                --memory-tracks tracks (default 1000), each fed one device's
+                traffic for --memory-duration seconds (default
+                TRACKER_MEMORY_SEC, so its rolling window is full), and a
+                per-attribute breakdown of the bytes per track
+
+Synthetic traffic comes from SyntheticScene: a 3x3-block room with one scanner
+per corner and a log-distance RSSI model. Device kinds:
+    phone       Apple Nearby-Info style payload, MAC and payload tail rotate
+                every --rotate-s seconds, slow random walk inside the room
+    beacon      iBeacon, fixed MAC and payload, fixed position, fast interval
+    background  Microsoft CDP style payload, fixed MAC, placed outside the room
+
+The tracker runs on offline_tracker.SimClock, so a scene of --duration
+simulated seconds is processed as fast as the tracker allows.
+
+Results are written as JSON to --out (default bench_results/) together with
+the git commit, so runs can be compared across commits:
+    python bench_receiver.py
+    python bench_receiver.py --only tracker --sizes 100,1000 --compare bench_results/<old>.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import glob
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ble_adv_parser import AdvParser
+from offline_tracker import SimClock, iter_windows, run_offline
+from stage_metrics import LatencyHistogram, summarize_state
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = (10, 100, 500, 1000)
+BENCHMARKS = ("parse", "window", "tracker", "sse", "replay", "memory")
+
+# Room geometry matches calibration_fingerprints.json: 3x3 blocks of 126 x 168 cm.
+ROOM_W_M = 3 * 1.26
+ROOM_H_M = 3 * 1.68
+SCANNER_POSITIONS = {
+    "1": (0.0, 0.0),
+    "2": (ROOM_W_M, 0.0),
+    "3": (ROOM_W_M, ROOM_H_M),
+    "4": (0.0, ROOM_H_M),
+}
+CHANNELS = (37, 38, 39)
+
+RSSI_AT_1M = -52.0
+PATH_LOSS_EXPONENT = 2.3
+RSSI_NOISE_DB = 3.0
+RSSI_FLOOR = -97
+PACKET_LOSS = 0.15
+
+DEVICE_MIX = (("phone", 0.5), ("beacon", 0.2), ("background", 0.3))
+
+
+# ----------------------------------------------------------------------------
+# Synthetic multi-scanner traffic
+# ----------------------------------------------------------------------------
+
+def _random_mac(rng: random.Random, random_address: bool = True) -> str:
+    b = [rng.randrange(256) for _ in range(6)]
+    if random_address:
+        b[0] = (b[0] & 0x3F) | 0x40  # resolvable private address
+    return "".join(f"{x:02X}" for x in b)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+class SyntheticDevice:
+    __slots__ = ("kind", "mac", "payload", "x", "y", "interval_s", "next_adv_s", "next_rotate_s")
+
+    def __init__(self, kind: str, rng: random.Random, rotate_s: float) -> None:
+        self.kind = kind
+        self.next_rotate_s = math.inf
+
+        if kind == "phone":
+            self.x = rng.uniform(0.2, ROOM_W_M - 0.2)
+            self.y = rng.uniform(0.2, ROOM_H_M - 0.2)
+            self.interval_s = rng.uniform(0.2, 1.0)
+            self.next_rotate_s = rng.uniform(0.0, rotate_s)
+            self.rotate(rng, rotate_s, first=True)
+        elif kind == "beacon":
+            self.x = rng.uniform(0.0, ROOM_W_M)
+            self.y = rng.uniform(0.0, ROOM_H_M)
+            self.interval_s = rng.uniform(0.1, 0.5)
+            self.mac = _random_mac(rng, random_address=False)
+            uuid = bytes(rng.randrange(256) for _ in range(16))
+            major_minor = bytes(rng.randrange(256) for _ in range(4))
+            self.payload = _b64(bytes.fromhex("0201061aff4c000215") + uuid + major_minor + b"\xc5")
+        else:
+            # Outside the room: behind one of the walls.
+            side = rng.randrange(4)
+            if side == 0:
+                self.x, self.y = -rng.uniform(1.0, 6.0), rng.uniform(0.0, ROOM_H_M)
+            elif side == 1:
+                self.x, self.y = ROOM_W_M + rng.uniform(1.0, 6.0), rng.uniform(0.0, ROOM_H_M)
+            elif side == 2:
+                self.x, self.y = rng.uniform(0.0, ROOM_W_M), -rng.uniform(1.0, 6.0)
+            else:
+                self.x, self.y = rng.uniform(0.0, ROOM_W_M), ROOM_H_M + rng.uniform(1.0, 6.0)
+            self.interval_s = rng.uniform(0.5, 2.0)
+            self.mac = _random_mac(rng)
+            body = bytes(rng.randrange(256) for _ in range(23))
+            self.payload = _b64(bytes.fromhex("1eff0600010920") + body)
+
+        self.next_adv_s = rng.uniform(0.0, self.interval_s)
+
+    def rotate(self, rng: random.Random, rotate_s: float, first: bool = False) -> None:
+        self.mac = _random_mac(rng)
+        status = bytes(rng.randrange(256) for _ in range(4))
+        self.payload = _b64(bytes.fromhex("02011a020a0c0bff4c001006") + status[:2] + bytes.fromhex("1d") + status[2:])
+        if not first:
+            self.next_rotate_s += rotate_s
+
+    def move(self, rng: random.Random, dt: float) -> None:
+        if self.kind != "phone":
+            return
+        step = 0.3 * dt
+        self.x = min(ROOM_W_M, max(0.0, self.x + rng.uniform(-step, step)))
+        self.y = min(ROOM_H_M, max(0.0, self.y + rng.uniform(-step, step)))
+
+
+class SyntheticScene:
+    """
+    Deterministic (seeded) generator of raw scanner events in the receiver's
+    internal format: mac, rssi, channel, scanner, ts, rx_ts_us, payload.
+    """
+
+    def __init__(self, n_devices: int, seed: int = 0, rotate_s: float = 30.0) -> None:
+        self.rng = random.Random(seed)
+        self.rotate_s = rotate_s
+        kinds: List[str] = []
+        for kind, share in DEVICE_MIX:
+            kinds.extend([kind] * int(round(n_devices * share)))
+        while len(kinds) < n_devices:
+            kinds.append("phone")
+        self.devices = [SyntheticDevice(k, self.rng, rotate_s) for k in kinds[:n_devices]]
+
+    def _rssi(self, dev: SyntheticDevice, scanner: str) -> Optional[int]:
+        sx, sy = SCANNER_POSITIONS[scanner]
+        d = max(0.3, math.hypot(dev.x - sx, dev.y - sy))
+        rssi = RSSI_AT_1M - 10.0 * PATH_LOSS_EXPONENT * math.log10(d) + self.rng.gauss(0.0, RSSI_NOISE_DB)
+        if dev.kind == "background":
+            rssi -= 8.0  # wall loss
+        if rssi < RSSI_FLOOR or self.rng.random() < PACKET_LOSS:
+            return None
+        return int(round(rssi))
+
+    def events(self, duration_s: float, start_us: int = 1_000_000_000,
+               with_device: bool = False) -> List[Dict[str, Any]]:
+        """with_device adds a "device" index field (ground truth for benchmarks)."""
+        out: List[Dict[str, Any]] = []
+        rng = self.rng
+        for dev_idx, dev in enumerate(self.devices):
+            t = dev.next_adv_s
+            while t < duration_s:
+                if t >= dev.next_rotate_s:
+                    dev.rotate(rng, self.rotate_s)
+                dev.move(rng, dev.interval_s)
+                t_us = start_us + int(t * 1_000_000)
+                for scanner in SCANNER_POSITIONS:
+                    rssi = self._rssi(dev, scanner)
+                    if rssi is None:
+                        continue
+                    rx_ts_us = t_us + rng.randrange(2000, 40_000)  # HTTP batching delay
+                    ev = {
+                        "mac": dev.mac,
+                        "rssi": rssi,
+                        "channel": rng.choice(CHANNELS),
+                        "scanner": scanner,
+                        "ts": t_us,
+                        "rx_ts_us": rx_ts_us,
+                        "payload": dev.payload,
+                    }
+                    if with_device:
+                        ev["device"] = dev_idx
+                    out.append(ev)
+                t += dev.interval_s * rng.uniform(0.9, 1.1)
+            dev.next_adv_s = t - duration_s
+        out.sort(key=lambda ev: ev["rx_ts_us"])
+        return out
+
+
+# ----------------------------------------------------------------------------
+# Measurement helpers
+# ----------------------------------------------------------------------------
+
+def _result(name: str, params: Dict[str, Any], n: int, seconds: float, **extra: Any) -> Dict[str, Any]:
+    res = {
+        "name": name,
+        "params": params,
+        "n": n,
+        "seconds": round(seconds, 6),
+        "us_per_op": round(seconds * 1_000_000 / n, 3) if n else 0.0,
+        "ops_per_s": round(n / seconds, 1) if seconds > 0 else 0.0,
+    }
+    res.update(extra)
+    return res
+
+
+def _add(out: List[Dict[str, Any]], res: Dict[str, Any]) -> None:
+    out.append(res)
+    _print_result(res)
+
+
+def _best_of(fn: Callable[[], int], repeat: int) -> Tuple[int, float]:
+    """Run fn repeat times and return (ops, best seconds)."""
+    best = math.inf
+    n = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = fn()
+        best = min(best, time.perf_counter() - t0)
+    return n, best
+
+
+def _print_result(res: Dict[str, Any]) -> None:
+    params = " ".join(f"{k}={v}" for k, v in res["params"].items())
+    extra = ""
+    if "p50_us" in res:
+        extra = f"  p50={res['p50_us']}us p99={res['p99_us']}us"
+    elif "bytes_per_track" in res:
+        extra = f"  {res['bytes_per_track']} B/track"
+    print(f"  {res['name']:<28} {params:<24} n={res['n']:<8} {res['us_per_op']:>11.3f} us/op {res['ops_per_s']:>12.1f} op/s{extra}")
+
+
+def _peak_windows(pr: Any, events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    return [w for _, w in iter_windows(iter(events), pr.WINDOW_SIZE_US, pr.SAFETY_MARGIN_US, batch_events=len(events) + 1)]
+
+
+# ----------------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------------
+
+def bench_parse(pr: Any, events: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    payloads = list(dict.fromkeys(ev["payload"] for ev in events))
+    raw = [base64.b64decode(p) for p in payloads]
+    all_payloads = [ev["payload"] for ev in events]
+
+    def cold() -> int:
+        with pr.parse_cache_lock:
+            pr.parse_cache.clear()
+        for p in payloads:
+            pr.parse_payload(p)
+        return len(payloads)
+
+    def warm() -> int:
+        for p in all_payloads:
+            pr.parse_payload(p)
+        return len(all_payloads)
+
+    def adv() -> int:
+        for b in raw:
+            AdvParser.parse(b)
+        return len(raw)
+
+    out: List[Dict[str, Any]] = []
+    n, s = _best_of(cold, repeat)
+    _add(out, _result("parse_payload_cold", {"unique": len(payloads)}, n, s))
+    cold()
+    n, s = _best_of(warm, repeat)
+    _add(out, _result("parse_payload_warm", {"events": len(all_payloads)}, n, s))
+    n, s = _best_of(adv, repeat)
+    _add(out, _result("adv_parser_parse", {"unique": len(raw)}, n, s))
+    return out
+
+
+def bench_window(pr: Any, events: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    windows = _peak_windows(pr, events)
+
+    def run() -> int:
+        for w in windows:
+            pr.window_peaks(w)
+        return len(events)
+
+    out: List[Dict[str, Any]] = []
+    n, s = _best_of(run, repeat)
+    _add(out, _result("window_peaks", {"windows": len(windows)}, n, s))
+    return out
+
+
+def bench_tracker(pr: Any, sizes: List[int], duration_s: float, seed: int, rotate_s: float,
+                  repeat: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    localization_loaded = pr.load_localization_fingerprints()
+
+    for size in sizes:
+        events = SyntheticScene(size, seed=seed, rotate_s=rotate_s).events(duration_s)
+        windows = _peak_windows(pr, events)
+        peaks = [(ev, pr.parse_payload(ev["payload"])) for w in windows for ev in pr.window_peaks(w)]
+
+        clock = SimClock()
+        real_clock = pr.monotonic_now
+        pr.monotonic_now = clock
+        try:
+            tracker = pr.DeviceTracker()
+            hist = LatencyHistogram()
+            t_start = time.perf_counter()
+            for ev, parsed in peaks:
+                clock.advance_to(ev["rx_ts_us"] / 1_000_000.0)
+                t0 = time.perf_counter_ns()
+                tracker.process_event(ev, parsed)
+                hist.record_us((time.perf_counter_ns() - t0) // 1000)
+            elapsed = time.perf_counter() - t_start
+            summary = summarize_state(hist.state())
+            _add(out, _result(
+                "tracker_process_event", {"devices": size}, len(peaks), elapsed,
+                p50_us=round(summary["p50_ms"] * 1000, 1),
+                p99_us=round(summary["p99_ms"] * 1000, 1),
+                tracks=len(tracker.tracks),
+                alias_tracks=len(tracker.alias_tracks),
+            ))
+
+            times = []
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                tracker.snapshot()
+                times.append(time.perf_counter() - t0)
+            _add(out, _result("tracker_snapshot", {"devices": size}, 1, statistics.median(times),
+                               tracks=len(tracker.tracks)))
+
+            times = []
+            for _ in range(repeat):
+                with tracker.lock.held("bench"):
+                    t0 = time.perf_counter()
+                    tracker._association_map_locked()
+                    times.append(time.perf_counter() - t0)
+            _add(out, _result("tracker_association_map", {"devices": size}, 1, statistics.median(times),
+                               tracks=len(tracker.tracks)))
+
+            if localization_loaded:
+                tracks = list(tracker.tracks.values())
+                times = []
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    for tr in tracks:
+                        pr.localize_track_to_grid(tr)
+                    times.append(time.perf_counter() - t0)
+                _add(out, _result("grid_localization", {"devices": size}, len(tracks), statistics.median(times)))
+        finally:
+            pr.monotonic_now = real_clock
+
+    return out
+
+
+def bench_sse(pr: Any, events: List[Dict[str, Any]], repeat: int) -> List[Dict[str, Any]]:
+    # Capture real stream events by acting as the SSE consumer of process_final_event().
+    outs: List[Dict[str, Any]] = []
+    for w in _peak_windows(pr, events):
+        for ev in pr.window_peaks(w):
+            pr.process_final_event(ev)
+            while not pr.data_queue.empty():
+                outs.append(pr.data_queue.get_nowait())
+
+    def enqueue() -> int:
+        for out in outs:
+            pr.enqueue_stream_event_realtime(out)
+            pr.data_queue.get_nowait()
+        return len(outs)
+
+    def encode(clients: int) -> Callable[[], int]:
+        def run() -> int:
+            for out in outs:
+                for _ in range(clients):
+                    f"data: {json.dumps(out)}\n\n"
+            return len(outs)
+        return run
+
+    res: List[Dict[str, Any]] = []
+    n, s = _best_of(enqueue, repeat)
+    _add(res, _result("sse_enqueue", {"events": len(outs)}, n, s))
+    for clients in (1, 4):
+        n, s = _best_of(encode(clients), repeat)
+        _add(res, _result("sse_encode", {"clients": clients}, n, s))
+    return res
+
+
+def find_sessions() -> List[str]:
+    sessions = []
+    for path in sorted(glob.glob(os.path.join(BASE_DIR, "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                head = f.read(4096)
+        except OSError:
+            continue
+        if '"events"' in head:
+            sessions.append(path)
+    return sessions
+
+
+def bench_replay(max_events: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for path in find_sessions():
+        r = run_offline(path, max_events=max_events)
+        _add(out, _result("session_replay", {"session": os.path.basename(path)}, r["events"], r["elapsed_s"],
+                          peaks=r["peaks"], tracks=r["tracks"], confirmed=r["confirmed"], merges=r["merges"]))
+    return out
+
+
+def _deep_size(obj: Any, seen: set) -> int:
+    """sys.getsizeof of obj and everything it references, each object once."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_size(v, seen) for v in obj)
+    elif hasattr(obj, "__slots__"):
+        for cls in type(obj).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(obj, name):
+                    size += _deep_size(getattr(obj, name), seen)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += _deep_size(vars(obj), seen)
+    return size
+
+
+def attribute_bytes(pr: Any, tracks: List[Any]) -> Dict[str, int]:
+    """
+    Mean deep size per track of each slot, largest first. Objects shared
+    between tracks (scanner registry, parse cache) are not counted.
+    """
+    seen: set = set()
+    _deep_size(pr.scanner_ids, seen)
+    _deep_size(pr.sig_parts_cache, seen)
+    totals: Dict[str, int] = {}
+    for t in tracks:
+        for name in type(t).__slots__:
+            if hasattr(t, name):
+                totals[name] = totals.get(name, 0) + _deep_size(getattr(t, name), seen)
+    n = max(1, len(tracks))
+    return dict(sorted(((k, v // n) for k, v in totals.items()), key=lambda kv: -kv[1]))
+
+
+def bench_memory(pr: Any, n_tracks: int, seed: int, rotate_s: float,
+                 duration_s: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Build one DeviceTrack and one AliasTrack per synthetic device directly (no
+    matching), feed each its own traffic and report traced bytes per track,
+    plus a per-attribute breakdown (attribute_bytes()). Payloads are parsed
+    before tracing so the shared parse cache is excluded. duration_s defaults
+    to TRACKER_MEMORY_SEC; a longer run also fills the burst/motion histories.
+    """
+    duration_s = float(duration_s or pr.TRACKER_MEMORY_SEC)
+    events = SyntheticScene(n_tracks, seed=seed, rotate_s=rotate_s).events(duration_s, with_device=True)
+    parsed = {p: pr.parse_payload(p) for p in {ev["payload"] for ev in events}}
+    out: List[Dict[str, Any]] = []
+
+    clock = SimClock()
+    real_clock = pr.monotonic_now
+    pr.monotonic_now = clock
+    try:
+        for kind in ("device_track", "alias_track"):
+            clock.advance_to(events[0]["rx_ts_us"] / 1_000_000.0)
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            t0 = time.perf_counter()
+            tracks: Dict[int, Any] = {}
+            for ev in events:
+                clock.advance_to(ev["rx_ts_us"] / 1_000_000.0)
+                p = parsed[ev["payload"]]
+                track = tracks.get(ev["device"])
+                if kind == "device_track":
+                    if track is None:
+                        track = tracks[ev["device"]] = pr.DeviceTrack(f"PD_{ev['device']}", ev["ts"], clock())
+                    track.update(ev, p, ev["mac"])
+                elif track is None:
+                    tracks[ev["device"]] = pr.AliasTrack(ev["mac"], ev, p)
+                else:
+                    track.update(ev, p)
+            elapsed = time.perf_counter() - t0
+            used = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+            obs = sum(len(t.obs) for t in tracks.values())
+            attributes = attribute_bytes(pr, list(tracks.values()))
+            _add(out, _result(
+                f"memory_{kind}", {"tracks": len(tracks), "duration_s": duration_s}, len(events), elapsed,
+                bytes_per_track=used // max(1, len(tracks)),
+                total_mb=round(used / (1024 * 1024), 2),
+                obs_per_track=round(obs / max(1, len(tracks)), 1),
+                attribute_bytes=attributes,
+            ))
+            for name, size in attributes.items():
+                if size:
+                    print(f"      {name:<34} {size:>8} B/track")
+            del tracks
+    finally:
+        pr.monotonic_now = real_clock
+    return out
+
+
+# ----------------------------------------------------------------------------
+# Results
+# ----------------------------------------------------------------------------
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _result_key(res: Dict[str, Any]) -> str:
+    return res["name"] + "|" + json.dumps(res["params"], sort_keys=True)
+
+
+def compare(current: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {_result_key(r): r for r in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_path} (us/op, ratio < 1.0 is faster):")
+    for res in current:
+        old = baseline.get(_result_key(res))
+        if not old or not old["us_per_op"]:
+            continue
+        ratio = res["us_per_op"] / old["us_per_op"]
+        params = " ".join(f"{k}={v}" for k, v in res["params"].items())
+        print(f"  {res['name']:<28} {params:<24} {old['us_per_op']:>11.3f} -> {res['us_per_op']:>11.3f}  x{ratio:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pc_receiver.py hot paths.")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"Comma list of {','.join(BENCHMARKS)}")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Concurrent device counts for the tracker benchmarks")
+    parser.add_argument("--duration", type=float, default=10.0, help="Simulated seconds of traffic per tracker scene")
+    parser.add_argument("--devices", type=int, default=200, help="Devices in the parse/window/sse scene")
+    parser.add_argument("--rotate-s", type=float, default=30.0, help="Phone MAC rotation period")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--replay-events", type=int, default=5000, help="Raw events replayed per recorded session")
+    parser.add_argument("--memory-tracks", type=int, default=1000, help="Tracks built by the memory benchmark")
+    parser.add_argument("--memory-duration", type=float, default=None,
+                        help="Simulated seconds of traffic per track in the memory benchmark (default TRACKER_MEMORY_SEC)")
+    parser.add_argument("--out", default=os.path.join(BASE_DIR, "bench_results"), help="Directory for the JSON results")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    selected = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    import pc_receiver as pr
+    pr.load_mfg_ids()
+    # Keep per-event diagnostics out of the measurements.
+    pr.stage_timers.enabled = False
+
+    scene_events: List[Dict[str, Any]] = []
+    if {"parse", "window", "sse"} & set(selected):
+        scene_events = SyntheticScene(args.devices, seed=args.seed, rotate_s=args.rotate_s).events(args.duration)
+
+    results: List[Dict[str, Any]] = []
+    print(f"Benchmarks: {', '.join(selected)}")
+    if "parse" in selected:
+        results.extend(bench_parse(pr, scene_events, args.repeat))
+    if "window" in selected:
+        results.extend(bench_window(pr, scene_events, args.repeat))
+    if "tracker" in selected:
+        results.extend(bench_tracker(pr, sizes, args.duration, args.seed, args.rotate_s, args.repeat))
+    if "sse" in selected:
+        results.extend(bench_sse(pr, scene_events, args.repeat))
+    if "replay" in selected:
+        results.extend(bench_replay(args.replay_events))
+    if "memory" in selected:
+        results.extend(bench_memory(pr, args.memory_tracks, args.seed, args.rotate_s, args.memory_duration))
+
+    commit = git_commit()
+    doc = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}{'_' + commit if commit else ''}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print(f"Results written to {path}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
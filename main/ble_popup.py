@@ -8,6 +8,8 @@ from datetime import datetime
 from pathlib import Path
 import base64
 from ble_adv_parser import AdvParser
+from session_reader import iter_raw_events
+from session_writer import SessionWriter, finalize_segments, list_segments, parts_dir_for
 
 import requests
 import tkinter as tk
@@ -162,24 +164,44 @@ class ScannerControlWindow(tk.Toplevel):
             self.lbl_cal_status.config(text="Status: Connection Error", foreground="red")
 
 # ---------------- Data Model ----------------
+CSV_LOG_HEADER = [
+    "timestamp_local", "mac", "name", "rssi", "channel", "txpwr",
+    "mfg", "adv_len", "has_services",
+    "n_services_16", "n_services_128", "mfg_data",
+    "scanner", "timestamp_epoch_us", "payload_sig"
+]
+
+def recover_leftover_segments(parts_dir, session_out):
+    """Finalize segments of a crashed run into <session>.recovered.json and clear parts_dir."""
+    recovered = session_out.with_name(session_out.stem + ".recovered.json")
+    if recovered.exists():
+        recovered = session_out.with_name(f"{session_out.stem}.recovered_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    meta = {"recovered_from": str(parts_dir), "end": datetime.now().isoformat()}
+    n = finalize_segments(parts_dir, recovered, meta)
+    for segment in list_segments(parts_dir):
+        segment.unlink()
+    print(f"[SESSION] Recovered {n} events from an earlier run into {recovered.resolve()}")
+
+
 class DeviceModel:
-    def __init__(self, presence_window_s=5, min_rssi=None, csv_log="ble_log.csv"):
+    def __init__(self, presence_window_s=5, min_rssi=None, csv_log="ble_log.csv", session_out=None):
         self.presence_window_s = presence_window_s
         self.min_rssi = min_rssi
         self.devices = {}
-        self.events = []
         self.csv_log = csv_log
         self.lock = threading.Lock()
 
-        if not os.path.exists(self.csv_log):
-            with open(self.csv_log, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    "timestamp_local", "mac", "name", "rssi", "channel", "txpwr",
-                    "mfg", "adv_len", "has_services",
-                    "n_services_16", "n_services_128", "mfg_data",
-                    "scanner", "timestamp_epoch_us", "payload_sig"
-                ])
+        # Events and CSV rows go to a background writer (JSON-lines segments
+        # next to the session file); nothing per-event is kept in memory.
+        if session_out is None:
+            session_out = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        parts_dir = parts_dir_for(Path(session_out))
+        try:
+            self.writer = SessionWriter(parts_dir, csv_log=csv_log, csv_header=CSV_LOG_HEADER)
+        except FileExistsError:
+            # Segments left by a crashed run with the same --json-out.
+            recover_leftover_segments(parts_dir, Path(session_out))
+            self.writer = SessionWriter(parts_dir, csv_log=csv_log, csv_header=CSV_LOG_HEADER)
 
     def prune_stale(self):
         cutoff = time.monotonic() - self.presence_window_s
@@ -229,34 +251,36 @@ class DeviceModel:
                 "scanner": scanner
             }
 
-            # Keep the exported session JSON schema compatible with the MATLAB workflow.
-            self.events.append({
+        # Keep the exported session JSON schema compatible with the MATLAB workflow.
+        self.writer.submit(
+            {
                 "mac": mac,
                 "name": name, "rssi": rssi_i, "channel": channel_i,
                 "scanner": scanner, "ts": ts_epoch_i, "payload": payload_str
-            })
-
-        with open(self.csv_log, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([
+            },
+            [
                 now_dt.isoformat(), mac, name, rssi_i, channel_i, txpwr_i, mfg_resolved,
                 adv_len_i, has_services_i, len(services_list or []),
                 n_services_128_i, mfg_data or "", scanner, ts_epoch_i, payload_sig
-            ])
+            ],
+        )
 
     def export_json(self, output_path: Path, session_meta: dict):
-        with self.lock:
-            payload = {"meta": session_meta, "events": list(self.events)}
-        with open(output_path, "w", encoding="utf-8") as f: json.dump(payload, f, indent=2)
+        # Streams the writer's segments into {"meta", "events"}; see session_writer.py.
+        return self.writer.finalize(output_path, session_meta)
 
 # ---------------- App ----------------
 class BLEPopupApp:
-    def __init__(self, stream_url, json_out):
-        self.base_url = stream_url.replace("/api/ble/stream", "")
+    def __init__(self, stream_url, json_out, replay=None, replay_from_us=None, replay_to_us=None, replay_speed=1.0):
+        self.base_url = (stream_url or "").replace("/api/ble/stream", "")
         self.stream_url = stream_url
         self.json_out = json_out
+        # Replay a recorded session (.json/.zip/.blesa) instead of the live stream.
+        self.replay = replay
+        self.replay_range = (replay_from_us, replay_to_us)
+        self.replay_speed = replay_speed
         self.start_iso = datetime.now().isoformat(timespec="seconds")
-        self.model = DeviceModel()
+        self.model = DeviceModel(session_out=json_out)
         self.view_mode = "SIGNALS"
 
         self.root = tk.Tk()
@@ -323,7 +347,8 @@ class BLEPopupApp:
         self.stop_flag.set()
         time.sleep(0.2)
         self.stop_flag.clear()
-        self.reader_thread_handle = threading.Thread(target=self.reader_thread, daemon=True)
+        target = self.replay_thread if self.replay else self.reader_thread
+        self.reader_thread_handle = threading.Thread(target=target, daemon=True)
         self.reader_thread_handle.start()
 
     def reader_thread(self):
@@ -342,6 +367,24 @@ class BLEPopupApp:
         except Exception:
             self.lbl_status.config(text="Status: Disconnected", foreground="red")
 
+    def replay_thread(self):
+        # Paces events by their recorded ts; speed <= 0 replays as fast as possible.
+        self.lbl_status.config(text=f"Status: Replaying {Path(self.replay).name}", foreground="blue")
+        first_ts = None
+        start_mono = time.monotonic()
+        try:
+            for ev in iter_raw_events(self.replay, t_start_us=self.replay_range[0], t_end_us=self.replay_range[1]):
+                if self.stop_flag.is_set(): return
+                ts = safe_int(ev.get("ts"), 0)
+                if self.replay_speed > 0 and ts:
+                    if first_ts is None: first_ts = ts
+                    delay = (ts - first_ts) / 1e6 / self.replay_speed - (time.monotonic() - start_mono)
+                    if delay > 0: time.sleep(delay)
+                self._handle_stream_event(ev)
+            self.lbl_status.config(text="Status: Replay finished", foreground="green")
+        except Exception:
+            self.lbl_status.config(text="Status: Replay failed", foreground="red")
+
     def _handle_stream_event(self, ev):
         p_data = ev.get("payload", ev.get("p", "")) or ""
 
@@ -416,14 +459,25 @@ class BLEPopupApp:
             meta = {"start": self.start_iso, "devices": len(self.model.snapshot_devices()), "end": datetime.now().isoformat()}
             try: self.model.export_json(Path(self.json_out), meta)
             except Exception: pass
+        else:
+            self.model.writer.close()
         self.root.destroy()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--url", required=True)
+    parser.add_argument("--url", default=None)
     parser.add_argument("--json-out", default=None)
+    parser.add_argument("--replay", default=None, help="Replay a recorded session (.json/.zip/.blesa) instead of --url")
+    parser.add_argument("--replay-from-us", type=int, default=None)
+    parser.add_argument("--replay-to-us", type=int, default=None)
+    parser.add_argument("--replay-speed", type=float, default=1.0)
     args = parser.parse_args()
+    if not args.url and not args.replay:
+        parser.error("one of --url or --replay is required")
     if args.json_out is None:
         args.json_out = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     load_mfg_ids()
-    BLEPopupApp(args.url, json_out=args.json_out).root.mainloop()
+    BLEPopupApp(
+        args.url, json_out=args.json_out, replay=args.replay,
+        replay_from_us=args.replay_from_us, replay_to_us=args.replay_to_us, replay_speed=args.replay_speed
+    ).root.mainloop()
@@ -3,11 +3,14 @@
 build_calibration_fingerprints.py
 
 Builds a 3x3 BLE RSSI fingerprint database from calibration_raw.csv and
-calibration_summary.csv.
+calibration_summary.csv, or from selected sessions of the per-session
+calibration store (calibration_store.py, --store).
 
 Input files:
     calibration_raw.csv
     calibration_summary.csv
+  or
+    calibration_store/index.json + calibration_store/sessions/*.cal.json.gz
 
 Output file:
     calibration_fingerprints.json
@@ -15,6 +18,20 @@ Output file:
 The output is used by pc_receiver.py for mobile-only probabilistic block
 localization.
 
+Ingestion notes:
+    - calibration_raw.csv is streamed in fixed-size chunks into compact
+      per-(block, scanner) integer columns instead of one dict per row.
+      CSV input is read with the csv module; pyarrow (when installed) is
+      only used to read .parquet input as record batches.
+    - Per-group statistics are vectorized with NumPy when installed and fall
+      back to the pure-Python implementation otherwise. Results are identical.
+    - Each block carries a digest of its raw and summary rows. Rebuilding into
+      an existing output reuses blocks whose digest did not change (--full
+      forces a complete rebuild).
+    - With --store, sessions are selected by date, room and block from the
+      store index. Block digests come from the index session hashes, so only
+      session files of changed blocks are opened.
+
 Model notes:
     - Tx Power is intentionally ignored.
     - The current ESP32 firmware channel field is a software label, not a real
@@ -27,13 +44,27 @@ from __future__ import annotations
 
 import argparse
 import csv
+import hashlib
 import json
 import math
 import statistics
+from array import array
 from collections import Counter, defaultdict
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional
+
+from calibration_store import DEFAULT_STORE_DIR, CalibrationStore
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa_parquet = None
 
 
 GRID_LAYOUT = [[1, 2, 3], [6, 5, 4], [7, 8, 9]]
@@ -55,6 +86,10 @@ BLOCK_SIZE_CM = {
     "y_cm": TILE_SIZE_CM * BLOCK_TILES_H,
 }
 
+# Rows per streamed chunk of calibration_raw.csv.
+RAW_CHUNK_ROWS = 50_000
+RAW_COLUMNS = ["grid_block", "scanner_id", "sample_index", "rssi"]
+
 
 def safe_float(value: Any, default: float | None = None) -> float | None:
     try:
@@ -148,6 +183,54 @@ def summarize_samples(samples: List[int]) -> Dict[str, Any]:
     }
 
 
+def summarize_samples_numpy(samples: Any) -> Dict[str, Any]:
+    """Vectorized summarize_samples(); same keys and rounding."""
+    vals = np.asarray(samples, dtype=np.float64)
+    if vals.size == 0:
+        return summarize_samples([])
+
+    ordered = np.sort(vals)
+    keep_n = max(1, int(vals.size) // 2)
+    std = float(vals.std(ddof=1)) if vals.size > 1 else 0.0
+    p10, p25, p50, p75, p90 = np.percentile(ordered, [10, 25, 50, 75, 90])
+
+    return {
+        "n_samples": int(vals.size),
+        "mean_rssi": round(float(vals.mean()), 3),
+        "median_rssi": round(float(np.median(ordered)), 3),
+        "std_rssi": round(std, 3),
+        "min_rssi": int(ordered[0]),
+        "max_rssi": int(ordered[-1]),
+        "p10_rssi": round(float(p10), 3),
+        "p25_rssi": round(float(p25), 3),
+        "p50_rssi": round(float(p50), 3),
+        "p75_rssi": round(float(p75), 3),
+        "p90_rssi": round(float(p90), 3),
+        "top_half_mean_rssi": round(float(ordered[-keep_n:].mean()), 3),
+    }
+
+
+def summarize_group(samples: Any) -> Dict[str, Any]:
+    if np is not None:
+        return summarize_samples_numpy(samples)
+    return summarize_samples(list(samples))
+
+
+def summary_row_values(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "session_id": row.get("session_id", ""),
+        "n_samples": safe_int(row.get("n_samples"), 0),
+        "mean_rssi": safe_float(row.get("mean_rssi")),
+        "median_rssi": safe_float(row.get("median_rssi")),
+        "std_rssi": safe_float(row.get("std_rssi")),
+        "min_rssi": safe_float(row.get("min_rssi")),
+        "max_rssi": safe_float(row.get("max_rssi")),
+        "p90_rssi": safe_float(row.get("p90_rssi")),
+        "top_half_mean_rssi": safe_float(row.get("top_half_mean_rssi")),
+        "complete": safe_int(row.get("complete"), 0),
+    }
+
+
 def read_summary(path: Path) -> Dict[str, Dict[str, Dict[str, Any]]]:
     out: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
     if not path.exists():
@@ -160,57 +243,133 @@ def read_summary(path: Path) -> Dict[str, Dict[str, Dict[str, Any]]]:
             if not block or not scanner:
                 continue
 
-            out[block][scanner] = {
-                "session_id": row.get("session_id", ""),
-                "n_samples": safe_int(row.get("n_samples"), 0),
-                "mean_rssi": safe_float(row.get("mean_rssi")),
-                "median_rssi": safe_float(row.get("median_rssi")),
-                "std_rssi": safe_float(row.get("std_rssi")),
-                "min_rssi": safe_float(row.get("min_rssi")),
-                "max_rssi": safe_float(row.get("max_rssi")),
-                "p90_rssi": safe_float(row.get("p90_rssi")),
-                "top_half_mean_rssi": safe_float(row.get("top_half_mean_rssi")),
-                "complete": safe_int(row.get("complete"), 0),
-            }
+            out[block][scanner] = summary_row_values(row)
 
     return out
 
 
-def read_raw(path: Path) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
-    out: Dict[str, Dict[str, List[Dict[str, Any]]]] = defaultdict(lambda: defaultdict(list))
+class RawBlockColumns:
+    """
+    Raw calibration samples of one grid block in compact columnar form.
+
+    Per scanner, RSSI and sample_index are parallel integer arrays in file
+    order. A running digest over the rows lets incremental rebuilds detect
+    blocks whose raw data did not change.
+    """
+
+    __slots__ = ("rssi", "sample_index", "_digest")
+
+    def __init__(self) -> None:
+        self.rssi: Dict[str, array] = {}
+        self.sample_index: Dict[str, array] = {}
+        self._digest = hashlib.sha1()
+
+    def append(self, scanner: str, sample_index: int, rssi: int) -> None:
+        col = self.rssi.get(scanner)
+        if col is None:
+            col = array("h")
+            self.rssi[scanner] = col
+            self.sample_index[scanner] = array("l")
+        col.append(rssi)
+        self.sample_index[scanner].append(sample_index)
+        self._digest.update(f"{scanner},{sample_index},{rssi}\n".encode("ascii", "replace"))
+
+    def digest(self) -> str:
+        return self._digest.hexdigest()
+
+    def n_rows(self) -> int:
+        return sum(len(col) for col in self.rssi.values())
+
+
+def iter_raw_chunks(path: Path, chunk_rows: int = RAW_CHUNK_ROWS) -> Iterator[Dict[str, List[Any]]]:
+    """
+    Stream calibration raw samples as column chunks of at most chunk_rows rows.
+
+    Only RAW_COLUMNS are materialized. A .parquet path is read with pyarrow
+    record batches when pyarrow is installed.
+    """
     if not path.exists():
-        return out
+        return
+
+    if path.suffix.lower() == ".parquet":
+        if pa_parquet is None:
+            raise RuntimeError(f"{path} is parquet but pyarrow is not installed")
+        parquet_file = pa_parquet.ParquetFile(str(path))
+        names = set(parquet_file.schema_arrow.names)
+        cols = [c for c in RAW_COLUMNS if c in names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=cols):
+            n = batch.num_rows
+            chunk = {c: [None] * n for c in RAW_COLUMNS}
+            for c in cols:
+                chunk[c] = batch.column(cols.index(c)).to_pylist()
+            yield chunk
+        return
 
     with path.open("r", newline="", encoding="utf-8-sig") as f:
-        for row in csv.DictReader(f):
-            block = str(row.get("grid_block", "")).strip()
-            scanner = str(row.get("scanner_id", "")).strip()
-            rssi = safe_int(row.get("rssi"))
-            if not block or not scanner or rssi is None:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if not header:
+            return
+        positions = {name.strip(): i for i, name in enumerate(header)}
+        indexes = [positions.get(c) for c in RAW_COLUMNS]
+
+        chunk: Dict[str, List[Any]] = {c: [] for c in RAW_COLUMNS}
+        rows = 0
+        for row in reader:
+            width = len(row)
+            for c, i in zip(RAW_COLUMNS, indexes):
+                chunk[c].append(row[i] if i is not None and i < width else None)
+            rows += 1
+            if rows >= chunk_rows:
+                yield chunk
+                chunk = {c: [] for c in RAW_COLUMNS}
+                rows = 0
+        if rows:
+            yield chunk
+
+
+def read_raw_columns(path: Path, chunk_rows: int = RAW_CHUNK_ROWS) -> Dict[str, RawBlockColumns]:
+    out: Dict[str, RawBlockColumns] = {}
+
+    for chunk in iter_raw_chunks(path, chunk_rows):
+        for block, scanner, sample_index, rssi in zip(
+            chunk["grid_block"], chunk["scanner_id"], chunk["sample_index"], chunk["rssi"],
+        ):
+            block = str(block if block is not None else "").strip()
+            scanner = str(scanner if scanner is not None else "").strip()
+            rssi_val = safe_int(rssi)
+            if not block or not scanner or rssi_val is None:
                 continue
 
-            out[block][scanner].append({
-                "sample_index": safe_int(row.get("sample_index"), 0),
-                "rssi": int(rssi),
-                "timestamp_local": row.get("timestamp_local", ""),
-                "payload_sig": row.get("payload_sig", ""),
-            })
+            columns = out.get(block)
+            if columns is None:
+                columns = RawBlockColumns()
+                out[block] = columns
+            columns.append(scanner, safe_int(sample_index, 0) or 0, int(rssi_val))
 
     return out
 
 
+def block_digest(summary_by_scanner: Dict[str, Dict[str, Any]], raw_block: Optional[RawBlockColumns]) -> str:
+    h = hashlib.sha1()
+    h.update(json.dumps(summary_by_scanner, sort_keys=True, default=str).encode("utf-8"))
+    h.update((raw_block.digest() if raw_block is not None else "").encode("ascii"))
+    return h.hexdigest()
+
+
 def build_block_from_summary_and_raw(
     block: str,
     summary_by_scanner: Dict[str, Dict[str, Any]],
-    raw_by_scanner: Dict[str, List[Dict[str, Any]]],
+    raw_block: Optional[RawBlockColumns],
+    session_ids: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
-    scanners = sorted(set(summary_by_scanner.keys()) | set(raw_by_scanner.keys()), key=lambda x: int(x) if x.isdigit() else x)
+    raw_rssi = raw_block.rssi if raw_block is not None else {}
+    raw_index = raw_block.sample_index if raw_block is not None else {}
+    scanners = sorted(set(summary_by_scanner.keys()) | set(raw_rssi.keys()), key=lambda x: int(x) if x.isdigit() else x)
 
     raw_stats = {}
     for scanner in scanners:
-        raw_samples = [safe_int(item.get("rssi")) for item in raw_by_scanner.get(scanner, [])]
-        raw_samples = [v for v in raw_samples if v is not None]
-        raw_stats[scanner] = summarize_samples(raw_samples)
+        raw_stats[scanner] = summarize_group(raw_rssi.get(scanner, ()))
 
     mean = {}
     median = {}
@@ -262,13 +421,11 @@ def build_block_from_summary_and_raw(
 
     # Dominance/top-2 pattern from sample_index-aligned raw measurements.
     by_index: Dict[int, Dict[str, int]] = defaultdict(dict)
-    for scanner, rows in raw_by_scanner.items():
-        for item in rows:
-            idx = safe_int(item.get("sample_index"), 0)
-            rssi = safe_int(item.get("rssi"))
-            if idx is None or idx <= 0 or rssi is None:
+    for scanner, rssi_col in raw_rssi.items():
+        for idx, rssi in zip(raw_index[scanner], rssi_col):
+            if idx <= 0:
                 continue
-            by_index[idx][scanner] = int(rssi)
+            by_index[idx][scanner] = rssi
 
     strongest_counter: Counter[str] = Counter()
     top2_counter: Counter[str] = Counter()
@@ -323,9 +480,12 @@ def build_block_from_summary_and_raw(
         else:
             ambiguity = "HIGH"
 
+    if session_ids is None:
+        session_ids = [v.get("session_id", "") for v in summary_by_scanner.values()]
+
     return {
         "block_id": block,
-        "session_ids": sorted({v.get("session_id", "") for v in summary_by_scanner.values() if v.get("session_id")}),
+        "session_ids": sorted({s for s in session_ids if s}),
         "physical_nearest_scanner": PHYSICAL_NEAREST_SCANNER.get(block, ""),
         "mean": clean_mean,
         "median": {k: v for k, v in median.items() if isinstance(v, (int, float))},
@@ -354,20 +514,145 @@ def build_block_from_summary_and_raw(
     }
 
 
-def build_fingerprints(raw_csv: Path, summary_csv: Path) -> Dict[str, Any]:
+def build_fingerprints(
+    raw_csv: Path,
+    summary_csv: Path,
+    previous: Optional[Dict[str, Any]] = None,
+    chunk_rows: int = RAW_CHUNK_ROWS,
+) -> Dict[str, Any]:
+    """
+    Build the fingerprint payload.
+
+    previous: an earlier output of this function. Blocks whose digest matches
+    previous["block_digests"] are copied from it instead of being recomputed.
+    """
     summary = read_summary(summary_csv)
-    raw = read_raw(raw_csv)
+    raw = read_raw_columns(raw_csv, chunk_rows)
+
+    previous_blocks = (previous or {}).get("blocks", {}) or {}
+    previous_digests = (previous or {}).get("block_digests", {}) or {}
 
     all_blocks = sorted(set(summary.keys()) | set(raw.keys()), key=lambda x: int(x) if x.isdigit() else x)
     blocks = {}
+    digests = {}
+    rebuilt = []
+    reused = []
 
     for block in all_blocks:
+        digest = block_digest(summary.get(block, {}), raw.get(block))
+        digests[block] = digest
+        if previous_digests.get(block) == digest and block in previous_blocks:
+            blocks[block] = previous_blocks[block]
+            reused.append(block)
+            continue
+
         blocks[block] = build_block_from_summary_and_raw(
             block,
             summary.get(block, {}),
-            raw.get(block, {}),
+            raw.get(block),
+        )
+        rebuilt.append(block)
+
+    return fingerprint_payload(
+        blocks,
+        digests,
+        rebuilt,
+        reused,
+        sum(columns.n_rows() for columns in raw.values()),
+    )
+
+
+def build_fingerprints_from_store(
+    store: CalibrationStore,
+    entries: List[Dict[str, Any]],
+    previous: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the fingerprint payload from selected calibration store sessions.
+
+    entries: index entries from CalibrationStore.select(). A block digest is
+    the hash of its sessions' content hashes, so unchanged blocks are reused
+    from previous without opening their session files.
+
+    With a single session per block its recorded summary is used as-is, like
+    the CSV path. With several sessions the statistics are recomputed from
+    the pooled raw samples.
+    """
+    previous_blocks = (previous or {}).get("blocks", {}) or {}
+    previous_digests = (previous or {}).get("block_digests", {}) or {}
+
+    entries_by_block: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for entry in entries:
+        block = str(entry.get("grid_block", "")).strip()
+        if block:
+            entries_by_block[block].append(entry)
+
+    blocks = {}
+    digests = {}
+    rebuilt = []
+    reused = []
+    raw_rows = 0
+
+    for block in sorted(entries_by_block.keys(), key=lambda x: int(x) if x.isdigit() else x):
+        block_entries = entries_by_block[block]
+        h = hashlib.sha1(b"store\n")
+        for entry in sorted(block_entries, key=lambda e: str(e.get("session_id", ""))):
+            h.update(f"{entry.get('session_id', '')},{entry.get('sha1', '')}\n".encode("utf-8"))
+        digest = h.hexdigest()
+        digests[block] = digest
+        raw_rows += sum(int(entry.get("n_rows", 0) or 0) for entry in block_entries)
+
+        if previous_digests.get(block) == digest and block in previous_blocks:
+            blocks[block] = previous_blocks[block]
+            reused.append(block)
+            continue
+
+        raw_block = RawBlockColumns()
+        summary_by_scanner: Dict[str, Dict[str, Any]] = {}
+        for entry in block_entries:
+            session = store.load_session(entry)
+            columns = session["columns"]
+            for scanner, sample_index, rssi in zip(
+                columns.get("scanner_id", []), columns.get("sample_index", []), columns.get("rssi", []),
+            ):
+                scanner = str(scanner if scanner is not None else "").strip()
+                rssi_val = safe_int(rssi)
+                if not scanner or rssi_val is None:
+                    continue
+                raw_block.append(scanner, safe_int(sample_index, 0) or 0, int(rssi_val))
+
+            if len(block_entries) == 1:
+                for row in session["summary"]:
+                    scanner = str(row.get("scanner_id", "")).strip()
+                    if scanner:
+                        summary_by_scanner[scanner] = summary_row_values(
+                            dict(row, session_id=entry.get("session_id", ""))
+                        )
+
+        blocks[block] = build_block_from_summary_and_raw(
+            block,
+            summary_by_scanner,
+            raw_block,
+            session_ids=[str(entry.get("session_id", "")) for entry in block_entries],
         )
+        rebuilt.append(block)
+
+    payload = fingerprint_payload(blocks, digests, rebuilt, reused, raw_rows)
+    payload["source"] = {
+        "type": "calibration_store",
+        "store": str(store.root),
+        "session_ids": [str(entry.get("session_id", "")) for entry in entries],
+    }
+    return payload
 
+
+def fingerprint_payload(
+    blocks: Dict[str, Any],
+    digests: Dict[str, str],
+    rebuilt: List[str],
+    reused: List[str],
+    raw_rows: int,
+) -> Dict[str, Any]:
     return {
         "schema_version": 1,
         "generated_at": datetime.now().isoformat(timespec="seconds"),
@@ -385,6 +670,13 @@ def build_fingerprints(raw_csv: Path, summary_csv: Path) -> Dict[str, Any]:
         "scanners": ["1", "2", "3", "4"],
         "physical_nearest_scanner_anchors": PHYSICAL_NEAREST_SCANNER,
         "blocks": blocks,
+        "block_digests": digests,
+        "incremental": {
+            "rebuilt_blocks": rebuilt,
+            "reused_blocks": reused,
+            "raw_rows": raw_rows,
+            "vectorized": np is not None,
+        },
     }
 
 
@@ -393,13 +685,48 @@ def main() -> None:
     parser.add_argument("--raw", default="calibration_raw.csv", help="Path to calibration_raw.csv")
     parser.add_argument("--summary", default="calibration_summary.csv", help="Path to calibration_summary.csv")
     parser.add_argument("--out", default="calibration_fingerprints.json", help="Output JSON path")
+    parser.add_argument("--full", action="store_true", help="Recompute every block even if its input did not change")
+    parser.add_argument("--chunk-rows", type=int, default=RAW_CHUNK_ROWS, help="Raw rows per streamed chunk")
+    parser.add_argument(
+        "--store",
+        nargs="?",
+        const=DEFAULT_STORE_DIR,
+        default=None,
+        help=f"Build from the per-session calibration store instead of the CSVs (default dir: {DEFAULT_STORE_DIR})",
+    )
+    parser.add_argument("--date-from", default=None, help="Store: first session date, YYYY-MM-DD")
+    parser.add_argument("--date-to", default=None, help="Store: last session date, YYYY-MM-DD")
+    parser.add_argument("--room", action="append", default=None, help="Store: room name (repeatable)")
+    parser.add_argument("--block", action="append", default=None, help="Store: grid block (repeatable)")
+    parser.add_argument("--complete-only", action="store_true", help="Store: skip incomplete sessions")
     args = parser.parse_args()
 
-    payload = build_fingerprints(Path(args.raw), Path(args.summary))
     out_path = Path(args.out)
-    out_path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    previous = None
+    if not args.full and out_path.exists():
+        try:
+            previous = json.loads(out_path.read_text(encoding="utf-8"))
+        except Exception:
+            previous = None
+
+    if args.store:
+        store = CalibrationStore(args.store)
+        entries = store.select(args.date_from, args.date_to, args.room, args.block, args.complete_only)
+        print(f"Selected {len(entries)} session(s) from {store.root.resolve()}")
+        payload = build_fingerprints_from_store(store, entries, previous)
+    else:
+        payload = build_fingerprints(Path(args.raw), Path(args.summary), previous, max(1, args.chunk_rows))
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+    # Atomic replace: pc_receiver may hot-reload this file while it is written.
+    tmp_path.replace(out_path)
 
+    inc = payload["incremental"]
     print(f"Wrote {out_path.resolve()}")
+    print(
+        f"Raw rows: {inc['raw_rows']} | rebuilt: {', '.join(inc['rebuilt_blocks']) or '-'} | "
+        f"reused: {', '.join(inc['reused_blocks']) or '-'} | numpy: {inc['vectorized']}"
+    )
     print(f"Blocks: {', '.join(payload['blocks'].keys())}")
     for block, info in payload["blocks"].items():
         print(
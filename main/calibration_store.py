@@ -0,0 +1,386 @@
+"""
+calibration_store.py
+
+Per-session calibration dataset store.
+
+pc_receiver.py used to append every calibration sample to two global CSV files
+(calibration_raw.csv / calibration_summary.csv), so every fingerprint rebuild
+had to rescan the whole history. The store keeps one compact columnar file per
+calibration session plus a small index:
+
+    calibration_store/
+        index.json                               <- one entry per session
+        sessions/<session_id>.cal.json.gz        <- columnar samples + summary
+
+Session files are gzip-compressed JSON with one list per column. Repetitive
+string columns (scanner, MAC, payload signature, name) are dictionary encoded.
+The index carries everything needed to select sessions (date, room, grid
+block, scanners, completeness) and a content hash per session, so the
+fingerprint builder can decide which blocks changed without opening any
+session file.
+
+Pure Python, no third-party dependencies.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+STORE_SCHEMA_VERSION = 1
+DEFAULT_STORE_DIR = "calibration_store"
+INDEX_FILENAME = "index.json"
+SESSIONS_DIRNAME = "sessions"
+SESSION_SUFFIX = ".cal.json.gz"
+DEFAULT_ROOM = "default"
+
+# Column order of raw calibration samples. Matches the calibration_raw.csv
+# header written by pc_receiver.py, minus the per-session constant columns.
+RAW_COLUMNS = [
+    "scanner_id",
+    "sample_index",
+    "timestamp_local",
+    "timestamp_us",
+    "rx_ts_us",
+    "scanner_tm_us",
+    "rssi",
+    "mac",
+    "payload_sig",
+    "name",
+    "mfg_id",
+    "mfg_name",
+    "adv_len",
+    "channel_label",
+]
+
+# Low-cardinality string columns stored as {"dict": [...], "codes": [...]}.
+DICT_COLUMNS = {"scanner_id", "mac", "payload_sig", "name", "mfg_name", "channel_label"}
+
+SUMMARY_COLUMNS = [
+    "scanner_id",
+    "n_samples",
+    "mean_rssi",
+    "median_rssi",
+    "std_rssi",
+    "min_rssi",
+    "max_rssi",
+    "p90_rssi",
+    "top_half_mean_rssi",
+    "complete",
+]
+
+_SESSION_DATE_RE = re.compile(r"(\d{8})_(\d{6})")
+_SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+# -----------------------------------------------------------------------------
+# Column encoding
+# -----------------------------------------------------------------------------
+
+def _encode_column(name: str, values: List[Any]) -> Any:
+    if name not in DICT_COLUMNS:
+        return values
+    dictionary: List[Any] = []
+    positions: Dict[Any, int] = {}
+    codes: List[int] = []
+    for value in values:
+        key = "" if value is None else str(value)
+        code = positions.get(key)
+        if code is None:
+            code = len(dictionary)
+            positions[key] = code
+            dictionary.append(key)
+        codes.append(code)
+    return {"dict": dictionary, "codes": codes}
+
+
+def _decode_column(encoded: Any) -> List[Any]:
+    if isinstance(encoded, dict) and "dict" in encoded:
+        dictionary = encoded.get("dict", [])
+        return [dictionary[c] for c in encoded.get("codes", [])]
+    return list(encoded or [])
+
+
+def session_date(session_id: str, fallback: str = "") -> str:
+    """YYYY-MM-DD from a calib_YYYYmmdd_HHMMSS_block_N session id."""
+    match = _SESSION_DATE_RE.search(str(session_id or ""))
+    if match:
+        day = match.group(1)
+        return f"{day[:4]}-{day[4:6]}-{day[6:]}"
+    return str(fallback or "")[:10]
+
+
+def _safe_file_stem(session_id: str) -> str:
+    return _SAFE_NAME_RE.sub("_", str(session_id or "session")).strip("_") or "session"
+
+
+# -----------------------------------------------------------------------------
+# Store
+# -----------------------------------------------------------------------------
+
+class CalibrationStore:
+    """Directory of per-session columnar calibration files plus a JSON index."""
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        self.sessions_dir = self.root / SESSIONS_DIRNAME
+        self.index_path = self.root / INDEX_FILENAME
+        self._lock = threading.Lock()
+
+    # ---------------- index ----------------
+
+    def read_index(self) -> Dict[str, Any]:
+        try:
+            with self.index_path.open("r", encoding="utf-8") as f:
+                index = json.load(f)
+            if isinstance(index, dict) and isinstance(index.get("sessions"), dict):
+                return index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[CALIB] Could not read calibration index {self.index_path}: {e}")
+        return {"schema_version": STORE_SCHEMA_VERSION, "sessions": {}}
+
+    def _write_index(self, index: Dict[str, Any]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        index["schema_version"] = STORE_SCHEMA_VERSION
+        index["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    # ---------------- write ----------------
+
+    def write_session(
+        self,
+        meta: Dict[str, Any],
+        raw_rows: List[Dict[str, Any]],
+        summary_rows: List[Dict[str, Any]],
+    ) -> Path:
+        """
+        Write one calibration session and register it in the index.
+
+        meta must contain session_id and grid_block; room defaults to
+        DEFAULT_ROOM. Re-writing an existing session_id replaces it.
+        """
+        session_id = str(meta.get("session_id") or "")
+        if not session_id:
+            raise ValueError("calibration session needs a session_id")
+
+        meta = dict(meta)
+        meta["grid_block"] = str(meta.get("grid_block") or "")
+        meta["room"] = str(meta.get("room") or DEFAULT_ROOM)
+        meta.setdefault("saved_at", datetime.now().isoformat(timespec="seconds"))
+        meta.setdefault("date", session_date(session_id, meta.get("saved_at", "")))
+
+        columns = {
+            name: _encode_column(name, [row.get(name, "") for row in raw_rows])
+            for name in RAW_COLUMNS
+        }
+        summary = [{name: row.get(name, "") for name in SUMMARY_COLUMNS} for row in summary_rows]
+        payload = {
+            "schema_version": STORE_SCHEMA_VERSION,
+            "meta": meta,
+            "n_rows": len(raw_rows),
+            "columns": columns,
+            "summary": summary,
+        }
+        blob = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        digest = hashlib.sha1(blob).hexdigest()
+
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        path = self.sessions_dir / f"{_safe_file_stem(session_id)}{SESSION_SUFFIX}"
+        tmp_path = path.with_name(path.name + ".tmp")
+        # mtime=0 keeps the gzip bytes deterministic for identical content.
+        with tmp_path.open("wb") as raw, gzip.GzipFile(filename="", mode="wb", fileobj=raw, mtime=0) as gz:
+            gz.write(blob)
+        os.replace(tmp_path, path)
+
+        n_samples: Dict[str, int] = {}
+        for scanner in _decode_column(columns["scanner_id"]):
+            n_samples[str(scanner)] = n_samples.get(str(scanner), 0) + 1
+
+        entry = {
+            "session_id": session_id,
+            "file": str(path.relative_to(self.root)).replace("\\", "/"),
+            "grid_block": meta["grid_block"],
+            "room": meta["room"],
+            "date": meta["date"],
+            "saved_at": meta["saved_at"],
+            "scanners": sorted(n_samples.keys(), key=lambda x: int(x) if x.isdigit() else x),
+            "n_samples": n_samples,
+            "n_rows": len(raw_rows),
+            "complete": bool(summary) and all(int(row.get("complete") or 0) == 1 for row in summary),
+            "sha1": digest,
+        }
+
+        with self._lock:
+            index = self.read_index()
+            index["sessions"][session_id] = entry
+            self._write_index(index)
+
+        return path
+
+    # ---------------- select / read ----------------
+
+    def select(
+        self,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        rooms: Optional[Iterable[str]] = None,
+        blocks: Optional[Iterable[str]] = None,
+        complete_only: bool = False,
+        session_ids: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Return index entries matching all given filters, oldest first.
+
+        Dates are inclusive YYYY-MM-DD strings. Only the index is read.
+        """
+        room_set = {str(r) for r in rooms} if rooms else None
+        block_set = {str(b) for b in blocks} if blocks else None
+        id_set = {str(s) for s in session_ids} if session_ids else None
+
+        out = []
+        for entry in self.read_index().get("sessions", {}).values():
+            date = str(entry.get("date", ""))
+            if date_from and date < str(date_from):
+                continue
+            if date_to and date > str(date_to):
+                continue
+            if room_set is not None and str(entry.get("room", "")) not in room_set:
+                continue
+            if block_set is not None and str(entry.get("grid_block", "")) not in block_set:
+                continue
+            if complete_only and not entry.get("complete", False):
+                continue
+            if id_set is not None and str(entry.get("session_id", "")) not in id_set:
+                continue
+            out.append(entry)
+
+        out.sort(key=lambda e: (str(e.get("saved_at", "")), str(e.get("session_id", ""))))
+        return out
+
+    def load_session(self, entry_or_id: Any) -> Dict[str, Any]:
+        """Return {"meta", "columns" (decoded lists), "summary", "n_rows"} for one session."""
+        if isinstance(entry_or_id, dict):
+            entry = entry_or_id
+        else:
+            entry = self.read_index().get("sessions", {}).get(str(entry_or_id))
+            if entry is None:
+                raise KeyError(f"unknown calibration session {entry_or_id}")
+
+        with gzip.open(self.root / entry["file"], "rb") as f:
+            payload = json.loads(f.read().decode("utf-8"))
+
+        return {
+            "meta": payload.get("meta", {}),
+            "n_rows": int(payload.get("n_rows", 0) or 0),
+            "columns": {name: _decode_column(col) for name, col in (payload.get("columns", {}) or {}).items()},
+            "summary": list(payload.get("summary", []) or []),
+        }
+
+    def iter_raw_rows(self, entries: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield calibration_raw.csv-compatible row dicts for the given index entries."""
+        for entry in entries:
+            session = self.load_session(entry)
+            meta = session["meta"]
+            columns = session["columns"]
+            names = [name for name in RAW_COLUMNS if name in columns]
+            for values in zip(*(columns[name] for name in names)):
+                row = dict(zip(names, values))
+                row["session_id"] = meta.get("session_id", "")
+                row["grid_block"] = meta.get("grid_block", "")
+                row["room"] = meta.get("room", DEFAULT_ROOM)
+                yield row
+
+    # ---------------- migration ----------------
+
+    def import_csv(self, raw_csv: Path, summary_csv: Path, room: str = DEFAULT_ROOM) -> List[str]:
+        """
+        Split legacy calibration_raw.csv / calibration_summary.csv history into
+        per-session files. Sessions already in the index are skipped.
+        """
+        known = set(self.read_index().get("sessions", {}).keys())
+        raw_by_session: Dict[str, List[Dict[str, Any]]] = {}
+        summary_by_session: Dict[str, List[Dict[str, Any]]] = {}
+        blocks: Dict[str, str] = {}
+
+        for path, target in ((raw_csv, raw_by_session), (summary_csv, summary_by_session)):
+            if not path.exists():
+                continue
+            with path.open("r", newline="", encoding="utf-8-sig") as f:
+                for row in csv.DictReader(f):
+                    session_id = str(row.get("session_id", "") or "").strip()
+                    if not session_id or session_id in known:
+                        continue
+                    target.setdefault(session_id, []).append(row)
+                    blocks.setdefault(session_id, str(row.get("grid_block", "") or "").strip())
+
+        imported = []
+        for session_id in sorted(set(raw_by_session) | set(summary_by_session)):
+            raw_rows = raw_by_session.get(session_id, [])
+            first_ts = str(raw_rows[0].get("timestamp_local", "")) if raw_rows else ""
+            meta = {
+                "session_id": session_id,
+                "grid_block": blocks.get(session_id, ""),
+                "room": room,
+                "date": session_date(session_id, first_ts),
+                "saved_at": first_ts[:19] or datetime.now().isoformat(timespec="seconds"),
+                "source": "imported_csv",
+            }
+            self.write_session(meta, raw_rows, summary_by_session.get(session_id, []))
+            imported.append(session_id)
+
+        return imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the per-session calibration store.")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Store directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="Import legacy calibration CSV history")
+    imp.add_argument("--raw", default="calibration_raw.csv")
+    imp.add_argument("--summary", default="calibration_summary.csv")
+    imp.add_argument("--room", default=DEFAULT_ROOM)
+
+    lst = sub.add_parser("list", help="List sessions matching filters")
+    lst.add_argument("--date-from", default=None)
+    lst.add_argument("--date-to", default=None)
+    lst.add_argument("--room", action="append", default=None)
+    lst.add_argument("--block", action="append", default=None)
+    lst.add_argument("--complete-only", action="store_true")
+
+    args = parser.parse_args()
+    store = CalibrationStore(args.store)
+
+    if args.command == "import":
+        imported = store.import_csv(Path(args.raw), Path(args.summary), args.room)
+        print(f"Imported {len(imported)} session(s) into {store.root.resolve()}")
+        for session_id in imported:
+            print(f"  {session_id}")
+        return
+
+    entries = store.select(args.date_from, args.date_to, args.room, args.block, args.complete_only)
+    for entry in entries:
+        print(
+            f"{entry['session_id']:<36} block={entry.get('grid_block'):<3} room={entry.get('room'):<12} "
+            f"date={entry.get('date')} rows={entry.get('n_rows')} complete={entry.get('complete')}"
+        )
+    print(f"{len(entries)} session(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+expiry_queue.py
+
+Deadline queue for tracker timers (track/alias expiry, burst and motion-slice
+finalization).
+
+ExpiryQueue is a lazy min-heap with at most one pending entry per key:
+    schedule(key, deadline)  no-op if the key already has a pending entry
+    pop_due(now)             yields keys whose deadline < now, earliest first
+
+Deadlines are not updated when the underlying object is touched again.
+Instead the owner re-checks the object when its key comes due and schedules
+it again if the real deadline has moved. An object seen on every packet
+therefore costs one heap push per timeout period, not per packet, and a
+poll with nothing due is a single comparison.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Any, Hashable, Iterator, List, Set, Tuple
+
+
+class ExpiryQueue:
+    def __init__(self) -> None:
+        self.heap: List[Tuple[float, int, Hashable]] = []
+        self.pending: Set[Hashable] = set()
+        self._seq = itertools.count()
+
+    def schedule(self, key: Hashable, deadline: float) -> bool:
+        if key in self.pending:
+            return False
+        self.pending.add(key)
+        heapq.heappush(self.heap, (deadline, next(self._seq), key))
+        return True
+
+    def pop_due(self, now: float) -> Iterator[Any]:
+        """
+        Yield due keys. A key is no longer pending once yielded, so the caller
+        may schedule it again (with a deadline >= now) while iterating.
+        """
+        heap = self.heap
+        while heap and heap[0][0] < now:
+            _, _, key = heapq.heappop(heap)
+            self.pending.discard(key)
+            yield key
+
+    def next_deadline(self) -> float:
+        return self.heap[0][0] if self.heap else float("inf")
+
+    def __len__(self) -> int:
+        return len(self.heap)
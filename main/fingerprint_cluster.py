@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+fingerprint_cluster.py
+
+Offline BLE physical-device clustering. Python port of fingerprint_cluster_new.m.
+
+The MATLAB script loads the whole session with jsondecode, decodes the
+manufacturer id with one hex2dec call per event and groups events by an
+identity key. This tool keeps the same identity-first model and outputs but:
+
+- streams the session through session_reader.py (.json, .zip, .blesa, .jsonl);
+- parses each distinct advertisement payload once and gathers the decoded
+  fields back to events with NumPy code arrays;
+- clusters per-(MAC, payload signature) groups instead of single events:
+  groups are blocked by identity key (the MATLAB grouping) and, within a
+  block, split by their per-scanner RSSI profile with vectorized leader
+  clustering (O(groups x leaders) per block);
+- writes the same reports as the MATLAB script:
+    <out>/events_with_physical_id.csv
+    <out>/physical_devices.csv
+    <out>/patterns/physical_device_<id>.csv
+    <out>/plots/cluster_<id>_patterns.png   (when matplotlib is installed)
+
+Identity key (same rules as the MATLAB script):
+    MFGSIG_<mfg_id>_<mfg_sig>        manufacturer data present
+    SRV_<mfg_id>_<n16>_<n128>        service UUIDs present
+    MFGONLY_<mfg_id>                 fallback
+
+mfg_sig is the first two bytes of manufacturer data after the company id
+(for Apple and Microsoft this is the message type and length).
+
+Use --split-db 0 to reproduce the MATLAB grouping exactly (identity key only).
+
+Requires NumPy.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ble_adv_parser import AdvParser
+from session_reader import iter_raw_events
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+
+
+# Groups whose scanner RSSI profiles differ by more than this RMS (dB) over
+# their shared scanners are split into different physical devices.
+DEFAULT_SPLIT_DB = 8.0
+# Groups must share at least this many scanners to be compared; otherwise
+# they are kept together (not enough evidence to split).
+MIN_SHARED_SCANNERS = 2
+# Clusters smaller than this get no pattern plot (same as the MATLAB script).
+MIN_PLOT_EVENTS = 5
+MFG_SIG_HEX_CHARS = 4
+NO_MFG_ID = -1
+
+
+# -----------------------------------------------------------------------------
+# Loading
+# -----------------------------------------------------------------------------
+
+class _Codes:
+    """String dictionary: value -> dense integer code."""
+
+    def __init__(self) -> None:
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: str) -> int:
+        c = self.index.get(value)
+        if c is None:
+            c = len(self.values)
+            self.index[value] = c
+            self.values.append(value)
+        return c
+
+
+def load_session_columns(path: str, t_start_us: Optional[int] = None, t_end_us: Optional[int] = None) -> Dict[str, Any]:
+    """Stream a session into NumPy columns; string fields are dictionary encoded."""
+    macs = _Codes()
+    scanners = _Codes()
+    payloads = _Codes()
+    names = _Codes()
+    ts: List[int] = []
+    rssi: List[int] = []
+    channel: List[int] = []
+    mac_c: List[int] = []
+    scanner_c: List[int] = []
+    payload_c: List[int] = []
+    name_c: List[int] = []
+    meta: Dict[str, Any] = {}
+
+    for ev in iter_raw_events(path, meta_out=meta, t_start_us=t_start_us, t_end_us=t_end_us):
+        ts.append(int(ev.get("ts") or 0))
+        rssi.append(int(ev.get("rssi") or 0))
+        channel.append(int(ev.get("channel") or 0))
+        mac_c.append(macs.code(str(ev.get("mac") or "").upper()))
+        scanner_c.append(scanners.code(str(ev.get("scanner") or "")))
+        payload_c.append(payloads.code(str(ev.get("payload") or "")))
+        name_c.append(names.code(str(ev.get("name") or "")))
+
+    return {
+        "meta": meta,
+        "ts": np.asarray(ts, dtype=np.int64),
+        "rssi": np.asarray(rssi, dtype=np.float64),
+        "channel": np.asarray(channel, dtype=np.int16),
+        "mac": np.asarray(mac_c, dtype=np.int32),
+        "scanner": np.asarray(scanner_c, dtype=np.int32),
+        "payload": np.asarray(payload_c, dtype=np.int32),
+        "name": np.asarray(name_c, dtype=np.int32),
+        "mac_values": macs.values,
+        "scanner_values": scanners.values,
+        "payload_values": payloads.values,
+        "name_values": names.values,
+    }
+
+
+def payload_features(payload_values: List[str]) -> Dict[str, Any]:
+    """Parse each distinct payload once; returns per-payload-code feature arrays."""
+    n = len(payload_values)
+    mfg_id = np.full(n, NO_MFG_ID, dtype=np.int32)
+    has_services = np.zeros(n, dtype=np.int8)
+    n16 = np.zeros(n, dtype=np.int16)
+    n128 = np.zeros(n, dtype=np.int16)
+    mfg_sig: List[str] = []
+    payload_sig: List[str] = []
+    adv_name: List[str] = []
+
+    for i, b64 in enumerate(payload_values):
+        parsed = AdvParser.parse_base64(b64)
+        if isinstance(parsed.get("mfg_id"), int):
+            mfg_id[i] = parsed["mfg_id"]
+        s16 = parsed.get("services_16", []) or []
+        s128 = parsed.get("services_128", []) or []
+        n16[i] = len(s16)
+        n128[i] = len(s128)
+        has_services[i] = 1 if (s16 or s128 or parsed.get("services_32")) else 0
+        mfg_hex = str(parsed.get("mfg_data_hex", "") or "")
+        mfg_sig.append(mfg_hex[:MFG_SIG_HEX_CHARS] if mfg_hex else "NONE")
+        payload_sig.append(str(parsed.get("payload_sig", "")))
+        adv_name.append(str(parsed.get("name", "Unknown") or "Unknown"))
+
+    return {
+        "mfg_id": mfg_id,
+        "has_services": has_services,
+        "n_services_16": n16,
+        "n_services_128": n128,
+        "mfg_sig": mfg_sig,
+        "payload_sig": payload_sig,
+        "adv_name": adv_name,
+    }
+
+
+def identity_keys(features: Dict[str, Any]) -> List[str]:
+    """Identity key per payload code, same precedence as the MATLAB script."""
+    keys = []
+    for mfg, sig, has_srv, n16, n128 in zip(
+        features["mfg_id"], features["mfg_sig"], features["has_services"],
+        features["n_services_16"], features["n_services_128"],
+    ):
+        mfg_s = str(int(mfg)) if mfg != NO_MFG_ID else "NONE"
+        if sig and sig != "NONE":
+            keys.append(f"MFGSIG_{mfg_s}_{sig}")
+        elif has_srv == 1:
+            keys.append(f"SRV_{mfg_s}_{int(n16)}_{int(n128)}")
+        else:
+            keys.append(f"MFGONLY_{mfg_s}")
+    return keys
+
+
+# -----------------------------------------------------------------------------
+# Clustering
+# -----------------------------------------------------------------------------
+
+def group_feature_matrix(cols: Dict[str, Any], sig_code_by_payload: np.ndarray, key_code_by_payload: np.ndarray) -> Dict[str, Any]:
+    """
+    Aggregate events into (MAC, payload signature) groups.
+
+    Returns per-group arrays: identity key code, event count and the mean
+    RSSI per scanner (NaN where the scanner never heard the group).
+    """
+    sig = sig_code_by_payload[cols["payload"]]
+    n_sigs = int(sig_code_by_payload.max()) + 1 if sig_code_by_payload.size else 1
+    pair = cols["mac"].astype(np.int64) * n_sigs + sig
+    pair_values, group_of_event = np.unique(pair, return_inverse=True)
+    n_groups = pair_values.size
+    n_scanners = len(cols["scanner_values"])
+
+    flat = group_of_event * n_scanners + cols["scanner"]
+    sums = np.bincount(flat, weights=cols["rssi"], minlength=n_groups * n_scanners).reshape(n_groups, n_scanners)
+    counts = np.bincount(flat, minlength=n_groups * n_scanners).reshape(n_groups, n_scanners)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        profile = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    # Every event of a group has the same payload signature, hence the same
+    # key, so any event can stand for its group.
+    any_event = np.zeros(n_groups, dtype=np.int64)
+    any_event[group_of_event] = np.arange(group_of_event.size)
+    key = key_code_by_payload[cols["payload"][any_event]]
+
+    return {
+        "group_of_event": group_of_event,
+        "key": key,
+        "n_events": counts.sum(axis=1),
+        "profile": profile,
+    }
+
+
+def leader_cluster(profile: np.ndarray, order: np.ndarray, split_db: float) -> np.ndarray:
+    """
+    Leader clustering of RSSI profiles (rows, NaN = unheard scanner).
+
+    Rows are visited in the given order (largest groups first). A row joins
+    the nearest leader within split_db RMS over shared scanners; rows sharing
+    fewer than MIN_SHARED_SCANNERS scanners with every leader join the first
+    leader. Returns a local cluster index per row.
+    """
+    labels = np.zeros(profile.shape[0], dtype=np.int32)
+    leaders = np.empty((0, profile.shape[1]))
+    for row in order:
+        vec = profile[row]
+        if leaders.shape[0] == 0:
+            leaders = vec[None, :]
+            labels[row] = 0
+            continue
+        diff = leaders - vec[None, :]
+        shared = ~np.isnan(diff)
+        n_shared = shared.sum(axis=1)
+        rms = np.sqrt(np.nansum(diff * diff, axis=1) / np.maximum(n_shared, 1))
+        comparable = n_shared >= MIN_SHARED_SCANNERS
+        if not comparable.any():
+            labels[row] = 0
+            continue
+        rms = np.where(comparable, rms, np.inf)
+        best = int(np.argmin(rms))
+        if rms[best] <= split_db:
+            labels[row] = best
+        else:
+            leaders = np.vstack([leaders, vec[None, :]])
+            labels[row] = leaders.shape[0] - 1
+    return labels
+
+
+def cluster_groups(groups: Dict[str, Any], split_db: float) -> np.ndarray:
+    """Physical id (1-based) per group: identity-key blocks, optionally split by RSSI profile."""
+    key = groups["key"]
+    physical = np.zeros(key.size, dtype=np.int32)
+    next_id = 1
+    order_all = np.argsort(key, kind="stable")
+    bounds = np.flatnonzero(np.diff(key[order_all])) + 1
+    for block in np.split(order_all, bounds):
+        if block.size == 0:
+            continue
+        if split_db <= 0 or block.size == 1:
+            physical[block] = next_id
+            next_id += 1
+            continue
+        local_order = np.argsort(-groups["n_events"][block], kind="stable")
+        labels = leader_cluster(groups["profile"][block], local_order, split_db)
+        physical[block] = next_id + labels
+        next_id += int(labels.max()) + 1
+    return physical
+
+
+# -----------------------------------------------------------------------------
+# Reports
+# -----------------------------------------------------------------------------
+
+def movmean(values: np.ndarray, win: int) -> np.ndarray:
+    """MATLAB movmean: centered window of win samples, shrinking at the edges."""
+    n = values.size
+    if n == 0:
+        return values
+    before = win // 2
+    after = win - before - 1
+    csum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    idx = np.arange(n)
+    lo = np.clip(idx - before, 0, n)
+    hi = np.clip(idx + after + 1, 0, n)
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+EVENT_COLUMNS = [
+    "time_axis", "ts", "mac", "scanner", "rssi", "channel", "name",
+    "mfg_id", "mfg_sig", "has_services", "n_services_16", "n_services_128",
+    "payload_sig", "identity_key", "physical_id",
+]
+
+
+def _event_rows(cols: Dict[str, Any], feats: Dict[str, Any], keys: List[str], physical_of_event: np.ndarray, idx: np.ndarray, t0: int):
+    """Rows for EVENT_COLUMNS. Columns are gathered with NumPy and zipped, not built per cell."""
+    def obj(values: List[Any]) -> np.ndarray:
+        arr = np.empty(len(values), dtype=object)
+        arr[:] = values
+        return arr
+
+    pc = cols["payload"][idx]
+    ts = cols["ts"][idx]
+    names = obj(cols["name_values"])[cols["name"][idx]]
+    adv_names = obj(feats["adv_name"])[pc]
+    mfg = obj([m if m != NO_MFG_ID else "" for m in feats["mfg_id"].tolist()])[pc]
+
+    return zip(
+        np.round((ts - t0) * 1e-6, 6).tolist(),
+        ts.tolist(),
+        obj(cols["mac_values"])[cols["mac"][idx]].tolist(),
+        obj(cols["scanner_values"])[cols["scanner"][idx]].tolist(),
+        cols["rssi"][idx].astype(np.int64).tolist(),
+        cols["channel"][idx].tolist(),
+        np.where(names == "", adv_names, names).tolist(),
+        mfg.tolist(),
+        obj(feats["mfg_sig"])[pc].tolist(),
+        feats["has_services"][pc].tolist(),
+        feats["n_services_16"][pc].tolist(),
+        feats["n_services_128"][pc].tolist(),
+        obj(feats["payload_sig"])[pc].tolist(),
+        obj(keys)[pc].tolist(),
+        physical_of_event[idx].tolist(),
+    )
+
+
+def _write_csv(path: Path, header: List[str], rows: Any) -> None:
+    with path.open("w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def plot_patterns(path: Path, physical_id: int, t: np.ndarray, rssi: np.ndarray, time_label: str) -> None:
+    win = max(3, int(round(rssi.size * 0.05)))
+    rssi_mean = movmean(rssi, win)
+    adv = np.diff(t)
+    keep = adv > 0
+    adv_mean = movmean(adv[keep], win)
+    t_adv = t[1:][keep]
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(9, 6), constrained_layout=True)
+    ax1.plot(t, rssi_mean, linewidth=1.5)
+    ax1.grid(True)
+    ax1.set_ylabel("RSSI Mean (dBm)")
+    ax1.set_title(f"Physical Device {physical_id} - RSSI Pattern")
+    ax2.plot(t_adv, adv_mean, linewidth=1.5)
+    ax2.grid(True)
+    ax2.set_ylabel("Advertising Interval (s)")
+    ax2.set_xlabel(time_label)
+    ax2.set_title("Advertising Interval Pattern")
+    fig.savefig(path, dpi=200)
+    plt.close(fig)
+
+
+def run(
+    session: str,
+    out_dir: Path,
+    split_db: float = DEFAULT_SPLIT_DB,
+    t_start_us: Optional[int] = None,
+    t_end_us: Optional[int] = None,
+    write_events: bool = True,
+    write_patterns: bool = True,
+    plots: bool = True,
+) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    t = time.perf_counter()
+    cols = load_session_columns(session, t_start_us, t_end_us)
+    timings["load"] = time.perf_counter() - t
+    n_events = int(cols["ts"].size)
+    if n_events == 0:
+        raise SystemExit(f"No events in {session}")
+
+    t = time.perf_counter()
+    feats = payload_features(cols["payload_values"])
+    keys = identity_keys(feats)
+    key_values, key_code_by_payload = np.unique(np.asarray(keys, dtype=object), return_inverse=True)
+    _, sig_code_by_payload = np.unique(np.asarray(feats["payload_sig"], dtype=object), return_inverse=True)
+    timings["parse_payloads"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    groups = group_feature_matrix(cols, sig_code_by_payload.astype(np.int64), key_code_by_payload.astype(np.int64))
+    physical_of_group = cluster_groups(groups, split_db)
+    physical_of_event = physical_of_group[groups["group_of_event"]]
+    timings["cluster"] = time.perf_counter() - t
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    pat_dir = out_dir / "patterns"
+    plot_dir = out_dir / "plots"
+
+    # Per-physical-device summary.
+    t = time.perf_counter()
+    order = np.lexsort((cols["ts"], physical_of_event))
+    sorted_phys = physical_of_event[order]
+    bounds = np.flatnonzero(np.diff(sorted_phys)) + 1
+    t0 = int(cols["ts"].min())
+    summary_rows = []
+    per_device = []
+    for idx in np.split(order, bounds):
+        pid = int(physical_of_event[idx[0]])
+        payload_codes = cols["payload"][idx]
+        mfg_vals = feats["mfg_id"][payload_codes]
+        mfg_mode = Counter(mfg_vals.tolist()).most_common(1)[0][0]
+        sigs = sorted({feats["mfg_sig"][p] for p in np.unique(payload_codes).tolist()})
+        rssi = cols["rssi"][idx]
+        summary_rows.append([
+            pid,
+            int(np.unique(cols["mac"][idx]).size),
+            mfg_mode if mfg_mode != NO_MFG_ID else "",
+            ";".join(sigs),
+            round(float(rssi.mean()), 3),
+            round(float(rssi.std(ddof=1)) if rssi.size > 1 else 0.0, 3),
+            int(idx.size),
+            keys[int(payload_codes[0])],
+        ])
+        per_device.append((pid, idx))
+
+    _write_csv(
+        out_dir / "physical_devices.csv",
+        ["physical_id", "n_macs", "mfg_id", "mfg_sig", "rssi_mean", "rssi_std", "n_events", "identity_key"],
+        summary_rows,
+    )
+    if write_events:
+        _write_csv(
+            out_dir / "events_with_physical_id.csv",
+            EVENT_COLUMNS,
+            _event_rows(cols, feats, keys, physical_of_event, np.arange(n_events), t0),
+        )
+    if write_patterns:
+        pat_dir.mkdir(exist_ok=True)
+        for pid, idx in per_device:
+            _write_csv(
+                pat_dir / f"physical_device_{pid}.csv",
+                EVENT_COLUMNS,
+                _event_rows(cols, feats, keys, physical_of_event, idx, t0),
+            )
+    timings["reports"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    n_plots = 0
+    if plots and plt is not None:
+        plot_dir.mkdir(exist_ok=True)
+        for pid, idx in per_device:
+            if idx.size < MIN_PLOT_EVENTS:
+                continue
+            times = (cols["ts"][idx] - t0) * 1e-6
+            plot_patterns(plot_dir / f"cluster_{pid}_patterns.png", pid, times, cols["rssi"][idx], "Time since session start (s)")
+            n_plots += 1
+    timings["plots"] = time.perf_counter() - t
+
+    return {
+        "events": n_events,
+        "macs": len(cols["mac_values"]),
+        "payloads": len(cols["payload_values"]),
+        "groups": int(groups["key"].size),
+        "identity_keys": int(key_values.size),
+        "physical_devices": len(per_device),
+        "plots": n_plots,
+        "timings": timings,
+        "summary": summary_rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline BLE physical-device clustering (port of fingerprint_cluster_new.m).")
+    parser.add_argument("session", help="Session .json / .zip / .blesa / .jsonl or segment directory")
+    parser.add_argument("--out", default="cluster_output", help="Output directory")
+    parser.add_argument("--split-db", type=float, default=DEFAULT_SPLIT_DB,
+                        help="RSSI-profile split threshold in dB RMS (0 = identity key only, as in MATLAB)")
+    parser.add_argument("--from-us", type=int, default=None)
+    parser.add_argument("--to-us", type=int, default=None)
+    parser.add_argument("--no-events-csv", action="store_true", help="Skip events_with_physical_id.csv")
+    parser.add_argument("--no-patterns", action="store_true", help="Skip per-device pattern CSVs")
+    parser.add_argument("--no-plots", action="store_true", help="Skip pattern plots")
+    args = parser.parse_args()
+
+    result = run(
+        args.session,
+        Path(args.out),
+        split_db=args.split_db,
+        t_start_us=args.from_us,
+        t_end_us=args.to_us,
+        write_events=not args.no_events_csv,
+        write_patterns=not args.no_patterns,
+        plots=not args.no_plots,
+    )
+
+    print(
+        f"Events: {result['events']} | MACs: {result['macs']} | payloads: {result['payloads']} | "
+        f"MAC/signature groups: {result['groups']} | identity keys: {result['identity_keys']}"
+    )
+    print(f"Detected physical devices: {result['physical_devices']}")
+    for row in result["summary"][:40]:
+        print(f"  {row[0]:>4}  macs={row[1]:<4} mfg={row[2]!s:<6} rssi={row[4]:>7} n={row[6]:<7} {row[7]}")
+    if plt is None and not args.no_plots:
+        print("matplotlib not installed: pattern plots skipped.")
+    elif not args.no_plots:
+        print(f"Cluster pattern plots saved in: {Path(args.out) / 'plots'} ({result['plots']})")
+    print("Timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in result["timings"].items()))
+
+
+if __name__ == "__main__":
+    main()
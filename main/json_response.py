@@ -0,0 +1,116 @@
+"""
+json_response.py
+
+Single-pass JSON encoding and response compression for the large API payloads
+(/api/devices, /api/localization, /api/stats).
+
+encode_json(payload) -> bytes
+    Serializes in one pass. Python-only types are handled by a default hook
+    instead of a recursive pre-walk over the whole payload:
+        set / frozenset     sorted list (by str)
+        deque / array       list
+        NumPy scalars/arrays  Python values / lists
+    Non-finite floats (NaN, +-inf) become null, so the body is strict JSON.
+    orjson is used when installed (it writes NaN as null natively); otherwise
+    the stdlib encoder runs with allow_nan=False and only a payload that
+    actually contains a non-finite float or a non-str dict key takes the slower
+    json_safe() walk.
+
+compress_body(body, accept_encoding, min_bytes) -> (body, content_encoding)
+    br (when the brotli package is installed) or gzip, picked from the
+    request's Accept-Encoding. Bodies below min_bytes are sent as-is.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import math
+from array import array
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if isinstance(value, (deque, array, tuple)):
+        return list(value)
+    tolist = getattr(value, "tolist", None)
+    if tolist is not None:
+        # NumPy scalar or array.
+        return tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def json_safe(value: Any) -> Any:
+    """Recursive conversion to plain JSON values (the slow fallback path)."""
+    if isinstance(value, dict):
+        return {str(k): json_safe(v) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted([json_safe(v) for v in value], key=lambda x: str(x))
+    if isinstance(value, (list, tuple, deque, array)):
+        return [json_safe(v) for v in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if hasattr(value, "tolist"):
+        return json_safe(value.tolist())
+    return value
+
+
+def encode_json(payload: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, default=json_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. tuple dict keys or integers beyond 64 bits.
+            return orjson.dumps(json_safe(payload), option=_ORJSON_OPTIONS)
+    try:
+        text = json.dumps(payload, default=json_default, allow_nan=False, separators=(",", ":"))
+    except (ValueError, TypeError):
+        text = json.dumps(json_safe(payload), default=json_default, separators=(",", ":"))
+    return text.encode("utf-8")
+
+
+def _accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        out[token] = q
+    return out
+
+
+def compress_body(body: bytes, accept_encoding: str, min_bytes: int) -> Tuple[bytes, Optional[str]]:
+    if len(body) < min_bytes:
+        return body, None
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and accepted.get("br", 0.0) > 0.0:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if accepted.get("gzip", accepted.get("*", 0.0)) > 0.0:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
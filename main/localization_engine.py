@@ -250,7 +250,17 @@ def confidence_for_track(track: Mapping[str, Any], scanner_rssi: Mapping[str, fl
     return "LOW", "weak_or_ambiguous_rssi_shape"
 
 
-def localize_track(track: Mapping[str, Any]) -> Dict[str, Any]:
+def localize_track(track: Mapping[str, Any], field_map: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Weighted-centroid position for one track row.
+
+    When a compiled field map (localization_field_map.load_or_build_field_map)
+    is passed, the bias-corrected RSSI is also matched against it and the
+    finer position is returned under "field_map_position".
+
+    Rows from pc_receiver carry the per-track recursive estimate under
+    "tracked_position"; it is passed through as-is (O(1), no recompute).
+    """
     ok, reason = localizability_reason(track)
     if not ok:
         return {
@@ -277,6 +287,12 @@ def localize_track(track: Mapping[str, Any]) -> Dict[str, Any]:
     top2_sids = [sid for sid, _ in ordered[:2]]
     confidence, confidence_reason = confidence_for_track(track, corr)
 
+    field_map_position = None
+    if field_map is not None:
+        # Imported lazily: localization_field_map depends on this module's geometry.
+        from localization_field_map import match_field_map
+        field_map_position = match_field_map(field_map, corr)
+
     return {
         "enabled": True,
         "method": "relative_rssi_weighted_centroid_3d",
@@ -297,26 +313,34 @@ def localize_track(track: Mapping[str, Any]) -> Dict[str, Any]:
         "corrected_rssi": {sid: _round_or_none(val, 3) for sid, val in sorted(corr.items())},
         "relative_rssi": {sid: _round_or_none(val, 3) for sid, val in sorted(rel.items())},
         "weights": {sid: _round_or_none(val, 6) for sid, val in sorted(weights.items())},
+        "field_map_position": field_map_position,
+        "tracked_position": track.get("tracked_position"),
     }
 
 
-def add_localization_to_tracks(tracks: Iterable[Dict[str, Any]]) -> list[Dict[str, Any]]:
+def add_localization_to_tracks(
+    tracks: Iterable[Dict[str, Any]],
+    field_map: Optional[Mapping[str, Any]] = None,
+) -> list[Dict[str, Any]]:
     out = []
     for track in tracks:
         row = dict(track)
-        row["localization"] = localize_track(row)
+        row["localization"] = localize_track(row, field_map)
         out.append(row)
     return out
 
 
-def add_localization_to_snapshot(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+def add_localization_to_snapshot(
+    snapshot: Dict[str, Any],
+    field_map: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
     """Attach localization to /api/devices or tracker snapshots."""
     if not isinstance(snapshot, dict):
         return snapshot
 
     updated = dict(snapshot)
-    updated["tracks"] = add_localization_to_tracks(updated.get("tracks", []))
-    updated["weak_memory_tracks"] = add_localization_to_tracks(updated.get("weak_memory_tracks", []))
+    updated["tracks"] = add_localization_to_tracks(updated.get("tracks", []), field_map)
+    updated["weak_memory_tracks"] = add_localization_to_tracks(updated.get("weak_memory_tracks", []), field_map)
     updated["localization_config"] = {
         "enabled": True,
         "method": "relative_rssi_weighted_centroid_3d",
@@ -326,5 +350,6 @@ def add_localization_to_snapshot(snapshot: Dict[str, Any]) -> Dict[str, Any]:
         "rssi_weight_k_db": RSSI_WEIGHT_K_DB,
         "relative_rssi_floor_db": RELATIVE_RSSI_FLOOR_DB,
         "device_or_mfg_bias_used": False,
+        "field_map_enabled": field_map is not None,
     }
     return updated
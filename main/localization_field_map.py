@@ -0,0 +1,672 @@
+"""
+localization_field_map.py
+
+Fine-grained sub-block localization from a precomputed RSSI field map.
+
+The 3x3 grid localizer in pc_receiver.py can only choose between the nine
+calibrated blocks. This module interpolates those block fingerprints onto a
+dense grid of small cells (25 cm by default) and matches live per-scanner RSSI
+against every cell with a cheap nearest-neighbor search.
+
+Design goals:
+- Build once per fingerprint file, cache on disk, reuse on every restart.
+- Honor the calibration exactly at block centers; between blocks follow a
+  per-scanner log-distance path-loss fit plus inverse-distance-weighted
+  residuals, so the field stays physically plausible near scanners.
+- Tx power is unknown for live devices, so matching removes the best common
+  dB offset between live and cell vectors and only softly penalizes it.
+- The map is a few hundred cells x 4 scanners; matching is a coarse-to-fine
+  scan over a precompiled cells x scanners matrix, each pass scored as one
+  NumPy batch (a per-cell Python loop without NumPy, same results).
+
+Coordinate units: centimeters, same frame as localization_engine.SCANNER_POSITIONS_CM.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from localization_engine import SCANNER_POSITIONS_CM
+
+try:
+    import numpy as np
+except ImportError:  # without NumPy, match_field_map() scores cell by cell
+    np = None
+
+
+# -----------------------------------------------------------------------------
+# Grid geometry.
+# The calibration grid is 3 x 3 blocks of 126 x 168 cm (see
+# build_calibration_fingerprints.py). Its placement in the scanner frame is
+# derived from the physical nearest-scanner anchors: block 1 -> scanner 3,
+# block 3 -> scanner 2, block 7 -> scanner 4, block 9 -> scanner 1.
+# Column 0 is on the negative-x side, row 0 is on the high-y side.
+# -----------------------------------------------------------------------------
+
+FIELD_MAP_SCHEMA_VERSION = 1
+FIELD_MAP_MODEL = "logdistance_idw_rssi_field_map"
+
+DEFAULT_GRID_LAYOUT = [[1, 2, 3], [6, 5, 4], [7, 8, 9]]
+DEFAULT_BLOCK_SIZE_CM = {"x_cm": 126.0, "y_cm": 168.0}
+
+# Top-left corner of block 1 in the scanner frame.
+GRID_ORIGIN_X_CM = -378.0
+GRID_ORIGIN_Y_CM = 560.0
+
+FIELD_MAP_CELL_SIZE_CM = 25.0
+
+# Calibration was sampled with the phone held roughly at table height.
+DEVICE_HEIGHT_CM = 100.0
+
+# Log-distance path-loss exponent clamp. Nine calibration points are not enough
+# to trust an unconstrained fit through multipath.
+PATH_LOSS_MIN_EXPONENT = 1.2
+PATH_LOSS_MAX_EXPONENT = 4.5
+PATH_LOSS_DEFAULT_EXPONENT = 2.2
+
+# Inverse-distance weighting of block residuals.
+IDW_POWER = 2.0
+
+# Matching.
+FIELD_MAP_MIN_SCANNERS = 3
+FIELD_MAP_STD_MIN_DB = 2.0
+FIELD_MAP_STD_MAX_DB = 8.0
+# Live Tx power is unknown. A large common offset is still a weak clue that the
+# device is further away than this cell, so it is penalized softly (dB^2 per dB^2).
+FIELD_MAP_OFFSET_WEIGHT = 0.05
+# Coarse-to-fine search: score every Nth cell, then refine around the best
+# coarse cells. Stride 1 is an exhaustive scan.
+FIELD_MAP_SEARCH_STRIDE = 2
+FIELD_MAP_REFINE_TOP_N = 3
+# Final position is the score-weighted mean of the K best cells.
+FIELD_MAP_NEIGHBORS_K = 4
+
+FIELD_MAP_HIGH_RMSE_DB = 2.5
+FIELD_MAP_MEDIUM_RMSE_DB = 4.5
+
+
+# -----------------------------------------------------------------------------
+# Small utilities
+# -----------------------------------------------------------------------------
+
+def _safe_float(value: Any) -> Optional[float]:
+    try:
+        out = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(out) or math.isinf(out):
+        return None
+    return out
+
+
+def _clean_scanner_map(raw: Any) -> Dict[str, float]:
+    if not isinstance(raw, Mapping):
+        return {}
+    out: Dict[str, float] = {}
+    for scanner_id, value in raw.items():
+        val = _safe_float(value)
+        if val is not None:
+            out[str(scanner_id).strip()] = val
+    return out
+
+
+def _block_mean(block_info: Mapping[str, Any]) -> Dict[str, float]:
+    return _clean_scanner_map(
+        block_info.get("matching_mean") or block_info.get("top_half_mean") or block_info.get("mean") or {}
+    )
+
+
+def _distance_3d(a: Tuple[float, float, float], b: Mapping[str, float]) -> float:
+    dx = a[0] - float(b["x"])
+    dy = a[1] - float(b["y"])
+    dz = a[2] - float(b["z"])
+    return max(10.0, math.sqrt(dx * dx + dy * dy + dz * dz))
+
+
+def fingerprint_source_hash(fingerprints: Mapping[str, Any]) -> str:
+    """Stable content hash used to decide whether a cached field map is still valid."""
+    blob = json.dumps(fingerprints.get("blocks", {}), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def field_map_params() -> Dict[str, Any]:
+    return {
+        "cell_size_cm": FIELD_MAP_CELL_SIZE_CM,
+        "origin_cm": {"x": GRID_ORIGIN_X_CM, "y": GRID_ORIGIN_Y_CM},
+        "device_height_cm": DEVICE_HEIGHT_CM,
+        "idw_power": IDW_POWER,
+        "path_loss_exponent_range": [PATH_LOSS_MIN_EXPONENT, PATH_LOSS_MAX_EXPONENT],
+        "scanner_positions_cm": {sid: dict(pos) for sid, pos in sorted(SCANNER_POSITIONS_CM.items())},
+    }
+
+
+# -----------------------------------------------------------------------------
+# Field map construction
+# -----------------------------------------------------------------------------
+
+def block_centers_cm(
+    grid_layout: List[List[Any]],
+    block_size_cm: Mapping[str, float],
+) -> Dict[str, Tuple[float, float]]:
+    """Return block_id -> (x_cm, y_cm) of the block center in the scanner frame."""
+    bw = float(block_size_cm.get("x_cm", DEFAULT_BLOCK_SIZE_CM["x_cm"]))
+    bh = float(block_size_cm.get("y_cm", DEFAULT_BLOCK_SIZE_CM["y_cm"]))
+    out: Dict[str, Tuple[float, float]] = {}
+    for row_idx, row in enumerate(grid_layout):
+        for col_idx, block_id in enumerate(row):
+            out[str(block_id)] = (
+                GRID_ORIGIN_X_CM + (col_idx + 0.5) * bw,
+                GRID_ORIGIN_Y_CM - (row_idx + 0.5) * bh,
+            )
+    return out
+
+
+def block_at_position(
+    x_cm: float,
+    y_cm: float,
+    grid_layout: Optional[List[List[Any]]] = None,
+    block_size_cm: Optional[Mapping[str, float]] = None,
+) -> Optional[str]:
+    """Return the grid block containing (x_cm, y_cm), or None outside the grid."""
+    layout = grid_layout or DEFAULT_GRID_LAYOUT
+    size = block_size_cm or DEFAULT_BLOCK_SIZE_CM
+    bw = float(size.get("x_cm", DEFAULT_BLOCK_SIZE_CM["x_cm"]))
+    bh = float(size.get("y_cm", DEFAULT_BLOCK_SIZE_CM["y_cm"]))
+    col = int(math.floor((float(x_cm) - GRID_ORIGIN_X_CM) / bw))
+    row = int(math.floor((GRID_ORIGIN_Y_CM - float(y_cm)) / bh))
+    if row < 0 or row >= len(layout) or col < 0 or col >= len(layout[row]):
+        return None
+    return str(layout[row][col])
+
+
+def fit_path_loss(points: List[Tuple[float, float]]) -> Dict[str, float]:
+    """
+    Least-squares fit of rssi = a_db - 10 * n * log10(distance_cm).
+
+    points: [(distance_cm, rssi_dbm), ...]
+    """
+    if not points:
+        return {"a_db": -60.0, "n": PATH_LOSS_DEFAULT_EXPONENT}
+
+    xs = [math.log10(d) for d, _ in points]
+    ys = [r for _, r in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+
+    if len(points) < 2 or var_x < 1e-6:
+        n = PATH_LOSS_DEFAULT_EXPONENT
+    else:
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        n = -slope / 10.0
+
+    n = min(PATH_LOSS_MAX_EXPONENT, max(PATH_LOSS_MIN_EXPONENT, n))
+    a_db = mean_y + 10.0 * n * mean_x
+    return {"a_db": round(a_db, 4), "n": round(n, 4)}
+
+
+def _idw(point: Tuple[float, float], anchors: List[Tuple[Tuple[float, float], float]]) -> Optional[float]:
+    if not anchors:
+        return None
+    num = 0.0
+    den = 0.0
+    for (ax, ay), value in anchors:
+        dist = math.hypot(point[0] - ax, point[1] - ay)
+        if dist < 1.0:
+            return value
+        w = 1.0 / (dist ** IDW_POWER)
+        num += w * value
+        den += w
+    return num / den if den > 0.0 else None
+
+
+def build_field_map(fingerprints: Mapping[str, Any]) -> Dict[str, Any]:
+    """Interpolate calibrated block fingerprints onto a dense cell grid."""
+    blocks = fingerprints.get("blocks", {}) or {}
+    grid_layout = fingerprints.get("grid_layout") or DEFAULT_GRID_LAYOUT
+    block_size = fingerprints.get("block_size_cm") or DEFAULT_BLOCK_SIZE_CM
+    centers = block_centers_cm(grid_layout, block_size)
+
+    scanners = sorted(
+        {sid for info in blocks.values() if isinstance(info, Mapping) for sid in _block_mean(info)}
+        & set(SCANNER_POSITIONS_CM.keys()),
+        key=lambda x: int(x) if x.isdigit() else x,
+    )
+
+    # Per-scanner calibration anchors: (block center, mean, std).
+    anchors: Dict[str, List[Tuple[Tuple[float, float], float, Optional[float]]]] = {sid: [] for sid in scanners}
+    for block_id, info in blocks.items():
+        if not isinstance(info, Mapping) or str(block_id) not in centers:
+            continue
+        center = centers[str(block_id)]
+        means = _block_mean(info)
+        stds = _clean_scanner_map(info.get("std") or {})
+        for sid in scanners:
+            if sid in means:
+                anchors[sid].append((center, means[sid], stds.get(sid)))
+
+    path_loss: Dict[str, Dict[str, float]] = {}
+    residual_anchors: Dict[str, List[Tuple[Tuple[float, float], float]]] = {}
+    std_anchors: Dict[str, List[Tuple[Tuple[float, float], float]]] = {}
+    for sid in scanners:
+        pos = SCANNER_POSITIONS_CM[sid]
+        pts = [(_distance_3d((c[0], c[1], DEVICE_HEIGHT_CM), pos), mean) for c, mean, _ in anchors[sid]]
+        model = fit_path_loss(pts)
+        path_loss[sid] = model
+        residual_anchors[sid] = [
+            (c, mean - (model["a_db"] - 10.0 * model["n"] * math.log10(d)))
+            for (c, mean, _), (d, _) in zip(anchors[sid], pts)
+        ]
+        std_anchors[sid] = [(c, std) for c, _, std in anchors[sid] if std is not None]
+
+    bw = float(block_size.get("x_cm", DEFAULT_BLOCK_SIZE_CM["x_cm"]))
+    bh = float(block_size.get("y_cm", DEFAULT_BLOCK_SIZE_CM["y_cm"]))
+    n_block_rows = len(grid_layout)
+    n_block_cols = max((len(r) for r in grid_layout), default=0)
+    width_cm = bw * n_block_cols
+    height_cm = bh * n_block_rows
+    cell = float(FIELD_MAP_CELL_SIZE_CM)
+    cols = max(1, int(math.ceil(width_cm / cell - 1e-9)))
+    rows = max(1, int(math.ceil(height_cm / cell - 1e-9)))
+
+    cells = []
+    for row in range(rows):
+        y = GRID_ORIGIN_Y_CM - min(height_cm, (row + 0.5) * cell)
+        for col in range(cols):
+            x = GRID_ORIGIN_X_CM + min(width_cm, (col + 0.5) * cell)
+            block_row = min(n_block_rows - 1, int((GRID_ORIGIN_Y_CM - y) // bh))
+            block_col = min(len(grid_layout[block_row]) - 1, int((x - GRID_ORIGIN_X_CM) // bw))
+
+            mean: Dict[str, float] = {}
+            std: Dict[str, float] = {}
+            for sid in scanners:
+                model = path_loss[sid]
+                d = _distance_3d((x, y, DEVICE_HEIGHT_CM), SCANNER_POSITIONS_CM[sid])
+                base = model["a_db"] - 10.0 * model["n"] * math.log10(d)
+                residual = _idw((x, y), residual_anchors[sid]) or 0.0
+                mean[sid] = round(base + residual, 3)
+                std_val = _idw((x, y), std_anchors[sid])
+                if std_val is not None:
+                    std[sid] = round(std_val, 3)
+
+            cells.append({
+                "row": row,
+                "col": col,
+                "x_cm": round(x, 2),
+                "y_cm": round(y, 2),
+                "block": str(grid_layout[block_row][block_col]),
+                "mean": mean,
+                "std": std,
+            })
+
+    return {
+        "schema_version": FIELD_MAP_SCHEMA_VERSION,
+        "model": FIELD_MAP_MODEL,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "source_sha1": fingerprint_source_hash(fingerprints),
+        "source_generated_at": fingerprints.get("generated_at", ""),
+        "params": field_map_params(),
+        "grid_layout": grid_layout,
+        "block_size_cm": {"x_cm": bw, "y_cm": bh},
+        "block_centers_cm": {k: {"x_cm": round(v[0], 2), "y_cm": round(v[1], 2)} for k, v in centers.items()},
+        "rows": rows,
+        "cols": cols,
+        "scanners": scanners,
+        "path_loss": path_loss,
+        "cells": cells,
+    }
+
+
+def load_or_build_field_map(fingerprints: Mapping[str, Any], cache_path: str) -> Dict[str, Any]:
+    """
+    Return a compiled field map for these fingerprints.
+
+    The on-disk cache is reused when both the fingerprint content hash and the
+    geometry parameters match; otherwise the map is rebuilt and rewritten.
+    A failed cache write is not fatal, the compiled map is still returned.
+    """
+    source_sha1 = fingerprint_source_hash(fingerprints)
+    params = field_map_params()
+    payload: Optional[Dict[str, Any]] = None
+    source = "cache"
+
+    try:
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if (
+                cached.get("schema_version") == FIELD_MAP_SCHEMA_VERSION and
+                cached.get("source_sha1") == source_sha1 and
+                cached.get("params") == json.loads(json.dumps(params))
+            ):
+                payload = cached
+    except Exception:
+        payload = None
+
+    if payload is None:
+        source = "built"
+        payload = build_field_map(fingerprints)
+        if cache_path:
+            try:
+                tmp_path = cache_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, indent=1)
+                os.replace(tmp_path, cache_path)
+            except Exception:
+                source = "built_not_cached"
+
+    compiled = compile_field_map(payload)
+    compiled["source"] = source
+    compiled["path"] = cache_path
+    return compiled
+
+
+# -----------------------------------------------------------------------------
+# Matching
+# -----------------------------------------------------------------------------
+
+def compile_field_map(payload: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Flatten the cell list into parallel per-scanner lists for the matcher.
+
+    means[i][j] / weights[i][j] belong to cell i and scanner column j. Missing
+    values are stored as None and skipped.
+    """
+    scanners = [str(s) for s in payload.get("scanners", [])]
+    cells = list(payload.get("cells", []) or [])
+    means: List[List[Optional[float]]] = []
+    weights: List[List[Optional[float]]] = []
+
+    for cell in cells:
+        cell_mean = cell.get("mean", {}) or {}
+        cell_std = cell.get("std", {}) or {}
+        row_mean: List[Optional[float]] = []
+        row_weight: List[Optional[float]] = []
+        for sid in scanners:
+            m = _safe_float(cell_mean.get(sid))
+            s = _safe_float(cell_std.get(sid))
+            if s is None:
+                s = 5.0
+            s = min(FIELD_MAP_STD_MAX_DB, max(FIELD_MAP_STD_MIN_DB, s))
+            row_mean.append(m)
+            row_weight.append(None if m is None else 1.0 / (s * s))
+        means.append(row_mean)
+        weights.append(row_weight)
+
+    rows = int(payload.get("rows", 0) or 0)
+    cols = int(payload.get("cols", 0) or 0)
+    stride = max(1, int(FIELD_MAP_SEARCH_STRIDE))
+    coarse = [
+        idx for idx, cell in enumerate(cells)
+        if int(cell.get("row", 0)) % stride == 0 and int(cell.get("col", 0)) % stride == 0
+    ]
+
+    means_np = weights_np = None
+    if np is not None and cells and scanners:
+        means_np = np.array([[np.nan if m is None else m for m in row] for row in means], dtype=np.float64)
+        weights_np = np.nan_to_num(np.array(
+            [[np.nan if w is None else w for w in row] for row in weights], dtype=np.float64,
+        ))
+
+    return {
+        "loaded": bool(cells and scanners),
+        "model": payload.get("model", FIELD_MAP_MODEL),
+        "source_sha1": payload.get("source_sha1", ""),
+        "generated_at": payload.get("generated_at", ""),
+        "cell_size_cm": (payload.get("params", {}) or {}).get("cell_size_cm", FIELD_MAP_CELL_SIZE_CM),
+        "rows": rows,
+        "cols": cols,
+        "scanners": scanners,
+        "cells": cells,
+        "means": means,
+        "weights": weights,
+        "means_np": means_np,
+        "weights_np": weights_np,
+        "coarse_indices": coarse,
+        "stride": stride,
+    }
+
+
+def _cell_score(live: List[Optional[float]], cell_mean: List[Optional[float]], cell_weight: List[Optional[float]]) -> Optional[Tuple[float, float, float, int]]:
+    """
+    Return (score, rel_rmse_db, offset_db, common) for one cell.
+
+    offset_db is the weighted mean live-minus-cell difference, i.e. the best
+    Tx-power correction for this cell. rel_rmse_db is what remains after it.
+    """
+    sw = 0.0
+    swd = 0.0
+    common = 0
+    for lv, cm, cw in zip(live, cell_mean, cell_weight):
+        if lv is None or cm is None:
+            continue
+        d = lv - cm
+        sw += cw
+        swd += cw * d
+        common += 1
+
+    if common < FIELD_MAP_MIN_SCANNERS or sw <= 0.0:
+        return None
+
+    offset = swd / sw
+    ss = 0.0
+    for lv, cm, cw in zip(live, cell_mean, cell_weight):
+        if lv is None or cm is None:
+            continue
+        r = lv - cm - offset
+        ss += cw * r * r
+    rel_mse = ss / sw
+    score = rel_mse + FIELD_MAP_OFFSET_WEIGHT * offset * offset
+    return score, math.sqrt(rel_mse), offset, common
+
+
+def _refine_indices(seeds: List[int], rows: int, cols: int, stride: int) -> List[int]:
+    """Cells within stride of each seed, seed by seed in row-major order."""
+    out = []
+    for idx in seeds:
+        r0, c0 = divmod(idx, cols)
+        for r in range(max(0, r0 - stride), min(rows, r0 + stride + 1)):
+            for c in range(max(0, c0 - stride), min(cols, c0 + stride + 1)):
+                out.append(r * cols + c)
+    return out
+
+
+Ranked = List[Tuple[int, Tuple[float, float, float, int]]]
+
+
+def _rank_cells_python(field_map: Mapping[str, Any], live: List[Optional[float]], top_k: int) -> Tuple[Ranked, int]:
+    """Coarse-to-fine scan with _cell_score(); (best top_k cells, cells scored)."""
+    means = field_map["means"]
+    weights = field_map["weights"]
+    rows = int(field_map.get("rows", 0) or 0)
+    cols = int(field_map.get("cols", 0) or 0)
+    stride = int(field_map.get("stride", 1) or 1)
+    scored: Dict[int, Tuple[float, float, float, int]] = {}
+
+    def score_index(idx: int) -> None:
+        if idx in scored:
+            return
+        row = _cell_score(live, means[idx], weights[idx])
+        if row is not None:
+            scored[idx] = row
+
+    for idx in field_map.get("coarse_indices") or range(len(means)):
+        score_index(idx)
+
+    if stride > 1 and scored and cols > 0:
+        seeds = sorted(scored.items(), key=lambda kv: kv[1][0])[:max(1, FIELD_MAP_REFINE_TOP_N)]
+        for idx in _refine_indices([idx for idx, _ in seeds], rows, cols, stride):
+            score_index(idx)
+
+    return sorted(scored.items(), key=lambda kv: kv[1][0])[:top_k], len(scored)
+
+
+def _rank_cells_numpy(field_map: Mapping[str, Any], live: List[Optional[float]], top_k: int) -> Tuple[Ranked, int]:
+    """
+    Same scan and ranking as _rank_cells_python(), with each pass scored as
+    one batch over the cells x scanners matrix. Only the top_k rows are
+    converted back to Python values.
+    """
+    rows = int(field_map.get("rows", 0) or 0)
+    cols = int(field_map.get("cols", 0) or 0)
+    stride = int(field_map.get("stride", 1) or 1)
+    live_v = np.array([np.nan if v is None else v for v in live], dtype=np.float64)
+    live_ok = ~np.isnan(live_v)
+
+    def score_batch(idx: "np.ndarray") -> Tuple["np.ndarray", ...]:
+        means = field_map["means_np"][idx]
+        valid = ~np.isnan(means) & live_ok
+        d = np.where(valid, live_v - means, 0.0)
+        w = np.where(valid, field_map["weights_np"][idx], 0.0)
+        common = valid.sum(axis=1)
+        sw = w.sum(axis=1)
+        ok = (common >= FIELD_MAP_MIN_SCANNERS) & (sw > 0.0)
+        idx, d, w, sw, common = idx[ok], d[ok], w[ok], sw[ok], common[ok]
+        valid = valid[ok]
+        offset = (w * d).sum(axis=1) / sw
+        r = np.where(valid, d - offset[:, None], 0.0)
+        rel_mse = (w * r * r).sum(axis=1) / sw
+        score = rel_mse + FIELD_MAP_OFFSET_WEIGHT * offset * offset
+        return idx, score, rel_mse, offset, common
+
+    coarse = field_map.get("coarse_indices") or range(len(field_map["means"]))
+    coarse_idx = np.fromiter(coarse, dtype=np.intp)
+    idx, score, rel_mse, offset, common = score_batch(coarse_idx)
+
+    if stride > 1 and idx.size and cols > 0:
+        seeds = idx[np.argsort(score, kind="stable")[:max(1, FIELD_MAP_REFINE_TOP_N)]]
+        tried = set(coarse_idx.tolist())
+        fresh = []
+        for cell in _refine_indices(seeds.tolist(), rows, cols, stride):
+            if cell not in tried:
+                tried.add(cell)
+                fresh.append(cell)
+        if fresh:
+            more = score_batch(np.array(fresh, dtype=np.intp))
+            idx, score, rel_mse, offset, common = (
+                np.concatenate([a, b]) for a, b in zip((idx, score, rel_mse, offset, common), more)
+            )
+
+    order = np.argsort(score, kind="stable")[:top_k]
+    ranked = [
+        (int(idx[k]), (float(score[k]), math.sqrt(float(rel_mse[k])), float(offset[k]), int(common[k])))
+        for k in order
+    ]
+    return ranked, int(idx.size)
+
+
+def match_field_map(field_map: Optional[Mapping[str, Any]], live_mean: Mapping[str, Any]) -> Dict[str, Any]:
+    """Nearest-neighbor match of a live per-scanner RSSI map against the field map."""
+    if not field_map or not field_map.get("loaded"):
+        return {"enabled": False, "reason": "field_map_not_loaded"}
+
+    scanners = field_map["scanners"]
+    live_clean = _clean_scanner_map(live_mean)
+    live = [live_clean.get(sid) for sid in scanners]
+    if sum(1 for v in live if v is not None) < FIELD_MAP_MIN_SCANNERS:
+        return {"enabled": False, "reason": f"not_enough_scanners:{sum(1 for v in live if v is not None)}"}
+
+    cells = field_map["cells"]
+    top_k = max(1, FIELD_MAP_NEIGHBORS_K)
+    if field_map.get("means_np") is not None:
+        ranked, cells_scored = _rank_cells_numpy(field_map, live, top_k)
+    else:
+        ranked, cells_scored = _rank_cells_python(field_map, live, top_k)
+
+    if not ranked:
+        return {"enabled": False, "reason": "no_matching_cells"}
+
+    best_idx, (best_score, best_rmse, best_offset, best_common) = ranked[0]
+    best_cell = cells[best_idx]
+
+    neighbors = ranked
+    wsum = 0.0
+    x = 0.0
+    y = 0.0
+    for idx, (score, _, _, _) in neighbors:
+        w = 1.0 / (score + 0.25)
+        wsum += w
+        x += w * float(cells[idx]["x_cm"])
+        y += w * float(cells[idx]["y_cm"])
+    x /= wsum
+    y /= wsum
+
+    if best_rmse <= FIELD_MAP_HIGH_RMSE_DB:
+        confidence = "HIGH"
+    elif best_rmse <= FIELD_MAP_MEDIUM_RMSE_DB:
+        confidence = "MEDIUM"
+    else:
+        confidence = "LOW"
+
+    return {
+        "enabled": True,
+        "method": FIELD_MAP_MODEL,
+        "units": "cm",
+        "x_cm": round(x, 2),
+        "y_cm": round(y, 2),
+        "cell_row": int(best_cell.get("row", 0)),
+        "cell_col": int(best_cell.get("col", 0)),
+        "cell_x_cm": best_cell.get("x_cm"),
+        "cell_y_cm": best_cell.get("y_cm"),
+        "cell_size_cm": field_map.get("cell_size_cm"),
+        "block": best_cell.get("block"),
+        "score": round(best_score, 4),
+        "rel_rmse_db": round(best_rmse, 3),
+        "tx_offset_db": round(best_offset, 3),
+        "common_scanners": best_common,
+        "confidence": confidence,
+        "cells_scored": cells_scored,
+        "cells_total": len(cells),
+    }
+
+
+def field_map_status(field_map: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+    if not field_map:
+        return {"loaded": False}
+    return {
+        "loaded": bool(field_map.get("loaded", False)),
+        "model": field_map.get("model", ""),
+        "source": field_map.get("source", ""),
+        "path": field_map.get("path", ""),
+        "source_sha1": field_map.get("source_sha1", ""),
+        "generated_at": field_map.get("generated_at", ""),
+        "cell_size_cm": field_map.get("cell_size_cm"),
+        "rows": field_map.get("rows"),
+        "cols": field_map.get("cols"),
+        "cells": len(field_map.get("cells", []) or []),
+        "search_stride": field_map.get("stride"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the dense RSSI field map from calibration fingerprints.")
+    parser.add_argument("--fingerprints", default="calibration_fingerprints.json", help="Path to calibration_fingerprints.json")
+    parser.add_argument("--out", default="calibration_field_map.json", help="Output field map JSON path")
+    args = parser.parse_args()
+
+    with open(args.fingerprints, "r", encoding="utf-8") as f:
+        fingerprints = json.load(f)
+
+    compiled = load_or_build_field_map(fingerprints, args.out)
+    print(f"Field map {compiled['source']}: {os.path.abspath(args.out)}")
+    print(f"Cells: {compiled['rows']} rows x {compiled['cols']} cols @ {compiled['cell_size_cm']} cm")
+
+    # Sanity check: each block's own fingerprint should land inside that block.
+    for block_id, info in sorted((fingerprints.get("blocks", {}) or {}).items()):
+        if not isinstance(info, Mapping):
+            continue
+        match = match_field_map(compiled, _block_mean(info))
+        print(
+            f"Block {block_id}: matched block={match.get('block')} "
+            f"x={match.get('x_cm')} y={match.get('y_cm')} rmse={match.get('rel_rmse_db')}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+lock_profiler.py
+
+Drop-in threading.Lock replacement that measures contention.
+
+ProfiledLock records, per call site:
+    wait  time spent blocked in acquire()
+    hold  time between acquire() and release()
+into stage_metrics.LatencyHistogram histograms. Work done while the lock is
+held can be broken down further with section(name). The longest holds are
+kept with their section breakdown and a caller-supplied context (e.g. track
+counts), and holds above slow_hold_ms are logged as they happen.
+
+Usage:
+    lock = ProfiledLock("tracker", context_fn=lambda: {"tracks": len(tracks)})
+    with lock.held("process_event"):
+        with lock.section("periodic_merge"):
+            ...
+    with lock:             # call site = name of the calling function
+        ...
+    lock.report()
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from stage_metrics import LatencyHistogram, summarize_state
+
+
+class _Hold:
+    __slots__ = ("owner", "site")
+
+    def __init__(self, owner: "ProfiledLock", site: str) -> None:
+        self.owner = owner
+        self.site = site
+
+    def __enter__(self) -> None:
+        self.owner._enter(self.site)
+
+    def __exit__(self, *exc: Any) -> None:
+        self.owner._exit()
+
+
+class _Section:
+    __slots__ = ("owner", "name", "t0")
+
+    def __init__(self, owner: "ProfiledLock", name: str) -> None:
+        self.owner = owner
+        self.name = name
+        self.t0 = 0
+
+    def __enter__(self) -> None:
+        self.t0 = time.perf_counter_ns()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.owner._section_done(self.name, (time.perf_counter_ns() - self.t0) // 1000)
+
+
+class _SiteStats:
+    __slots__ = ("wait", "hold")
+
+    def __init__(self) -> None:
+        self.wait = LatencyHistogram()
+        self.hold = LatencyHistogram()
+
+
+class ProfiledLock:
+    def __init__(
+        self,
+        name: str = "lock",
+        enabled: bool = True,
+        top_n: int = 20,
+        slow_hold_ms: Optional[float] = None,
+        context_fn: Optional[Callable[[], Dict[str, Any]]] = None,
+        log_fn: Callable[[str], None] = print,
+    ) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.top_n = top_n
+        self.slow_hold_ms = slow_hold_ms
+        self.context_fn = context_fn
+        self.log_fn = log_fn
+
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.sites: Dict[str, _SiteStats] = {}
+        self.sections: Dict[str, LatencyHistogram] = {}
+        self._longest: List[Tuple[int, int, Dict[str, Any]]] = []  # min-heap on hold_us
+        self._seq = itertools.count()
+        self.slow_holds = 0
+
+        # State of the current holder; only written while _lock is held.
+        self._site = ""
+        self._t_acquired = 0
+        self._wait_us = 0
+        self._section_us: Dict[str, int] = {}
+
+    # ------------------------------------------------------------------
+    # Lock API
+    # ------------------------------------------------------------------
+
+    def held(self, site: str) -> _Hold:
+        return _Hold(self, site)
+
+    def section(self, name: str) -> _Section:
+        return _Section(self, name)
+
+    def __enter__(self) -> None:
+        self._enter(sys._getframe(1).f_code.co_name)
+
+    def __exit__(self, *exc: Any) -> None:
+        self._exit()
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    # ------------------------------------------------------------------
+    # Measurement
+    # ------------------------------------------------------------------
+
+    def _enter(self, site: str) -> None:
+        if not self.enabled:
+            self._lock.acquire()
+            return
+        t0 = time.perf_counter_ns()
+        self._lock.acquire()
+        t1 = time.perf_counter_ns()
+        self._site = site
+        self._t_acquired = t1
+        self._wait_us = (t1 - t0) // 1000
+        self._section_us = {}
+
+    def _exit(self) -> None:
+        if not self.enabled:
+            self._lock.release()
+            return
+
+        hold_us = (time.perf_counter_ns() - self._t_acquired) // 1000
+        site = self._site
+        wait_us = self._wait_us
+        sections = self._section_us
+
+        slow = self.slow_hold_ms is not None and hold_us >= self.slow_hold_ms * 1000
+        keep = slow or len(self._longest) < self.top_n or hold_us > self._longest[0][0]
+        # Context is read before release so it matches the state that was held.
+        context = self.context_fn() if keep and self.context_fn is not None else {}
+
+        self._lock.release()
+
+        stats = self.sites.get(site)
+        if stats is None:
+            with self._stats_lock:
+                stats = self.sites.setdefault(site, _SiteStats())
+        stats.wait.record_us(wait_us)
+        stats.hold.record_us(hold_us)
+
+        if not keep:
+            return
+
+        record = {
+            "site": site,
+            "hold_ms": round(hold_us / 1000.0, 3),
+            "wait_ms": round(wait_us / 1000.0, 3),
+            "sections_ms": {k: round(v / 1000.0, 3) for k, v in sections.items()},
+            "time": round(time.time(), 3),
+        }
+        record.update(context)
+
+        with self._stats_lock:
+            item = (hold_us, next(self._seq), record)
+            if len(self._longest) < self.top_n:
+                heapq.heappush(self._longest, item)
+            elif hold_us > self._longest[0][0]:
+                heapq.heapreplace(self._longest, item)
+            if slow:
+                self.slow_holds += 1
+
+        if slow:
+            extra = " ".join(f"{k}={v}" for k, v in context.items())
+            parts = " ".join(f"{k}={v}ms" for k, v in record["sections_ms"].items())
+            self.log_fn(
+                f"[LOCK] slow {self.name} hold site={site} hold={record['hold_ms']}ms "
+                f"wait={record['wait_ms']}ms {extra} {parts}".rstrip()
+            )
+
+    def _section_done(self, name: str, elapsed_us: int) -> None:
+        if not self.enabled:
+            return
+        self._section_us[name] = self._section_us.get(name, 0) + elapsed_us
+        hist = self.sections.get(name)
+        if hist is None:
+            with self._stats_lock:
+                hist = self.sections.setdefault(name, LatencyHistogram())
+        hist.record_us(elapsed_us)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def report(self) -> Dict[str, Any]:
+        sites = {}
+        for site, stats in list(self.sites.items()):
+            wait = stats.wait.state()
+            hold = stats.hold.state()
+            sites[site] = {
+                "acquisitions": hold["count"],
+                "wait_total_ms": round(wait["total_us"] / 1000.0, 3),
+                "hold_total_ms": round(hold["total_us"] / 1000.0, 3),
+                "wait": summarize_state(wait),
+                "hold": summarize_state(hold),
+            }
+
+        with self._stats_lock:
+            longest = [rec for _, _, rec in sorted(self._longest, key=lambda x: (-x[0], x[1]))]
+            slow_holds = self.slow_holds
+
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "sites": sites,
+            "sections": {name: summarize_state(h.state()) for name, h in list(self.sections.items())},
+            "longest_holds": longest,
+            "slow_hold_ms": self.slow_hold_ms,
+            "slow_holds": slow_holds,
+        }
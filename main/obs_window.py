@@ -0,0 +1,294 @@
+"""
+obs_window.py
+
+Compact rolling observation window for tracker tracks.
+
+A track keeps every (mono_time, scanner, channel, rssi) observation of the last
+few seconds. Stored as a deque of tuples that costs ~120 bytes per sample; here
+the samples live in four parallel typed arrays (13 bytes per sample) and the
+scanner id is interned to a small int through a ScannerIds registry shared by
+all windows. rssi_samples() gives the same 1-byte storage for the tracks' other
+per-scanner RSSI lists.
+
+The live samples are always contiguous (a sliding buffer: appends go to the
+end, pruning advances the start, and the buffer slides or doubles when full),
+so per-scanner scans can run on zero-copy NumPy views when NumPy is available
+and the window is large enough to benefit. Results are identical to the
+pure-Python path, including dict key order (first appearance in the window).
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from array import array
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INITIAL_CAPACITY = 16
+SHRINK_MIN_CAPACITY = 64
+
+# Shorter windows are scanned straight from the arrays; the histogram pass
+# only pays off on long, busy windows.
+NUMPY_MIN_SAMPLES = 400
+
+RSSI_MIN = -128
+RSSI_MAX = 127
+RSSI_BINS = RSSI_MAX - RSSI_MIN + 1
+
+# Histogram column values, strongest first.
+_RSSI_DESC = np.arange(RSSI_MAX, RSSI_MIN - 1, -1, dtype=np.int64) if np is not None else None
+
+
+def clamp_rssi(rssi: int) -> int:
+    return max(RSSI_MIN, min(RSSI_MAX, int(rssi)))
+
+
+def rssi_samples() -> array:
+    """Empty int8 RSSI sample list (1 byte per sample instead of a boxed int)."""
+    return array("b")
+
+
+class ScannerIds:
+    """Scanner id string <-> small int registry, shared by all windows."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.ids: Dict[str, int] = {}
+        self.names: List[str] = []
+
+    def intern(self, scanner: str) -> int:
+        idx = self.ids.get(scanner)
+        if idx is None:
+            with self.lock:
+                idx = self.ids.get(scanner)
+                if idx is None:
+                    idx = len(self.names)
+                    self.names.append(scanner)
+                    self.ids[scanner] = idx
+        return idx
+
+    def canonical(self, scanner: str) -> str:
+        """The registry's own copy of the scanner string (one object per scanner)."""
+        return self.names[self.intern(scanner)]
+
+    def name(self, idx: int) -> str:
+        return self.names[idx]
+
+
+class ObsWindow:
+    __slots__ = ("ids", "mono", "scanner", "channel", "rssi", "start", "end", "means")
+
+    def __init__(self, ids: ScannerIds, capacity: int = INITIAL_CAPACITY) -> None:
+        self.ids = ids
+        self.mono = array("d", bytes(8 * capacity))
+        self.scanner = array("H", bytes(2 * capacity))
+        self.channel = array("h", bytes(2 * capacity))
+        self.rssi = array("b", bytes(capacity))
+        self.start = 0
+        self.end = 0
+        self.means: Optional[Dict[str, float]] = None
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _arrays(self) -> Tuple[array, array, array, array]:
+        return self.mono, self.scanner, self.channel, self.rssi
+
+    def _resize(self, capacity: int) -> None:
+        """Move the live samples to the front of fresh arrays of `capacity`."""
+        n = self.end - self.start
+        for name in ("mono", "scanner", "channel", "rssi"):
+            old = getattr(self, name)
+            new = array(old.typecode, bytes(old.itemsize * capacity))
+            new[0:n] = old[self.start:self.end]
+            setattr(self, name, new)
+        self.start = 0
+        self.end = n
+
+    def _make_room(self) -> None:
+        n = self.end - self.start
+        capacity = len(self.mono)
+        if self.start and n * 4 <= capacity * 3:
+            # Slide down in place; at least a quarter of the buffer becomes free.
+            for arr in self._arrays():
+                arr[0:n] = arr[self.start:self.end]
+            self.start = 0
+            self.end = n
+        else:
+            self._resize(capacity * 2)
+
+    def append(self, mono: float, scanner: str, channel: int, rssi: int) -> None:
+        if self.end == len(self.mono):
+            self._make_room()
+        i = self.end
+        self.mono[i] = mono
+        self.scanner[i] = self.ids.intern(scanner)
+        self.channel[i] = max(-32768, min(32767, int(channel)))
+        self.rssi[i] = clamp_rssi(rssi)
+        self.end = i + 1
+        self.means = None
+
+    def extend(self, other: "ObsWindow") -> None:
+        for mono, scanner, channel, rssi in other:
+            self.append(mono, scanner, channel, rssi)
+
+    def prune_before(self, cutoff: float) -> None:
+        """Drop leading samples older than cutoff (deque.popleft() semantics)."""
+        mono = self.mono
+        i = self.start
+        end = self.end
+        while i < end and mono[i] < cutoff:
+            i += 1
+        if i == self.start:
+            return
+        self.start = i
+        self.means = None
+        if i == end:
+            self.start = self.end = 0
+
+        capacity = len(self.mono)
+        n = self.end - self.start
+        if capacity > SHRINK_MIN_CAPACITY and n * 4 < capacity:
+            self._resize(max(INITIAL_CAPACITY, n * 2))
+
+    def clear(self) -> None:
+        self.start = self.end = 0
+        self.means = None
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __bool__(self) -> bool:
+        return self.end > self.start
+
+    def __iter__(self) -> Iterator[Tuple[float, str, int, int]]:
+        names = self.ids.names
+        for i in range(self.start, self.end):
+            yield self.mono[i], names[self.scanner[i]], self.channel[i], self.rssi[i]
+
+    def nbytes(self) -> int:
+        return sum(arr.itemsize * len(arr) for arr in self._arrays())
+
+    # ------------------------------------------------------------------
+    # Scans
+    # ------------------------------------------------------------------
+
+    def _columns(self, min_mono: Optional[float], max_mono: Optional[float],
+                 with_mono: bool = False) -> Iterator[tuple]:
+        """(scanner_id, rssi[, mono]) for the live samples inside [min_mono, max_mono]."""
+        sl = slice(self.start, self.end)
+        if min_mono is None and max_mono is None and not with_mono:
+            return zip(self.scanner[sl], self.rssi[sl])
+        lo = -math.inf if min_mono is None else min_mono
+        hi = math.inf if max_mono is None else max_mono
+        rows = zip(self.scanner[sl], self.rssi[sl], self.mono[sl])
+        if with_mono:
+            return ((s, r, t) for s, r, t in rows if lo <= t <= hi)
+        return ((s, r) for s, r, t in rows if lo <= t <= hi)
+
+    def scanners(self) -> Set[str]:
+        names = self.ids.names
+        return {names[s] for s in set(self.scanner[self.start:self.end])}
+
+    def scanner_channels(self) -> Set[Tuple[str, int]]:
+        names = self.ids.names
+        pairs = set(zip(self.scanner[self.start:self.end], self.channel[self.start:self.end]))
+        return {(names[s], c) for s, c in pairs}
+
+    def _grouped(self, min_mono: Optional[float], max_mono: Optional[float]) -> Dict[int, List[int]]:
+        vals: Dict[int, List[int]] = {}
+        for s, r in self._columns(min_mono, max_mono):
+            group = vals.get(s)
+            if group is None:
+                vals[s] = [r]
+            else:
+                group.append(r)
+        return vals
+
+    def rssi_by_scanner(self, min_mono: Optional[float] = None,
+                        max_mono: Optional[float] = None) -> Dict[str, List[int]]:
+        names = self.ids.names
+        return {names[s]: vals for s, vals in self._grouped(min_mono, max_mono).items()}
+
+    def scanner_samples(self, min_mono: Optional[float] = None,
+                        max_mono: Optional[float] = None) -> Dict[str, Tuple[List[int], float, float]]:
+        """scanner -> (rssi samples, oldest mono, newest mono) within [min_mono, max_mono]."""
+        acc: Dict[int, list] = {}
+        for s, r, t in self._columns(min_mono, max_mono, with_mono=True):
+            item = acc.get(s)
+            if item is None:
+                acc[s] = [[r], t, t]
+            else:
+                item[0].append(r)
+                if t < item[1]:
+                    item[1] = t
+                if t > item[2]:
+                    item[2] = t
+        names = self.ids.names
+        return {names[s]: (vals, oldest, newest) for s, (vals, oldest, newest) in acc.items()}
+
+    def top_half_means(self, min_mono: Optional[float] = None,
+                       max_mono: Optional[float] = None) -> Dict[str, float]:
+        """
+        Per-scanner mean of the strongest half of the samples. The unfiltered
+        result is memoized until the window next changes.
+        """
+        unfiltered = min_mono is None and max_mono is None
+        if unfiltered and self.means is not None:
+            return dict(self.means)
+
+        if np is not None and self.end - self.start >= NUMPY_MIN_SAMPLES:
+            by_id = self._top_half_means_numpy(min_mono, max_mono)
+        else:
+            by_id = {}
+            for s, samples in self._grouped(min_mono, max_mono).items():
+                samples.sort(reverse=True)
+                keep_n = max(1, len(samples) // 2)
+                by_id[s] = sum(samples[:keep_n]) / keep_n
+
+        names = self.ids.names
+        out = {names[s]: mean for s, mean in by_id.items()}
+        if unfiltered:
+            self.means = out
+            return dict(out)
+        return out
+
+    def _top_half_means_numpy(self, min_mono: Optional[float], max_mono: Optional[float]) -> Dict[int, float]:
+        # One (scanner x rssi) histogram; the strongest half of each row is
+        # taken from the cumulative counts. Sums are exact integers, so the
+        # means equal the Python path's.
+        sl = slice(self.start, self.end)
+        scanner = np.frombuffer(self.scanner, dtype=np.uint16)[sl]
+        rssi = np.frombuffer(self.rssi, dtype=np.int8)[sl]
+        if min_mono is not None or max_mono is not None:
+            mono = np.frombuffer(self.mono, dtype=np.float64)[sl]
+            mask = np.ones(mono.shape, dtype=bool)
+            if min_mono is not None:
+                mask &= mono >= min_mono
+            if max_mono is not None:
+                mask &= mono <= max_mono
+            scanner = scanner[mask]
+            rssi = rssi[mask]
+        if scanner.size == 0:
+            return {}
+
+        n_ids = int(scanner.max()) + 1
+        hist = np.bincount(
+            scanner.astype(np.intp) * RSSI_BINS + (rssi.astype(np.intp) - RSSI_MIN),
+            minlength=n_ids * RSSI_BINS,
+        ).reshape(n_ids, RSSI_BINS)[:, ::-1]
+        counts = hist.sum(axis=1)
+        keep = np.maximum(1, counts // 2)
+        before = np.cumsum(hist, axis=1) - hist
+        taken = np.minimum(hist, np.maximum(0, keep[:, None] - before))
+        sums = taken @ _RSSI_DESC
+
+        # First-appearance order, like the Python path.
+        order = dict.fromkeys(scanner.tolist())
+        return {s: int(sums[s]) / int(keep[s]) for s in order}
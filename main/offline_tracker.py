@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+offline_tracker.py
+
+Offline re-identification: runs pc_receiver.DeviceTracker over a recorded
+session instead of live scanner traffic, so tracker thresholds can be tuned
+without a new capture.
+
+- events are streamed through session_reader.py (.json, .zip, .blesa, .jsonl,
+  event-log segment directories) and processed in large sorted batches;
+- the 100 ms window peak filter is the same code the receiver uses
+  (pc_receiver.window_peaks);
+- the tracker runs on a simulated clock driven by event time (rx_ts_us when
+  present, else ts), so burst gaps, presence ages and identity expiry behave
+  as they did during the capture, only faster;
+- configuration is injected per run as overrides of the receiver's tuning
+  constants (MATCH_THRESHOLD, CONFIRMED_MERGE_REL_RMSE_DB, ...);
+- a parameter sweep runs every combination in a process pool (one tracker
+  and one set of constants per worker process) and prints a comparison
+  table of track counts, merges and confirmations.
+
+Examples:
+    python offline_tracker.py session_20260522_162550.json
+    python offline_tracker.py session.json --set MATCH_THRESHOLD=8
+    python offline_tracker.py session.json --sweep MATCH_THRESHOLD=7,9,11 \\
+        --sweep CONFIRMED_MERGE_REL_RMSE_DB=2.5,3.5,4.5 --processes 4 --csv sweep.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from session_reader import iter_raw_events
+
+DEFAULT_BATCH_EVENTS = 50_000
+
+RESULT_COLUMNS = [
+    "events",
+    "peaks",
+    "tracks_created",
+    "tracks",
+    "visible_tracks",
+    "confirmed",
+    "alias_tracks",
+    "merges",
+    "rejected_class_conflicts",
+    "rejected_track_expansion",
+    "blocked_confirmation_weak_rssi",
+    "blocked_confirmation_unknown_heavy",
+    "elapsed_s",
+    "events_per_s",
+]
+
+
+# ----------------------------------------------------------------------------
+# Simulated clock
+# ----------------------------------------------------------------------------
+
+class SimClock:
+    """Callable drop-in for time.monotonic() that only moves when advanced."""
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.now = start
+
+    def advance_to(self, t: float) -> None:
+        if t > self.now:
+            self.now = t
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# ----------------------------------------------------------------------------
+# Event stream
+# ----------------------------------------------------------------------------
+
+def _event_time_us(ev: Dict[str, Any]) -> int:
+    return ev.get("rx_ts_us") or ev["ts"]
+
+
+def _normalize(ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Same field types the receiver's ingest route produces.
+    try:
+        out = {
+            "mac": str(ev["mac"]).upper(),
+            "rssi": int(ev["rssi"]),
+            "channel": int(ev.get("channel", 0) or 0),
+            "scanner": str(ev.get("scanner", "unknown")),
+            "ts": int(ev["ts"]),
+            "payload": str(ev.get("payload", "")),
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+    if ev.get("rx_ts_us"):
+        out["rx_ts_us"] = int(ev["rx_ts_us"])
+    return out
+
+
+def iter_windows(
+    events: Iterator[Dict[str, Any]],
+    window_us: int,
+    margin_us: int,
+    batch_events: int = DEFAULT_BATCH_EVENTS,
+) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Yield (bucket_idx, events) windows in time order.
+
+    Events are collected into batches of batch_events, sorted, and every
+    window older than the newest event minus margin_us is released; the rest
+    is carried into the next batch, as in pc_receiver.window_processor.
+    """
+    pending: List[Dict[str, Any]] = []
+
+    def release(threshold_us: Optional[int]) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        nonlocal pending
+        pending.sort(key=_event_time_us)
+        if threshold_us is None:
+            ready, pending = pending, []
+        else:
+            split = 0
+            while split < len(pending) and _event_time_us(pending[split]) <= threshold_us:
+                split += 1
+            ready, pending = pending[:split], pending[split:]
+
+        window: List[Dict[str, Any]] = []
+        current = None
+        for ev in ready:
+            idx = _event_time_us(ev) // window_us
+            if idx != current and window:
+                yield current, window
+                window = []
+            current = idx
+            window.append(ev)
+        if window:
+            yield current, window
+
+    for raw in events:
+        ev = _normalize(raw)
+        if ev is None:
+            continue
+        pending.append(ev)
+        if len(pending) >= batch_events:
+            newest = max(_event_time_us(e) for e in pending)
+            # Release whole windows only, so a window is never split across batches.
+            threshold = ((newest - margin_us) // window_us) * window_us - 1
+            yield from release(threshold)
+
+    yield from release(None)
+
+
+# ----------------------------------------------------------------------------
+# Single run
+# ----------------------------------------------------------------------------
+
+def run_offline(
+    session: str,
+    overrides: Optional[Dict[str, Any]] = None,
+    batch_events: int = DEFAULT_BATCH_EVENTS,
+    t_start_us: Optional[int] = None,
+    t_end_us: Optional[int] = None,
+    load_localization: bool = False,
+    max_events: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Replay one session through a fresh DeviceTracker with the given constant
+    overrides and return the run metrics (see RESULT_COLUMNS).
+    max_events stops the replay after the first max_events raw events.
+    """
+    import pc_receiver as pr
+
+    overrides = dict(overrides or {})
+    previous = pr.apply_config_overrides(overrides)
+    real_clock = pr.monotonic_now
+    clock = SimClock()
+    pr.monotonic_now = clock
+
+    try:
+        if not pr.MFG_NAMES:
+            pr.load_mfg_ids()
+        if load_localization:
+            pr.load_localization_fingerprints()
+
+        tracker = pr.DeviceTracker()
+        n_events = 0
+        n_peaks = 0
+        t0 = time.perf_counter()
+
+        raw = iter_raw_events(session, t_start_us=t_start_us, t_end_us=t_end_us)
+        if max_events is not None:
+            raw = itertools.islice(raw, max_events)
+        for _, window in iter_windows(raw, pr.WINDOW_SIZE_US, pr.SAFETY_MARGIN_US, batch_events):
+            n_events += len(window)
+            for peak_ev in pr.window_peaks(window):
+                clock.advance_to(_event_time_us(peak_ev) / 1_000_000.0)
+                tracker.process_event(peak_ev, pr.parse_payload(peak_ev["payload"]))
+                n_peaks += 1
+
+        elapsed = time.perf_counter() - t0
+        snap = tracker.snapshot()
+
+        return {
+            "overrides": overrides,
+            "events": n_events,
+            "peaks": n_peaks,
+            "tracks_created": tracker.next_id - 1,
+            "tracks": len(tracker.tracks),
+            "visible_tracks": snap["num_tracks"],
+            "confirmed": snap["num_confirmed"],
+            "alias_tracks": snap["num_alias_tracks"],
+            "merges": tracker.merges_total,
+            "rejected_class_conflicts": tracker.rejected_class_conflicts,
+            "rejected_track_expansion": tracker.rejected_track_expansion,
+            "blocked_confirmation_weak_rssi": tracker.blocked_confirmation_weak_rssi,
+            "blocked_confirmation_unknown_heavy": tracker.blocked_confirmation_unknown_heavy,
+            "elapsed_s": round(elapsed, 3),
+            "events_per_s": round(n_events / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+    finally:
+        pr.monotonic_now = real_clock
+        pr.apply_config_overrides(previous)
+
+
+def _run_job(job: Tuple[str, Dict[str, Any], Dict[str, Any]]) -> Dict[str, Any]:
+    session, overrides, kwargs = job
+    return run_offline(session, overrides, **kwargs)
+
+
+# ----------------------------------------------------------------------------
+# Parameter sweep
+# ----------------------------------------------------------------------------
+
+def sweep_configs(base: Dict[str, Any], grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the grid values on top of the base overrides."""
+    names = list(grid)
+    configs = []
+    for values in itertools.product(*(grid[n] for n in names)):
+        cfg = dict(base)
+        cfg.update(zip(names, values))
+        configs.append(cfg)
+    return configs or [dict(base)]
+
+
+def sweep(
+    session: str,
+    configs: List[Dict[str, Any]],
+    processes: Optional[int] = None,
+    **kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    Run every configuration. Each run happens in its own worker process, so the
+    module-level constants of one configuration never leak into another.
+    """
+    jobs = [(session, cfg, kwargs) for cfg in configs]
+    if processes == 1 or len(jobs) == 1:
+        return [_run_job(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_run_job, jobs))
+
+
+# ----------------------------------------------------------------------------
+# Reports
+# ----------------------------------------------------------------------------
+
+def _override_names(results: List[Dict[str, Any]]) -> List[str]:
+    names: List[str] = []
+    for res in results:
+        for name in res["overrides"]:
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def format_table(results: List[Dict[str, Any]], columns: Optional[List[str]] = None) -> str:
+    names = _override_names(results)
+    columns = columns or ["tracks_created", "tracks", "visible_tracks", "confirmed", "merges",
+                          "rejected_class_conflicts", "events_per_s"]
+    header = names + columns
+    rows = [[str(res["overrides"].get(n, "")) for n in names] + [str(res[c]) for c in columns] for res in results]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) if rows else len(h) for i, h in enumerate(header)]
+
+    lines = ["  ".join(h.rjust(w) for h, w in zip(header, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    for row in rows:
+        lines.append("  ".join(v.rjust(w) for v, w in zip(row, widths)))
+    return "\n".join(lines)
+
+
+def write_csv(results: List[Dict[str, Any]], path: str) -> None:
+    names = _override_names(results)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(names + RESULT_COLUMNS)
+        for res in results:
+            writer.writerow([res["overrides"].get(n, "") for n in names] + [res[c] for c in RESULT_COLUMNS])
+
+
+# ----------------------------------------------------------------------------
+# CLI
+# ----------------------------------------------------------------------------
+
+def _parse_assignment(text: str) -> Tuple[str, str]:
+    if "=" not in text:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    name, value = text.split("=", 1)
+    return name.strip(), value.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay a recorded session through DeviceTracker offline.")
+    parser.add_argument("session", help="Session .json / .zip / .blesa / .jsonl or segment directory")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], type=_parse_assignment,
+                        metavar="NAME=VALUE", help="Override a pc_receiver constant for every run")
+    parser.add_argument("--sweep", action="append", default=[], type=_parse_assignment,
+                        metavar="NAME=V1,V2,...", help="Sweep a pc_receiver constant over several values")
+    parser.add_argument("--processes", type=int, default=None,
+                        help=f"Worker processes for a sweep (default: CPU count, {os.cpu_count()})")
+    parser.add_argument("--batch-events", type=int, default=DEFAULT_BATCH_EVENTS)
+    parser.add_argument("--from-us", type=int, default=None)
+    parser.add_argument("--to-us", type=int, default=None)
+    parser.add_argument("--localization", action="store_true",
+                        help="Load calibration_fingerprints.json so tracks are localized during the replay")
+    parser.add_argument("--csv", default=None, help="Write the full result table to this CSV file")
+    args = parser.parse_args()
+
+    base = dict(args.overrides)
+    grid = {name: [v for v in values.split(",") if v] for name, values in args.sweep}
+    configs = sweep_configs(base, grid)
+
+    results = sweep(
+        args.session,
+        configs,
+        processes=args.processes,
+        batch_events=args.batch_events,
+        t_start_us=args.from_us,
+        t_end_us=args.to_us,
+        load_localization=args.localization,
+    )
+
+    first = results[0]
+    print(f"Session: {args.session} | events: {first['events']} | peaks: {first['peaks']} | runs: {len(results)}")
+    print(format_table(results))
+    if args.csv:
+        write_csv(results, args.csv)
+        print(f"Results written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,26 @@ from zeroconf import ServiceInfo, Zeroconf
 
 # Import the AdvParser for calibration, UI display, and payload fingerprinting
 from ble_adv_parser import AdvParser
+from build_calibration_fingerprints import build_fingerprints_from_store
+from calibration_store import CalibrationStore
+from expiry_queue import ExpiryQueue
+from json_response import compress_body, encode_json
+from localization_field_map import (
+    block_at_position,
+    field_map_status,
+    fingerprint_source_hash,
+    load_or_build_field_map,
+    match_field_map,
+)
+from position_tracker import TrackPositionEstimator
+from lock_profiler import ProfiledLock
+from obs_window import ObsWindow, ScannerIds, clamp_rssi, rssi_samples
+from rssi_kernel import one_vs_many, pairwise_distances
+from rssi_sketch import RssiSketch
+from session_writer import SessionWriter
+from stack_sampler import collapsed_text, sample_stacks
+from stage_metrics import StageTimers
+from track_history import BoundedList, RingArray, ScannerMapRing
 
 # Silence Flask logs for a cleaner terminal
 log = logging.getLogger("werkzeug")
@@ -34,6 +54,10 @@ data_queue = queue.Queue(maxsize=5000)
 # Active scanner registry: scanner_id -> {ip, last_seen}
 active_scanners: Dict[str, Dict[str, Any]] = {}
 
+# Clock used by the tracker for ages, bursts and expiry. Offline replays
+# (offline_tracker.py) swap this for a simulated clock driven by event time.
+monotonic_now = time.monotonic
+
 # Buffering for windowed processing
 event_buffer = []
 buffer_lock = threading.Lock()
@@ -43,6 +67,15 @@ parse_cache: Dict[str, Dict[str, Any]] = {}
 parse_cache_lock = threading.Lock()
 PARSE_CACHE_MAX = 5000
 
+# Payload-signature -> parsed signature parts (frozen), shared by every track
+# comparison that looks at the same signature.
+sig_parts_cache: Dict[str, Dict[str, Any]] = {}
+sig_parts_cache_lock = threading.Lock()
+SIG_PARTS_CACHE_MAX = 20000
+
+# Scanner id strings interned to small ints for the tracks' observation windows.
+scanner_ids = ScannerIds()
+
 # Robust absolute pathing
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -123,6 +156,26 @@ PHONE_BURSTY_MAX_AVG_BURST_DURATION_SEC = 8.0
 PHONE_BURSTY_MAX_AVG_PACKETS_PER_BURST = 25.0
 PHONE_ROTATION_MIN_MACS_OR_PAYLOADS = 2
 
+# ---------------- Identity state compaction ----------------
+# A physical track can live all day while its device rotates MAC and payload
+# every few minutes. Per-entry identity state (aliases, MACs, payload signatures,
+# per-payload RSSI, per-alias interval streams, alias features) is therefore
+# kept live only for recent entries. Entries idle for IDENTITY_ENTRY_IDLE_SEC, or
+# beyond the live caps, are retired: MAC/alias/payload counts stay in lifetime
+# totals and retired payloads fold into one summary per payload family (packet
+# counts plus a merged per-scanner RSSI histogram), capped at
+# IDENTITY_MAX_RETIRED_FAMILIES. The newest IDENTITY_MIN_LIVE_ENTRIES of each
+# kind are never retired, so a device returning after silence still matches.
+IDENTITY_COMPACT_ENABLED = True
+IDENTITY_COMPACT_INTERVAL_SEC = 30.0
+IDENTITY_ENTRY_IDLE_SEC = 180.0
+IDENTITY_MIN_LIVE_ENTRIES = 4
+IDENTITY_MAX_LIVE_ALIASES = 64
+IDENTITY_MAX_LIVE_MACS = 64
+IDENTITY_MAX_LIVE_PAYLOADS = 64
+IDENTITY_MAX_ALIAS_FEATURES = 32
+IDENTITY_MAX_RETIRED_FAMILIES = 32
+
 # ---------------- Mobile service-data tracking ----------------
 # Test result:
 #   Samsung phone near scanner 2 appeared mainly as Unknown service-data
@@ -163,6 +216,12 @@ MOBILE_TO_MOBILE_REQUIRE_TOP2_OVERLAP = True
 # but physical identities are retained until IDENTITY_MEMORY_SEC.
 TRACK_STALE_SEC = 12.0
 
+# Track/alias expiry and burst/motion-slice finalization are deadline timers
+# (expiry_queue.py). They are polled on every event and, so that silent devices
+# are finalized without waiting for their next packet, by the tracker_expiry
+# thread every TRACKER_EXPIRY_TICK_SEC.
+TRACKER_EXPIRY_TICK_SEC = 0.5
+
 # Main assignment threshold. Lower = stricter/more devices. Higher = looser/fewer devices.
 # V2 is intentionally stricter because a room can contain many Apple/Samsung devices.
 MATCH_THRESHOLD = 9.0
@@ -322,6 +381,14 @@ CROSS_PERSONALITY_HIGH_ABS_REQUIRE_REL_RMSE_DB = 2.2
 HIDE_WEAK_INACTIVE_CANDIDATES_IN_MAIN_API = True
 WEAK_INACTIVE_MAX_PACKETS_FOR_HIDE = 10
 
+# snapshot() reuses the row of a quiet track (no packet for TRACKER_MEMORY_SEC,
+# no open burst/motion slice) while its version, presence_state and idle-time
+# bucket are unchanged. age_sec, last_seen_age_sec, last_burst_age_sec and
+# associated_tracks are always current; the rest of a reused row is at most
+# SNAPSHOT_ROW_REFRESH_SEC old.
+SNAPSHOT_ROW_CACHE_ENABLED = True
+SNAPSHOT_ROW_REFRESH_SEC = 5.0
+
 # ---------------- Background/mobile false-positive suppression ----------------
 # Test conclusion:
 # scanner-4-dominant FCF1/FEF3 families can persist for many minutes while not
@@ -387,9 +454,20 @@ SAMPLES_PER_SCANNER = 100
 CALIBRATION_RAW_CSV = "calibration_raw.csv"
 CALIBRATION_SUMMARY_CSV = "calibration_summary.csv"
 
+# Per-session calibration store (see calibration_store.py). Every completed
+# run is written as one compact columnar file plus an index entry, so
+# fingerprint builds can select sessions by date, room or block instead of
+# rescanning the whole CSV history. The legacy append-only CSVs are still
+# written for existing tools unless disabled.
+CALIBRATION_STORE_ENABLED = True
+CALIBRATION_STORE_DIR = "calibration_store"
+CALIBRATION_WRITE_LEGACY_CSV = True
+CALIBRATION_DEFAULT_ROOM = "default"
+
 calib_state = {
     "active": False,
     "grid_block": None,             # 3x3 grid block ID entered by the user
+    "room": CALIBRATION_DEFAULT_ROOM,
     "session_id": "",
     "buckets": {},                  # scanner_id -> [raw measurement dicts]
     "last_progress_print": 0.0,
@@ -402,6 +480,30 @@ calib_lock = threading.Lock()
 GRID_LOCALIZATION_ENABLED = True
 LOCALIZATION_FINGERPRINTS_JSON = "calibration_fingerprints.json"
 
+# Sub-block position from a dense RSSI field map interpolated from the block
+# fingerprints (see localization_field_map.py). The map is cached next to the
+# fingerprint file and rebuilt automatically when the fingerprints change.
+# It is reported alongside the block result and never changes block assignment.
+LOCALIZATION_FIELD_MAP_ENABLED = True
+LOCALIZATION_FIELD_MAP_JSON = "calibration_field_map.json"
+
+# Recursive per-track position estimate (see position_tracker.py). Each packet
+# updates a per-scanner RSSI Kalman filter; a constant-velocity x/y filter is
+# fed a position fix at most every POSITION_FIX_MIN_INTERVAL_SEC. Reading the
+# estimate is O(1), so localization reports it without a window recompute.
+# The default fix is the cheap relative-RSSI centroid. The field-map fix is
+# finer but costs ~0.5 ms per fix per track, so it is opt-in.
+POSITION_TRACKER_ENABLED = True
+POSITION_TRACKER_USE_FIELD_MAP = False
+
+# Fingerprint hot-reload. Reloads compile in the background and swap in
+# atomically; the last N versions stay in memory for rollback and A/B
+# comparison (/api/localization/versions, /api/localization/compare).
+# Auto reload polls the fingerprint file for changes.
+LOCALIZATION_KEEP_VERSIONS = 5
+LOCALIZATION_AUTO_RELOAD = False
+LOCALIZATION_WATCH_INTERVAL_SEC = 2.0
+
 # The localization engine intentionally ignores Tx Power. It relies on
 # calibrated multi-scanner RSSI shape, absolute level as a weak secondary clue,
 # and RSSI STD as both reliability and fingerprint behavior.
@@ -575,7 +677,17 @@ localization_state: Dict[str, Any] = {
     "path": "",
     "message": "not_loaded",
     "fingerprints": {},
+    "field_map": None,
+    # Active immutable version record; see _compile_fingerprint_version().
+    "active": None,
+    "next_version": 1,
+    "reloading": False,
+    "last_reload_error": "",
+    "watch_mtime": None,
+    "watch_size": None,
 }
+# Last LOCALIZATION_KEEP_VERSIONS compiled fingerprint sets, oldest first.
+localization_versions: deque = deque(maxlen=LOCALIZATION_KEEP_VERSIONS)
 
 
 # ---------------- Diagnostics ----------------
@@ -604,6 +716,232 @@ stats = {
     "tracker_weak_flat_background_tracks": 0,
 }
 
+# Per-stage latency histograms (stage_metrics.py), exposed at /api/metrics in
+# Prometheus text format and summarized by stats_reporter every STAGE_METRICS_REPORT_SEC.
+# Stages, in pipeline order:
+#   ingest_parse        normalizing one ingest POST (per request)
+#   buffer_wait         receive -> released by the window processor (per raw event)
+#   safety_margin_wait  part of buffer_wait spent waiting for SAFETY_MARGIN_US of newer events
+#   window_peak         window_peaks() for one 100 ms window
+#   parse_payload       parse_payload() per peak event (cache hits included)
+#   process_event       DeviceTracker.process_event() per peak event
+#   identity_result     DeviceTracker._identity_result() (part of process_event)
+#   sse_enqueue         enqueue_stream_event_realtime()
+#   snapshot            DeviceTracker.snapshot()
+#   end_to_end          scanner POST received -> event written to an SSE client (via rx_ts_us)
+STAGE_METRICS_ENABLED = True
+STAGE_METRICS_REPORT_SEC = 10.0
+
+stage_timers = StageTimers(
+    stages=(
+        "ingest_parse",
+        "buffer_wait",
+        "safety_margin_wait",
+        "window_peak",
+        "parse_payload",
+        "process_event",
+        "identity_result",
+        "sse_enqueue",
+        "snapshot",
+        "end_to_end",
+    ),
+    enabled=STAGE_METRICS_ENABLED,
+)
+
+# DeviceTracker.lock contention profiling (lock_profiler.py): wait and hold time
+# per call site (process_event, snapshot) and per section inside a hold
+# (prune_stale, periodic_merge, association_map), plus the longest holds with
+# the track counts at the time. Reported in /api/stats under "tracker_lock".
+TRACKER_LOCK_PROFILING = True
+TRACKER_LOCK_TOP_HOLDS = 20
+# Log every hold longer than this many ms as "[LOCK] slow ..."; None disables.
+TRACKER_LOCK_SLOW_HOLD_MS: Optional[float] = None
+
+# On-demand stack sampling of the running receiver (stack_sampler.py):
+#   GET /api/debug/profile?seconds=N[&hz=100][&thread=window_processor][&lines=1][&format=json]
+# returns collapsed stacks (flamegraph.pl / speedscope input) for every thread.
+# Nothing is sampled until the endpoint is called; one profile runs at a time.
+# The receiver listens on all interfaces without auth, so only loopback
+# callers are served unless DEBUG_PROFILE_ALLOW_REMOTE is set. That keeps the
+# endpoint usable on a lagging receiver without a restart.
+DEBUG_PROFILE_ENABLED = True
+DEBUG_PROFILE_ALLOW_REMOTE = False
+DEBUG_PROFILE_MAX_SEC = 60.0
+DEBUG_PROFILE_DEFAULT_HZ = 100
+DEBUG_PROFILE_MAX_HZ = 200
+debug_profile_lock = threading.Lock()
+
+
+# ---------------- Durable event log ----------------
+
+# Optional append-only record of everything the receiver accepted, independent
+# of SSE clients (the stream drops old events under backlog by design).
+# Raw ingest events and processed peak events go to JSON-lines segments under
+#   EVENT_LOG_DIR/<run_id>/raw/events_NNNNN.jsonl
+#   EVENT_LOG_DIR/<run_id>/peak/events_NNNNN.jsonl
+# Ingest only enqueues one item per POST; JSON encoding, group commit, fsync and
+# rotation run on the session_writer.SessionWriter background threads. Both
+# directories are readable directly by session_reader.py (and ble_popup.py
+# --replay); raw records keep rx_ts_us so the window filter can be replayed.
+EVENT_LOG_ENABLED = False
+EVENT_LOG_DIR = "event_log"
+EVENT_LOG_RAW = True
+EVENT_LOG_PEAK = True
+EVENT_LOG_COMMIT_INTERVAL_SEC = 0.2
+# None: leave durability to the OS. 0: fsync every group commit.
+EVENT_LOG_FSYNC_INTERVAL_SEC = 1.0
+EVENT_LOG_ROTATE_BYTES = 64 * 1024 * 1024
+EVENT_LOG_ROTATE_INTERVAL_SEC = 10 * 60.0
+# Queue items are whole ingest POSTs (raw) or single peak events.
+EVENT_LOG_MAX_PENDING = 100_000
+
+event_log_writers: Dict[str, SessionWriter] = {}
+event_log_run_dir = ""
+
+
+def start_event_log() -> None:
+    global event_log_run_dir
+    if not EVENT_LOG_ENABLED or event_log_writers:
+        return
+
+    run_id = datetime.now().strftime("run_%Y%m%d_%H%M%S")
+    event_log_run_dir = os.path.join(BASE_DIR, EVENT_LOG_DIR, run_id)
+    os.makedirs(event_log_run_dir, exist_ok=True)
+    with open(os.path.join(event_log_run_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "run_id": run_id,
+            "start": datetime.now().isoformat(timespec="seconds"),
+            "window_size_us": WINDOW_SIZE_US,
+            "safety_margin_us": SAFETY_MARGIN_US,
+            "kinds": [k for k, on in (("raw", EVENT_LOG_RAW), ("peak", EVENT_LOG_PEAK)) if on],
+        }, f, indent=2)
+
+    for kind, enabled in (("raw", EVENT_LOG_RAW), ("peak", EVENT_LOG_PEAK)):
+        if not enabled:
+            continue
+        event_log_writers[kind] = SessionWriter(
+            os.path.join(event_log_run_dir, kind),
+            max_queue=EVENT_LOG_MAX_PENDING,
+            batch_size=5000,
+            flush_interval_s=EVENT_LOG_COMMIT_INTERVAL_SEC,
+            rotate_bytes=EVENT_LOG_ROTATE_BYTES,
+            rotate_interval_s=EVENT_LOG_ROTATE_INTERVAL_SEC,
+            fsync_interval_s=EVENT_LOG_FSYNC_INTERVAL_SEC,
+        )
+    print(f"[EVENTLOG] Writing {', '.join(event_log_writers)} events to {event_log_run_dir}")
+
+
+def stop_event_log() -> None:
+    for writer in event_log_writers.values():
+        writer.close()
+
+
+def event_log_status() -> Dict[str, Any]:
+    if not event_log_writers:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "run_dir": event_log_run_dir,
+        "fsync_interval_sec": EVENT_LOG_FSYNC_INTERVAL_SEC,
+        "writers": {kind: writer.get_stats() for kind, writer in event_log_writers.items()},
+    }
+
+
+# ---------------- API responses ----------------
+
+# Snapshot-sized endpoints (/api/devices, /api/localization, /api/stats) are
+# encoded in one pass by json_response.encode_json (orjson when installed) and
+# compressed with br/gzip when the client's Accept-Encoding allows it.
+API_COMPRESSION_ENABLED = True
+API_COMPRESSION_MIN_BYTES = 2048
+
+
+def json_api_response(payload: Any, status: int = 200) -> Response:
+    body = encode_json(payload)
+    encoding = None
+    if API_COMPRESSION_ENABLED:
+        body, encoding = compress_body(body, request.headers.get("Accept-Encoding", ""), API_COMPRESSION_MIN_BYTES)
+    resp = Response(body, status=status, mimetype="application/json")
+    if API_COMPRESSION_ENABLED:
+        resp.headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    return resp
+
+
+# /api/devices query parameters. A request without any of them gets the full
+# snapshot unchanged; with them, DeviceTracker.query_devices() filters tracks
+# before their rows are built and only builds rows for the requested page:
+#   status, display_class, device_type, presence_state
+#                  comma-separated, case-insensitive values to keep
+#   weak           include (default) | exclude | only weak-memory tracks
+#   fields         comma-separated row fields to return (uid is always kept)
+#   sort           uid (default), packets, age_sec, last_seen_age_sec,
+#                  strongest_rssi; prefix "-" for descending
+#   limit, cursor  page size and the next_cursor of the previous page
+DEVICES_API_DEFAULT_LIMIT = 100
+DEVICES_API_MAX_LIMIT = 1000
+DEVICES_API_FILTERS = ("status", "display_class", "device_type", "presence_state")
+DEVICES_API_SORT_KEYS = ("uid", "packets", "age_sec", "last_seen_age_sec", "strongest_rssi")
+DEVICES_API_PARAMS = DEVICES_API_FILTERS + ("weak", "fields", "sort", "limit", "cursor")
+
+
+def encode_devices_cursor(sort: str, desc: bool, key: Tuple[Any, ...]) -> str:
+    raw = json.dumps([sort, desc, key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_devices_cursor(cursor: str, sort: str, desc: bool) -> Tuple[Any, ...]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cur_sort, cur_desc, key = json.loads(raw.decode("utf-8"))
+        (flag, value), uid = key
+    except Exception:
+        raise ValueError("invalid cursor")
+    if cur_sort != sort or cur_desc != desc:
+        raise ValueError("cursor was issued for a different sort order")
+    return (flag, value), uid
+
+
+def devices_query_from_args(args: Any) -> Dict[str, Any]:
+    """Parse /api/devices query args. Raises ValueError on an invalid value."""
+    def _set(name: str) -> Optional[set]:
+        raw = str(args.get(name) or "").strip()
+        if not raw:
+            return None
+        return {v.strip().upper() for v in raw.split(",") if v.strip()} or None
+
+    weak = str(args.get("weak") or "include").strip().lower()
+    if weak not in ("include", "exclude", "only"):
+        raise ValueError("weak must be include, exclude or only")
+
+    sort = str(args.get("sort") or "uid").strip()
+    desc = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in DEVICES_API_SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(DEVICES_API_SORT_KEYS)}")
+
+    limit = safe_int(args.get("limit"), DEVICES_API_DEFAULT_LIMIT)
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+
+    fields = None
+    raw_fields = str(args.get("fields") or "").strip()
+    if raw_fields:
+        fields = ["uid"] + [f.strip() for f in raw_fields.split(",") if f.strip() and f.strip() != "uid"]
+
+    cursor = str(args.get("cursor") or "").strip()
+    query = {name: _set(name) for name in DEVICES_API_FILTERS}
+    query.update({
+        "weak": weak,
+        "fields": fields,
+        "sort": sort,
+        "desc": desc,
+        "limit": min(limit, DEVICES_API_MAX_LIMIT),
+        "after": decode_devices_cursor(cursor, sort, desc) if cursor else None,
+    })
+    return query
+
 
 # ---------------- mDNS ----------------
 
@@ -639,6 +977,56 @@ def safe_float(value: Any, default: float = 0.0) -> float:
         return default
 
 
+# Constants whose value follows another constant by default. When the base is
+# overridden, the derived constant follows it unless it is overridden too or
+# was already set to a different value.
+DERIVED_CONFIG_CONSTANTS = {
+    "IDENTITY_CONTINUITY_MAX_LAST_SEEN_GAP_SEC": "IDENTITY_MEMORY_SEC",
+}
+
+
+def apply_config_overrides(overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Overrides tuning constants (MATCH_THRESHOLD, CONFIRMED_MERGE_REL_RMSE_DB, ...)
+    in this module and returns their previous values so the caller can restore them.
+
+    Values may be given as strings (e.g. from a command line); they are cast to the
+    type of the existing constant. Unknown names raise KeyError. Constants in
+    DERIVED_CONFIG_CONSTANTS are moved along with their base.
+    """
+    g = globals()
+    cast_values: Dict[str, Any] = {}
+
+    for name, value in overrides.items():
+        if not name.isupper() or name not in g:
+            raise KeyError(f"unknown config constant: {name}")
+
+        current = g[name]
+        if isinstance(current, bool):
+            if isinstance(value, str):
+                value = value.strip().lower() in ("1", "true", "yes", "on")
+            else:
+                value = bool(value)
+        elif isinstance(current, int):
+            value = int(float(value))
+        elif isinstance(current, float):
+            value = float(value)
+        elif isinstance(current, str):
+            value = str(value)
+        else:
+            raise TypeError(f"config constant {name} is not a scalar")
+
+        cast_values[name] = value
+
+    for derived, base in DERIVED_CONFIG_CONSTANTS.items():
+        if base in cast_values and derived not in cast_values and g[derived] == g[base]:
+            cast_values[derived] = type(g[derived])(cast_values[base])
+
+    previous = {name: g[name] for name in cast_values}
+    g.update(cast_values)
+    return previous
+
+
 def load_mfg_ids(filename: str = "mfg_ids.csv") -> None:
     """
     Load Bluetooth Company Identifier names from mfg_ids.csv.
@@ -684,6 +1072,10 @@ def load_mfg_ids(filename: str = "mfg_ids.csv") -> None:
         MFG_NAMES = {}
         print(f"[MFG] Could not load {path}: {e}")
 
+    # Cached parse results carry mfg_name/meta_class derived from MFG_NAMES.
+    with parse_cache_lock:
+        parse_cache.clear()
+
 
 def mfg_name_from_id(mfg_id: Any) -> str:
     if not isinstance(mfg_id, int):
@@ -739,9 +1131,14 @@ def parse_payload(payload_b64: str) -> Dict[str, Any]:
     """
     Decode and parse a base64 BLE advertisement payload.
     Uses a bounded cache because many packets repeat the same payload.
+
+    The result also carries the payload-only derived fields "meta_class",
+    "service_data_uuids" and "mobile_service_uuids" (frozensets), so tracker
+    code does not re-classify the same payload on every packet. Cached results
+    are shared; treat them as read-only.
     """
     if not payload_b64:
-        return {
+        return attach_payload_classification({
             "name": "Unknown",
             "mfg_id": None,
             "mfg_data_hex": "",
@@ -754,7 +1151,7 @@ def parse_payload(payload_b64: str) -> Dict[str, Any]:
             "ad_structure": "",
             "adv_len": 0,
             "payload_sig": "EMPTY",
-        }
+        })
 
     with parse_cache_lock:
         cached = parse_cache.get(payload_b64)
@@ -797,6 +1194,8 @@ def parse_payload(payload_b64: str) -> Dict[str, Any]:
         with stats_lock:
             stats["parse_errors"] += 1
 
+    attach_payload_classification(result)
+
     with parse_cache_lock:
         if len(parse_cache) >= PARSE_CACHE_MAX:
             # Simple bounded cache policy: clear all.
@@ -929,31 +1328,128 @@ def service_data_uuids(parsed: Dict[str, Any]) -> set:
     return out
 
 
+def attach_payload_classification(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    uuids = frozenset(service_data_uuids(parsed))
+    parsed["meta_class"] = classify_metadata(parsed)
+    parsed["service_data_uuids"] = uuids
+    parsed["mobile_service_uuids"] = uuids & MOBILE_SERVICE_UUIDS
+    return parsed
+
+
+def parsed_meta_class(parsed: Dict[str, Any]) -> str:
+    cls = parsed.get("meta_class")
+    return cls if cls is not None else classify_metadata(parsed)
+
+
+def parsed_mobile_service_uuids(parsed: Dict[str, Any]) -> frozenset:
+    uuids = parsed.get("mobile_service_uuids")
+    if uuids is None:
+        uuids = frozenset(service_data_uuids(parsed) & MOBILE_SERVICE_UUIDS)
+    return uuids
+
+
 def is_mobile_service_parsed(parsed: Dict[str, Any]) -> bool:
-    return bool(service_data_uuids(parsed) & MOBILE_SERVICE_UUIDS)
+    return bool(parsed_mobile_service_uuids(parsed))
 
 
 def mobile_service_uuids_from_sigs(payload_sigs: set) -> set:
     """
-    Extract SD[...] UUIDs from our compact payload signatures.
-    Example:
+    Mobile-service SD[...] UUIDs of our compact payload signatures, e.g.
       MFG_NONE;...;SD[FCF1];...
+    Each signature is parsed once by payload_sig_parts().
     """
     out = set()
-    for sig in payload_sigs or []:
-        s = str(sig)
-        start = s.find("SD[")
-        if start < 0:
-            continue
-        end = s.find("]", start)
-        if end < 0:
-            continue
-        inside = s[start + 3:end]
-        for part in inside.replace("|", ",").split(","):
-            uid = normalize_uuid16(part)
-            if uid:
-                out.add(uid)
-    return out & MOBILE_SERVICE_UUIDS
+    for sig in payload_sigs or ():
+        uuids = payload_sig_parts(sig)["mobile_uuids"]
+        if uuids:
+            out |= uuids
+    return out
+
+
+def payload_sig_parts(payload_sig: str) -> Dict[str, Any]:
+    """
+    Parsed parts of one compact payload signature, memoized per signature.
+    Values are frozensets plus the payload family key; do not mutate.
+    """
+    sig = str(payload_sig or "")
+    with sig_parts_cache_lock:
+        cached = sig_parts_cache.get(sig)
+        if cached is not None:
+            return cached
+
+    mfg_ids = set()
+    service_uuids = set()
+    crc_set = set()
+    ad_structures = set()
+    lengths = set()
+
+    for part in sig.split(";"):
+        part = part.strip()
+
+        if part.startswith("MFG_"):
+            mfg_text = part[4:]
+            if mfg_text and mfg_text != "NONE":
+                try:
+                    mfg_ids.add(int(mfg_text, 16))
+                except ValueError:
+                    pass
+
+        elif part.startswith("SD["):
+            end = part.find("]")
+            if end >= 0:
+                inside = part[3:end]
+                for uid_part in inside.replace("|", ",").split(","):
+                    uid = normalize_uuid16(uid_part)
+                    if uid:
+                        service_uuids.add(uid)
+
+        elif part.startswith("AD["):
+            end = part.find("]")
+            if end >= 0:
+                ad = part[3:end].strip()
+                if ad:
+                    ad_structures.add(ad)
+
+        elif part.startswith("LEN_"):
+            try:
+                lengths.add(int(part[4:]))
+            except ValueError:
+                pass
+
+        elif part.startswith("CRC_"):
+            crc = part[4:].strip().upper()
+            if crc:
+                crc_set.add(crc)
+
+    mobile_uuids = service_uuids & MOBILE_SERVICE_UUIDS
+    length_key = tuple(sorted(lengths))
+    if mobile_uuids:
+        family_key = ("MOBILE_SERVICE", tuple(sorted(mobile_uuids)), tuple(), length_key)
+    elif service_uuids:
+        family_key = ("SERVICE_DATA", tuple(sorted(service_uuids)), tuple(), length_key)
+    elif mfg_ids:
+        family_key = ("MANUFACTURER_DATA", tuple(), tuple(sorted(f"{x:04X}" for x in mfg_ids)), length_key)
+    else:
+        family_key = ("OTHER_ADV", tuple(), tuple(), length_key)
+
+    entry = {
+        "mfg_ids": frozenset(mfg_ids),
+        "service_uuids": frozenset(service_uuids),
+        "crc_set": frozenset(crc_set),
+        "ad_structures": frozenset(ad_structures),
+        "lengths": frozenset(lengths),
+        "has_mfg": bool(mfg_ids),
+        "has_mobile_service": bool(mobile_uuids),
+        "mobile_uuids": frozenset(mobile_uuids),
+        "family_key": family_key,
+    }
+
+    with sig_parts_cache_lock:
+        if len(sig_parts_cache) >= SIG_PARTS_CACHE_MAX:
+            sig_parts_cache.clear()
+        sig_parts_cache[sig] = entry
+
+    return entry
 
 
 def parse_payload_sig_parts(payload_sigs: set) -> Dict[str, Any]:
@@ -967,6 +1463,9 @@ def parse_payload_sig_parts(payload_sigs: set) -> Dict[str, Any]:
       - AD structure families
       - payload CRCs
       - payload lengths
+
+    Each signature is parsed once (payload_sig_parts()); this only unions the
+    cached parts into fresh sets.
     """
     out = {
         "mfg_ids": set(),
@@ -979,49 +1478,66 @@ def parse_payload_sig_parts(payload_sigs: set) -> Dict[str, Any]:
     }
 
     for raw_sig in payload_sigs or set():
-        sig = str(raw_sig or "")
+        parts = payload_sig_parts(raw_sig)
+        out["mfg_ids"] |= parts["mfg_ids"]
+        out["service_uuids"] |= parts["service_uuids"]
+        out["crc_set"] |= parts["crc_set"]
+        out["ad_structures"] |= parts["ad_structures"]
+        out["lengths"] |= parts["lengths"]
+        out["has_mfg"] = out["has_mfg"] or parts["has_mfg"]
 
-        for part in sig.split(";"):
-            part = part.strip()
+    out["has_mobile_service"] = bool(out["service_uuids"] & MOBILE_SERVICE_UUIDS)
+    return out
 
-            if part.startswith("MFG_"):
-                mfg_text = part[4:]
-                if mfg_text and mfg_text != "NONE":
-                    try:
-                        out["mfg_ids"].add(int(mfg_text, 16))
-                        out["has_mfg"] = True
-                    except ValueError:
-                        pass
-
-            elif part.startswith("SD["):
-                end = part.find("]")
-                if end >= 0:
-                    inside = part[3:end]
-                    for uid_part in inside.replace("|", ",").split(","):
-                        uid = normalize_uuid16(uid_part)
-                        if uid:
-                            out["service_uuids"].add(uid)
-
-            elif part.startswith("AD["):
-                end = part.find("]")
-                if end >= 0:
-                    ad = part[3:end].strip()
-                    if ad:
-                        out["ad_structures"].add(ad)
-
-            elif part.startswith("LEN_"):
-                try:
-                    out["lengths"].add(int(part[4:]))
-                except ValueError:
-                    pass
 
-            elif part.startswith("CRC_"):
-                crc = part[4:].strip().upper()
-                if crc:
-                    out["crc_set"].add(crc)
+def payload_family_key(payload_sig: str) -> Tuple[str, Tuple[str, ...], Tuple[str, ...], Tuple[int, ...]]:
+    """Compact exact-ish payload family key for safe polluted-track expansion."""
+    return payload_sig_parts(payload_sig)["family_key"]
 
-    out["has_mobile_service"] = bool(out["service_uuids"] & MOBILE_SERVICE_UUIDS)
-    return out
+
+def _retire_idle_entries(
+    entries: Dict[str, float],
+    now_mono: float,
+    max_live: int,
+    with_times: bool = False,
+) -> List[Any]:
+    """
+    Remove entries idle for IDENTITY_ENTRY_IDLE_SEC, then the oldest beyond
+    max_live, from a key -> last-seen dict. The newest IDENTITY_MIN_LIVE_ENTRIES
+    always stay. Returns the removed keys (or (key, last_seen) pairs).
+    """
+    if len(entries) <= IDENTITY_MIN_LIVE_ENTRIES:
+        return []
+    ordered = sorted(entries.items(), key=lambda kv: kv[1], reverse=True)
+    keep_n = max(IDENTITY_MIN_LIVE_ENTRIES, min(max_live, len(ordered)))
+    idle_before = now_mono - IDENTITY_ENTRY_IDLE_SEC
+    while keep_n > IDENTITY_MIN_LIVE_ENTRIES and ordered[keep_n - 1][1] < idle_before:
+        keep_n -= 1
+
+    retired = ordered[keep_n:]
+    for key, _ in retired:
+        del entries[key]
+    if with_times:
+        return retired
+    return [key for key, _ in retired]
+
+
+def _merge_last_seen(dst: Dict[str, float], src: Dict[str, float]) -> None:
+    for key, last in src.items():
+        if last > dst.get(key, float("-inf")):
+            dst[key] = last
+
+
+def _scanner_rssi_samples() -> Dict[str, List[int]]:
+    # Module-level factory: a lambda would be one more function object per track.
+    return defaultdict(rssi_samples)
+
+
+def _extend_samples(dst: List[int], src: List[int], cap: int) -> None:
+    """Append src to a bounded sample list, keeping the newest `cap` values."""
+    dst.extend(src)
+    if len(dst) > cap:
+        del dst[:-cap]
 
 
 def concrete_mfg_ids_from_summary(summary: Dict[str, Any]) -> set:
@@ -1049,7 +1565,7 @@ def has_manufacturer_conflict(existing_mfg_ids: set, incoming_mfg_ids: set) -> b
 
 
 def identity_summary_from_track(track: "DeviceTrack") -> Dict[str, Any]:
-    sig_parts = parse_payload_sig_parts(track.payload_sigs)
+    sig_parts = track.identity_sig_parts()
     dominant_class = track.dominant_class()
     known_classes = track.known_classes()
     known_packet_ratio = track.known_packet_ratio()
@@ -1132,13 +1648,25 @@ def effective_scanner_rssi(track: "DeviceTrack") -> Dict[str, float]:
     return {}
 
 
-def rssi_fingerprint_metrics(a_raw: Dict[str, float], b_raw: Dict[str, float]) -> Dict[str, Any]:
-    rel, absr, common_n = rssi_distance_pair(a_raw, b_raw)
+def rssi_fingerprint_metrics(
+    a_raw: Dict[str, float],
+    b_raw: Dict[str, float],
+    distance: Optional[Tuple[Optional[float], Optional[float], Optional[float], int]] = None,
+) -> Dict[str, Any]:
+    """
+    distance: (rel, abs, max_diff, common) already computed for this pair by
+    rssi_kernel (RssiDistances.pair()); otherwise the dict helpers are used.
+    """
+    if distance is None:
+        rel, absr, common_n = rssi_distance_pair(a_raw, b_raw)
+        max_diff = max_abs_rssi_diff_common(a_raw, b_raw)
+    else:
+        rel, absr, max_diff, common_n = distance
     return {
         "rel_rmse": rel,
         "abs_rmse": absr,
         "common_scanners": common_n,
-        "max_diff": max_abs_rssi_diff_common(a_raw, b_raw),
+        "max_diff": max_diff,
         "same_strongest": bool(a_raw and b_raw and strongest_scanner(a_raw) == strongest_scanner(b_raw)),
         "top2_overlap": bool(top_scanners(a_raw, 2) & top_scanners(b_raw, 2)),
         "top2_exact": top_scanners(a_raw, 2) == top_scanners(b_raw, 2) if a_raw and b_raw else False,
@@ -1243,6 +1771,28 @@ def jaccard_distance(a: set, b: set) -> float:
 # ---------------- Real-time DeviceTracker ----------------
 
 class DeviceTrack:
+    # Tracks are long-lived and numerous; slots keep the per-track footprint small.
+    __slots__ = (
+        "uid", "created_ts_us", "first_seen_mono", "last_seen_mono", "packet_count", "aliases",
+        "macs", "payload_sigs", "mfg_ids", "names", "retired_aliases", "retired_macs",
+        "retired_payloads", "retired_families", "last_compact_mono", "metadata_classes",
+        "mobile_service_uuids", "mobile_service_packet_count", "payload_rssi_vals",
+        "alias_features", "obs", "last_known_rssi_vals", "last_known_scanner_rssi",
+        "last_known_scanner_update_mono", "last_alias_scanner_ts_us", "adv_intervals_ms",
+        "confirmed", "burst_count", "current_burst_packets", "current_burst_start_mono",
+        "current_burst_end_mono", "burst_packet_counts", "burst_durations_sec",
+        "burst_scanner_sets", "burst_rssi_maps", "current_burst_scanners",
+        "current_burst_rssi", "motion_slice_start_mono", "motion_slice_end_mono",
+        "motion_slice_packets", "motion_slice", "motion_rssi_maps", "motion_slice_packet_counts",
+        "merge_history", "association_cache", "grid_location_history", "grid_location_block",
+        "grid_location_probability", "grid_location_confidence", "grid_location_last_update_mono",
+        "grid_display_hold_block", "grid_display_hold_probability", "grid_display_hold_confidence",
+        "grid_display_hold_reason", "grid_display_hold_is_test_estimate",
+        "grid_display_hold_candidate_rank", "grid_display_hold_candidates",
+        "grid_display_hold_updated_mono", "position_estimator", "identity_cache",
+        "version", "snapshot_row",
+    )
+
     def __init__(self, uid: str, first_ts_us: int, now_mono: float):
         self.uid = uid
         self.created_ts_us = int(first_ts_us)
@@ -1250,31 +1800,40 @@ class DeviceTrack:
         self.last_seen_mono = now_mono
         self.packet_count = 0
 
-        self.aliases = set()
-        self.macs = set()
-        self.payload_sigs = set()
+        # Live identity entries -> last-seen mono time (see IDENTITY_COMPACT_*).
+        self.aliases: Dict[str, float] = {}
+        self.macs: Dict[str, float] = {}
+        self.payload_sigs: Dict[str, float] = {}
         self.mfg_ids = set()
         self.names = set()
+
+        # Lifetime counts of retired entries and retired payload summaries:
+        # family key -> {"sig", "parts", "sigs", "packets", "rssi" (scanner -> RssiSketch), "last_seen"}
+        self.retired_aliases = 0
+        self.retired_macs = 0
+        self.retired_payloads = 0
+        self.retired_families: Dict[Tuple, Dict[str, Any]] = {}
+        self.last_compact_mono = now_mono
         self.metadata_classes = defaultdict(int)
         self.mobile_service_uuids = set()
         self.mobile_service_packet_count = 0
 
         # Per-payload RSSI fingerprints are used only for diagnostics and
         # split/pollution detection. They do not replace the raw PD/debug view.
-        self.payload_rssi_vals: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        self.payload_rssi_vals: Dict[str, Dict[str, List[int]]] = defaultdict(_scanner_rssi_samples)
 
         # alias_key -> compact spatial fingerprint of that alias while it was mature.
         # Used to prevent one large same-vendor bucket from swallowing multiple devices.
         self.alias_features: Dict[str, Dict[str, Any]] = {}
 
-        # Rolling observations for 20 seconds:
-        # each item: (mono_time, scanner, channel, rssi)
-        self.obs = deque()
+        # Rolling observations for TRACKER_MEMORY_SEC:
+        # each item: (mono_time, scanner, channel, rssi), stored in typed arrays
+        self.obs = ObsWindow(scanner_ids)
 
         # Last-known spatial fingerprint is retained beyond the rolling RSSI
         # window so INACTIVE/INTERMITTENT phone-memory tracks remain useful in
         # /api/devices after live observations are pruned.
-        self.last_known_rssi_vals: Dict[str, List[int]] = defaultdict(list)
+        self.last_known_rssi_vals: Dict[str, List[int]] = defaultdict(rssi_samples)
         self.last_known_scanner_rssi: Dict[str, float] = {}
         self.last_known_scanner_update_mono = now_mono
 
@@ -1283,7 +1842,7 @@ class DeviceTrack:
         # Scanner ts is local to each ESP32 and resets when that scanner reboots.
         # Therefore, intervals are calculated only within the same (alias, scanner) stream.
         self.last_alias_scanner_ts_us: Dict[Tuple[str, str], int] = {}
-        self.adv_intervals_ms = deque(maxlen=50)
+        self.adv_intervals_ms = RingArray("d", 50)
 
         self.confirmed = False
 
@@ -1292,12 +1851,12 @@ class DeviceTrack:
         self.current_burst_packets = 0
         self.current_burst_start_mono = now_mono
         self.current_burst_end_mono = now_mono
-        self.burst_packet_counts = deque(maxlen=40)
-        self.burst_durations_sec = deque(maxlen=40)
-        self.burst_scanner_sets = deque(maxlen=40)
-        self.burst_rssi_maps = deque(maxlen=40)
+        self.burst_packet_counts = RingArray("I", 40)
+        self.burst_durations_sec = RingArray("d", 40)
+        self.burst_scanner_sets = ScannerMapRing(scanner_ids, 40, with_values=False)
+        self.burst_rssi_maps = ScannerMapRing(scanner_ids, 40)
         self.current_burst_scanners = set()
-        self.current_burst_rssi_vals: Dict[str, List[int]] = defaultdict(list)
+        self.current_burst_rssi: Dict[str, RssiSketch] = defaultdict(RssiSketch)
 
         # Fixed-duration motion slices for continuous advertisers. Burst maps
         # only finalize after silence; these slices keep producing RF snapshots
@@ -1305,19 +1864,18 @@ class DeviceTrack:
         self.motion_slice_start_mono = now_mono
         self.motion_slice_end_mono = now_mono
         self.motion_slice_packets = 0
-        self.motion_slice_scanners = set()
-        self.motion_slice_rssi_vals: Dict[str, List[int]] = defaultdict(list)
-        self.motion_rssi_maps = deque(maxlen=MOTION_SLICE_HISTORY)
-        self.motion_slice_packet_counts = deque(maxlen=MOTION_SLICE_HISTORY)
+        self.motion_slice = ObsWindow(scanner_ids)
+        self.motion_rssi_maps = ScannerMapRing(scanner_ids, MOTION_SLICE_HISTORY)
+        self.motion_slice_packet_counts = RingArray("I", MOTION_SLICE_HISTORY)
 
         # Debug/traceability for the identity layer.
         # Raw PDs remain visible, but each hard merge records why it happened.
-        self.merge_history = deque(maxlen=20)
+        self.merge_history = BoundedList(20)
         self.association_cache = []
 
         # Grid localization smoothing state. This is used only for mobile/mobile-
         # candidate devices after role classification.
-        self.grid_location_history = deque(maxlen=8)
+        self.grid_location_history = BoundedList(8)
         self.grid_location_block = None
         self.grid_location_probability = 0.0
         self.grid_location_confidence = "NONE"
@@ -1335,8 +1893,23 @@ class DeviceTrack:
         self.grid_display_hold_candidates = []
         self.grid_display_hold_updated_mono = 0.0
 
+        # Incremental Kalman position state, updated per packet in update().
+        self.position_estimator = TrackPositionEstimator()
+
+        # identity_summary() result; cleared whenever the identity state changes.
+        self.identity_cache: Optional[Dict[str, Any]] = None
+
+        # Bumped on every state change (packet, burst/motion close, merge);
+        # snapshot_row is (cache key, row, weak_inactive) for SNAPSHOT_ROW_*.
+        self.version = 0
+        self.snapshot_row: Optional[Tuple[Any, Dict[str, Any], bool]] = None
+
     def identity_summary(self) -> Dict[str, Any]:
-        return identity_summary_from_track(self)
+        # The merge pass asks for it once per track pair, so it is cached
+        # until the next update(), compact() or merge. Callers must not mutate it.
+        if self.identity_cache is None:
+            self.identity_cache = identity_summary_from_track(self)
+        return self.identity_cache
 
     def can_accept_known_classes(self, incoming_known: set) -> bool:
         own_known = self.known_classes()
@@ -1345,17 +1918,17 @@ class DeviceTrack:
         return True
 
     def update(self, ev: Dict[str, Any], parsed: Dict[str, Any], alias_key: str) -> bool:
-        now_mono = time.monotonic()
+        now_mono = monotonic_now()
         ts_us = safe_int(ev.get("ts"), 0)
-        scanner = str(ev.get("scanner", "UNK"))
+        scanner = scanner_ids.canonical(str(ev.get("scanner", "UNK")))
         channel = safe_int(ev.get("channel"), 0)
         rssi = safe_int(ev.get("rssi"), 0)
         mac = str(ev.get("mac", "UNK")).upper()
         payload_sig = parsed.get("payload_sig", payload_signature(ev.get("payload", "")))
         name = str(parsed.get("name", "Unknown") or "Unknown").strip()
         mfg = parsed.get("mfg_id")
-        meta_class = classify_metadata(parsed)
-        mobile_uuids = service_data_uuids(parsed) & MOBILE_SERVICE_UUIDS
+        meta_class = parsed_meta_class(parsed)
+        mobile_uuids = parsed_mobile_service_uuids(parsed)
         incoming_known = {meta_class} if is_known_metadata_class(meta_class) else set()
         if not self.can_accept_known_classes(incoming_known):
             return False
@@ -1365,9 +1938,11 @@ class DeviceTrack:
 
         self.last_seen_mono = now_mono
         self.packet_count += 1
-        self.aliases.add(alias_key)
-        self.macs.add(mac)
-        self.payload_sigs.add(payload_sig)
+        self.version += 1
+        self.identity_cache = None
+        self.aliases[alias_key] = now_mono
+        self.macs[mac] = now_mono
+        self.payload_sigs[payload_sig] = now_mono
 
         if isinstance(mfg, int):
             self.mfg_ids.add(mfg)
@@ -1380,11 +1955,19 @@ class DeviceTrack:
             self.mobile_service_uuids.update(mobile_uuids)
             self.mobile_service_packet_count += 1
 
-        self.obs.append((now_mono, scanner, channel, rssi))
+        self.obs.append(now_mono, scanner, channel, rssi)
         self._update_last_known_rssi(scanner, rssi, now_mono)
         self._update_payload_rssi(payload_sig, scanner, rssi)
         self._prune_obs(now_mono)
 
+        if POSITION_TRACKER_ENABLED:
+            self.position_estimator.update(
+                now_mono,
+                scanner,
+                rssi,
+                field_map_position_fix if POSITION_TRACKER_USE_FIELD_MAP else None,
+            )
+
         ts_stream_key = (alias_key, scanner)
         prev_ts = self.last_alias_scanner_ts_us.get(ts_stream_key)
         if prev_ts is not None and ts_us > prev_ts:
@@ -1393,15 +1976,141 @@ class DeviceTrack:
                 self.adv_intervals_ms.append(dt_ms)
         self.last_alias_scanner_ts_us[ts_stream_key] = ts_us
 
+        self.compact(now_mono)
+
         self.confirmed = self.is_confirmed()
         return True
 
+    # ---------------- Identity compaction ----------------
+
+    def alias_count(self) -> int:
+        return len(self.aliases) + self.retired_aliases
+
+    def mac_count(self) -> int:
+        return len(self.macs) + self.retired_macs
+
+    def payload_count(self) -> int:
+        return len(self.payload_sigs) + self.retired_payloads
+
+    def compact(self, now_mono: float, force: bool = False) -> None:
+        """Retire idle/excess identity entries (see IDENTITY_COMPACT_*)."""
+        if not IDENTITY_COMPACT_ENABLED:
+            return
+        over_cap = (
+            len(self.aliases) > IDENTITY_MAX_LIVE_ALIASES or
+            len(self.macs) > IDENTITY_MAX_LIVE_MACS or
+            len(self.payload_sigs) > IDENTITY_MAX_LIVE_PAYLOADS
+        )
+        if not force and not over_cap and now_mono - self.last_compact_mono < IDENTITY_COMPACT_INTERVAL_SEC:
+            return
+        self.last_compact_mono = now_mono
+        self.identity_cache = None
+
+        retired_aliases = _retire_idle_entries(self.aliases, now_mono, IDENTITY_MAX_LIVE_ALIASES)
+        if retired_aliases:
+            self.retired_aliases += len(retired_aliases)
+            gone = set(retired_aliases)
+            for key in [k for k in self.last_alias_scanner_ts_us if k[0] in gone]:
+                del self.last_alias_scanner_ts_us[key]
+
+        self.retired_macs += len(_retire_idle_entries(self.macs, now_mono, IDENTITY_MAX_LIVE_MACS))
+
+        for sig, last_seen in _retire_idle_entries(self.payload_sigs, now_mono, IDENTITY_MAX_LIVE_PAYLOADS, with_times=True):
+            self.retired_payloads += 1
+            self._retire_payload(sig, last_seen)
+
+        if len(self.alias_features) > IDENTITY_MAX_ALIAS_FEATURES:
+            newest = sorted(self.alias_features.items(), key=lambda kv: kv[1].get("last", 0.0), reverse=True)
+            self.alias_features = dict(newest[:IDENTITY_MAX_ALIAS_FEATURES])
+
+    def _retire_payload(self, sig: str, last_seen: float) -> None:
+        by_scanner = self.payload_rssi_vals.pop(sig, None) or {}
+        key = payload_family_key(sig)
+        fam = self.retired_families.get(key)
+        if fam is None:
+            fam = {
+                "sig": sig,
+                "parts": payload_sig_parts(sig),
+                "sigs": 0,
+                "packets": 0,
+                "rssi": {},
+                "last_seen": last_seen,
+            }
+            self.retired_families[key] = fam
+
+        fam["sigs"] += 1
+        fam["last_seen"] = max(fam["last_seen"], last_seen)
+        for scanner, vals in by_scanner.items():
+            fam["packets"] += len(vals)
+            sketch = fam["rssi"].get(scanner)
+            if sketch is None:
+                sketch = fam["rssi"][scanner] = RssiSketch()
+            for v in vals:
+                sketch.add(v)
+
+        self._cap_retired_families()
+
+    def _absorb_retired(self, other: "DeviceTrack") -> None:
+        self.retired_aliases += other.retired_aliases
+        self.retired_macs += other.retired_macs
+        self.retired_payloads += other.retired_payloads
+        for key, src in other.retired_families.items():
+            fam = self.retired_families.get(key)
+            if fam is None:
+                self.retired_families[key] = {
+                    "sig": src["sig"],
+                    "parts": src["parts"],
+                    "sigs": src["sigs"],
+                    "packets": src["packets"],
+                    "rssi": {scanner: sketch.copy() for scanner, sketch in src["rssi"].items()},
+                    "last_seen": src["last_seen"],
+                }
+                continue
+            fam["sigs"] += src["sigs"]
+            fam["packets"] += src["packets"]
+            fam["last_seen"] = max(fam["last_seen"], src["last_seen"])
+            for scanner, sketch in src["rssi"].items():
+                dst = fam["rssi"].get(scanner)
+                if dst is None:
+                    fam["rssi"][scanner] = sketch.copy()
+                else:
+                    dst.merge(sketch)
+        self._cap_retired_families()
+
+    def _cap_retired_families(self) -> None:
+        while len(self.retired_families) > IDENTITY_MAX_RETIRED_FAMILIES:
+            oldest = min(self.retired_families, key=lambda k: self.retired_families[k]["last_seen"])
+            del self.retired_families[oldest]
+
+    def identity_sig_parts(self) -> Dict[str, Any]:
+        """parse_payload_sig_parts() over live payloads plus retired family summaries."""
+        out = parse_payload_sig_parts(self.payload_sigs)
+        for fam in self.retired_families.values():
+            parts = fam["parts"]
+            for field in ("mfg_ids", "service_uuids", "crc_set", "ad_structures", "lengths"):
+                out[field] |= parts.get(field, set())
+            out["has_mfg"] = out["has_mfg"] or parts.get("has_mfg", False)
+            out["has_mobile_service"] = out["has_mobile_service"] or parts.get("has_mobile_service", False)
+        return out
+
+    def payload_family_keys(self) -> set:
+        keys = {payload_family_key(sig) for sig in self.payload_sigs}
+        keys.update(self.retired_families)
+        return keys
+
     def _prune_obs(self, now_mono: Optional[float] = None) -> None:
         if now_mono is None:
-            now_mono = time.monotonic()
-        cutoff = now_mono - TRACKER_MEMORY_SEC
-        while self.obs and self.obs[0][0] < cutoff:
-            self.obs.popleft()
+            now_mono = monotonic_now()
+        self.obs.prune_before(now_mono - TRACKER_MEMORY_SEC)
+
+    def position_state(self) -> Dict[str, Any]:
+        """O(1) read of the recursive position estimate, with the grid block it falls in."""
+        if not POSITION_TRACKER_ENABLED:
+            return {"enabled": False, "reason": "disabled"}
+        out = self.position_estimator.state(monotonic_now())
+        if out.get("enabled"):
+            out["block"] = block_at_position(out["x_cm"], out["y_cm"])
+        return out
 
     def scanner_rssi(self) -> Dict[str, float]:
         """
@@ -1409,23 +2118,12 @@ class DeviceTrack:
         Channel is not used strongly because current firmware channel is a software label.
         """
         self._prune_obs()
-        vals: Dict[str, List[int]] = defaultdict(list)
-        for _, scanner, _, rssi in self.obs:
-            vals[scanner].append(rssi)
-
-        out = {}
-        for scanner, samples in vals.items():
-            if not samples:
-                continue
-            # Use top-half mean to reduce deep fades and preserve peak-RSSI behavior.
-            samples_sorted = sorted(samples, reverse=True)
-            keep_n = max(1, len(samples_sorted) // 2)
-            out[scanner] = sum(samples_sorted[:keep_n]) / keep_n
-        return out
+        # Use top-half mean to reduce deep fades and preserve peak-RSSI behavior.
+        return self.obs.top_half_means()
 
     def _update_last_known_rssi(self, scanner: str, rssi: int, now_mono: float) -> None:
         vals = self.last_known_rssi_vals[scanner]
-        vals.append(rssi)
+        vals.append(clamp_rssi(rssi))
         # Keep bounded memory per scanner.
         if len(vals) > 80:
             del vals[:-80]
@@ -1437,10 +2135,33 @@ class DeviceTrack:
 
     def _update_payload_rssi(self, payload_sig: str, scanner: str, rssi: int) -> None:
         vals = self.payload_rssi_vals[payload_sig][scanner]
-        vals.append(rssi)
+        vals.append(clamp_rssi(rssi))
         if len(vals) > 120:
             del vals[:-120]
 
+    def _absorb_rssi_samples(self, other: "DeviceTrack") -> None:
+        """
+        Merge other's last-known and per-payload RSSI lists. Same result as
+        feeding its samples one by one through _update_last_known_rssi() and
+        _update_payload_rssi(), but each list is extended and trimmed once and
+        each last-known mean recomputed once.
+        """
+        now_mono = max(self.last_seen_mono, other.last_seen_mono)
+        for scanner, vals in other.last_known_rssi_vals.items():
+            if not vals:
+                continue
+            dst = self.last_known_rssi_vals[scanner]
+            _extend_samples(dst, vals, 80)
+            samples_sorted = sorted(dst, reverse=True)
+            keep_n = max(1, len(samples_sorted) // 2)
+            self.last_known_scanner_rssi[scanner] = sum(samples_sorted[:keep_n]) / keep_n
+            self.last_known_scanner_update_mono = now_mono
+
+        for sig, by_scanner in other.payload_rssi_vals.items():
+            for scanner, vals in by_scanner.items():
+                if vals:
+                    _extend_samples(self.payload_rssi_vals[sig][scanner], vals, 120)
+
     def payload_rssi_map(self, payload_sig: str) -> Dict[str, float]:
         out = {}
         for scanner, vals in self.payload_rssi_vals.get(payload_sig, {}).items():
@@ -1463,7 +2184,23 @@ class DeviceTrack:
             out[sig] = {
                 "rssi": rssi_map,
                 "packets": self.payload_packet_count(sig),
-                "parts": parse_payload_sig_parts({sig}),
+                "parts": payload_sig_parts(sig),
+            }
+
+        # One entry per retired payload family; "RETIRED;" keeps the key parseable.
+        for key, fam in self.retired_families.items():
+            rssi_map = {}
+            for scanner, sketch in fam["rssi"].items():
+                val = sketch.top_half_mean()
+                if val is not None:
+                    rssi_map[scanner] = val
+            if not rssi_map:
+                continue
+            out[f"RETIRED;{fam['sig']}"] = {
+                "rssi": rssi_map,
+                "packets": fam["packets"],
+                "parts": fam["parts"],
+                "family_key": key,
             }
         return out
 
@@ -1518,19 +2255,17 @@ class DeviceTrack:
 
         divergent_pairs = []
         significant = [f for f in families if int(f.get("packets", 0)) >= POLLUTION_MIN_PAYLOAD_PACKETS]
+        dist = pairwise_distances([f.get("rssi", {}) for f in significant])
+        diverging = dist.exceeds(
+            POLLUTION_REL_RMSE_DB, POLLUTION_ABS_RMSE_DB, POLLUTION_MAX_SCANNER_DIFF_DB,
+            POLLUTION_MIN_COMMON_SCANNERS,
+        )
         for i in range(len(significant)):
             for j in range(i + 1, len(significant)):
-                a = significant[i]
-                b = significant[j]
-                metrics = rssi_fingerprint_metrics(a.get("rssi", {}), b.get("rssi", {}))
-                rel = metrics.get("rel_rmse")
-                absr = metrics.get("abs_rmse")
-                max_diff = metrics.get("max_diff")
-                if metrics.get("common_scanners", 0) < POLLUTION_MIN_COMMON_SCANNERS:
-                    continue
-                if rel is None or absr is None or max_diff is None:
-                    continue
-                if rel >= POLLUTION_REL_RMSE_DB or absr >= POLLUTION_ABS_RMSE_DB or max_diff >= POLLUTION_MAX_SCANNER_DIFF_DB:
+                if diverging[i][j]:
+                    a = significant[i]
+                    b = significant[j]
+                    rel, absr, max_diff, common_n = dist.pair(i, j)
                     divergent_pairs.append({
                         "a_crc": a.get("payload_crc", ""),
                         "a_type": a.get("family_type", ""),
@@ -1539,7 +2274,7 @@ class DeviceTrack:
                         "rel_rmse": rounded_metric(rel),
                         "abs_rmse": rounded_metric(absr),
                         "max_diff": rounded_metric(max_diff),
-                        "common_scanners": metrics.get("common_scanners", 0),
+                        "common_scanners": common_n,
                     })
 
         return {
@@ -1565,11 +2300,11 @@ class DeviceTrack:
 
     def channel_visibility(self) -> set:
         self._prune_obs()
-        return {(scanner, channel) for _, scanner, channel, _ in self.obs}
+        return self.obs.scanner_channels()
 
     def scanner_visibility(self) -> set:
         self._prune_obs()
-        return {scanner for _, scanner, _, _ in self.obs}
+        return self.obs.scanners()
 
     def known_classes(self) -> set:
         return {cls for cls in self.metadata_classes.keys() if is_known_metadata_class(cls)}
@@ -1701,8 +2436,8 @@ class DeviceTrack:
         best_abs = None
         best_common = 0
 
-        for feat in self.alias_features.values():
-            rel, absr, common = rssi_distance_pair(feat.get("rssi", {}), rssi_map)
+        feature_maps = [feat.get("rssi", {}) for feat in self.alias_features.values()]
+        for rel, absr, _, common in one_vs_many(rssi_map, feature_maps):
             if rel is None or absr is None:
                 continue
             if best_rel is None or (rel + 0.25 * absr) < (best_rel + 0.25 * best_abs):
@@ -1725,11 +2460,8 @@ class DeviceTrack:
         worst_diff = None
         comparable = 0
 
-        for feat in self.alias_features.values():
-            feat_rssi = feat.get("rssi", {})
-            rel, absr, common = rssi_distance_pair(feat_rssi, rssi_map)
-            max_diff = max_abs_rssi_diff_common(feat_rssi, rssi_map)
-
+        feature_maps = [feat.get("rssi", {}) for feat in self.alias_features.values()]
+        for rel, absr, max_diff, common in one_vs_many(rssi_map, feature_maps):
             if rel is None or absr is None or max_diff is None:
                 continue
 
@@ -1813,54 +2545,47 @@ class DeviceTrack:
 
         dur = max(0.0, self.current_burst_end_mono - self.current_burst_start_mono)
         rssi_map = {}
-        for scanner, vals in self.current_burst_rssi_vals.items():
-            if vals:
-                vals_sorted = sorted(vals, reverse=True)
-                keep_n = max(1, len(vals_sorted) // 2)
-                rssi_map[scanner] = sum(vals_sorted[:keep_n]) / keep_n
+        for scanner, sketch in self.current_burst_rssi.items():
+            if sketch:
+                rssi_map[scanner] = sketch.top_half_mean()
 
         self.burst_packet_counts.append(self.current_burst_packets)
         self.burst_durations_sec.append(dur)
         self.burst_scanner_sets.append(set(self.current_burst_scanners))
         self.burst_rssi_maps.append(rssi_map)
 
-    def _update_burst(self, now_mono: float, scanner: str, rssi: int) -> None:
-        # First packet in this track starts the first burst.
-        if self.burst_count == 0:
-            self.burst_count = 1
-            self.current_burst_start_mono = now_mono
-            self.current_burst_end_mono = now_mono
-            self.current_burst_packets = 0
-            self.current_burst_scanners = set()
-            self.current_burst_rssi_vals = defaultdict(list)
+    def close_burst(self) -> None:
+        """End the current burst (called by the tracker's burst-gap timer)."""
+        self._finalize_current_burst()
+        self.version += 1
+        self.current_burst_packets = 0
+        self.current_burst_scanners = set()
+        self.current_burst_rssi = defaultdict(RssiSketch)
 
+    def _update_burst(self, now_mono: float, scanner: str, rssi: int) -> None:
         gap = now_mono - self.current_burst_end_mono
 
         if self.current_burst_packets > 0 and gap > BURST_GAP_SEC:
-            self._finalize_current_burst()
+            self.close_burst()
+
+        # First packet of the track, or first packet after a burst gap.
+        if self.current_burst_packets == 0:
             self.burst_count += 1
             self.current_burst_start_mono = now_mono
             self.current_burst_end_mono = now_mono
-            self.current_burst_packets = 0
             self.current_burst_scanners = set()
-            self.current_burst_rssi_vals = defaultdict(list)
+            self.current_burst_rssi = defaultdict(RssiSketch)
 
         self.current_burst_end_mono = now_mono
         self.current_burst_packets += 1
         self.current_burst_scanners.add(scanner)
-        self.current_burst_rssi_vals[scanner].append(rssi)
+        self.current_burst_rssi[scanner].add(rssi)
 
     def _finalize_current_motion_window(self) -> None:
         if self.motion_slice_packets < MOTION_SLICE_MIN_PACKETS:
             return
 
-        rssi_map = {}
-        for scanner, vals in self.motion_slice_rssi_vals.items():
-            if vals:
-                vals_sorted = sorted(vals, reverse=True)
-                keep_n = max(1, len(vals_sorted) // 2)
-                rssi_map[str(scanner)] = sum(vals_sorted[:keep_n]) / keep_n
-
+        rssi_map = self.motion_slice.top_half_means()
         if len(rssi_map) >= MOTION_SLICE_MIN_SCANNERS:
             self.motion_rssi_maps.append(rssi_map)
             self.motion_slice_packet_counts.append(self.motion_slice_packets)
@@ -1869,33 +2594,32 @@ class DeviceTrack:
         if self.motion_slice_packets < MOTION_SLICE_MIN_PACKETS:
             return {}
 
-        rssi_map = {}
-        for scanner, vals in self.motion_slice_rssi_vals.items():
-            if vals:
-                vals_sorted = sorted(vals, reverse=True)
-                keep_n = max(1, len(vals_sorted) // 2)
-                rssi_map[str(scanner)] = sum(vals_sorted[:keep_n]) / keep_n
+        rssi_map = self.motion_slice.top_half_means()
         return rssi_map if len(rssi_map) >= MOTION_SLICE_MIN_SCANNERS else {}
 
+    def close_motion_slice(self) -> None:
+        """End the current motion slice (called by the tracker's slice timer)."""
+        self._finalize_current_motion_window()
+        self.motion_slice_packets = 0
+        self.motion_slice.clear()
+        self.version += 1
+
     def _update_motion_window(self, now_mono: float, scanner: str, rssi: int) -> None:
         if self.motion_slice_packets == 0:
             self.motion_slice_start_mono = now_mono
             self.motion_slice_end_mono = now_mono
-            self.motion_slice_scanners = set()
-            self.motion_slice_rssi_vals = defaultdict(list)
+            self.motion_slice.clear()
 
         if self.motion_slice_packets > 0 and (now_mono - self.motion_slice_start_mono) >= MOTION_SLICE_SEC:
             self._finalize_current_motion_window()
             self.motion_slice_start_mono = now_mono
             self.motion_slice_end_mono = now_mono
             self.motion_slice_packets = 0
-            self.motion_slice_scanners = set()
-            self.motion_slice_rssi_vals = defaultdict(list)
+            self.motion_slice.clear()
 
         self.motion_slice_end_mono = now_mono
         self.motion_slice_packets += 1
-        self.motion_slice_scanners.add(str(scanner))
-        self.motion_slice_rssi_vals[str(scanner)].append(int(rssi))
+        self.motion_slice.append(now_mono, str(scanner), 0, int(rssi))
 
     def motion_slice_count(self) -> int:
         count = len(self.motion_rssi_maps)
@@ -1922,7 +2646,7 @@ class DeviceTrack:
         return out
 
     def last_burst_age_sec(self) -> float:
-        return max(0.0, time.monotonic() - self.current_burst_end_mono)
+        return max(0.0, monotonic_now() - self.current_burst_end_mono)
 
     def avg_burst_duration_sec(self) -> float:
         vals = self.all_burst_durations_sec()
@@ -2140,7 +2864,7 @@ class DeviceTrack:
             return False, ""
 
         significant_items = []
-        mobile_items = []
+        mobile_items = []  # indices into significant_items
         known_items = []
 
         for sig, info in family_maps.items():
@@ -2149,47 +2873,44 @@ class DeviceTrack:
             parts = info.get("parts", {})
             is_mobile = bool(parts.get("service_uuids", set()) & MOBILE_SERVICE_UUIDS)
             is_mfg_or_known = bool(parts.get("mfg_ids", set())) or not is_mobile
-            significant_items.append((sig, info))
             if is_mobile:
-                mobile_items.append((sig, info))
+                mobile_items.append(len(significant_items))
             if is_mfg_or_known:
-                known_items.append((sig, info))
+                known_items.append(len(significant_items))
+            significant_items.append((sig, info))
 
-        def diverges(sig_a: str, info_a: Dict[str, Any], sig_b: str, info_b: Dict[str, Any]) -> Optional[str]:
-            metrics = rssi_fingerprint_metrics(info_a["rssi"], info_b["rssi"])
-            if metrics["common_scanners"] < POLLUTION_MIN_COMMON_SCANNERS:
-                return None
-            rel = metrics.get("rel_rmse")
-            absr = metrics.get("abs_rmse")
-            max_diff = metrics.get("max_diff")
-            if rel is None or absr is None or max_diff is None:
-                return None
-            if rel >= POLLUTION_REL_RMSE_DB or absr >= POLLUTION_ABS_RMSE_DB or max_diff >= POLLUTION_MAX_SCANNER_DIFF_DB:
-                return (
-                    f"payload_vectors_diverge:{sig_a[-12:]}_vs_{sig_b[-12:]},"
-                    f"rel={rel:.2f},abs={absr:.2f},max={max_diff:.2f}"
-                )
-            return None
+        if len(significant_items) < 2:
+            return False, ""
+
+        # Every significant family pair at once; the loops below only pick the
+        # first diverging pair in the original evaluation order.
+        dist = pairwise_distances([info["rssi"] for _, info in significant_items])
+        diverging = dist.exceeds(
+            POLLUTION_REL_RMSE_DB, POLLUTION_ABS_RMSE_DB, POLLUTION_MAX_SCANNER_DIFF_DB,
+            POLLUTION_MIN_COMMON_SCANNERS,
+        )
+
+        def reason(i: int, j: int) -> str:
+            rel, absr, max_diff, _ = dist.pair(i, j)
+            return (
+                f"payload_vectors_diverge:{significant_items[i][0][-12:]}_vs_{significant_items[j][0][-12:]},"
+                f"rel={rel:.2f},abs={absr:.2f},max={max_diff:.2f}"
+            )
 
         # First, the known/mobile-service pollution pattern.
-        for msig, minfo in mobile_items:
-            for ksig, kinfo in known_items:
-                if msig == ksig:
-                    continue
-                reason = diverges(msig, minfo, ksig, kinfo)
-                if reason:
-                    return True, reason
+        for mi in mobile_items:
+            for ki in known_items:
+                if mi != ki and diverging[mi][ki]:
+                    return True, reason(mi, ki)
 
         # Second, a generic same-track split pattern: any two sufficiently common
         # payload families with incompatible RF fingerprints. This catches cases
         # where all payloads share the same manufacturer ID but clearly do not
         # behave like one spatial source.
         for i in range(len(significant_items)):
-            sig_a, info_a = significant_items[i]
-            for sig_b, info_b in significant_items[i + 1:]:
-                reason = diverges(sig_a, info_a, sig_b, info_b)
-                if reason:
-                    return True, reason
+            for j in range(i + 1, len(significant_items)):
+                if diverging[i][j]:
+                    return True, reason(i, j)
 
         return False, ""
 
@@ -2253,10 +2974,10 @@ class DeviceTrack:
         if top2 is not None and top2 >= MOBILE_SERVICE_TOP2_AVG_DBM:
             score += 1.0
 
-        if len(self.macs) >= 2:
+        if self.mac_count() >= 2:
             score += 1.0
 
-        if len(self.payload_sigs) >= 2:
+        if self.payload_count() >= 2:
             score += 0.5
 
         # Unknown-heavy service-data is exactly the pattern seen with the Samsung
@@ -2352,9 +3073,9 @@ class DeviceTrack:
             return False
         if self.avg_packets_per_burst() < STABLE_DEVICE_MIN_AVG_PACKETS_PER_BURST:
             return False
-        if len(self.macs) > STABLE_DEVICE_MAX_MACS:
+        if self.mac_count() > STABLE_DEVICE_MAX_MACS:
             return False
-        if len(self.payload_sigs) > STABLE_DEVICE_MAX_PAYLOADS:
+        if self.payload_count() > STABLE_DEVICE_MAX_PAYLOADS:
             return False
         return True
 
@@ -2392,13 +3113,13 @@ class DeviceTrack:
             score -= 4.0
 
         rotating_aliases = (
-            len(self.macs) >= PHONE_ROTATION_MIN_MACS_OR_PAYLOADS or
-            len(self.payload_sigs) >= PHONE_ROTATION_MIN_MACS_OR_PAYLOADS
+            self.mac_count() >= PHONE_ROTATION_MIN_MACS_OR_PAYLOADS or
+            self.payload_count() >= PHONE_ROTATION_MIN_MACS_OR_PAYLOADS
         )
 
-        if len(self.macs) >= 2:
+        if self.mac_count() >= 2:
             score += 1.0
-        if len(self.payload_sigs) >= 2:
+        if self.payload_count() >= 2:
             score += 1.0
 
         burst_counts = self.all_burst_packet_counts()
@@ -2429,8 +3150,26 @@ class DeviceTrack:
     def is_phone_like(self) -> bool:
         return self.phone_likelihood_score() >= PHONE_LIKE_SCORE_THRESHOLD
 
+    def is_quiet(self, now_mono: float) -> bool:
+        """No live observations left and no burst or motion slice open."""
+        return (
+            now_mono - self.last_seen_mono > TRACKER_MEMORY_SEC and
+            self.current_burst_packets == 0 and
+            self.motion_slice_packets == 0
+        )
+
+    def is_weak_inactive_candidate(self, confirmed: bool) -> bool:
+        """Listed under weak_memory_tracks instead of tracks in /api/devices."""
+        return (
+            HIDE_WEAK_INACTIVE_CANDIDATES_IN_MAIN_API and
+            not confirmed and
+            self.presence_state() == "INACTIVE" and
+            self.packet_count <= WEAK_INACTIVE_MAX_PACKETS_FOR_HIDE and
+            not self.is_localizable()
+        )
+
     def presence_state(self) -> str:
-        last_age = time.monotonic() - self.last_seen_mono
+        last_age = monotonic_now() - self.last_seen_mono
         if last_age <= LIVE_ACTIVE_TIMEOUT_SEC:
             return "ACTIVE"
         if self.is_phone_like() and last_age <= IDENTITY_MEMORY_SEC:
@@ -2479,7 +3218,7 @@ class DeviceTrack:
         if presence == "STALE":
             return "STALE", "identity_memory_expired"
         if presence in ("INACTIVE", "INTERMITTENT"):
-            return presence, f"last_seen_age={time.monotonic() - self.last_seen_mono:.2f}s"
+            return presence, f"last_seen_age={monotonic_now() - self.last_seen_mono:.2f}s"
 
         rf_moving, rf_reason = _track_motion_evidence(self)
         cls = self.dominant_class().lower()
@@ -2776,12 +3515,18 @@ class AliasTrack:
     First it builds a short fingerprint here; only then it is matched to a
     physical device. This avoids vendor-wide over-merging.
     """
+    __slots__ = (
+        "alias_key", "first_seen_mono", "last_seen_mono", "packet_count", "obs", "macs",
+        "payload_sigs", "mfg_ids", "names", "metadata_classes", "mobile_service_uuids",
+        "mobile_service_packet_count", "last_ts_by_scanner", "adv_intervals_ms",
+    )
+
     def __init__(self, alias_key: str, ev: Dict[str, Any], parsed: Dict[str, Any]):
         self.alias_key = alias_key
-        self.first_seen_mono = time.monotonic()
+        self.first_seen_mono = monotonic_now()
         self.last_seen_mono = self.first_seen_mono
         self.packet_count = 0
-        self.obs = deque()
+        self.obs = ObsWindow(scanner_ids)
         self.macs = set()
         self.payload_sigs = set()
         self.mfg_ids = set()
@@ -2790,12 +3535,12 @@ class AliasTrack:
         self.mobile_service_uuids = set()
         self.mobile_service_packet_count = 0
         self.last_ts_by_scanner: Dict[str, int] = {}
-        self.adv_intervals_ms = deque(maxlen=50)
+        self.adv_intervals_ms = RingArray("d", 50)
         self.update(ev, parsed)
 
     def update(self, ev: Dict[str, Any], parsed: Dict[str, Any]) -> None:
-        now_mono = time.monotonic()
-        scanner = str(ev.get("scanner", "UNK"))
+        now_mono = monotonic_now()
+        scanner = scanner_ids.canonical(str(ev.get("scanner", "UNK")))
         channel = safe_int(ev.get("channel"), 0)
         rssi = safe_int(ev.get("rssi"), 0)
         ts_us = safe_int(ev.get("ts"), 0)
@@ -2803,8 +3548,8 @@ class AliasTrack:
         payload_sig = parsed.get("payload_sig", payload_signature(ev.get("payload", "")))
         name = str(parsed.get("name", "Unknown") or "Unknown").strip()
         mfg = parsed.get("mfg_id")
-        meta_class = classify_metadata(parsed)
-        mobile_uuids = service_data_uuids(parsed) & MOBILE_SERVICE_UUIDS
+        meta_class = parsed_meta_class(parsed)
+        mobile_uuids = parsed_mobile_service_uuids(parsed)
 
         self.last_seen_mono = now_mono
 
@@ -2816,7 +3561,7 @@ class AliasTrack:
 
         self.last_ts_by_scanner[scanner] = ts_us
         self.packet_count += 1
-        self.obs.append((now_mono, scanner, channel, rssi))
+        self.obs.append(now_mono, scanner, channel, rssi)
 
         self.macs.add(mac)
         self.payload_sigs.add(payload_sig)
@@ -2832,27 +3577,16 @@ class AliasTrack:
 
     def _prune_obs(self, now_mono: Optional[float] = None) -> None:
         if now_mono is None:
-            now_mono = time.monotonic()
-        cutoff = now_mono - TRACKER_MEMORY_SEC
-        while self.obs and self.obs[0][0] < cutoff:
-            self.obs.popleft()
+            now_mono = monotonic_now()
+        self.obs.prune_before(now_mono - TRACKER_MEMORY_SEC)
 
     def scanner_rssi(self) -> Dict[str, float]:
         self._prune_obs()
-        vals: Dict[str, List[int]] = defaultdict(list)
-        for _, scanner, _, rssi in self.obs:
-            vals[scanner].append(rssi)
-
-        out = {}
-        for scanner, samples in vals.items():
-            samples_sorted = sorted(samples, reverse=True)
-            keep_n = max(1, len(samples_sorted) // 2)
-            out[scanner] = sum(samples_sorted[:keep_n]) / keep_n
-        return out
+        return self.obs.top_half_means()
 
     def scanner_visibility(self) -> set:
         self._prune_obs()
-        return {scanner for _, scanner, _, _ in self.obs}
+        return self.obs.scanners()
 
     def known_classes(self) -> set:
         return {cls for cls in self.metadata_classes.keys() if is_known_metadata_class(cls)}
@@ -2879,7 +3613,7 @@ class AliasTrack:
         return self.mobile_service_packet_count / max(1, self.packet_count)
 
     def ready_for_physical_match(self) -> bool:
-        age = time.monotonic() - self.first_seen_mono
+        age = monotonic_now() - self.first_seen_mono
 
         # Strong case: enough packets from at least two scanners.
         if self.packet_count >= ALIAS_MIN_PACKETS_FOR_MATCH and len(self.scanner_visibility()) >= ALIAS_MIN_SCANNERS_FOR_MATCH:
@@ -2895,60 +3629,409 @@ class AliasTrack:
 
 # ---------------- Grid localization model ----------------
 
-def load_localization_fingerprints(filename: str = LOCALIZATION_FINGERPRINTS_JSON) -> None:
+def _compile_fingerprint_version(path: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Read and precompile one fingerprint file into an immutable version record.
+
+    Runs without holding localization_lock: file IO, JSON parsing and the field
+    map build can take tens of milliseconds and must not stall live
+    localization. Raises on an unreadable or empty file.
+
+    If payload is given (fingerprints built in memory from the calibration
+    store), path is only a label and nothing is read from disk.
+    """
+    stat = None
+    if payload is None:
+        stat = os.stat(path)
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+
+    blocks = payload.get("blocks", {})
+    if not isinstance(blocks, dict) or not blocks:
+        raise ValueError("fingerprint file has no blocks")
+
+    # Precompiled block list: avoids copying each block dict on every
+    # localization call just to attach its block_id.
+    compiled_blocks = []
+    for block_id, block_info in blocks.items():
+        if not isinstance(block_info, dict):
+            continue
+        info = dict(block_info)
+        info.setdefault("block_id", str(block_id))
+        info["scoring"] = _scoring_block(info)
+        compiled_blocks.append((str(block_id), info))
+
+    field_map = None
+    if LOCALIZATION_FIELD_MAP_ENABLED:
+        try:
+            field_map = load_or_build_field_map(payload, os.path.join(BASE_DIR, LOCALIZATION_FIELD_MAP_JSON))
+            print(
+                f"[LOCALIZATION] Field map {field_map.get('source')}: "
+                f"{field_map.get('rows')}x{field_map.get('cols')} cells @ {field_map.get('cell_size_cm')} cm."
+            )
+        except Exception as e:
+            print(f"[LOCALIZATION] Field map build failed, sub-block positions disabled: {e}")
+
+    return {
+        "version": 0,
+        "path": path,
+        "mtime": stat.st_mtime if stat is not None else None,
+        "size": stat.st_size if stat is not None else None,
+        "loaded_at": datetime.now().isoformat(timespec="seconds"),
+        "source_sha1": fingerprint_source_hash(payload),
+        "generated_at": payload.get("generated_at", ""),
+        "fingerprints": payload,
+        "blocks": compiled_blocks,
+        "field_map": field_map,
+    }
+
+
+def _activate_fingerprint_version_locked(version: Dict[str, Any], remember: bool = True) -> None:
+    """Swap the active fingerprint set. Caller holds localization_lock; only references move."""
+    if remember:
+        localization_state["next_version"] = int(localization_state.get("next_version", 1) or 1)
+        version["version"] = localization_state["next_version"]
+        localization_state["next_version"] += 1
+        localization_versions.append(version)
+
+    localization_state.update({
+        "loaded": True,
+        "enabled": True,
+        "path": version.get("path", ""),
+        "message": f"loaded {len(version.get('blocks', []))} blocks (v{version.get('version')})",
+        "fingerprints": version.get("fingerprints", {}),
+        "field_map": version.get("field_map"),
+        "active": version,
+    })
+    # Only a fresh load from the file moves the watch stamps. Store-built
+    # versions have no file behind them, and a manual rollback to an older
+    # file version must not make the watcher reload the current file over it.
+    if remember and version.get("mtime") is not None:
+        localization_state["watch_mtime"] = version.get("mtime")
+        localization_state["watch_size"] = version.get("size")
+
+
+def load_localization_fingerprints(filename: str = LOCALIZATION_FINGERPRINTS_JSON) -> bool:
     """
     Load calibration_fingerprints.json generated by build_calibration_fingerprints.py.
     Safe to call at startup and again after recalibration.
+
+    The file is compiled outside localization_lock and swapped in atomically.
+    If a reload fails, the previously active version stays in service.
     """
     path = os.path.join(BASE_DIR, filename)
 
-    with localization_lock:
-        localization_state["path"] = path
-
-        if not GRID_LOCALIZATION_ENABLED:
+    if not GRID_LOCALIZATION_ENABLED:
+        with localization_lock:
             localization_state.update({
+                "path": path,
                 "loaded": False,
                 "enabled": False,
                 "message": "disabled_by_config",
                 "fingerprints": {},
+                "field_map": None,
+                "active": None,
             })
-            print("[LOCALIZATION] Grid localization disabled by config.")
-            return
+        print("[LOCALIZATION] Grid localization disabled by config.")
+        return False
 
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                payload = json.load(f)
+    try:
+        version = _compile_fingerprint_version(path)
+    except Exception as e:
+        with localization_lock:
+            localization_state["last_reload_error"] = f"{datetime.now().isoformat(timespec='seconds')} {e}"
+            if localization_state.get("active") is None:
+                localization_state.update({
+                    "path": path,
+                    "loaded": False,
+                    "enabled": True,
+                    "message": f"load_failed: {e}",
+                    "fingerprints": {},
+                    "field_map": None,
+                })
+            else:
+                localization_state["message"] = (
+                    f"reload_failed_keeping_v{localization_state['active'].get('version')}: {e}"
+                )
+        print(f"[LOCALIZATION] Could not load {path}: {e}")
+        return False
 
-            blocks = payload.get("blocks", {})
-            if not isinstance(blocks, dict) or not blocks:
-                raise ValueError("fingerprint file has no blocks")
+    with localization_lock:
+        _activate_fingerprint_version_locked(version)
+    print(
+        f"[LOCALIZATION] Loaded grid fingerprints from {path} "
+        f"({len(version['blocks'])} blocks, version {version['version']})."
+    )
+    return True
 
-            localization_state.update({
-                "loaded": True,
-                "enabled": True,
-                "message": f"loaded {len(blocks)} blocks",
-                "fingerprints": payload,
-            })
-            print(f"[LOCALIZATION] Loaded grid fingerprints from {path} ({len(blocks)} blocks).")
 
-        except Exception as e:
-            localization_state.update({
-                "loaded": False,
-                "enabled": True,
-                "message": f"load_failed: {e}",
-                "fingerprints": {},
-            })
-            print(f"[LOCALIZATION] Could not load {path}: {e}")
+def claim_localization_reload() -> bool:
+    """
+    Take the reload flag. Every fingerprint compile (background reload, store
+    build, watcher, ?wait=1 requests) goes through this, so only one runs at a
+    time. Returns False if one is already running.
+    """
+    with localization_lock:
+        if localization_state.get("reloading"):
+            return False
+        localization_state["reloading"] = True
+    return True
+
+
+def release_localization_reload() -> None:
+    with localization_lock:
+        localization_state["reloading"] = False
+
+
+def _reload_worker(filename: str) -> None:
+    try:
+        load_localization_fingerprints(filename)
+    finally:
+        release_localization_reload()
+
+
+def reload_localization_fingerprints_async(filename: str = LOCALIZATION_FINGERPRINTS_JSON) -> bool:
+    """Start a background reload. Returns False if one is already running."""
+    if not claim_localization_reload():
+        return False
+    threading.Thread(target=_reload_worker, args=(filename,), daemon=True).start()
+    return True
+
+
+calibration_stores: Dict[str, CalibrationStore] = {}
+calibration_stores_lock = threading.Lock()
+
+
+def get_calibration_store() -> CalibrationStore:
+    """
+    The shared CalibrationStore. One instance per store directory, so its
+    index lock serializes every writer in this process.
+    """
+    root = os.path.join(BASE_DIR, CALIBRATION_STORE_DIR)
+    with calibration_stores_lock:
+        store = calibration_stores.get(root)
+        if store is None:
+            store = calibration_stores[root] = CalibrationStore(root)
+        return store
+
+
+def build_localization_from_store(selection: Dict[str, Any], activate: bool = True, save: bool = False) -> bool:
+    """
+    Build fingerprints from selected calibration store sessions and keep them
+    as a new localization version.
+
+    selection keys: date_from, date_to (YYYY-MM-DD), rooms, blocks,
+    complete_only. Blocks whose sessions match the active version's are
+    reused from it. With activate=False the version is only kept for
+    /api/localization/compare and /api/localization/activate. With save=True
+    the payload also replaces LOCALIZATION_FINGERPRINTS_JSON.
+    """
+    store = get_calibration_store()
+    entries = store.select(
+        selection.get("date_from"),
+        selection.get("date_to"),
+        selection.get("rooms"),
+        selection.get("blocks"),
+        bool(selection.get("complete_only", False)),
+    )
+    if not entries:
+        with localization_lock:
+            localization_state["last_reload_error"] = (
+                f"{datetime.now().isoformat(timespec='seconds')} no calibration sessions match {selection}"
+            )
+        print(f"[LOCALIZATION] No calibration sessions match {selection}.")
+        return False
+
+    with localization_lock:
+        active = localization_state.get("active") or {}
+        previous = active.get("fingerprints") or None
+
+    try:
+        payload = build_fingerprints_from_store(store, entries, previous)
+        path = os.path.join(BASE_DIR, LOCALIZATION_FINGERPRINTS_JSON)
+        if save:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            version = _compile_fingerprint_version(path)
+            # The watcher must not pick up our own write: it would activate
+            # the build even with activate=False and keep it a second time.
+            with localization_lock:
+                localization_state["watch_mtime"] = version.get("mtime")
+                localization_state["watch_size"] = version.get("size")
+        else:
+            version = _compile_fingerprint_version(f"store:{store.root}", payload)
+    except Exception as e:
+        with localization_lock:
+            localization_state["last_reload_error"] = f"{datetime.now().isoformat(timespec='seconds')} {e}"
+        print(f"[LOCALIZATION] Fingerprint build from calibration store failed: {e}")
+        return False
+
+    version["selection"] = dict(selection, sessions=len(entries))
+
+    with localization_lock:
+        if activate:
+            _activate_fingerprint_version_locked(version)
+        else:
+            localization_state["next_version"] = int(localization_state.get("next_version", 1) or 1)
+            version["version"] = localization_state["next_version"]
+            localization_state["next_version"] += 1
+            localization_versions.append(version)
+
+    inc = payload.get("incremental", {})
+    print(
+        f"[LOCALIZATION] Built version {version['version']} from {len(entries)} calibration session(s) "
+        f"(rebuilt: {', '.join(inc.get('rebuilt_blocks', [])) or '-'}, "
+        f"reused: {', '.join(inc.get('reused_blocks', [])) or '-'}, active={activate})."
+    )
+    return True
+
+
+def _store_build_worker(selection: Dict[str, Any], activate: bool, save: bool) -> None:
+    try:
+        build_localization_from_store(selection, activate, save)
+    finally:
+        release_localization_reload()
+
+
+def build_localization_from_store_async(selection: Dict[str, Any], activate: bool = True, save: bool = False) -> bool:
+    """Start a background store build. Shares the reload flag so only one compile runs at a time."""
+    if not claim_localization_reload():
+        return False
+    threading.Thread(target=_store_build_worker, args=(selection, activate, save), daemon=True).start()
+    return True
+
+
+def calibration_selection_from_request(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Session filters from JSON body or query args. rooms/blocks accept lists or comma-separated strings."""
+    def _list(value: Any) -> Optional[List[str]]:
+        if value is None or value == "":
+            return None
+        if isinstance(value, (list, tuple)):
+            items = [str(v).strip() for v in value]
+        else:
+            items = [v.strip() for v in str(value).split(",")]
+        items = [v for v in items if v]
+        return items or None
+
+    return {
+        "date_from": str(data.get("date_from") or "").strip() or None,
+        "date_to": str(data.get("date_to") or "").strip() or None,
+        "rooms": _list(data.get("rooms", data.get("room"))),
+        "blocks": _list(data.get("blocks", data.get("block"))),
+        "complete_only": str(data.get("complete_only", "")).lower() in ("1", "true", "yes"),
+    }
+
+
+def fingerprint_file_watcher(filename: str = LOCALIZATION_FINGERPRINTS_JSON) -> None:
+    """
+    Poll the fingerprint file and hot-reload it when its mtime or size changes.
+
+    Polling keeps this dependency-free and works the same on Windows and Linux.
+    A change must be stable for one poll interval so a half-written file from
+    build_calibration_fingerprints.py is not picked up.
+    """
+    pending: Optional[Tuple[float, int]] = None
+
+    while True:
+        time.sleep(LOCALIZATION_WATCH_INTERVAL_SEC)
+        pending = poll_fingerprint_file(filename, pending)
+
+
+def poll_fingerprint_file(filename: str, pending: Optional[Tuple[float, int]]) -> Optional[Tuple[float, int]]:
+    """One fingerprint_file_watcher poll. Returns the new pending stamp."""
+    path = os.path.join(BASE_DIR, filename)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return pending
+
+    current = (stat.st_mtime, stat.st_size)
+    with localization_lock:
+        active = (localization_state.get("watch_mtime"), localization_state.get("watch_size"))
+    if current == active:
+        return None
+
+    if pending != current:
+        return current
+
+    print(f"[LOCALIZATION] {filename} changed on disk, reloading in background.")
+    if not reload_localization_fingerprints_async(filename):
+        return None
+    # Remember the stamp even if the file turns out to be invalid, so a
+    # broken file is not retried every interval.
+    with localization_lock:
+        localization_state["watch_mtime"], localization_state["watch_size"] = current
+    return None
+
+
+def activate_localization_version(version_id: int) -> bool:
+    """Switch back (or forward) to a kept fingerprint version. Returns False if unknown."""
+    with localization_lock:
+        for version in localization_versions:
+            if int(version.get("version", 0)) == int(version_id):
+                _activate_fingerprint_version_locked(version, remember=False)
+                localization_state["message"] += ";manually_activated"
+                return True
+    return False
+
+
+def get_localization_version(version_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    with localization_lock:
+        if version_id is None:
+            return localization_state.get("active")
+        for version in localization_versions:
+            if int(version.get("version", 0)) == int(version_id):
+                return version
+    return None
+
+
+def _version_summary(version: Dict[str, Any], active_id: Optional[int]) -> Dict[str, Any]:
+    return {
+        "version": version.get("version"),
+        "active": version.get("version") == active_id,
+        "path": version.get("path", ""),
+        "loaded_at": version.get("loaded_at", ""),
+        "generated_at": version.get("generated_at", ""),
+        "source_sha1": version.get("source_sha1", ""),
+        "blocks": [block_id for block_id, _ in version.get("blocks", [])],
+        "field_map": field_map_status(version.get("field_map")),
+        "selection": version.get("selection"),
+    }
+
+
+def localization_versions_for_api() -> Dict[str, Any]:
+    with localization_lock:
+        active = localization_state.get("active") or {}
+        active_id = active.get("version")
+        versions = list(localization_versions)
+        reloading = bool(localization_state.get("reloading", False))
+        last_error = localization_state.get("last_reload_error", "")
+    return {
+        "active_version": active_id,
+        "keep_versions": LOCALIZATION_KEEP_VERSIONS,
+        "reloading": reloading,
+        "last_reload_error": last_error,
+        "versions": [_version_summary(v, active_id) for v in reversed(versions)],
+    }
 
 
 def localization_status_for_api() -> Dict[str, Any]:
     with localization_lock:
         fp = localization_state.get("fingerprints", {}) or {}
+        active = localization_state.get("active") or {}
         return {
             "enabled": bool(localization_state.get("enabled", False)),
             "loaded": bool(localization_state.get("loaded", False)),
             "path": localization_state.get("path", ""),
             "message": localization_state.get("message", ""),
+            "version": active.get("version"),
+            "loaded_at": active.get("loaded_at", ""),
+            "versions_kept": len(localization_versions),
+            "reloading": bool(localization_state.get("reloading", False)),
+            "auto_reload": LOCALIZATION_AUTO_RELOAD,
+            "last_reload_error": localization_state.get("last_reload_error", ""),
             "model": fp.get("model", ""),
             "schema_version": fp.get("schema_version"),
             "grid_layout": fp.get("grid_layout", [[1, 2, 3], [6, 5, 4], [7, 8, 9]]),
@@ -2976,6 +4059,7 @@ def localization_status_for_api() -> Dict[str, Any]:
             },
             "min_scanners": LOCALIZATION_MIN_SCANNERS,
             "tx_power_used": False,
+            "field_map": field_map_status(localization_state.get("field_map")),
         }
 
 
@@ -3017,7 +4101,7 @@ def scanner_stats_for_localization(track: "DeviceTrack") -> Dict[str, Any]:
     This prevents the GUI from showing a block based on RSSI samples that are
     tens of seconds old after EldarCalib/mobile moved to a different block.
     """
-    now_mono = time.monotonic()
+    now_mono = monotonic_now()
     track._prune_obs(now_mono)
 
     values: Dict[str, List[int]] = defaultdict(list)
@@ -3029,19 +4113,12 @@ def scanner_stats_for_localization(track: "DeviceTrack") -> Dict[str, Any]:
     # max-age limit. The hard limit protects against future tuning that might
     # make the window larger than the acceptable latency.
     max_age = min(float(LOCALIZATION_REALTIME_WINDOW_SEC), float(LOCALIZATION_MAX_SAMPLE_AGE_SEC))
-    for mono_ts, scanner, _, rssi in track.obs:
-        age = now_mono - float(mono_ts)
-        if age < 0.0 or age > max_age:
-            continue
-        scanner_id = str(scanner)
-        values[scanner_id].append(safe_int(rssi, 0))
-        sample_ages.append(age)
-        info = per_scanner_age.setdefault(scanner_id, {"oldest": 0.0, "newest": None})
-        info["oldest"] = max(float(info.get("oldest") or 0.0), age)
-        if info.get("newest") is None:
-            info["newest"] = age
-        else:
-            info["newest"] = min(float(info["newest"]), age)
+    for scanner_id, (samples, oldest_mono, newest_mono) in track.obs.scanner_samples(now_mono - max_age, now_mono).items():
+        values[scanner_id].extend(samples)
+        oldest_age = now_mono - oldest_mono
+        newest_age = now_mono - newest_mono
+        sample_ages.extend((oldest_age, newest_age))
+        per_scanner_age[scanner_id] = {"oldest": max(0.0, oldest_age), "newest": newest_age}
 
     # Optional compatibility fallback, disabled for the real-time grid. Keeping
     # this as a switch makes it easy to compare old/sticky behavior if needed.
@@ -3132,11 +4209,10 @@ def _burst_rssi_maps_for_motion(track: "DeviceTrack") -> List[Dict[str, float]]:
 
     if getattr(track, "current_burst_packets", 0) > 0:
         current = {}
-        for scanner, vals in getattr(track, "current_burst_rssi_vals", {}).items():
-            if vals:
-                val = _top_half_mean([safe_int(v, 0) for v in vals])
-                if val is not None:
-                    current[str(scanner)] = float(val)
+        for scanner, sketch in getattr(track, "current_burst_rssi", {}).items():
+            val = sketch.top_half_mean()
+            if val is not None:
+                current[str(scanner)] = float(val)
         if len(current) >= LOCALIZATION_MOTION_MIN_COMMON_SCANNERS:
             maps.append(current)
 
@@ -3332,28 +4408,67 @@ def _weakest_scanner(rssi_map: Dict[str, float]) -> Optional[str]:
     return str(min(rssi_map.items(), key=lambda kv: kv[1])[0])
 
 
-def _block_score(
-    live_mean: Dict[str, float],
-    live_std: Dict[str, float],
-    live_count: Dict[str, int],
-    block_info: Dict[str, Any],
-) -> Optional[Dict[str, Any]]:
+def _scoring_block(block_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Block side of _block_score(), normalized once per fingerprint version by
+    _compile_fingerprint_version() instead of on every localization call.
+    """
     block_mean = block_info.get("matching_mean") or block_info.get("top_half_mean") or block_info.get("mean") or {}
+    if not isinstance(block_mean, dict) or not block_mean:
+        return None
     block_rel = block_info.get("relative_matching_mean") or relative_vector(block_mean)
     block_std = block_info.get("std") or {}
 
-    if not isinstance(block_mean, dict) or not block_mean:
-        return None
+    # Normalize keys because CSV/JSON may contain scanner IDs as ints or strings.
+    block_mean = {str(k): float(v) for k, v in block_mean.items() if _safe_float_or_none(v) is not None}
+    block_rel = {str(k): float(v) for k, v in block_rel.items() if _safe_float_or_none(v) is not None}
+    block_std = {str(k): float(v) for k, v in block_std.items() if _safe_float_or_none(v) is not None}
+
+    block_order = _ordered_scanners_by_rssi(block_mean)
+    return {
+        "block": str(block_info.get("block_id", "")),
+        "mean": block_mean,
+        "rel": block_rel,
+        "std": block_std,
+        "top2": [str(x) for x in (block_info.get("top2_scanners") or block_order[:2])][:2],
+        "dominant": str(block_info.get("dominant_scanner") or (block_order[0] if block_order else "")),
+        "weakest": _weakest_scanner(block_mean),
+        "margin": _rssi_dominance_margin(block_mean),
+        "ambiguity": block_info.get("ambiguity", ""),
+    }
+
 
-    # Normalize keys because CSV/JSON may contain scanner IDs as ints or strings.
-    block_mean = {str(k): float(v) for k, v in block_mean.items() if _safe_float_or_none(v) is not None}
-    block_rel = {str(k): float(v) for k, v in block_rel.items() if _safe_float_or_none(v) is not None}
-    block_std = {str(k): float(v) for k, v in block_std.items() if _safe_float_or_none(v) is not None}
+def _scoring_live(
+    live_mean: Dict[str, float],
+    live_std: Dict[str, float],
+    live_count: Dict[str, int],
+) -> Dict[str, Any]:
+    """Live side of _block_score(), normalized once per call instead of per block."""
     live_mean = {str(k): float(v) for k, v in live_mean.items() if _safe_float_or_none(v) is not None}
     live_std = {str(k): float(v) for k, v in live_std.items() if _safe_float_or_none(v) is not None}
     live_count = {str(k): int(v) for k, v in live_count.items()}
+    live_order = _ordered_scanners_by_rssi(live_mean)
+    return {
+        "mean": live_mean,
+        "rel": relative_vector(live_mean),
+        "std": live_std,
+        "count": live_count,
+        "order": live_order,
+        "weakest": _weakest_scanner(live_mean),
+        "margin": _rssi_dominance_margin(live_mean),
+    }
+
+
+def _block_score(live: Dict[str, Any], block: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Score one block; live from _scoring_live(), block from _scoring_block()."""
+    live_mean = live["mean"]
+    live_std = live["std"]
+    live_count = live["count"]
+    live_rel = live["rel"]
+    block_mean = block["mean"]
+    block_rel = block["rel"]
+    block_std = block["std"]
 
-    live_rel = relative_vector(live_mean)
     common = sorted(set(live_mean.keys()) & set(block_mean.keys()))
 
     if len(common) < LOCALIZATION_MIN_SCANNERS:
@@ -3400,14 +4515,13 @@ def _block_score(
     absolute_score = abs_num / abs_den if abs_den > 0 else 999.0
     std_score = std_num / std_den if std_den > 0 else 0.0
 
-    live_order = _ordered_scanners_by_rssi(live_mean)
-    block_order = _ordered_scanners_by_rssi(block_mean)
+    live_order = live["order"]
     live_top2 = live_order[:2]
-    block_top2 = [str(x) for x in (block_info.get("top2_scanners") or block_order[:2])][:2]
+    block_top2 = block["top2"]
     live_dominant = live_order[0] if live_order else None
-    block_dominant = str(block_info.get("dominant_scanner") or (block_order[0] if block_order else ""))
-    live_weakest = _weakest_scanner(live_mean)
-    block_weakest = _weakest_scanner(block_mean)
+    block_dominant = block["dominant"]
+    live_weakest = live["weakest"]
+    block_weakest = block["weakest"]
 
     shape_score = 0.0
     shape_parts = []
@@ -3438,8 +4552,8 @@ def _block_score(
     else:
         shape_parts.append("weakest_match")
 
-    live_margin = _rssi_dominance_margin(live_mean)
-    block_margin = _rssi_dominance_margin(block_mean)
+    live_margin = live["margin"]
+    block_margin = block["margin"]
     margin_score = 0.0
     if live_margin is not None and block_margin is not None:
         margin_score = min(1.5, (abs(live_margin - block_margin) / 8.0) ** 2)
@@ -3454,7 +4568,7 @@ def _block_score(
     )
 
     return {
-        "block": str(block_info.get("block_id", "")),
+        "block": block["block"],
         "score": round(total_score, 4),
         "relative_score": round(relative_score, 4),
         "absolute_score": round(absolute_score, 4),
@@ -3472,7 +4586,7 @@ def _block_score(
         "live_margin_db": rounded_metric(live_margin),
         "block_margin_db": rounded_metric(block_margin),
         "margin_score": round(margin_score, 4),
-        "block_ambiguity": block_info.get("ambiguity", ""),
+        "block_ambiguity": block["ambiguity"],
     }
 
 def _scores_to_probabilities(scored_blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -3496,6 +4610,25 @@ def _scores_to_probabilities(scored_blocks: List[Dict[str, Any]]) -> List[Dict[s
     return out
 
 
+def _score_fingerprint_blocks(
+    live_mean: Dict[str, float],
+    live_std: Dict[str, float],
+    live_count: Dict[str, int],
+    compiled_blocks: List[Tuple[str, Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """Score live RSSI against one compiled fingerprint version; best candidate first."""
+    live = _scoring_live(live_mean, live_std, live_count)
+    scored = []
+    for _, block_info in compiled_blocks:
+        block = block_info["scoring"] if "scoring" in block_info else _scoring_block(block_info)
+        if block is None:
+            continue
+        row = _block_score(live, block)
+        if row is not None:
+            scored.append(row)
+    return _scores_to_probabilities(scored)
+
+
 def _probability_confidence(candidates: List[Dict[str, Any]]) -> Tuple[str, str]:
     if not candidates:
         return "NONE", "no_candidates"
@@ -3603,7 +4736,7 @@ def _grid_display_hold_payload(track: "DeviceTrack", base: Dict[str, Any], reaso
     if not block or updated <= 0.0:
         return None
 
-    age = max(0.0, time.monotonic() - updated)
+    age = max(0.0, monotonic_now() - updated)
     if age > LOCALIZATION_DISPLAY_HOLD_SEC:
         return None
 
@@ -3651,7 +4784,19 @@ def _remember_grid_display_estimate(
     track.grid_display_hold_is_test_estimate = bool(is_test_estimate)
     track.grid_display_hold_candidate_rank = candidate_rank
     track.grid_display_hold_candidates = list(candidates or [])[:5]
-    track.grid_display_hold_updated_mono = time.monotonic()
+    track.grid_display_hold_updated_mono = monotonic_now()
+
+
+def field_map_position_fix(filtered_rssi: Dict[str, float]) -> Optional[Tuple[float, float, Optional[float]]]:
+    """Position fix for TrackPositionEstimator from the loaded field map, or None."""
+    with localization_lock:
+        field_map = (localization_state.get("active") or {}).get("field_map")
+    if not field_map:
+        return None
+    match = match_field_map(field_map, filtered_rssi)
+    if not match.get("enabled"):
+        return None
+    return float(match["x_cm"]), float(match["y_cm"]), None
 
 
 def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
@@ -3693,11 +4838,18 @@ def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
         "grid_display_reason": "",
         "grid_display_is_test_estimate": False,
         "grid_display_candidate_rank": None,
+        # Sub-block x/y from the dense field map. Informational only.
+        "sub_block_position": None,
+        # Recursive Kalman estimate maintained per packet; O(1) to read.
+        "tracked_position": None,
     }
 
+    # Take a reference to the active version; reloads swap the reference and
+    # never mutate a version in place, so no lock is needed after this.
     with localization_lock:
         loaded = bool(localization_state.get("loaded", False))
-        fp = localization_state.get("fingerprints", {}) or {}
+        active = localization_state.get("active") or {}
+    field_map = active.get("field_map")
 
     if not GRID_LOCALIZATION_ENABLED:
         base["localization_skip_reason"] = "disabled"
@@ -3713,6 +4865,8 @@ def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
         base["localization_skip_reason"] = role_reason
         return base
 
+    base["tracked_position"] = track.position_state()
+
     stats_for_loc = scanner_stats_for_localization(track)
     live_mean = stats_for_loc.get("matching_mean", {})
     live_std = stats_for_loc.get("std", {})
@@ -3756,18 +4910,10 @@ def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
         base["localization_skip_reason"] = reason
         return base
 
-    blocks = fp.get("blocks", {}) or {}
-    scored = []
-    for block_id, block_info in blocks.items():
-        if not isinstance(block_info, dict):
-            continue
-        block_info = dict(block_info)
-        block_info.setdefault("block_id", str(block_id))
-        row = _block_score(live_mean, live_std, live_count, block_info)
-        if row is not None:
-            scored.append(row)
+    if LOCALIZATION_FIELD_MAP_ENABLED and field_map:
+        base["sub_block_position"] = match_field_map(field_map, live_mean)
 
-    candidates = _scores_to_probabilities(scored)
+    candidates = _score_fingerprint_blocks(live_mean, live_std, live_count, active.get("blocks", []))
     if not candidates:
         reason = "no_matching_blocks"
         held = _grid_display_hold_payload(track, base, reason)
@@ -3811,14 +4957,14 @@ def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
         "raw_probability": raw_best.get("probability"),
         "chosen_probability": chosen_probability,
         "assigned": assign_block,
-        "time_mono": round(time.monotonic(), 3),
+        "time_mono": round(monotonic_now(), 3),
     })
 
     if assign_block:
         track.grid_location_block = str(chosen.get("block"))
         track.grid_location_probability = chosen_probability
         track.grid_location_confidence = confidence
-        track.grid_location_last_update_mono = time.monotonic()
+        track.grid_location_last_update_mono = monotonic_now()
         _remember_grid_display_estimate(
             track,
             chosen.get("block"),
@@ -3850,7 +4996,7 @@ def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
     track.grid_location_block = None
     track.grid_location_probability = chosen_probability
     track.grid_location_confidence = "AMBIGUOUS"
-    track.grid_location_last_update_mono = time.monotonic()
+    track.grid_location_last_update_mono = monotonic_now()
 
     # For tuning runs, keep strict location_block=None, but expose where the
     # model would have placed this eligible mobile/calibration signal.
@@ -3911,21 +5057,6 @@ def localize_track_to_grid(track: "DeviceTrack") -> Dict[str, Any]:
     return base
 
 
-def make_json_safe(value: Any) -> Any:
-    """
-    Recursively convert Python-only container types into JSON-safe values.
-    This protects /api/localization from accidental set/tuple objects in
-    diagnostic fields or localization candidates.
-    """
-    if isinstance(value, dict):
-        return {str(k): make_json_safe(v) for k, v in value.items()}
-    if isinstance(value, set):
-        return sorted([make_json_safe(v) for v in value], key=lambda x: str(x))
-    if isinstance(value, (list, tuple, deque)):
-        return [make_json_safe(v) for v in value]
-    return value
-
-
 def build_localization_api_payload(tracker_snapshot: Dict[str, Any]) -> Dict[str, Any]:
     status = localization_status_for_api()
     layout = status.get("grid_layout") or [[1, 2, 3], [6, 5, 4], [7, 8, 9]]
@@ -3963,6 +5094,8 @@ def build_localization_api_payload(tracker_snapshot: Dict[str, Any]) -> Dict[str
             "grid_display_reason": row.get("grid_display_reason"),
             "grid_display_is_test_estimate": row.get("grid_display_is_test_estimate", False),
             "grid_display_candidate_rank": row.get("grid_display_candidate_rank"),
+            "sub_block_position": row.get("sub_block_position"),
+            "tracked_position": row.get("tracked_position"),
             "strongest_scanner": row.get("strongest_scanner"),
             "top2_scanners": row.get("top2_scanners", []),
             "scanner_rssi": row.get("scanner_rssi", {}),
@@ -4045,6 +5178,78 @@ def build_localization_api_payload(tracker_snapshot: Dict[str, Any]) -> Dict[str
     }
 
 
+def compare_localization_versions(
+    tracker: "DeviceTracker",
+    version_a: Dict[str, Any],
+    version_b: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Live A/B comparison of two kept fingerprint versions.
+
+    Fresh RSSI stats are collected for every localization-eligible track under
+    the tracker lock; scoring against both versions happens after releasing it.
+    Neither version is activated and no per-track smoothing state is touched.
+    """
+    live_rows = []
+    with tracker.lock:
+        for uid, track in tracker.tracks.items():
+            eligible, _ = _localization_candidate_role(track)
+            if not eligible:
+                continue
+            stats_for_loc = scanner_stats_for_localization(track)
+            if stats_for_loc.get("is_stale", True):
+                continue
+            if len(stats_for_loc.get("matching_mean", {})) < LOCALIZATION_MIN_SCANNERS:
+                continue
+            live_rows.append((uid, track.label(), stats_for_loc))
+
+    def best_of(version: Dict[str, Any], stats_for_loc: Dict[str, Any]) -> Dict[str, Any]:
+        candidates = _score_fingerprint_blocks(
+            stats_for_loc.get("matching_mean", {}),
+            stats_for_loc.get("std", {}),
+            stats_for_loc.get("count", {}),
+            version.get("blocks", []),
+        )
+        if not candidates:
+            return {"block": None, "probability": 0.0, "confidence": "NONE"}
+        confidence, _ = _probability_confidence(candidates)
+        return {
+            "block": candidates[0].get("block"),
+            "probability": candidates[0].get("probability"),
+            "confidence": confidence,
+        }
+
+    tracks = []
+    agree = 0
+    blocks_a: Dict[str, int] = defaultdict(int)
+    blocks_b: Dict[str, int] = defaultdict(int)
+    for uid, label, stats_for_loc in live_rows:
+        a = best_of(version_a, stats_for_loc)
+        b = best_of(version_b, stats_for_loc)
+        same = a["block"] is not None and a["block"] == b["block"]
+        agree += 1 if same else 0
+        blocks_a[str(a["block"])] += 1
+        blocks_b[str(b["block"])] += 1
+        tracks.append({
+            "uid": uid,
+            "label": label,
+            "live_rssi_mean": stats_for_loc.get("matching_mean", {}),
+            "a": a,
+            "b": b,
+            "same_block": same,
+        })
+
+    return {
+        "version_a": version_a.get("version"),
+        "version_b": version_b.get("version"),
+        "tracks_compared": len(tracks),
+        "agreement_ratio": round(agree / len(tracks), 4) if tracks else None,
+        "block_counts_a": dict(blocks_a),
+        "block_counts_b": dict(blocks_b),
+        "tracks": tracks,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
 
 class DeviceTracker:
     """
@@ -4054,9 +5259,19 @@ class DeviceTracker:
     fields to streamed events so the UI can group signals into physical-device tracks.
     """
     def __init__(self):
-        self.lock = threading.Lock()
+        # All tracker state is guarded by one lock; ProfiledLock measures wait and
+        # hold time per call site (see TRACKER_LOCK_* and /api/stats "tracker_lock").
+        self.lock = ProfiledLock(
+            "tracker",
+            enabled=TRACKER_LOCK_PROFILING,
+            top_n=TRACKER_LOCK_TOP_HOLDS,
+            slow_hold_ms=TRACKER_LOCK_SLOW_HOLD_MS,
+            context_fn=self._lock_context,
+        )
         self.tracks: Dict[str, DeviceTrack] = {}
         self.alias_to_uid: Dict[str, str] = {}
+        # Union-find parent links of merged-away uids (dropped uid -> kept uid).
+        self.merged_into: Dict[str, str] = {}
         self.alias_tracks: Dict[str, AliasTrack] = {}
         self.next_id = 1
         self.last_merge_mono = 0.0
@@ -4066,6 +5281,15 @@ class DeviceTracker:
         self.blocked_confirmation_unknown_heavy = 0
         self._pending_merge_reason = ""
         self.last_merge_events = deque(maxlen=50)
+        self.merges_total = 0
+        self.snapshot_rows_reused = 0
+        self.snapshot_rows_rebuilt = 0
+
+        # ("track" | "alias" | "burst" | "motion", uid or alias key) deadlines.
+        self.expiry = ExpiryQueue()
+
+    def _lock_context(self) -> Dict[str, Any]:
+        return {"tracks": len(self.tracks), "alias_tracks": len(self.alias_tracks)}
 
     def make_alias_key(self, ev: Dict[str, Any], parsed: Dict[str, Any]) -> str:
         mac = str(ev.get("mac", "UNK")).upper()
@@ -4126,41 +5350,28 @@ class DeviceTracker:
         return True
 
     def _payload_mobile_uuid_set(self, payload_sig: str) -> set:
-        parts = parse_payload_sig_parts({payload_sig})
-        return set(parts.get("service_uuids", set())) & MOBILE_SERVICE_UUIDS
+        return set(payload_sig_parts(payload_sig)["service_uuids"] & MOBILE_SERVICE_UUIDS)
 
     def _payload_family_key(self, payload_sig: str) -> Tuple[str, Tuple[str, ...], Tuple[str, ...], Tuple[int, ...]]:
-        """Compact exact-ish payload family key for safe polluted-track expansion."""
-        parts = parse_payload_sig_parts({payload_sig})
-        service_uuids = tuple(sorted(str(x) for x in parts.get("service_uuids", set())))
-        mobile_uuids = tuple(sorted(str(x) for x in (parts.get("service_uuids", set()) & MOBILE_SERVICE_UUIDS)))
-        mfg_ids = tuple(sorted(f"{x:04X}" for x in parts.get("mfg_ids", set()) if isinstance(x, int)))
-        lengths = tuple(sorted(int(x) for x in parts.get("lengths", set()) if isinstance(x, int)))
-
-        if mobile_uuids:
-            return ("MOBILE_SERVICE", mobile_uuids, tuple(), lengths)
-        if service_uuids:
-            return ("SERVICE_DATA", service_uuids, tuple(), lengths)
-        if mfg_ids:
-            return ("MANUFACTURER_DATA", tuple(), mfg_ids, lengths)
-        return ("OTHER_ADV", tuple(), tuple(), lengths)
+        return payload_family_key(payload_sig)
 
     def _shared_payload_family(self, a: DeviceTrack, b: DeviceTrack) -> bool:
-        a_keys = {self._payload_family_key(sig) for sig in a.payload_sigs}
-        b_keys = {self._payload_family_key(sig) for sig in b.payload_sigs}
-        return bool(a_keys & b_keys)
+        return bool(a.payload_family_keys() & b.payload_family_keys())
 
     def _same_mac_and_shared_payload_family(self, a: DeviceTrack, b: DeviceTrack) -> bool:
-        return bool((a.macs & b.macs) and self._shared_payload_family(a, b))
+        return bool((a.macs.keys() & b.macs.keys()) and self._shared_payload_family(a, b))
 
-    def _mobile_payload_family_items(self, track: DeviceTrack, min_packets: int = MOBILE_FAMILY_MIN_PACKETS_FOR_MERGE) -> List[Dict[str, Any]]:
+    def _mobile_payload_family_items(self, track: DeviceTrack, min_packets: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Return mobile-service payload families with their own RSSI vectors.
 
         This is stricter than whole-track RSSI. Whole-track averages allowed PD_006
         to swallow FCF1, FEF3, FD5A, and weak OTHER_ADV families. Per-family gates
         keep those families separate unless they really match.
+        min_packets defaults to MOBILE_FAMILY_MIN_PACKETS_FOR_MERGE, read per call.
         """
+        if min_packets is None:
+            min_packets = MOBILE_FAMILY_MIN_PACKETS_FOR_MERGE
         items = []
         for sig, info in track.payload_family_rssi_maps().items():
             parts = info.get("parts", {}) or {}
@@ -4177,7 +5388,7 @@ class DeviceTracker:
             items.append({
                 "payload_sig": sig,
                 "mobile_uuids": mobile_uuids,
-                "family_key": self._payload_family_key(sig),
+                "family_key": info.get("family_key") or self._payload_family_key(sig),
                 "packets": packets,
                 "rssi": rssi,
             })
@@ -4274,7 +5485,7 @@ class DeviceTracker:
         if alias is not None:
             alias_uuids |= set(alias.mobile_service_uuids)
             alias_uuids |= mobile_service_uuids_from_sigs(alias.payload_sigs)
-        alias_uuids |= (service_data_uuids(parsed) & MOBILE_SERVICE_UUIDS)
+        alias_uuids |= parsed_mobile_service_uuids(parsed)
 
         if not alias_uuids:
             return True
@@ -4326,7 +5537,7 @@ class DeviceTracker:
         same_mfg_family = bool(shared_mfg)
         same_service_family = bool(shared_service)
         strong_payload_overlap = len(shared_crc) >= IDENTITY_CONTINUITY_MIN_SHARED_CRC
-        direct_track_proof = bool((a.macs & b.macs) or strong_payload_overlap)
+        direct_track_proof = bool((a.macs.keys() & b.macs.keys()) or strong_payload_overlap)
         same_mac_and_payload_family = self._same_mac_and_shared_payload_family(a, b)
         a_has_mobile_service = a.has_mobile_service_data()
         b_has_mobile_service = b.has_mobile_service_data()
@@ -4460,16 +5671,11 @@ class DeviceTracker:
 
         return False
 
-    def _cross_personality_association(self, a: DeviceTrack, b: DeviceTrack) -> Optional[Dict[str, Any]]:
+    def _cross_personality_sides(self, a: DeviceTrack, b: DeviceTrack) -> Optional[Tuple[DeviceTrack, DeviceTrack]]:
         """
-        Cautious physical association, not a hard merge.
-
-        This connects a clean mobile-service identity to a known/manufacturer-data
-        identity when their behavior is compatible. It keeps the raw PDs visible.
+        Identity gates of a cross-personality association. Returns
+        (mobile_track, known_track) when the pair may be associated, else None.
         """
-        if not CROSS_PERSONALITY_ASSOCIATIONS_ENABLED:
-            return None
-
         a_summary = a.identity_summary()
         b_summary = b.identity_summary()
 
@@ -4498,10 +5704,24 @@ class DeviceTracker:
         if CROSS_PERSONALITY_BLOCK_STABLE_KNOWN_TARGETS and self._stable_known_target_for_association(known_track):
             return None
 
-        ar_raw = effective_scanner_rssi(mobile_track)
-        br_raw = effective_scanner_rssi(known_track)
-        metrics = rssi_fingerprint_metrics(ar_raw, br_raw)
+        return mobile_track, known_track
+
+    def _cross_personality_association(
+        self,
+        a: DeviceTrack,
+        b: DeviceTrack,
+        mobile_track: DeviceTrack,
+        known_track: DeviceTrack,
+        metrics: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Cautious physical association, not a hard merge.
 
+        This connects a clean mobile-service identity to a known/manufacturer-data
+        identity when their behavior is compatible. It keeps the raw PDs visible.
+        The pair has passed _cross_personality_sides(); metrics is the
+        rssi_fingerprint_metrics() of mobile_track against known_track.
+        """
         if metrics["common_scanners"] < MIN_COMMON_SCANNERS_STRONG_MATCH:
             return None
         if metrics["rel_rmse"] is None or metrics["abs_rmse"] is None or metrics["max_diff"] is None:
@@ -4584,15 +5804,42 @@ class DeviceTracker:
         """
         raw_by_mobile: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
         final_associations: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        if not CROSS_PERSONALITY_ASSOCIATIONS_ENABLED:
+            return final_associations
         uids = list(self.tracks.keys())
 
+        # Identity gates first; the RSSI step then runs once over the
+        # surviving mobile x known tracks with rssi_kernel.
+        candidates: List[Tuple[DeviceTrack, DeviceTrack, DeviceTrack, DeviceTrack]] = []
         for i in range(len(uids)):
             for j in range(i + 1, len(uids)):
                 a = self.tracks.get(uids[i])
                 b = self.tracks.get(uids[j])
                 if a is None or b is None:
                     continue
-                assoc = self._cross_personality_association(a, b)
+                sides = self._cross_personality_sides(a, b)
+                if sides is not None:
+                    candidates.append((a, b) + sides)
+
+        if candidates:
+            mobile_row: Dict[str, int] = {}
+            known_col: Dict[str, int] = {}
+            mobile_maps: List[Dict[str, float]] = []
+            known_maps: List[Dict[str, float]] = []
+            for _, _, mobile_track, known_track in candidates:
+                if mobile_track.uid not in mobile_row:
+                    mobile_row[mobile_track.uid] = len(mobile_maps)
+                    mobile_maps.append(effective_scanner_rssi(mobile_track))
+                if known_track.uid not in known_col:
+                    known_col[known_track.uid] = len(known_maps)
+                    known_maps.append(effective_scanner_rssi(known_track))
+            dist = pairwise_distances(mobile_maps, known_maps)
+
+            for a, b, mobile_track, known_track in candidates:
+                r = mobile_row[mobile_track.uid]
+                c = known_col[known_track.uid]
+                metrics = rssi_fingerprint_metrics(mobile_maps[r], known_maps[c], dist.pair(r, c))
+                assoc = self._cross_personality_association(a, b, mobile_track, known_track, metrics)
                 if not assoc:
                     continue
                 raw_by_mobile[assoc["mobile_uid"]].append(dict(assoc))
@@ -4642,8 +5889,9 @@ class DeviceTracker:
     def process_event(self, ev: Dict[str, Any], parsed: Dict[str, Any]) -> Dict[str, Any]:
         alias_key = self.make_alias_key(ev, parsed)
 
-        with self.lock:
-            self._prune_stale_locked()
+        with self.lock.held("process_event"):
+            with self.lock.section("prune_stale"):
+                self._prune_stale_locked()
 
             alias = self.alias_tracks.get(alias_key)
             if alias is None:
@@ -4651,12 +5899,17 @@ class DeviceTracker:
                 self.alias_tracks[alias_key] = alias
             else:
                 alias.update(ev, parsed)
+            self.expiry.schedule(("alias", alias_key), alias.last_seen_mono + TRACK_STALE_SEC)
 
             uid = self.alias_to_uid.get(alias_key)
+            if uid in self.merged_into:
+                uid = self.resolve_uid(uid)
+                self.alias_to_uid[alias_key] = uid
             if uid and uid in self.tracks:
                 track = self.tracks[uid]
                 if track.update(ev, parsed, alias_key):
                     track.remember_alias_feature(alias_key, alias)
+                    self._schedule_track_timers(track)
                     self._periodic_merge_locked()
                     return self._identity_result(track)
 
@@ -4713,25 +5966,40 @@ class DeviceTracker:
             else:
                 uid = f"PD_{self.next_id:03d}"
                 self.next_id += 1
-                track = DeviceTrack(uid, safe_int(ev.get("ts"), 0), time.monotonic())
+                track = DeviceTrack(uid, safe_int(ev.get("ts"), 0), monotonic_now())
                 self.tracks[uid] = track
 
             if not track.update(ev, parsed, alias_key):
                 self.rejected_class_conflicts += 1
                 uid = f"PD_{self.next_id:03d}"
                 self.next_id += 1
-                track = DeviceTrack(uid, safe_int(ev.get("ts"), 0), time.monotonic())
+                track = DeviceTrack(uid, safe_int(ev.get("ts"), 0), monotonic_now())
                 self.tracks[uid] = track
                 # A fresh track cannot conflict with itself. If this fails, keep it as a candidate shell.
                 track.update(ev, parsed, alias_key)
 
             track.remember_alias_feature(alias_key, alias)
             self.alias_to_uid[alias_key] = track.uid
+            self._schedule_track_timers(track)
 
             self._periodic_merge_locked()
             return self._identity_result(track)
 
+    def resolve_uid(self, uid: Optional[str]) -> Optional[str]:
+        """Follow merge links to the surviving uid (with path compression)."""
+        merged_into = self.merged_into
+        root = uid
+        while root in merged_into:
+            root = merged_into[root]
+        while uid in merged_into and merged_into[uid] != root:
+            merged_into[uid], uid = root, merged_into[uid]
+        return root
+
     def _identity_result(self, track: DeviceTrack) -> Dict[str, str]:
+        with stage_timers.time("identity_result"):
+            return self._build_identity_result(track)
+
+    def _build_identity_result(self, track: DeviceTrack) -> Dict[str, str]:
         confirmed, reason = track.confirm_quality()
 
         if not confirmed:
@@ -4786,7 +6054,7 @@ class DeviceTracker:
     def _score_alias_to_track(self, ev: Dict[str, Any], parsed: Dict[str, Any],
                               alias_key: str, track: DeviceTrack,
                               alias: Optional[AliasTrack] = None) -> float:
-        now_mono = time.monotonic()
+        now_mono = monotonic_now()
         gap = now_mono - track.last_seen_mono
         if gap > TRACK_STALE_SEC:
             # Only phone-like tracks get long reconnect memory. Fixed outside sources
@@ -4794,7 +6062,7 @@ class DeviceTracker:
             if gap > IDENTITY_MEMORY_SEC or not track.is_phone_like() or track.is_outside_stable_source():
                 return float("inf")
 
-        incoming_class = classify_metadata(parsed)
+        incoming_class = parsed_meta_class(parsed)
         track_known = track.known_classes()
         alias_known = alias.known_classes() if alias is not None else ({incoming_class} if is_known_metadata_class(incoming_class) else set())
 
@@ -4840,7 +6108,7 @@ class DeviceTracker:
         has_direct_continuity = has_same_alias or has_same_mac
         has_direct_low_level_proof = has_same_alias or has_same_mac or has_same_payload
         incoming_family_key = self._payload_family_key(payload_sig)
-        has_same_payload_family = incoming_family_key in {self._payload_family_key(sig) for sig in track.payload_sigs}
+        has_same_payload_family = incoming_family_key in track.payload_family_keys()
         has_strict_polluted_continuity = has_same_alias or (has_same_mac and has_same_payload_family)
 
         # Do not let already-polluted tracks continue absorbing unrelated aliases.
@@ -4994,29 +6262,30 @@ class DeviceTracker:
 
 
     def _periodic_merge_locked(self) -> None:
-        now = time.monotonic()
+        now = monotonic_now()
         if now - self.last_merge_mono < 1.0:
             return
         self.last_merge_mono = now
 
-        uids = list(self.tracks.keys())
-        for i in range(len(uids)):
-            a_uid = uids[i]
-            if a_uid not in self.tracks:
-                continue
-            for j in range(i + 1, len(uids)):
-                b_uid = uids[j]
-                if b_uid not in self.tracks:
+        with self.lock.section("periodic_merge"):
+            uids = list(self.tracks.keys())
+            for i in range(len(uids)):
+                a_uid = uids[i]
+                if a_uid not in self.tracks:
                     continue
+                for j in range(i + 1, len(uids)):
+                    b_uid = uids[j]
+                    if b_uid not in self.tracks:
+                        continue
 
-                a = self.tracks[a_uid]
-                b = self.tracks[b_uid]
+                    a = self.tracks[a_uid]
+                    b = self.tracks[b_uid]
 
-                if not self._should_merge_tracks(a, b):
-                    continue
+                    if not self._should_merge_tracks(a, b):
+                        continue
 
-                reason = self._pending_merge_reason or "generic_merge"
-                self._merge_tracks_locked(a_uid, b_uid, reason=reason)
+                    reason = self._pending_merge_reason or "generic_merge"
+                    self._merge_tracks_locked(a_uid, b_uid, reason=reason)
 
     def _should_merge_tracks(self, a: DeviceTrack, b: DeviceTrack) -> bool:
         self._pending_merge_reason = ""
@@ -5037,7 +6306,7 @@ class DeviceTracker:
         a_summary_pre = a.identity_summary()
         b_summary_pre = b.identity_summary()
         shared_crc_pre = a_summary_pre.get("payload_crc_set", set()) & b_summary_pre.get("payload_crc_set", set())
-        direct_track_proof = bool((a.macs & b.macs) or shared_crc_pre)
+        direct_track_proof = bool((a.macs.keys() & b.macs.keys()) or shared_crc_pre)
         same_mac_and_payload_family = self._same_mac_and_shared_payload_family(a, b)
 
         if (a.pollution_suspect()[0] or b.pollution_suspect()[0]) and not same_mac_and_payload_family:
@@ -5069,7 +6338,7 @@ class DeviceTracker:
             return True
 
         # Same MAC means two payload families from the same physical BLE address.
-        if a.macs & b.macs:
+        if a.macs.keys() & b.macs.keys():
             self._pending_merge_reason = "same_mac"
             return True
 
@@ -5222,7 +6491,7 @@ class DeviceTracker:
             "kept_uid": keep_uid,
             "dropped_uid": drop_uid,
             "reason": reason,
-            "time_mono": round(time.monotonic(), 3),
+            "time_mono": round(monotonic_now(), 3),
             "keep_label_before": keep.label(),
             "drop_label_before": drop.label(),
         }
@@ -5236,7 +6505,7 @@ class DeviceTracker:
         keep_summary = keep.identity_summary()
         drop_summary = drop.identity_summary()
         shared_crc = keep_summary.get("payload_crc_set", set()) & drop_summary.get("payload_crc_set", set())
-        direct_track_proof = bool((keep.macs & drop.macs) or shared_crc)
+        direct_track_proof = bool((keep.macs.keys() & drop.macs.keys()) or shared_crc)
         same_mac_and_payload_family = self._same_mac_and_shared_payload_family(keep, drop)
         keep_mobile = keep.has_mobile_service_data()
         drop_mobile = drop.has_mobile_service_data()
@@ -5254,9 +6523,10 @@ class DeviceTracker:
             return
 
         keep.packet_count += drop.packet_count
-        keep.aliases |= drop.aliases
-        keep.macs |= drop.macs
-        keep.payload_sigs |= drop.payload_sigs
+        _merge_last_seen(keep.aliases, drop.aliases)
+        _merge_last_seen(keep.macs, drop.macs)
+        _merge_last_seen(keep.payload_sigs, drop.payload_sigs)
+        keep._absorb_retired(drop)
         keep.mfg_ids |= drop.mfg_ids
         keep.names |= drop.names
         keep.alias_features.update(drop.alias_features)
@@ -5267,192 +6537,395 @@ class DeviceTracker:
         keep.mobile_service_uuids |= drop.mobile_service_uuids
         keep.mobile_service_packet_count += drop.mobile_service_packet_count
 
-        for obs in drop.obs:
-            keep.obs.append(obs)
+        keep.obs.extend(drop.obs)
         keep._prune_obs()
 
         for k, v in drop.last_alias_scanner_ts_us.items():
             keep.last_alias_scanner_ts_us[k] = max(keep.last_alias_scanner_ts_us.get(k, 0), v)
 
-        for v in drop.adv_intervals_ms:
-            keep.adv_intervals_ms.append(v)
-
-        for scanner, vals in drop.last_known_rssi_vals.items():
-            for rssi_val in vals:
-                keep._update_last_known_rssi(scanner, rssi_val, max(keep.last_seen_mono, drop.last_seen_mono))
-
-        for sig, by_scanner in drop.payload_rssi_vals.items():
-            for scanner, vals in by_scanner.items():
-                for rssi_val in vals:
-                    keep._update_payload_rssi(sig, scanner, rssi_val)
+        keep.adv_intervals_ms.extend(drop.adv_intervals_ms)
+        keep._absorb_rssi_samples(drop)
 
         keep.first_seen_mono = min(keep.first_seen_mono, drop.first_seen_mono)
         keep.last_seen_mono = max(keep.last_seen_mono, drop.last_seen_mono)
-        for v in drop.burst_packet_counts:
-            keep.burst_packet_counts.append(v)
-        for v in drop.burst_durations_sec:
-            keep.burst_durations_sec.append(v)
-        for v in drop.burst_scanner_sets:
-            keep.burst_scanner_sets.append(set(v))
-        for v in drop.burst_rssi_maps:
-            keep.burst_rssi_maps.append(dict(v))
-        for v in getattr(drop, "motion_rssi_maps", []):
-            keep.motion_rssi_maps.append(dict(v))
-        for v in getattr(drop, "motion_slice_packet_counts", []):
-            keep.motion_slice_packet_counts.append(v)
+        # The bounded deques keep their newest maxlen entries, as append() would.
+        keep.burst_packet_counts.extend(drop.burst_packet_counts)
+        keep.burst_durations_sec.extend(drop.burst_durations_sec)
+        keep.burst_scanner_sets.extend(set(v) for v in drop.burst_scanner_sets)
+        keep.burst_rssi_maps.extend(dict(v) for v in drop.burst_rssi_maps)
+        keep.motion_rssi_maps.extend(dict(v) for v in drop.motion_rssi_maps)
+        keep.motion_slice_packet_counts.extend(drop.motion_slice_packet_counts)
         keep.burst_count += drop.burst_count
+        keep.position_estimator.absorb(drop.position_estimator)
+        # Cleared here as well as in compact(), which is a no-op when
+        # IDENTITY_COMPACT_ENABLED is False.
+        keep.identity_cache = None
+        keep.compact(monotonic_now(), force=True)
         keep.confirmed = keep.is_confirmed()
+        keep.version += 1
 
         keep.merge_history.append(merge_event)
         self.last_merge_events.append(merge_event)
-
-        for alias in drop.aliases:
-            self.alias_to_uid[alias] = keep_uid
+        self.merges_total += 1
+
+        # The dropped aliases keep pointing at drop_uid; resolve_uid() follows
+        # the link, so a merge costs O(1) here instead of one write per alias.
+        self.merged_into[drop_uid] = keep_uid
+        # Aliases re-point themselves on their next packet; the rest expire
+        # within TRACK_STALE_SEC, after which the link is discarded. Read at
+        # merge time so a TRACK_STALE_SEC override applies.
+        self.expiry.schedule(
+            ("merged", drop_uid),
+            monotonic_now() + TRACK_STALE_SEC + 2 * TRACKER_EXPIRY_TICK_SEC,
+        )
 
         del self.tracks[drop_uid]
 
+    def _schedule_track_timers(self, track: DeviceTrack) -> None:
+        uid = track.uid
+        self.expiry.schedule(("track", uid), track.last_seen_mono + IDENTITY_MEMORY_SEC)
+        if track.current_burst_packets > 0:
+            self.expiry.schedule(("burst", uid), track.current_burst_end_mono + BURST_GAP_SEC)
+        if track.motion_slice_packets > 0:
+            self.expiry.schedule(("motion", uid), track.motion_slice_start_mono + MOTION_SLICE_SEC)
+
+    def expire_due(self) -> None:
+        """Run due timers without an incoming event (tracker_expiry thread)."""
+        if self.expiry.next_deadline() >= monotonic_now():
+            return
+        with self.lock.held("expire_due"):
+            self._prune_stale_locked()
+
     def _prune_stale_locked(self) -> None:
-        now = time.monotonic()
+        """
+        Run due expiry timers. Each key is re-checked against the object's
+        current state: if it was seen again, the timer is re-armed at the new
+        deadline instead.
+        """
+        now = monotonic_now()
+
+        for kind, key in self.expiry.pop_due(now):
+            if kind == "alias":
+                alias = self.alias_tracks.get(key)
+                if alias is None:
+                    continue
+                deadline = alias.last_seen_mono + TRACK_STALE_SEC
+                if deadline >= now:
+                    self.expiry.schedule((kind, key), deadline)
+                    continue
+                self.alias_tracks.pop(key, None)
+                self.alias_to_uid.pop(key, None)
+                continue
+
+            if kind == "merged":
+                self.merged_into.pop(key, None)
+                continue
 
-        # Keep physical-device identities much longer than the live display timeout.
-        # This is required for screen-off phones that disappear and later return as
-        # another burst. They can be marked INACTIVE/INTERMITTENT in the API instead
-        # of being deleted immediately.
-        stale = [uid for uid, t in self.tracks.items() if now - t.last_seen_mono > IDENTITY_MEMORY_SEC]
+            tr = self.tracks.get(key)
+            if tr is None:
+                continue
 
-        for uid in stale:
-            tr = self.tracks.pop(uid, None)
-            if tr:
+            if kind == "track":
+                # Keep physical-device identities much longer than the live display timeout.
+                # This is required for screen-off phones that disappear and later return as
+                # another burst. They can be marked INACTIVE/INTERMITTENT in the API instead
+                # of being deleted immediately.
+                deadline = tr.last_seen_mono + IDENTITY_MEMORY_SEC
+                if deadline >= now:
+                    self.expiry.schedule((kind, key), deadline)
+                    continue
+                del self.tracks[key]
                 for alias in tr.aliases:
-                    if self.alias_to_uid.get(alias) == uid:
+                    if self.resolve_uid(self.alias_to_uid.get(alias)) == key:
                         del self.alias_to_uid[alias]
 
-        stale_aliases = [
-            alias_key for alias_key, alias in self.alias_tracks.items()
-            if now - alias.last_seen_mono > TRACK_STALE_SEC
-        ]
-        for alias_key in stale_aliases:
-            self.alias_tracks.pop(alias_key, None)
-            self.alias_to_uid.pop(alias_key, None)
+            elif kind == "burst":
+                if tr.current_burst_packets <= 0:
+                    continue
+                deadline = tr.current_burst_end_mono + BURST_GAP_SEC
+                if deadline >= now:
+                    self.expiry.schedule((kind, key), deadline)
+                    continue
+                tr.close_burst()
+
+            elif kind == "motion":
+                if tr.motion_slice_packets <= 0:
+                    continue
+                deadline = tr.motion_slice_start_mono + MOTION_SLICE_SEC
+                if deadline >= now:
+                    self.expiry.schedule((kind, key), deadline)
+                    continue
+                tr.close_motion_slice()
 
     def snapshot(self) -> Dict[str, Any]:
-        with self.lock:
-            self._prune_stale_locked()
-            association_map = self._association_map_locked()
+        with stage_timers.time("snapshot"):
+            return self._build_snapshot()
+
+    def _snapshot_row_key(self, t: DeviceTrack, now: float) -> Optional[Tuple[int, str, int]]:
+        """Cache key of a quiet track's row; None when the row must be rebuilt."""
+        if not SNAPSHOT_ROW_CACHE_ENABLED or not t.is_quiet(now):
+            return None
+        idle_bucket = int((now - t.last_seen_mono) // SNAPSHOT_ROW_REFRESH_SEC)
+        return (t.version, t.presence_state(), idle_bucket)
+
+    def _snapshot_row_locked(self, t: DeviceTrack, now: float) -> Tuple[Dict[str, Any], bool]:
+        """
+        The track's snapshot row and weak-inactive flag. Rows of quiet tracks
+        are reused while (version, presence_state, idle bucket) is unchanged;
+        see SNAPSHOT_ROW_*. The caller gets its own dict to fill in.
+        """
+        key = self._snapshot_row_key(t, now)
+        if key is not None:
+            cached = t.snapshot_row
+            if cached is not None and cached[0] == key:
+                self.snapshot_rows_reused += 1
+                row = dict(cached[1])
+                row["age_sec"] = round(t.age_sec(), 2)
+                row["last_seen_age_sec"] = round(now - t.last_seen_mono, 2)
+                row["last_burst_age_sec"] = round(t.last_burst_age_sec(), 2)
+                return row, cached[2]
+
+        row, weak_inactive_candidate = self._build_snapshot_row(t)
+        self.snapshot_rows_rebuilt += 1
+        if key is None:
+            t.snapshot_row = None
+            return row, weak_inactive_candidate
+        t.snapshot_row = (key, row, weak_inactive_candidate)
+        return dict(row), weak_inactive_candidate
+
+    def _build_snapshot_row(self, t: DeviceTrack) -> Tuple[Dict[str, Any], bool]:
+        confirmed, confirm_reason = t.confirm_quality()
+        strongest_rssi_val = t.strongest_rssi_value()
+        top2_avg_rssi_val = t.top2_avg_rssi_value()
+
+        identity_summary = t.identity_summary()
+        display_info = t.display_classification()
+        region_info = region_hint_for_track(t)
+        polluted, pollution_reason = t.pollution_suspect()
+        weak_inactive_candidate = t.is_weak_inactive_candidate(confirmed)
+
+        row = {
+            "uid": t.uid,
+            "status": "CONFIRMED" if confirmed else "CANDIDATE",
+            "label": t.label(),
+            "identity_summary": identity_summary_for_api(identity_summary),
+            "associated_tracks": [],
+            "merge_history": list(t.merge_history),
+            "dna": t.dna(),
+            "confirm_reason": confirm_reason,
+            "confirm_block_reason": "" if confirmed else confirm_reason,
+            "strongest_rssi": round(strongest_rssi_val, 2) if strongest_rssi_val is not None else None,
+            "top2_avg_rssi": round(top2_avg_rssi_val, 2) if top2_avg_rssi_val is not None else None,
+            "known_packet_count": t.known_packet_count(),
+            "unknown_packet_count": t.unknown_packet_count(),
+            "known_packet_ratio": round(t.known_packet_ratio(), 3),
+            "weak_track_label": "" if confirmed else (WEAK_TRACK_LABEL if confirm_reason == "weak_rssi" else ""),
+            "presence_state": t.presence_state(),
+            "device_role": t.device_role(),
+            "display_class": display_info.get("display_class"),
+            "device_type": display_info.get("device_type"),
+            "movement_state": display_info.get("movement_state"),
+            "rf_motion_evidence": display_info.get("rf_motion_evidence", False),
+            "rf_motion_reason": display_info.get("rf_motion_reason", ""),
+            "classification_confidence": display_info.get("classification_confidence"),
+            "classification_reason": display_info.get("classification_reason"),
+            "grid_display_eligible": display_info.get("grid_display_eligible", False),
+            "region_hint": region_info.get("region_hint"),
+            "region_confidence": region_info.get("region_confidence"),
+            "region_scanners": region_info.get("region_scanners", []),
+            "region_reason": region_info.get("region_reason"),
+            "phone_likelihood": round(t.phone_likelihood_score(), 2),
+            "outside_likelihood": round(t.outside_likelihood_score(), 2),
+            "mobile_service_score": round(t.mobile_service_score(), 2),
+            "mobile_service_presence": t.mobile_service_presence(),
+            "mobile_service_uuids": sorted(list(t.mobile_service_uuids or mobile_service_uuids_from_sigs(t.payload_sigs))),
+            "mobile_service_packet_count": t.mobile_service_packet_count,
+            "mobile_service_packet_ratio": round(t.mobile_service_packet_ratio(), 3),
+            "mobile_service_reason": t.mobile_service_reason(),
+            "background_mobile_service_score": round(t.background_mobile_service_score(), 2),
+            "is_background_mobile_service": t.is_background_mobile_service(),
+            "background_mobile_reason": t.background_mobile_reason(),
+            "weak_flat_background_score": round(t.weak_flat_background_score(), 2),
+            "is_weak_flat_background": t.is_weak_flat_background(),
+            "weak_flat_background_reason": t.weak_flat_background_reason(),
+            "strongest_margin_db": rounded_metric(t.strongest_margin_db()),
+            "location_confidence": t.location_confidence()[0],
+            "location_reason": t.location_confidence()[1],
+            "pollution_suspect": polluted,
+            "pollution_reason": pollution_reason,
+            "polluted_family_debug": t.polluted_family_debug() if polluted else {"families": [], "divergent_pairs": []},
+            "localizable": t.is_localizable(),
+            "burst_count": t.burst_count,
+            "last_burst_age_sec": round(t.last_burst_age_sec(), 2),
+            "avg_burst_duration_sec": round(t.avg_burst_duration_sec(), 2),
+            "avg_packets_per_burst": round(t.avg_packets_per_burst(), 2),
+            "recent_burst_scanners": sorted(list(t.recent_burst_scanners())),
+            "motion_slice_count": t.motion_slice_count(),
+            "motion_slice_packets_current": t.motion_slice_packets,
+            "motion_slice_history_packets": list(t.motion_slice_packet_counts),
+            "last_known_scanner_rssi": dict(t.last_known_scanner_rssi),
+            "last_known_num_scanners": len(t.last_known_scanner_visibility()),
+            "last_known_strongest_scanner": strongest_scanner(t.last_known_scanner_rssi),
+            "last_known_top2_scanners": sorted(list(top_scanners(t.last_known_scanner_rssi, 2))),
+            "last_known_strongest_rssi": round(t.last_known_strongest_rssi_value(), 2) if t.last_known_strongest_rssi_value() is not None else None,
+            "last_known_top2_avg_rssi": round(t.last_known_top2_avg_rssi_value(), 2) if t.last_known_top2_avg_rssi_value() is not None else None,
+            "packets": t.packet_count,
+            "num_macs": t.mac_count(),
+            "num_payloads": t.payload_count(),
+            "num_aliases": t.alias_count(),
+            "num_scanners": len(t.scanner_visibility()),
+            "age_sec": round(t.age_sec(), 2),
+            "last_seen_age_sec": round(monotonic_now() - t.last_seen_mono, 2),
+            "scanner_rssi": t.scanner_rssi(),
+            "macs": sorted(list(t.macs))[:10],
+            "payload_sigs": sorted(list(t.payload_sigs))[:10],
+            "known_classes": sorted(list(t.known_classes())),
+            "class_counts": dict(sorted(t.metadata_classes.items())),
+            "alias_feature_count": len(t.alias_features),
+            "identity_core_aliases": len(t.alias_features),
+            "adv_interval_mean_ms": round(t.mean_adv_interval_ms(), 2) if t.mean_adv_interval_ms() is not None else None,
+            "adv_interval_samples": t.adv_interval_sample_count(),
+            "adv_interval_source": "scanner_local_same_alias_same_scanner",
+            "strongest_scanner": strongest_scanner(t.scanner_rssi()),
+            "top2_scanners": sorted(list(top_scanners(t.scanner_rssi(), 2))),
+        }
+
+        # Mobile-only grid/block localization. This uses the calibrated
+        # probabilistic RSSI fingerprint model and adds location_block /
+        # location_probability fields to the API row.
+        row.update(localize_track_to_grid(t))
+        return row, weak_inactive_candidate
+
+    def query_devices(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """/api/devices with query parameters; see devices_query_from_args()."""
+        with stage_timers.time("snapshot"):
+            return self._build_query(query)
+
+    def _query_match_locked(self, t: DeviceTrack, now: float, query: Dict[str, Any]) -> bool:
+        """
+        Whether a track passes the query's filters. Only what the active
+        filters need is computed, cheapest first; a quiet track with a valid
+        cached row is filtered on that row.
+        """
+        weak_mode = query["weak"]
+        key = self._snapshot_row_key(t, now)
+        cached = t.snapshot_row if key is not None else None
+        if cached is not None and cached[0] == key:
+            if weak_mode != "include" and cached[2] != (weak_mode == "only"):
+                return False
+            row = cached[1]
+            return all(
+                row.get(name) in query[name]
+                for name in DEVICES_API_FILTERS if query[name] is not None
+            )
+
+        if query["presence_state"] is not None and t.presence_state() not in query["presence_state"]:
+            return False
+        if query["status"] is not None or weak_mode != "include":
+            confirmed = t.confirm_quality()[0]
+            if query["status"] is not None and ("CONFIRMED" if confirmed else "CANDIDATE") not in query["status"]:
+                return False
+            if weak_mode != "include" and t.is_weak_inactive_candidate(confirmed) != (weak_mode == "only"):
+                return False
+        if query["display_class"] is not None or query["device_type"] is not None:
+            display_info = t.display_classification()
+            for name in ("display_class", "device_type"):
+                if query[name] is not None and display_info.get(name) not in query[name]:
+                    return False
+        return True
+
+    @staticmethod
+    def _query_sort_key(t: DeviceTrack, sort: str) -> Tuple[Any, ...]:
+        """
+        (value, uid) page key. last_seen_age_sec sorts on -last_seen_mono,
+        which orders the same but does not drift between page requests.
+        """
+        if sort == "uid":
+            value = t.uid
+        elif sort == "packets":
+            value = t.packet_count
+        elif sort == "age_sec":
+            value = round(t.age_sec(), 2)
+        elif sort == "last_seen_age_sec":
+            value = -t.last_seen_mono
+        else:
+            value = t.strongest_rssi_value()
+        return ((0, 0) if value is None else (1, value)), t.uid
+
+    def _build_query(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock.held("snapshot"):
+            with self.lock.section("prune_stale"):
+                self._prune_stale_locked()
+            now = monotonic_now()
+            sort, desc = query["sort"], query["desc"]
+            matched = [
+                (self._query_sort_key(t, sort), t)
+                for t in self.tracks.values()
+                if self._query_match_locked(t, now, query)
+            ]
+            matched.sort(key=lambda item: item[0], reverse=desc)
+            num_matched = len(matched)
+
+            after = query["after"]
+            if after is not None:
+                matched = [item for item in matched if (item[0] < after if desc else item[0] > after)]
+            page = matched[:query["limit"]]
+            next_cursor = encode_devices_cursor(sort, desc, page[-1][0]) if len(matched) > len(page) else None
+
+            # Rows are built only for the page.
+            fields = query["fields"]
+            association_map: Dict[str, List[Dict[str, Any]]] = {}
+            if fields is None or "associated_tracks" in fields:
+                with self.lock.section("association_map"):
+                    association_map = self._association_map_locked()
             tracks = []
             weak_memory_tracks = []
-            for uid, t in sorted(self.tracks.items()):
-                confirmed, confirm_reason = t.confirm_quality()
-                strongest_rssi_val = t.strongest_rssi_value()
-                top2_avg_rssi_val = t.top2_avg_rssi_value()
-
-                identity_summary = t.identity_summary()
-                display_info = t.display_classification()
-                region_info = region_hint_for_track(t)
-                polluted, pollution_reason = t.pollution_suspect()
-                weak_inactive_candidate = (
-                    HIDE_WEAK_INACTIVE_CANDIDATES_IN_MAIN_API and
-                    not confirmed and
-                    t.presence_state() == "INACTIVE" and
-                    t.packet_count <= WEAK_INACTIVE_MAX_PACKETS_FOR_HIDE and
-                    not t.is_localizable()
-                )
+            for _, t in page:
+                row, weak_inactive_candidate = self._snapshot_row_locked(t, now)
+                row["associated_tracks"] = association_map.get(t.uid, [])
+                if fields is not None:
+                    row = {name: row[name] for name in fields if name in row}
 
-                row = {
-                    "uid": uid,
-                    "status": "CONFIRMED" if confirmed else "CANDIDATE",
-                    "label": t.label(),
-                    "identity_summary": identity_summary_for_api(identity_summary),
-                    "associated_tracks": association_map.get(uid, []),
-                    "merge_history": list(t.merge_history),
-                    "dna": t.dna(),
-                    "confirm_reason": confirm_reason,
-                    "confirm_block_reason": "" if confirmed else confirm_reason,
-                    "strongest_rssi": round(strongest_rssi_val, 2) if strongest_rssi_val is not None else None,
-                    "top2_avg_rssi": round(top2_avg_rssi_val, 2) if top2_avg_rssi_val is not None else None,
-                    "known_packet_count": t.known_packet_count(),
-                    "unknown_packet_count": t.unknown_packet_count(),
-                    "known_packet_ratio": round(t.known_packet_ratio(), 3),
-                    "weak_track_label": "" if confirmed else (WEAK_TRACK_LABEL if confirm_reason == "weak_rssi" else ""),
-                    "presence_state": t.presence_state(),
-                    "device_role": t.device_role(),
-                    "display_class": display_info.get("display_class"),
-                    "device_type": display_info.get("device_type"),
-                    "movement_state": display_info.get("movement_state"),
-                    "rf_motion_evidence": display_info.get("rf_motion_evidence", False),
-                    "rf_motion_reason": display_info.get("rf_motion_reason", ""),
-                    "classification_confidence": display_info.get("classification_confidence"),
-                    "classification_reason": display_info.get("classification_reason"),
-                    "grid_display_eligible": display_info.get("grid_display_eligible", False),
-                    "region_hint": region_info.get("region_hint"),
-                    "region_confidence": region_info.get("region_confidence"),
-                    "region_scanners": region_info.get("region_scanners", []),
-                    "region_reason": region_info.get("region_reason"),
-                    "phone_likelihood": round(t.phone_likelihood_score(), 2),
-                    "outside_likelihood": round(t.outside_likelihood_score(), 2),
-                    "mobile_service_score": round(t.mobile_service_score(), 2),
-                    "mobile_service_presence": t.mobile_service_presence(),
-                    "mobile_service_uuids": sorted(list(t.mobile_service_uuids or mobile_service_uuids_from_sigs(t.payload_sigs))),
-                    "mobile_service_packet_count": t.mobile_service_packet_count,
-                    "mobile_service_packet_ratio": round(t.mobile_service_packet_ratio(), 3),
-                    "mobile_service_reason": t.mobile_service_reason(),
-                    "background_mobile_service_score": round(t.background_mobile_service_score(), 2),
-                    "is_background_mobile_service": t.is_background_mobile_service(),
-                    "background_mobile_reason": t.background_mobile_reason(),
-                    "weak_flat_background_score": round(t.weak_flat_background_score(), 2),
-                    "is_weak_flat_background": t.is_weak_flat_background(),
-                    "weak_flat_background_reason": t.weak_flat_background_reason(),
-                    "strongest_margin_db": rounded_metric(t.strongest_margin_db()),
-                    "location_confidence": t.location_confidence()[0],
-                    "location_reason": t.location_confidence()[1],
-                    "pollution_suspect": polluted,
-                    "pollution_reason": pollution_reason,
-                    "polluted_family_debug": t.polluted_family_debug() if polluted else {"families": [], "divergent_pairs": []},
-                    "localizable": t.is_localizable(),
-                    "burst_count": t.burst_count,
-                    "last_burst_age_sec": round(t.last_burst_age_sec(), 2),
-                    "avg_burst_duration_sec": round(t.avg_burst_duration_sec(), 2),
-                    "avg_packets_per_burst": round(t.avg_packets_per_burst(), 2),
-                    "recent_burst_scanners": sorted(list(t.recent_burst_scanners())),
-                    "motion_slice_count": t.motion_slice_count(),
-                    "motion_slice_packets_current": t.motion_slice_packets,
-                    "motion_slice_history_packets": list(t.motion_slice_packet_counts),
-                    "last_known_scanner_rssi": dict(t.last_known_scanner_rssi),
-                    "last_known_num_scanners": len(t.last_known_scanner_visibility()),
-                    "last_known_strongest_scanner": strongest_scanner(t.last_known_scanner_rssi),
-                    "last_known_top2_scanners": sorted(list(top_scanners(t.last_known_scanner_rssi, 2))),
-                    "last_known_strongest_rssi": round(t.last_known_strongest_rssi_value(), 2) if t.last_known_strongest_rssi_value() is not None else None,
-                    "last_known_top2_avg_rssi": round(t.last_known_top2_avg_rssi_value(), 2) if t.last_known_top2_avg_rssi_value() is not None else None,
-                    "packets": t.packet_count,
-                    "num_macs": len(t.macs),
-                    "num_payloads": len(t.payload_sigs),
-                    "num_aliases": len(t.aliases),
-                    "num_scanners": len(t.scanner_visibility()),
-                    "age_sec": round(t.age_sec(), 2),
-                    "last_seen_age_sec": round(time.monotonic() - t.last_seen_mono, 2),
-                    "scanner_rssi": t.scanner_rssi(),
-                    "macs": sorted(list(t.macs))[:10],
-                    "payload_sigs": sorted(list(t.payload_sigs))[:10],
-                    "known_classes": sorted(list(t.known_classes())),
-                    "class_counts": dict(sorted(t.metadata_classes.items())),
-                    "alias_feature_count": len(t.alias_features),
-                    "identity_core_aliases": len(t.alias_features),
-                    "adv_interval_mean_ms": round(t.mean_adv_interval_ms(), 2) if t.mean_adv_interval_ms() is not None else None,
-                    "adv_interval_samples": t.adv_interval_sample_count(),
-                    "adv_interval_source": "scanner_local_same_alias_same_scanner",
-                    "strongest_scanner": strongest_scanner(t.scanner_rssi()),
-                    "top2_scanners": sorted(list(top_scanners(t.scanner_rssi(), 2))),
-                }
+                if weak_inactive_candidate:
+                    weak_memory_tracks.append(row)
+                else:
+                    tracks.append(row)
 
-                # Mobile-only grid/block localization. This uses the calibrated
-                # probabilistic RSSI fingerprint model and adds location_block /
-                # location_probability fields to the API row.
-                row.update(localize_track_to_grid(t))
+            return {
+                "enabled": TRACKER_ENABLED,
+                "tracks": tracks,
+                "weak_memory_tracks": weak_memory_tracks,
+                "num_tracks": len(tracks),
+                "num_weak_memory_tracks": len(weak_memory_tracks),
+                "num_matched": num_matched,
+                "next_cursor": next_cursor,
+                "query": {
+                    "filters": {name: sorted(query[name]) for name in DEVICES_API_FILTERS if query[name] is not None},
+                    "weak": query["weak"],
+                    "fields": fields,
+                    "sort": ("-" if desc else "") + sort,
+                    "limit": query["limit"],
+                },
+            }
+
+    def _build_snapshot(self) -> Dict[str, Any]:
+        with self.lock.held("snapshot"):
+            with self.lock.section("prune_stale"):
+                self._prune_stale_locked()
+            with self.lock.section("association_map"):
+                association_map = self._association_map_locked()
+            now = monotonic_now()
+            tracks = []
+            weak_memory_tracks = []
+            for uid, t in sorted(self.tracks.items()):
+                row, weak_inactive_candidate = self._snapshot_row_locked(t, now)
+                row["associated_tracks"] = association_map.get(uid, [])
 
                 if weak_inactive_candidate:
                     weak_memory_tracks.append(row)
                 else:
                     tracks.append(row)
+            rows = tracks + weak_memory_tracks
 
             return {
                 "enabled": TRACKER_ENABLED,
@@ -5471,11 +6944,11 @@ class DeviceTracker:
                 "outside_stable_tracks": sum(1 for t in self.tracks.values() if t.is_outside_stable_source()),
                 "stable_device_tracks": sum(1 for t in self.tracks.values() if t.is_stable_device()),
                 "mobile_service_tracks": sum(1 for t in self.tracks.values() if t.is_mobile_service_data_like()),
-                "background_mobile_tracks": sum(1 for t in self.tracks.values() if t.is_background_mobile_service()),
-                "pollution_suspect_tracks": sum(1 for t in self.tracks.values() if t.pollution_suspect()[0]),
-                "weak_flat_background_tracks": sum(1 for t in self.tracks.values() if t.is_weak_flat_background()),
+                "background_mobile_tracks": sum(1 for r in rows if r["is_background_mobile_service"]),
+                "pollution_suspect_tracks": sum(1 for r in rows if r["pollution_suspect"]),
+                "weak_flat_background_tracks": sum(1 for r in rows if r["is_weak_flat_background"]),
                 "display_class_counts": dict(sorted({
-                    cls: sum(1 for t in self.tracks.values() if t.display_classification().get("display_class") == cls)
+                    cls: sum(1 for r in rows if r["display_class"] == cls)
                     for cls in {
                         DISPLAY_CLASS_NEARBY_MOBILE,
                         DISPLAY_CLASS_MOBILE_CANDIDATE,
@@ -5492,6 +6965,9 @@ class DeviceTracker:
                     }
                 }.items())),
                 "last_merge_events": list(self.last_merge_events),
+                "merges_total": self.merges_total,
+                "snapshot_rows_reused": self.snapshot_rows_reused,
+                "snapshot_rows_rebuilt": self.snapshot_rows_rebuilt,
                 "presence_thresholds": {
                     "live_active_timeout_sec": LIVE_ACTIVE_TIMEOUT_SEC,
                     "identity_memory_sec": IDENTITY_MEMORY_SEC,
@@ -5727,12 +7203,14 @@ def save_calibration_results_locked() -> None:
     """
     Must be called with calib_lock held.
 
-    Writes two files:
+    Writes the session to the calibration store (one columnar file + index
+    entry) and, unless CALIBRATION_WRITE_LEGACY_CSV is off, appends to:
       1. calibration_raw.csv      -> every raw RSSI measurement
       2. calibration_summary.csv  -> per-scanner summary for the localization model
     """
     session_id = str(calib_state.get("session_id") or _new_calibration_session_id(calib_state.get("grid_block")))
     grid_block = str(calib_state.get("grid_block") or "")
+    room = str(calib_state.get("room") or CALIBRATION_DEFAULT_ROOM)
 
     raw_header = [
         "session_id",
@@ -5771,6 +7249,8 @@ def save_calibration_results_locked() -> None:
         "channel_label_is_real_ble_channel",
     ]
     summary_rows = []
+    store_raw_rows = []
+    store_summary_rows = []
 
     for s_id in sorted(calib_state["buckets"].keys(), key=str):
         rows = list(calib_state["buckets"].get(s_id, []))
@@ -5779,6 +7259,7 @@ def save_calibration_results_locked() -> None:
         complete = 1 if stats_row["n_samples"] >= SAMPLES_PER_SCANNER else 0
 
         for row in rows:
+            store_raw_rows.append(dict(row, scanner_id=s_id))
             raw_rows.append([
                 session_id,
                 grid_block,
@@ -5799,6 +7280,7 @@ def save_calibration_results_locked() -> None:
                 CHANNEL_LABEL_IS_REAL_BLE_CHANNEL,
             ])
 
+        store_summary_rows.append(dict(stats_row, scanner_id=s_id, complete=complete))
         summary_rows.append([
             session_id,
             grid_block,
@@ -5815,12 +7297,31 @@ def save_calibration_results_locked() -> None:
             CHANNEL_LABEL_IS_REAL_BLE_CHANNEL,
         ])
 
-    raw_path = _append_csv_row(CALIBRATION_RAW_CSV, raw_header, raw_rows)
-    summary_path = _append_csv_row(CALIBRATION_SUMMARY_CSV, summary_header, summary_rows)
-
     calib_state["active"] = False
-    print(f"[CALIB] Saved raw calibration samples to {raw_path}")
-    print(f"[CALIB] Saved calibration summary to {summary_path}")
+
+    if CALIBRATION_STORE_ENABLED:
+        try:
+            session_path = get_calibration_store().write_session(
+                {
+                    "session_id": session_id,
+                    "grid_block": grid_block,
+                    "room": room,
+                    "samples_per_scanner": SAMPLES_PER_SCANNER,
+                    "target": CALIBRATION_TARGET,
+                    "channel_label_is_real_ble_channel": CHANNEL_LABEL_IS_REAL_BLE_CHANNEL,
+                },
+                store_raw_rows,
+                store_summary_rows,
+            )
+            print(f"[CALIB] Saved calibration session to {session_path}")
+        except Exception as e:
+            print(f"[CALIB] Could not write calibration session to store: {e}")
+
+    if CALIBRATION_WRITE_LEGACY_CSV:
+        raw_path = _append_csv_row(CALIBRATION_RAW_CSV, raw_header, raw_rows)
+        summary_path = _append_csv_row(CALIBRATION_SUMMARY_CSV, summary_header, summary_rows)
+        print(f"[CALIB] Saved raw calibration samples to {raw_path}")
+        print(f"[CALIB] Saved calibration summary to {summary_path}")
     print("[CALIB] Use top_half_mean_rssi or median_rssi per scanner for grid-block localization.")
 
     # Stop scanners after calibration. This is a request to our own HTTP endpoint.
@@ -5933,12 +7434,14 @@ def process_final_event(ev: Dict[str, Any]) -> None:
     """
     Handles parsing, calibration, DeviceTracker assignment, and queueing for filtered peak events.
     """
-    parsed = parse_payload(ev["payload"])
+    with stage_timers.time("parse_payload"):
+        parsed = parse_payload(ev["payload"])
 
     update_calibration_if_needed(ev, parsed)
 
     if TRACKER_ENABLED:
-        ident = device_tracker.process_event(ev, parsed)
+        with stage_timers.time("process_event"):
+            ident = device_tracker.process_event(ev, parsed)
     else:
         sig = parsed.get("payload_sig", payload_signature(ev["payload"]))
         ident = {
@@ -5948,6 +7451,21 @@ def process_final_event(ev: Dict[str, Any]) -> None:
             "physical_label": "Alias only",
         }
 
+    peak_log = event_log_writers.get("peak")
+    if peak_log is not None:
+        peak_log.submit({
+            "mac": ev["mac"],
+            "rssi": ev["rssi"],
+            "channel": ev["channel"],
+            "scanner": ev["scanner"],
+            "payload": ev["payload"],
+            "ts": ev["ts"],
+            "rx_ts_us": ev.get("rx_ts_us"),
+            "name": parsed.get("name", ""),
+            "uid": ident["uid"],
+            "status": ident["status"],
+        })
+
     out = {
         "mac": ev["mac"],
         "rssi": ev["rssi"],
@@ -6011,7 +7529,34 @@ def process_final_event(ev: Dict[str, Any]) -> None:
         "localizable": ident.get("localizable", False),
     }
 
-    enqueue_stream_event_realtime(out)
+    with stage_timers.time("sse_enqueue"):
+        enqueue_stream_event_realtime(out)
+
+
+def window_peaks(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Reduces one window of raw events to its peaks:
+        (mac, payload) -> (scanner, channel) -> strongest RSSI event
+    """
+    # key: (mac, payload) -> {(scanner_id, channel): max_rssi_event}
+    uniques: Dict[Tuple[str, str], Dict[Tuple[str, int], Dict[str, Any]]] = {}
+
+    for ev in batch:
+        pk_key = (ev["mac"], ev["payload"])
+        obs_key = (ev["scanner"], ev["channel"])
+
+        if pk_key not in uniques:
+            uniques[pk_key] = {}
+
+        current = uniques[pk_key].get(obs_key)
+        if current is None or ev["rssi"] > current["rssi"]:
+            uniques[pk_key][obs_key] = ev
+
+    return [
+        peak_ev
+        for scanner_channel_peaks in uniques.values()
+        for peak_ev in scanner_channel_peaks.values()
+    ]
 
 
 def window_processor() -> None:
@@ -6049,33 +7594,32 @@ def window_processor() -> None:
         if not to_process:
             continue
 
+        if stage_timers.enabled:
+            released_us = time.monotonic_ns() // 1000
+            for ev in to_process:
+                rx_ts_us = ev.get("rx_ts_us")
+                if rx_ts_us:
+                    stage_timers.record_us("buffer_wait", released_us - rx_ts_us)
+                    stage_timers.record_us("safety_margin_wait", newest_ts - rx_ts_us)
+
         buckets: Dict[int, list] = defaultdict(list)
         for ev in to_process:
             bucket_idx = ev.get("rx_ts_us", ev["ts"]) // WINDOW_SIZE_US
             buckets[bucket_idx].append(ev)
 
         for idx in sorted(buckets.keys()):
-            batch = buckets[idx]
-
-            # key: (mac, payload) -> {(scanner_id, channel): max_rssi_event}
-            uniques: Dict[Tuple[str, str], Dict[Tuple[str, int], Dict[str, Any]]] = {}
-
-            for ev in batch:
-                pk_key = (ev["mac"], ev["payload"])
-                obs_key = (ev["scanner"], ev["channel"])
-
-                if pk_key not in uniques:
-                    uniques[pk_key] = {}
+            with stage_timers.time("window_peak"):
+                peaks = window_peaks(buckets[idx])
+            for peak_ev in peaks:
+                process_final_event(peak_ev)
+                with stats_lock:
+                    stats["processed_events"] += 1
 
-                current = uniques[pk_key].get(obs_key)
-                if current is None or ev["rssi"] > current["rssi"]:
-                    uniques[pk_key][obs_key] = ev
 
-            for scanner_channel_peaks in uniques.values():
-                for peak_ev in scanner_channel_peaks.values():
-                    process_final_event(peak_ev)
-                    with stats_lock:
-                        stats["processed_events"] += 1
+def tracker_expiry_loop() -> None:
+    while True:
+        time.sleep(TRACKER_EXPIRY_TICK_SEC)
+        device_tracker.expire_due()
 
 
 # ---------------- Flask routes ----------------
@@ -6103,36 +7647,50 @@ def ingest():
     bad = 0
     now_us = int(time.time() * 1_000_000)
     rx_batch_us = time.monotonic_ns() // 1000
+    t_parse = time.perf_counter()
 
-    with buffer_lock:
-        for ev in events:
-            try:
-                mac_raw = str(ev.get("a", ev.get("mac", ""))).upper().strip()
-                if not mac_raw:
-                    bad += 1
-                    continue
-
-                ts = safe_int(ev.get("ts", 0), 0)
-                if ts == 0:
-                    ts = now_us
-
-                rssi = safe_int(ev.get("r", ev.get("rssi", 0)), 0)
-                channel = safe_int(ev.get("c", ev.get("channel", 0)), 0)
-                payload = ev.get("p", ev.get("payload", "")) or ""
-
-                # Keep the JSON data as-is, but normalize internal field names.
-                event_buffer.append({
-                    "mac": mac_raw,
-                    "rssi": rssi,
-                    "channel": channel,
-                    "payload": payload,
-                    "ts": ts,                  # scanner-local timestamp, kept for logs/session compatibility
-                    "rx_ts_us": rx_batch_us + accepted,  # receiver-local monotonic timestamp for windowing/debug
-                    "scanner": scanner_id,
-                })
-                accepted += 1
-            except Exception:
+    # Normalize outside buffer_lock; the lock only covers the list extend.
+    batch = []
+    for ev in events:
+        try:
+            mac_raw = str(ev.get("a", ev.get("mac", ""))).upper().strip()
+            if not mac_raw:
                 bad += 1
+                continue
+
+            ts = safe_int(ev.get("ts", 0), 0)
+            if ts == 0:
+                ts = now_us
+
+            rssi = safe_int(ev.get("r", ev.get("rssi", 0)), 0)
+            channel = safe_int(ev.get("c", ev.get("channel", 0)), 0)
+            payload = ev.get("p", ev.get("payload", "")) or ""
+
+            # Keep the JSON data as-is, but normalize internal field names.
+            batch.append({
+                "mac": mac_raw,
+                "rssi": rssi,
+                "channel": channel,
+                "payload": payload,
+                "ts": ts,                  # scanner-local timestamp, kept for logs/session compatibility
+                "rx_ts_us": rx_batch_us + accepted,  # receiver-local monotonic timestamp for windowing/debug
+                "scanner": scanner_id,
+            })
+            accepted += 1
+        except Exception:
+            bad += 1
+
+    stage_timers.record("ingest_parse", time.perf_counter() - t_parse)
+
+    if batch:
+        with buffer_lock:
+            event_buffer.extend(batch)
+
+        raw_log = event_log_writers.get("raw")
+        if raw_log is not None:
+            # Event dicts are never mutated after ingest, so the writer thread
+            # can encode them later without copying here.
+            raw_log.submit_many(batch)
 
     with stats_lock:
         stats["ingest_events"] += accepted
@@ -6201,11 +7759,13 @@ def start_calib():
         }), 400
 
     session_id = _new_calibration_session_id(grid_block)
+    room = str(data.get("room") or "").strip() or CALIBRATION_DEFAULT_ROOM
 
     with calib_lock:
         calib_state.update({
             "active": True,
             "grid_block": grid_block,
+            "room": room,
             "session_id": session_id,
             "buckets": {},
             "last_progress_print": 0.0,
@@ -6213,7 +7773,7 @@ def start_calib():
 
     target_desc = f'name contains "{CALIBRATION_TARGET}"'
     print(
-        f"\n[*] Grid calibration started: block={grid_block} "
+        f"\n[*] Grid calibration started: block={grid_block} room={room} "
         f"session_id={session_id} target={target_desc} "
         f"samples_per_scanner={SAMPLES_PER_SCANNER}"
     )
@@ -6221,6 +7781,7 @@ def start_calib():
     return jsonify({
         "status": "Started",
         "grid_block": grid_block,
+        "room": room,
         "session_id": session_id,
         "target": CALIBRATION_TARGET,
         "samples_per_scanner": SAMPLES_PER_SCANNER,
@@ -6236,6 +7797,10 @@ def stream():
             try:
                 ev = data_queue.get(timeout=3)
                 yield f"data: {json.dumps(ev)}\n\n"
+                # The generator resumes only after the server has written the chunk.
+                rx_ts_us = ev.get("rx_ts_us")
+                if rx_ts_us:
+                    stage_timers.record_us("end_to_end", time.monotonic_ns() // 1000 - rx_ts_us)
             except queue.Empty:
                 yield ": heartbeat\n\n"
             except GeneratorExit:
@@ -6260,6 +7825,9 @@ def get_stats():
         if time.time() - d.get("last_seen", 0) < 30
     ])
     snapshot["tracker"] = tracker_snapshot
+    snapshot["event_log"] = event_log_status()
+    snapshot["latency"] = stage_timers.summary()
+    snapshot["tracker_lock"] = device_tracker.lock.report()
 
     with stats_lock:
         stats["tracker_tracks"] = tracker_snapshot["num_tracks"]
@@ -6276,13 +7844,80 @@ def get_stats():
         stats["tracker_pollution_suspect_tracks"] = tracker_snapshot.get("pollution_suspect_tracks", 0)
         stats["tracker_weak_flat_background_tracks"] = tracker_snapshot.get("weak_flat_background_tracks", 0)
 
-    return jsonify(snapshot)
+    return json_api_response(snapshot)
+
+
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Prometheus text exposition: per-stage latency histograms plus the receiver
+    counters from /api/stats (tracker_* entries are gauges).
+    """
+    with stats_lock:
+        cur = dict(stats)
+
+    lines = []
+    for key, value in cur.items():
+        if key.startswith("tracker_"):
+            name = f"ble_receiver_{key}"
+            lines.append(f"# TYPE {name} gauge")
+        else:
+            name = f"ble_receiver_{key}_total"
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+
+    for name, value in (
+        ("ble_receiver_buffer_size", len(event_buffer)),
+        ("ble_receiver_queue_size", data_queue.qsize()),
+    ):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    body = "\n".join(lines) + "\n" + stage_timers.prometheus_text()
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/debug/profile", methods=["GET"])
+def debug_profile():
+    if not DEBUG_PROFILE_ENABLED:
+        return jsonify({"status": "error", "message": "disabled_by_config"}), 404
+    if not DEBUG_PROFILE_ALLOW_REMOTE and request.remote_addr not in ("127.0.0.1", "::1"):
+        return jsonify({"status": "error", "message": "loopback_only"}), 403
+
+    seconds = min(max(safe_float(request.args.get("seconds"), 5.0), 0.1), DEBUG_PROFILE_MAX_SEC)
+    hz = min(max(safe_int(request.args.get("hz"), DEBUG_PROFILE_DEFAULT_HZ), 1), DEBUG_PROFILE_MAX_HZ)
+    thread_filter = request.args.get("thread") or None
+    include_lines = str(request.args.get("lines", "")).lower() in ("1", "true", "yes")
+    as_json = str(request.args.get("format", "")).lower() == "json"
+
+    if not debug_profile_lock.acquire(blocking=False):
+        return jsonify({"status": "error", "message": "a profile is already running"}), 409
+
+    try:
+        print(f"[PROFILE] Sampling {seconds:.1f}s at {hz} Hz" + (f" thread={thread_filter}" if thread_filter else ""))
+        result = sample_stacks(
+            seconds,
+            interval_s=1.0 / hz,
+            include_lines=include_lines,
+            thread_filter=thread_filter,
+        )
+    finally:
+        debug_profile_lock.release()
+
+    if as_json:
+        return jsonify(result)
+
+    resp = Response(collapsed_text(result["stacks"]), mimetype="text/plain")
+    resp.headers["Content-Disposition"] = f"attachment; filename=receiver_{datetime.now().strftime('%Y%m%d_%H%M%S')}.collapsed"
+    resp.headers["X-Profile-Samples"] = str(result["samples"])
+    resp.headers["X-Profile-Duration"] = str(result["duration_s"])
+    return resp
 
 
 @app.route("/api/localization", methods=["GET"])
 def get_localization():
     tracker_snapshot = device_tracker.snapshot()
-    return jsonify(make_json_safe(build_localization_api_payload(tracker_snapshot)))
+    return json_api_response(build_localization_api_payload(tracker_snapshot))
 
 
 @app.route("/localization", methods=["GET"])
@@ -6292,19 +7927,119 @@ def localization_dashboard():
 
 @app.route("/api/localization/reload", methods=["POST"])
 def reload_localization():
-    load_localization_fingerprints()
-    return jsonify(localization_status_for_api())
+    # Default is a background compile + atomic swap; ?wait=1 keeps the old
+    # synchronous behavior for scripts that want the result immediately.
+    if str(request.args.get("wait", "")).lower() in ("1", "true", "yes"):
+        if not claim_localization_reload():
+            return jsonify({"status": "reload_already_running", **localization_status_for_api()}), 409
+        try:
+            load_localization_fingerprints()
+        finally:
+            release_localization_reload()
+        return jsonify({"status": "reloaded", **localization_status_for_api()})
+
+    started = reload_localization_fingerprints_async()
+    status = "reload_started" if started else "reload_already_running"
+    return jsonify({"status": status, **localization_status_for_api()}), 202
+
+
+@app.route("/api/localization/build", methods=["POST"])
+def build_localization():
+    """
+    Build a fingerprint version from selected calibration store sessions.
+
+    Body (all optional): date_from, date_to, rooms, blocks, complete_only,
+    activate (default true), save (default false), wait.
+    """
+    data = request.get_json(silent=True) or {}
+    selection = calibration_selection_from_request(data)
+    activate = str(data.get("activate", True)).lower() not in ("0", "false", "no")
+    save = str(data.get("save", False)).lower() in ("1", "true", "yes")
+
+    if str(data.get("wait", request.args.get("wait", ""))).lower() in ("1", "true", "yes"):
+        if not claim_localization_reload():
+            return jsonify({"status": "reload_already_running", "selection": selection,
+                            **localization_status_for_api()}), 409
+        try:
+            built = build_localization_from_store(selection, activate, save)
+        finally:
+            release_localization_reload()
+        status = "built" if built else "build_failed"
+        return jsonify({"status": status, "selection": selection, **localization_status_for_api()}), (200 if built else 400)
+
+    started = build_localization_from_store_async(selection, activate, save)
+    status = "build_started" if started else "reload_already_running"
+    return jsonify({"status": status, "selection": selection, **localization_status_for_api()}), 202
+
+
+@app.route("/api/calibration/sessions", methods=["GET"])
+def get_calibration_sessions():
+    args = request.args.to_dict(flat=True)
+    for key in ("room", "block"):
+        values = request.args.getlist(key)
+        if len(values) > 1:
+            args[key] = values
+    selection = calibration_selection_from_request(args)
+    entries = get_calibration_store().select(
+        selection["date_from"],
+        selection["date_to"],
+        selection["rooms"],
+        selection["blocks"],
+        selection["complete_only"],
+    )
+    return jsonify({"selection": selection, "count": len(entries), "sessions": entries})
+
+
+@app.route("/api/localization/versions", methods=["GET"])
+def get_localization_versions():
+    return jsonify(localization_versions_for_api())
+
+
+@app.route("/api/localization/activate", methods=["POST"])
+def activate_localization():
+    data = request.get_json(silent=True) or {}
+    version_id = safe_int(data.get("version", request.args.get("version")), 0)
+    if not activate_localization_version(version_id):
+        return jsonify({"status": "error", "message": f"unknown version {version_id}"}), 404
+    return jsonify({"status": "activated", **localization_status_for_api()})
+
+
+@app.route("/api/localization/compare", methods=["GET"])
+def compare_localization():
+    """A/B compare two kept versions on live tracks. Defaults: active vs previous."""
+    versions = localization_versions_for_api()
+    active_id = versions.get("active_version")
+    others = [v["version"] for v in versions.get("versions", []) if v.get("version") != active_id]
+
+    a_id = request.args.get("a")
+    b_id = request.args.get("b")
+    version_a = get_localization_version(safe_int(a_id, 0) if a_id else active_id)
+    if b_id:
+        version_b = get_localization_version(safe_int(b_id, 0))
+    else:
+        version_b = get_localization_version(others[0]) if others else None
+    if version_a is None or version_b is None:
+        return jsonify({"status": "error", "message": "need two kept fingerprint versions to compare"}), 404
+
+    return json_api_response(compare_localization_versions(device_tracker, version_a, version_b))
 
 
 @app.route("/api/devices", methods=["GET"])
 def get_devices():
-    return jsonify(device_tracker.snapshot())
+    if not any(name in request.args for name in DEVICES_API_PARAMS):
+        return json_api_response(device_tracker.snapshot())
+    try:
+        query = devices_query_from_args(request.args)
+    except ValueError as exc:
+        return jsonify({"status": "error", "message": str(exc)}), 400
+    return json_api_response(device_tracker.query_devices(query))
 
 
 # ---------------- Background diagnostics ----------------
 
 def stats_reporter() -> None:
     last = None
+    last_latency_report = time.monotonic()
     while True:
         time.sleep(1.0)
         with stats_lock:
@@ -6350,6 +8085,16 @@ def stats_reporter() -> None:
                 f"scanners={alive}"
             )
 
+        if stage_timers.enabled and time.monotonic() - last_latency_report >= STAGE_METRICS_REPORT_SEC:
+            last_latency_report = time.monotonic()
+            parts = [
+                f"{name}={s['p50_ms']}/{s['p99_ms']}/{s['max_ms']}"
+                for name, s in stage_timers.interval_summary().items()
+                if s["count"]
+            ]
+            if parts:
+                print("[LATENCY] p50/p99/max ms " + " ".join(parts))
+
 
 def get_local_ip() -> str:
     """
@@ -6372,11 +8117,17 @@ if __name__ == "__main__":
     my_ip = get_local_ip()
     zc_instance = start_mdns(my_ip, 8000)
 
-    threading.Thread(target=window_processor, daemon=True).start()
-    threading.Thread(target=stats_reporter, daemon=True).start()
+    threading.Thread(target=window_processor, name="window_processor", daemon=True).start()
+    threading.Thread(target=stats_reporter, name="stats_reporter", daemon=True).start()
+    if TRACKER_ENABLED:
+        threading.Thread(target=tracker_expiry_loop, name="tracker_expiry", daemon=True).start()
+    if LOCALIZATION_AUTO_RELOAD:
+        threading.Thread(target=fingerprint_file_watcher, name="fingerprint_file_watcher", daemon=True).start()
+    start_event_log()
 
     try:
         app.run(host="0.0.0.0", port=8000, threaded=True)
     finally:
+        stop_event_log()
         zc_instance.unregister_all_services()
         zc_instance.close()
@@ -0,0 +1,259 @@
+"""
+position_tracker.py
+
+Recursive per-track position estimation for live BLE tracks.
+
+Grid placement in pc_receiver.py is recomputed from scratch over a 4 s RSSI
+window and then stabilized with hysteresis and a short display hold. This
+module keeps a small recursive state per track instead:
+
+- one scalar Kalman filter per scanner on RSSI (dBm), updated on every packet;
+- a 2-D constant-velocity Kalman filter on (x, y) in cm, fed at a bounded
+  cadence with a position fix computed from the filtered per-scanner RSSI.
+
+Every update is O(number of scanners) and reading the state is O(1), so
+localization code can report a smoothed live position without rescanning the
+observation window.
+
+Coordinate units: centimeters, same frame as localization_engine.SCANNER_POSITIONS_CM.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from localization_engine import corrected_rssi, relative_rssi, rssi_weights, weighted_centroid_3d
+
+
+# -----------------------------------------------------------------------------
+# Tuning
+# -----------------------------------------------------------------------------
+
+# Per-scanner RSSI filter. Measurement noise is the typical single-packet BLE
+# RSSI scatter; process noise lets the level follow a walking phone.
+RSSI_MEASUREMENT_STD_DB = 4.0
+RSSI_PROCESS_NOISE_DB2_PER_SEC = 6.0
+
+# Deep fades are common and one-sided. Live fingerprints use top-half means for
+# the same reason, so a packet far below the current level is trusted less.
+RSSI_FADE_INNOVATION_DB = -8.0
+RSSI_FADE_VARIANCE_SCALE = 6.0
+
+# Filtered scanner levels older than this are not used for position fixes.
+RSSI_MAX_AGE_SEC = 4.0
+POSITION_MIN_SCANNERS = 3
+
+# Position filter. Acceleration noise is for a person walking indoors.
+POSITION_ACCEL_NOISE_CM2_PER_S3 = 400.0
+POSITION_FIX_MIN_INTERVAL_SEC = 0.25
+# Position fixes from 3 scanners are much noisier than from 4.
+POSITION_FIX_STD_CM_BY_SCANNERS = {3: 90.0, 4: 60.0}
+POSITION_FIX_DEFAULT_STD_CM = 60.0
+# Silence longer than this restarts the position filter from the next fix.
+POSITION_RESET_AFTER_SEC = 10.0
+POSITION_MOVING_SPEED_CM_S = 25.0
+
+# Position fix callback: filtered RSSI by scanner -> (x_cm, y_cm, std_cm) or None.
+PositionFixFn = Callable[[Dict[str, float]], Optional[Tuple[float, float, Optional[float]]]]
+
+
+# -----------------------------------------------------------------------------
+# Filters
+# -----------------------------------------------------------------------------
+
+class RssiKalman:
+    """Scalar random-walk Kalman filter on one scanner's RSSI."""
+
+    __slots__ = ("level", "var", "last_mono", "updates")
+
+    def __init__(self) -> None:
+        self.level = 0.0
+        self.var = 0.0
+        self.last_mono = 0.0
+        self.updates = 0
+
+    def update(self, now_mono: float, rssi: float) -> None:
+        r = RSSI_MEASUREMENT_STD_DB * RSSI_MEASUREMENT_STD_DB
+        if self.updates == 0:
+            self.level = float(rssi)
+            self.var = r
+            self.last_mono = now_mono
+            self.updates = 1
+            return
+
+        dt = max(0.0, now_mono - self.last_mono)
+        self.var += RSSI_PROCESS_NOISE_DB2_PER_SEC * dt
+
+        innovation = float(rssi) - self.level
+        if innovation < RSSI_FADE_INNOVATION_DB:
+            r *= RSSI_FADE_VARIANCE_SCALE
+
+        gain = self.var / (self.var + r)
+        self.level += gain * innovation
+        self.var *= (1.0 - gain)
+        self.last_mono = now_mono
+        self.updates += 1
+
+
+class _AxisKalman:
+    """Constant-velocity Kalman filter on one axis: state (pos, vel)."""
+
+    __slots__ = ("pos", "vel", "p00", "p01", "p11")
+
+    def __init__(self, pos: float, var: float) -> None:
+        self.pos = pos
+        self.vel = 0.0
+        self.p00 = var
+        self.p01 = 0.0
+        # Unknown initial velocity: allow roughly walking speed.
+        self.p11 = 100.0 * 100.0
+
+    def predict(self, dt: float) -> None:
+        if dt <= 0.0:
+            return
+        q = POSITION_ACCEL_NOISE_CM2_PER_S3
+        self.pos += self.vel * dt
+        p00 = self.p00 + dt * (2.0 * self.p01 + dt * self.p11)
+        p01 = self.p01 + dt * self.p11
+        self.p00 = p00 + q * dt ** 3 / 3.0
+        self.p01 = p01 + q * dt ** 2 / 2.0
+        self.p11 = self.p11 + q * dt
+
+    def update(self, z: float, r: float) -> None:
+        s = self.p00 + r
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        innovation = z - self.pos
+        self.pos += k0 * innovation
+        self.vel += k1 * innovation
+        p00, p01, p11 = self.p00, self.p01, self.p11
+        self.p00 = (1.0 - k0) * p00
+        self.p01 = (1.0 - k0) * p01
+        self.p11 = p11 - k1 * p01
+
+
+def centroid_position_fix(filtered_rssi: Dict[str, float]) -> Optional[Tuple[float, float, Optional[float]]]:
+    """Default position fix: localization_engine's relative-RSSI weighted centroid."""
+    pos = weighted_centroid_3d(rssi_weights(relative_rssi(corrected_rssi(filtered_rssi))))
+    if pos is None:
+        return None
+    return pos["x_cm"], pos["y_cm"], None
+
+
+class TrackPositionEstimator:
+    """
+    Per-track recursive position state.
+
+    update() is called for every accepted packet. state() returns the last
+    estimate without touching the observation window.
+    """
+
+    __slots__ = ("scanners", "x", "y", "last_fix_mono", "fix_count", "fix_scanners", "last_fix_source")
+
+    def __init__(self) -> None:
+        self.scanners: Dict[str, RssiKalman] = {}
+        self.x: Optional[_AxisKalman] = None
+        self.y: Optional[_AxisKalman] = None
+        self.last_fix_mono = 0.0
+        self.fix_count = 0
+        self.fix_scanners = 0
+        self.last_fix_source = ""
+
+    def update(self, now_mono: float, scanner: str, rssi: float, fix_fn: Optional[PositionFixFn] = None) -> None:
+        filt = self.scanners.get(scanner)
+        if filt is None:
+            filt = RssiKalman()
+            self.scanners[scanner] = filt
+        filt.update(now_mono, rssi)
+
+        if now_mono - self.last_fix_mono < POSITION_FIX_MIN_INTERVAL_SEC:
+            return
+
+        fresh = self.filtered_rssi(now_mono)
+        if len(fresh) < POSITION_MIN_SCANNERS:
+            return
+
+        fix = None
+        source = "centroid"
+        if fix_fn is not None:
+            try:
+                fix = fix_fn(fresh)
+                source = "custom"
+            except Exception:
+                fix = None
+        if fix is None:
+            fix = centroid_position_fix(fresh)
+            source = "centroid"
+        if fix is None:
+            return
+
+        fx, fy, fstd = fix
+        std = fstd if fstd is not None else POSITION_FIX_STD_CM_BY_SCANNERS.get(len(fresh), POSITION_FIX_DEFAULT_STD_CM)
+        r = float(std) * float(std)
+
+        if self.x is None or self.y is None or now_mono - self.last_fix_mono > POSITION_RESET_AFTER_SEC:
+            self.x = _AxisKalman(float(fx), r)
+            self.y = _AxisKalman(float(fy), r)
+        else:
+            dt = now_mono - self.last_fix_mono
+            self.x.predict(dt)
+            self.y.predict(dt)
+            self.x.update(float(fx), r)
+            self.y.update(float(fy), r)
+
+        self.last_fix_mono = now_mono
+        self.fix_count += 1
+        self.fix_scanners = len(fresh)
+        self.last_fix_source = source
+
+    def filtered_rssi(self, now_mono: float) -> Dict[str, float]:
+        return {
+            sid: filt.level
+            for sid, filt in self.scanners.items()
+            if filt.updates > 0 and now_mono - filt.last_mono <= RSSI_MAX_AGE_SEC
+        }
+
+    def absorb(self, other: "TrackPositionEstimator") -> None:
+        """Keep the fresher per-scanner and position state after a track merge."""
+        for sid, filt in other.scanners.items():
+            mine = self.scanners.get(sid)
+            if mine is None or filt.last_mono > mine.last_mono:
+                self.scanners[sid] = filt
+        if other.x is not None and other.last_fix_mono > self.last_fix_mono:
+            self.x = other.x
+            self.y = other.y
+            self.last_fix_mono = other.last_fix_mono
+            self.fix_scanners = other.fix_scanners
+            self.last_fix_source = other.last_fix_source
+        self.fix_count += other.fix_count
+
+    def state(self, now_mono: float) -> Dict[str, Any]:
+        if self.x is None or self.y is None:
+            return {"enabled": False, "reason": "no_position_fix_yet"}
+
+        age = max(0.0, now_mono - self.last_fix_mono)
+        speed = math.hypot(self.x.vel, self.y.vel)
+        return {
+            "enabled": True,
+            "method": "rssi_kalman_cv_position",
+            "units": "cm",
+            "x_cm": round(self.x.pos, 2),
+            "y_cm": round(self.y.pos, 2),
+            "vx_cm_s": round(self.x.vel, 2),
+            "vy_cm_s": round(self.y.vel, 2),
+            "speed_cm_s": round(speed, 2),
+            "moving": bool(speed >= POSITION_MOVING_SPEED_CM_S),
+            "std_x_cm": round(math.sqrt(max(0.0, self.x.p00)), 2),
+            "std_y_cm": round(math.sqrt(max(0.0, self.y.p00)), 2),
+            "age_sec": round(age, 3),
+            "is_stale": bool(age > RSSI_MAX_AGE_SEC),
+            "fix_count": self.fix_count,
+            "fix_scanners": self.fix_scanners,
+            "fix_source": self.last_fix_source,
+            "filtered_rssi": {
+                sid: round(filt.level, 2)
+                for sid, filt in sorted(self.scanners.items())
+                if now_mono - filt.last_mono <= RSSI_MAX_AGE_SEC
+            },
+        }
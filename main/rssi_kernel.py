@@ -0,0 +1,176 @@
+"""
+rssi_kernel.py
+
+Pairwise distances between per-scanner RSSI fingerprints (scanner -> dBm
+dicts), one-vs-many or many-vs-many.
+
+pairwise_distances(a_maps, b_maps) lays both sides out as a dense
+rows x scanners matrix (NaN where a row has no reading for a scanner) and
+computes, for every (a, b) pair, the same values as the tracker's dict helpers:
+    rel       rmse_common(relative_vector(a), relative_vector(b))
+    abs       rmse_common(a, b)
+    max_diff  max_abs_rssi_diff_common(a, b)
+    common    number of scanners both rows have
+
+Pairs without a common scanner get NaN for the three distances. The gates
+(exceeds(), the argmin/max helpers) run on the whole result instead of one
+pair at a time.
+
+With NumPy the kernel is vectorized over all pairs; it can differ from the
+dict helpers in the last bit (NumPy squares with a multiply, Python's ** 2
+goes through pow()), which no gate threshold is sensitive to. Below
+NUMPY_MIN_PAIRS pairs, or without NumPy, a pure-Python loop gives exactly the
+dict helpers' values.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Smallest n x m batch worth converting the maps to matrices for.
+NUMPY_MIN_PAIRS = 48
+
+Distance = Tuple[Optional[float], Optional[float], Optional[float], int]
+
+
+def _opt(value: float) -> Optional[float]:
+    return None if math.isnan(value) else float(value)
+
+
+class RssiDistances:
+    """n x m pair metrics; NumPy arrays or nested lists with the same indexing."""
+
+    __slots__ = ("rel", "abs", "max_diff", "common", "shape")
+
+    def __init__(self, rel, absr, max_diff, common, shape: Tuple[int, int]) -> None:
+        self.rel = rel
+        self.abs = absr
+        self.max_diff = max_diff
+        self.common = common
+        self.shape = shape
+
+    def pair(self, i: int, j: int) -> Distance:
+        """(rel, abs, max_diff, common) of one pair, None where undefined."""
+        return (
+            _opt(self.rel[i][j]),
+            _opt(self.abs[i][j]),
+            _opt(self.max_diff[i][j]),
+            int(self.common[i][j]),
+        )
+
+    def exceeds(self, rel_limit: float, abs_limit: float, diff_limit: float,
+                min_common: int) -> List[List[bool]]:
+        """
+        Pairs with at least min_common common scanners where any distance is
+        >= its limit (the pollution/split "diverges" gate).
+        """
+        if np is not None and isinstance(self.rel, np.ndarray):
+            with np.errstate(invalid="ignore"):
+                mask = (self.common >= min_common) & (
+                    (self.rel >= rel_limit) | (self.abs >= abs_limit) | (self.max_diff >= diff_limit)
+                )
+            return mask.tolist()
+        n, m = self.shape
+        return [
+            [
+                self.common[i][j] >= min_common and (
+                    self.rel[i][j] >= rel_limit or
+                    self.abs[i][j] >= abs_limit or
+                    self.max_diff[i][j] >= diff_limit
+                )
+                for j in range(m)
+            ]
+            for i in range(n)
+        ]
+
+
+def _relative(rssi_map: Dict[str, float]) -> Dict[str, float]:
+    if not rssi_map:
+        return {}
+    mx = max(rssi_map.values())
+    return {k: v - mx for k, v in rssi_map.items()}
+
+
+def _pairwise_python(a_maps: Sequence[Dict[str, float]], b_maps: Sequence[Dict[str, float]]) -> RssiDistances:
+    nan = math.nan
+    a_rel = [_relative(m) for m in a_maps]
+    b_rel = [_relative(m) for m in b_maps]
+    rel_rows, abs_rows, diff_rows, common_rows = [], [], [], []
+    for a, ar in zip(a_maps, a_rel):
+        rel_row, abs_row, diff_row, common_row = [], [], [], []
+        for b, br in zip(b_maps, b_rel):
+            common = sorted(a.keys() & b.keys())
+            common_row.append(len(common))
+            if not common:
+                rel_row.append(nan)
+                abs_row.append(nan)
+                diff_row.append(nan)
+                continue
+            rel_row.append(math.sqrt(sum([(ar[k] - br[k]) ** 2 for k in common]) / len(common)))
+            abs_row.append(math.sqrt(sum([(a[k] - b[k]) ** 2 for k in common]) / len(common)))
+            diff_row.append(max(abs(a[k] - b[k]) for k in common))
+        rel_rows.append(rel_row)
+        abs_rows.append(abs_row)
+        diff_rows.append(diff_row)
+        common_rows.append(common_row)
+    return RssiDistances(rel_rows, abs_rows, diff_rows, common_rows, (len(a_maps), len(b_maps)))
+
+
+def _dense(maps: Sequence[Dict[str, float]], index: Dict[str, int]) -> "np.ndarray":
+    out = np.full((len(maps), len(index)), np.nan)
+    for r, rssi_map in enumerate(maps):
+        for scanner, value in rssi_map.items():
+            out[r, index[scanner]] = value
+    return out
+
+
+def _pairwise_numpy(a_maps: Sequence[Dict[str, float]], b_maps: Sequence[Dict[str, float]]) -> RssiDistances:
+    scanners = sorted(set().union(*a_maps, *b_maps))
+    index = {s: i for i, s in enumerate(scanners)}
+    a = _dense(a_maps, index)
+    b = _dense(b_maps, index)
+    n, m = len(a_maps), len(b_maps)
+    if not scanners:
+        nan = np.full((n, m), np.nan)
+        return RssiDistances(nan, nan.copy(), nan.copy(), np.zeros((n, m), dtype=np.int64), (n, m))
+
+    a_rel = a - np.where(np.isnan(a), -np.inf, a).max(axis=1, keepdims=True)
+    b_rel = b - np.where(np.isnan(b), -np.inf, b).max(axis=1, keepdims=True)
+
+    # (a, b, scanner); NaN wherever either side lacks the scanner.
+    d = a[:, None, :] - b[None, :, :]
+    d_rel = a_rel[:, None, :] - b_rel[None, :, :]
+    valid = ~np.isnan(d)
+
+    common = valid.sum(axis=2)
+    abs_sq = np.where(valid, d * d, 0.0).sum(axis=2)
+    rel_sq = np.where(valid, d_rel * d_rel, 0.0).sum(axis=2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        absr = np.sqrt(abs_sq / common)
+        rel = np.sqrt(rel_sq / common)
+    max_diff = np.where(valid, np.abs(d), -np.inf).max(axis=2)
+    max_diff[common == 0] = np.nan
+    return RssiDistances(rel, absr, max_diff, common, (n, m))
+
+
+def pairwise_distances(a_maps: Sequence[Dict[str, float]],
+                       b_maps: Optional[Sequence[Dict[str, float]]] = None) -> RssiDistances:
+    """All (a, b) pair metrics; b_maps defaults to a_maps (many-vs-many)."""
+    if b_maps is None:
+        b_maps = a_maps
+    if np is not None and len(a_maps) * len(b_maps) >= NUMPY_MIN_PAIRS:
+        return _pairwise_numpy(a_maps, b_maps)
+    return _pairwise_python(a_maps, b_maps)
+
+
+def one_vs_many(rssi_map: Dict[str, float], maps: Sequence[Dict[str, float]]) -> List[Distance]:
+    """(rel, abs, max_diff, common) of rssi_map against each of maps."""
+    dist = pairwise_distances(maps, [rssi_map])
+    return [dist.pair(j, 0) for j in range(len(maps))]
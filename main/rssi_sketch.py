@@ -0,0 +1,179 @@
+"""
+rssi_sketch.py
+
+Fixed-bin RSSI histogram for per-scanner fingerprints.
+
+An RssiSketch counts samples in 1 dB bins over the whole int8 range the
+receiver stores (obs_window.clamp_rssi, -128..127 dBm), so a phone held at a
+scanner or a reading below -100 dBm keeps its own bin. BLE RSSI values are
+integers, so the statistics below are exactly those of the raw sample list.
+Only the bins between the weakest and strongest sample are allocated.
+    add()              O(1)
+    merge()            O(occupied span), independent of the number of samples
+    top_half_mean()    same statistic as sorting and averaging the top half
+    percentile(), median(), mean(), std()
+
+Unlike a bounded sample list, a sketch has no "oldest sample" to evict. Use it
+where the samples of a span are summarized as a whole (a burst, a retired
+payload family); decay() ages a long-running sketch instead.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Iterable, Optional, Tuple
+
+RSSI_SKETCH_MIN = -128
+RSSI_SKETCH_MAX = 127
+RSSI_SKETCH_BINS = RSSI_SKETCH_MAX - RSSI_SKETCH_MIN + 1
+
+
+class RssiSketch:
+    # counts only covers the bins from lo to the strongest sample seen so
+    # far (a burst spans a few dozen dB), growing at either end as needed,
+    # so an idle sketch costs bytes, not a 256-bin table.
+    __slots__ = ("counts", "total", "lo")
+
+    def __init__(self, values: Iterable[int] = ()) -> None:
+        self.counts = array("I")
+        self.total = 0
+        self.lo = 0
+        for v in values:
+            self.add(v)
+
+    @staticmethod
+    def _bin(rssi: int) -> int:
+        return max(RSSI_SKETCH_MIN, min(RSSI_SKETCH_MAX, int(rssi))) - RSSI_SKETCH_MIN
+
+    def _cover(self, lo: int, hi: int) -> None:
+        """Grow counts so it covers bins lo..hi."""
+        counts = self.counts
+        if not counts:
+            self.counts = array("I", bytes(4 * (hi - lo + 1)))
+            self.lo = lo
+            return
+        if lo < self.lo:
+            self.counts = array("I", bytes(4 * (self.lo - lo))) + counts
+            self.lo = lo
+        top = self.lo + len(self.counts) - 1
+        if hi > top:
+            self.counts.extend(array("I", bytes(4 * (hi - top))))
+
+    def add(self, rssi: int, n: int = 1) -> None:
+        i = self._bin(rssi)
+        j = i - self.lo
+        if not self.counts or j < 0 or j >= len(self.counts):
+            self._cover(i, i)
+            j = i - self.lo
+        self.counts[j] += n
+        self.total += n
+
+    def merge(self, other: "RssiSketch") -> None:
+        if not other.total:
+            return
+        other_counts = other.counts
+        self._cover(other.lo, other.lo + len(other_counts) - 1)
+        counts = self.counts
+        base = other.lo - self.lo
+        for j, n in enumerate(other_counts):
+            if n:
+                counts[base + j] += n
+        self.total += other.total
+
+    def copy(self) -> "RssiSketch":
+        out = RssiSketch()
+        out.counts = array("I", self.counts)
+        out.total = self.total
+        out.lo = self.lo
+        return out
+
+    def decay(self, factor: float) -> None:
+        """Scale every count by factor (0..1), rounding down."""
+        counts = self.counts
+        total = 0
+        for j, n in enumerate(counts):
+            if n:
+                n = int(n * factor)
+                counts[j] = n
+                total += n
+        self.total = total
+        if not total:
+            self.counts = array("I")
+
+    def _occupied(self) -> Iterable[Tuple[int, int]]:
+        """(rssi, count) of the non-empty bins, weakest first."""
+        base = self.lo + RSSI_SKETCH_MIN
+        for j, n in enumerate(self.counts):
+            if n:
+                yield base + j, n
+
+    def __len__(self) -> int:
+        return self.total
+
+    def __bool__(self) -> bool:
+        return self.total > 0
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def _value_at(self, rank: int) -> int:
+        """RSSI of the rank-th weakest sample (0-based)."""
+        seen = 0
+        for rssi, n in self._occupied():
+            seen += n
+            if seen > rank:
+                return rssi
+        return RSSI_SKETCH_MAX
+
+    def top_half_mean(self) -> Optional[float]:
+        """Mean of the strongest half of the samples (at least one)."""
+        if self.total <= 0:
+            return None
+        keep_n = max(1, self.total // 2)
+        taken = 0
+        acc = 0
+        counts = self.counts
+        base = self.lo + RSSI_SKETCH_MIN
+        for j in range(len(counts) - 1, -1, -1):
+            n = counts[j]
+            if not n:
+                continue
+            n = min(n, keep_n - taken)
+            acc += (base + j) * n
+            taken += n
+            if taken >= keep_n:
+                break
+        return acc / keep_n
+
+    def percentile(self, q: float) -> Optional[int]:
+        """Nearest-rank percentile, q in 0..1 (0.9 is a strong-RSSI percentile)."""
+        if self.total <= 0:
+            return None
+        rank = min(self.total - 1, max(0, math.ceil(q * self.total) - 1))
+        return self._value_at(rank)
+
+    def median(self) -> Optional[float]:
+        if self.total <= 0:
+            return None
+        mid = self.total // 2
+        if self.total % 2:
+            return float(self._value_at(mid))
+        return (self._value_at(mid - 1) + self._value_at(mid)) / 2.0
+
+    def mean(self) -> Optional[float]:
+        if self.total <= 0:
+            return None
+        acc = sum(rssi * n for rssi, n in self._occupied())
+        return acc / self.total
+
+    def std(self) -> Optional[float]:
+        """Sample standard deviation (n - 1), 0.0 for a single sample."""
+        mean = self.mean()
+        if mean is None:
+            return None
+        if self.total == 1:
+            return 0.0
+        acc = sum((rssi - mean) ** 2 * n for rssi, n in self._occupied())
+        return math.sqrt(acc / (self.total - 1))
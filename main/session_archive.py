@@ -0,0 +1,423 @@
+"""
+session_archive.py
+
+Columnar archive format for recorded BLE sessions (.blesa).
+
+Pretty-printed session JSON repeats every key for every event and stores the
+advertisement payload as base64 text each time. The archive keeps the same
+information column by column:
+
+- mac, scanner, name and payload are dictionary encoded (one global
+  dictionary per column, events store integer codes);
+- ts is delta encoded per block (int64 deltas from the previous event's
+  ts, starting from ts_first);
+- rssi is int8, channel is int16;
+- every column of every block is zlib-compressed on its own;
+- a block index (ts range, byte offsets) lets readers decode only the blocks
+  that overlap a requested time range.
+
+File layout:
+
+    MAGIC
+    block 0: column blobs back to back
+    block 1: ...
+    footer: zlib(JSON) with meta, dictionaries and the block index
+    trailer: <footer offset u64><footer length u32> MAGIC
+
+Reading the session back through session_reader.iter_session_events() gives
+the same SessionEvent records as the original JSON. Only the standard event
+fields (mac, rssi, channel, scanner, ts, name, payload) are archived; extra
+per-event keys some older captures carry (uid, status, dna) are dropped.
+
+Usage:
+    python session_archive.py convert session_20260522_172736.zip session_20260522_172736.blesa
+    python session_archive.py info session_20260522_172736.blesa
+    python session_archive.py export session.blesa out.json --from-us 1779456332000000 --to-us 1779456400000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # iter_block_columns() then yields array-module columns
+    np = None
+
+
+ARCHIVE_SUFFIX = ".blesa"
+MAGIC = b"BLESA\x01"
+FORMAT_VERSION = 1
+TRAILER = struct.Struct("<QI")
+
+DEFAULT_BLOCK_EVENTS = 8192
+COMPRESS_LEVEL = 6
+
+# (column, array typecode). Order is the on-disk order inside a block.
+COLUMNS = [
+    ("ts_delta", "q"),
+    ("rssi", "b"),
+    ("channel", "h"),
+    ("mac", "I"),
+    ("scanner", "I"),
+    ("name", "I"),
+    ("payload", "I"),
+]
+DICT_COLUMNS = ("mac", "scanner", "name", "payload")
+
+_SWAP = sys.byteorder != "little"
+
+
+def is_archive(path: Any) -> bool:
+    path = Path(path)
+    if path.suffix.lower() == ARCHIVE_SUFFIX:
+        return True
+    try:
+        with path.open("rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (OSError, IsADirectoryError):
+        return False
+
+
+def _pack(values: array) -> bytes:
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return zlib.compress(values.tobytes(), COMPRESS_LEVEL)
+
+
+def _unpack(blob: bytes, typecode: str) -> array:
+    values = array(typecode)
+    values.frombytes(zlib.decompress(blob))
+    if _SWAP:
+        values.byteswap()
+    return values
+
+
+# -----------------------------------------------------------------------------
+# Writer
+# -----------------------------------------------------------------------------
+
+class SessionArchiveWriter:
+    """
+    Streaming .blesa writer. Memory is one block of events plus the dictionaries.
+
+    append() takes session event dicts (mac, rssi, channel, scanner, ts, name,
+    payload) or session_reader.SessionEvent records.
+    """
+
+    def __init__(self, path: Any, meta: Optional[Dict[str, Any]] = None, block_events: int = DEFAULT_BLOCK_EVENTS) -> None:
+        self.path = Path(path)
+        self.meta = dict(meta or {})
+        self.block_events = max(1, int(block_events))
+        self._tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._f = self._tmp_path.open("wb")
+        self._f.write(MAGIC)
+
+        self._dicts: Dict[str, List[str]] = {c: [] for c in DICT_COLUMNS}
+        self._codes: Dict[str, Dict[str, int]] = {c: {} for c in DICT_COLUMNS}
+        self._blocks: List[Dict[str, Any]] = []
+        self.n_events = 0
+        self._reset_block()
+
+    def _reset_block(self) -> None:
+        self._ts: List[int] = []
+        self._cols: Dict[str, array] = {name: array(tc) for name, tc in COLUMNS if name != "ts_delta"}
+
+    def _code(self, column: str, value: Any) -> int:
+        key = "" if value is None else str(value)
+        codes = self._codes[column]
+        code = codes.get(key)
+        if code is None:
+            code = len(self._dicts[column])
+            codes[key] = code
+            self._dicts[column].append(key)
+        return code
+
+    def append(self, ev: Any) -> None:
+        if isinstance(ev, dict):
+            get = ev.get
+        else:
+            get = lambda key, default=None: getattr(ev, key, default)  # noqa: E731
+
+        try:
+            ts = int(get("ts", 0) or 0)
+        except (TypeError, ValueError):
+            ts = 0
+        try:
+            rssi = int(get("rssi", 0) or 0)
+        except (TypeError, ValueError):
+            rssi = 0
+        try:
+            channel = int(get("channel", 0) or 0)
+        except (TypeError, ValueError):
+            channel = 0
+
+        self._ts.append(ts)
+        self._cols["rssi"].append(max(-128, min(127, rssi)))
+        self._cols["channel"].append(max(-32768, min(32767, channel)))
+        self._cols["mac"].append(self._code("mac", str(get("mac", "") or "").upper()))
+        self._cols["scanner"].append(self._code("scanner", get("scanner", "")))
+        self._cols["name"].append(self._code("name", get("name", "")))
+        self._cols["payload"].append(self._code("payload", get("payload", "")))
+
+        if len(self._ts) >= self.block_events:
+            self._flush_block()
+
+    def extend(self, events: Iterable[Any]) -> None:
+        for ev in events:
+            self.append(ev)
+
+    def _flush_block(self) -> None:
+        n = len(self._ts)
+        if n == 0:
+            return
+        ts_first = self._ts[0]
+        deltas = array("q", [0] * n)
+        prev = ts_first
+        for i, ts in enumerate(self._ts):
+            deltas[i] = ts - prev
+            prev = ts
+
+        blobs = [_pack(deltas)] + [_pack(self._cols[name]) for name, _ in COLUMNS[1:]]
+        offset = self._f.tell()
+        for blob in blobs:
+            self._f.write(blob)
+
+        self._blocks.append({
+            "n": n,
+            "ts_first": ts_first,
+            "ts_min": min(self._ts),
+            "ts_max": max(self._ts),
+            "offset": offset,
+            "sizes": [len(blob) for blob in blobs],
+        })
+        self.n_events += n
+        self._reset_block()
+
+    def close(self) -> Path:
+        """Write the last block and footer, then move the file into place."""
+        if self._f is None:
+            return self.path
+        self._flush_block()
+        footer = {
+            "format": "blesa",
+            "version": FORMAT_VERSION,
+            "meta": self.meta,
+            "n_events": self.n_events,
+            "block_events": self.block_events,
+            "columns": [[name, tc] for name, tc in COLUMNS],
+            "dicts": self._dicts,
+            "blocks": self._blocks,
+        }
+        blob = zlib.compress(json.dumps(footer, separators=(",", ":")).encode("utf-8"), COMPRESS_LEVEL)
+        offset = self._f.tell()
+        self._f.write(blob)
+        self._f.write(TRAILER.pack(offset, len(blob)))
+        self._f.write(MAGIC)
+        self._f.close()
+        self._f = None
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def __enter__(self) -> "SessionArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        elif self._f is not None:
+            self._f.close()
+            self._f = None
+            try:
+                self._tmp_path.unlink()
+            except OSError:
+                pass
+
+
+def convert_session(src: Any, dst: Any, member: Optional[str] = None, block_events: int = DEFAULT_BLOCK_EVENTS) -> int:
+    """Stream any session_reader input into a .blesa archive. Returns the event count."""
+    from session_reader import iter_raw_events
+
+    meta: Dict[str, Any] = {}
+    events = iter_raw_events(src, member, meta)
+    first = next(events, None)
+    with SessionArchiveWriter(dst, meta, block_events) as writer:
+        if first is not None:
+            writer.append(first)
+            writer.extend(events)
+        writer.meta = dict(meta)
+    return writer.n_events
+
+
+# -----------------------------------------------------------------------------
+# Reader
+# -----------------------------------------------------------------------------
+
+class SessionArchive:
+    """Random-access reader. Only the footer is read on open."""
+
+    def __init__(self, path: Any) -> None:
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a session archive")
+            f.seek(-(TRAILER.size + len(MAGIC)), os.SEEK_END)
+            offset, length = TRAILER.unpack(f.read(TRAILER.size))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is truncated (no trailer)")
+            f.seek(offset)
+            footer = json.loads(zlib.decompress(f.read(length)).decode("utf-8"))
+
+        if footer.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported session archive version {footer.get('version')}")
+        self.meta: Dict[str, Any] = footer.get("meta", {}) or {}
+        self.n_events = int(footer.get("n_events", 0) or 0)
+        self.blocks: List[Dict[str, Any]] = footer.get("blocks", []) or []
+        self.dicts: Dict[str, List[str]] = footer.get("dicts", {}) or {}
+        self.columns = [(str(name), str(tc)) for name, tc in footer.get("columns", COLUMNS)]
+
+    def time_range(self) -> Optional[tuple]:
+        if not self.blocks:
+            return None
+        return min(b["ts_min"] for b in self.blocks), max(b["ts_max"] for b in self.blocks)
+
+    def blocks_for_range(self, t_start_us: Optional[int] = None, t_end_us: Optional[int] = None) -> List[int]:
+        out = []
+        for i, block in enumerate(self.blocks):
+            if t_start_us is not None and block["ts_max"] < t_start_us:
+                continue
+            if t_end_us is not None and block["ts_min"] > t_end_us:
+                continue
+            out.append(i)
+        return out
+
+    def _read_block(self, f: Any, index: int, wanted: Optional[Iterable[str]] = None) -> Dict[str, array]:
+        block = self.blocks[index]
+        wanted_set = set(wanted) if wanted is not None else None
+        out: Dict[str, array] = {}
+        pos = block["offset"]
+        for (name, tc), size in zip(self.columns, block["sizes"]):
+            if wanted_set is None or name in wanted_set or (name == "ts_delta" and "ts" in wanted_set):
+                f.seek(pos)
+                out[name] = _unpack(f.read(size), tc)
+            pos += size
+        if "ts_delta" in out:
+            deltas = out.pop("ts_delta")
+            out["ts"] = array("q", accumulate(deltas, initial=block["ts_first"]))[1:]
+        return out
+
+    def iter_block_columns(
+        self,
+        t_start_us: Optional[int] = None,
+        t_end_us: Optional[int] = None,
+        columns: Optional[Iterable[str]] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yield decoded column dicts (integer codes for dictionary columns) per
+        overlapping block, trimmed to the time range. ts is always included.
+        """
+        wanted = set(columns) | {"ts"} if columns is not None else None
+        with self.path.open("rb") as f:
+            for index in self.blocks_for_range(t_start_us, t_end_us):
+                cols = self._read_block(f, index, wanted)
+                block = self.blocks[index]
+                inside = (t_start_us is None or block["ts_min"] >= t_start_us) and (
+                    t_end_us is None or block["ts_max"] <= t_end_us
+                )
+                if not inside:
+                    keep = [
+                        i for i, ts in enumerate(cols["ts"])
+                        if (t_start_us is None or ts >= t_start_us) and (t_end_us is None or ts <= t_end_us)
+                    ]
+                    cols = {name: array(values.typecode, (values[i] for i in keep)) for name, values in cols.items()}
+                if np is not None:
+                    cols = {name: np.frombuffer(values.tobytes(), dtype=values.typecode).copy() for name, values in cols.items()}
+                yield cols
+
+    def iter_raw_events(self, t_start_us: Optional[int] = None, t_end_us: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield session event dicts (same keys as the JSON) in file order."""
+        macs = self.dicts.get("mac", [])
+        scanners = self.dicts.get("scanner", [])
+        names = self.dicts.get("name", [])
+        payloads = self.dicts.get("payload", [])
+        with self.path.open("rb") as f:
+            for index in self.blocks_for_range(t_start_us, t_end_us):
+                cols = self._read_block(f, index)
+                for ts, mac, rssi, channel, scanner, name, payload in zip(
+                    cols["ts"], cols["mac"], cols["rssi"], cols["channel"],
+                    cols["scanner"], cols["name"], cols["payload"],
+                ):
+                    if t_start_us is not None and ts < t_start_us:
+                        continue
+                    if t_end_us is not None and ts > t_end_us:
+                        continue
+                    ev = {
+                        "mac": macs[mac],
+                        "rssi": rssi,
+                        "channel": channel,
+                        "scanner": scanners[scanner],
+                        "ts": ts,
+                    }
+                    if names[name]:
+                        ev["name"] = names[name]
+                    if payloads[payload]:
+                        ev["payload"] = payloads[payload]
+                    yield ev
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Columnar BLE session archives (.blesa).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    conv = sub.add_parser("convert", help="Convert a session .json/.zip/.jsonl into .blesa")
+    conv.add_argument("src")
+    conv.add_argument("dst", nargs="?", default=None)
+    conv.add_argument("--member", default=None)
+    conv.add_argument("--block-events", type=int, default=DEFAULT_BLOCK_EVENTS)
+
+    info = sub.add_parser("info", help="Show archive meta and block index summary")
+    info.add_argument("path")
+
+    exp = sub.add_parser("export", help="Write a time range back out as session JSON")
+    exp.add_argument("path")
+    exp.add_argument("out")
+    exp.add_argument("--from-us", type=int, default=None)
+    exp.add_argument("--to-us", type=int, default=None)
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        dst = Path(args.dst) if args.dst else Path(args.src).with_suffix(ARCHIVE_SUFFIX)
+        n = convert_session(args.src, dst, args.member, args.block_events)
+        src_size = os.path.getsize(args.src)
+        dst_size = os.path.getsize(dst)
+        print(f"Wrote {n} events to {dst.resolve()} ({dst_size:,} bytes, source {src_size:,} bytes)")
+        return
+
+    if args.command == "info":
+        archive = SessionArchive(args.path)
+        print(f"Meta: {json.dumps(archive.meta)}")
+        print(f"Events: {archive.n_events} in {len(archive.blocks)} block(s)")
+        print(f"Time range: {archive.time_range()}")
+        print("Dictionaries: " + ", ".join(f"{k}={len(v)}" for k, v in archive.dicts.items()))
+        return
+
+    from session_writer import finalize_events
+
+    archive = SessionArchive(args.path)
+    n = finalize_events(archive.iter_raw_events(args.from_us, args.to_us), Path(args.out), archive.meta)
+    print(f"Wrote {n} events to {Path(args.out).resolve()}")
+
+
+if __name__ == "__main__":
+    main()
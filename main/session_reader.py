@@ -0,0 +1,402 @@
+"""
+session_reader.py
+
+Streaming reader for recorded BLE session files, shared by the offline tools.
+
+Session files are {"meta": {...}, "events": [{...}, ...]} JSON written by
+ble_popup.py (plain, or zipped for archiving). Loading them with json.load
+needs several times the file size in RAM. This module walks the top-level
+object incrementally and decodes one event at a time, so memory stays bounded
+by the read chunk size no matter how long the capture is.
+
+Supported inputs:
+    session.json              plain session file
+    session.zip               zip archive; the session JSON is read in place
+    session.json.gz           gzip-compressed session file
+    events_*.jsonl / *_parts  JSON-lines segments from session_writer.py
+    session.blesa             columnar archive (session_archive.py)
+
+All readers accept an optional [t_start_us, t_end_us] range on the event ts.
+For .blesa archives only blocks overlapping the range are decoded; other
+inputs are filtered while streaming.
+
+Outputs:
+    iter_session_events()   compact SessionEvent records (or raw dicts)
+    iter_session_batches()  column batches, NumPy arrays when installed
+    read_session_meta()     the meta object
+
+Pure Python; NumPy is optional and only used for column batches.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import re
+import time
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, TextIO
+
+from session_archive import SessionArchive, is_archive
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+READ_CHUNK_CHARS = 1 << 20
+DEFAULT_BATCH_EVENTS = 65_536
+
+# Column batches: name -> NumPy dtype. String columns use NumPy unicode arrays.
+BATCH_COLUMN_DTYPES = {
+    "ts": "int64",
+    "rssi": "int16",
+    "channel": "int16",
+    "scanner": "U",
+    "mac": "U",
+    "name": "U",
+    "payload": "U",
+}
+DEFAULT_BATCH_COLUMNS = ("ts", "rssi", "channel", "scanner", "mac")
+
+_WS_RE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+class SessionEvent(NamedTuple):
+    """One advertisement as recorded in a session file."""
+
+    ts: int
+    mac: str
+    rssi: int
+    channel: int
+    scanner: str
+    name: str
+    payload: str
+
+
+def _to_int(value: Any, default: int = 0) -> int:
+    try:
+        return int(value)
+    except Exception:
+        try:
+            return int(float(value))
+        except Exception:
+            return default
+
+
+def session_event_from_dict(ev: Dict[str, Any]) -> SessionEvent:
+    return SessionEvent(
+        ts=_to_int(ev.get("ts")),
+        mac=str(ev.get("mac") or "").upper(),
+        rssi=_to_int(ev.get("rssi")),
+        channel=_to_int(ev.get("channel")),
+        scanner=str(ev.get("scanner") or ""),
+        name=str(ev.get("name") or ""),
+        payload=str(ev.get("payload") or ""),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Incremental JSON walking
+# -----------------------------------------------------------------------------
+
+class _JsonStream:
+    """Chunked text buffer with raw_decode-based value parsing."""
+
+    def __init__(self, text: TextIO, chunk_chars: int = READ_CHUNK_CHARS) -> None:
+        self.text = text
+        self.chunk_chars = chunk_chars
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.text.read(self.chunk_chars)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"session JSON: expected {ch!r}, got {got!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer end may continue in the next chunk.
+            if end >= len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _walk_session_object(stream: _JsonStream, meta_out: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield events from the top-level object; other top-level keys go to meta_out."""
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "events":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    ev = stream.value()
+                    if isinstance(ev, dict):
+                        yield ev
+                    sep = stream.peek()
+                    stream.pos += 1
+                    if sep == "]":
+                        break
+                    if sep != ",":
+                        raise ValueError(f"session JSON: bad separator {sep!r} in events")
+        elif key == "meta":
+            meta_out.update(stream.value() or {})
+        else:
+            meta_out[str(key)] = stream.value()
+
+        sep = stream.peek()
+        stream.pos += 1
+        if sep == "}":
+            return
+        if sep != ",":
+            raise ValueError(f"session JSON: bad separator {sep!r} at top level")
+
+
+def _iter_jsonl(text: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in text:
+        line = line.strip()
+        if not line or not line.endswith("}"):
+            continue
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(ev, dict):
+            yield ev
+
+
+# -----------------------------------------------------------------------------
+# Input opening
+# -----------------------------------------------------------------------------
+
+def _default_zip_member(zf: zipfile.ZipFile) -> str:
+    names = [n for n in zf.namelist() if not n.endswith("/")]
+    for suffix in (".json", ".jsonl"):
+        for n in names:
+            if n.lower().endswith(suffix):
+                return n
+    if not names:
+        raise ValueError("zip archive is empty")
+    return names[0]
+
+
+@contextmanager
+def open_session_text(path: Any, member: Optional[str] = None) -> Iterator[TextIO]:
+    """Open a session file, zip member or .gz file as a UTF-8 text stream without extracting."""
+    path = Path(path)
+    if path.suffix.lower() == ".gz":
+        with gzip.open(path, "rt", encoding="utf-8-sig") as text:
+            yield text
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            name = member or _default_zip_member(zf)
+            with zf.open(name) as raw, io.TextIOWrapper(raw, encoding="utf-8-sig") as text:
+                yield text
+    else:
+        with path.open("r", encoding="utf-8-sig") as text:
+            yield text
+
+
+def _is_jsonl(path: Path, member: Optional[str]) -> bool:
+    name = (member or path.name).lower()
+    return name.endswith(".jsonl") or name.endswith(".jsonl.gz")
+
+
+def _in_range(events: Iterator[Dict[str, Any]], t_start_us: Optional[int], t_end_us: Optional[int]) -> Iterator[Dict[str, Any]]:
+    if t_start_us is None and t_end_us is None:
+        yield from events
+        return
+    for ev in events:
+        ts = _to_int(ev.get("ts"))
+        if t_start_us is not None and ts < t_start_us:
+            continue
+        if t_end_us is not None and ts > t_end_us:
+            continue
+        yield ev
+
+
+def iter_raw_events(
+    path: Any,
+    member: Optional[str] = None,
+    meta_out: Optional[Dict[str, Any]] = None,
+    chunk_chars: int = READ_CHUNK_CHARS,
+    t_start_us: Optional[int] = None,
+    t_end_us: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield event dicts in file order, optionally limited to a ts range.
+
+    meta_out, if given, is filled with the session meta as soon as it has
+    been read (before the first event for files written by ble_popup.py).
+    A directory is treated as session_writer.py segments.
+    """
+    path = Path(path)
+    meta = meta_out if meta_out is not None else {}
+
+    if not path.is_dir() and is_archive(path):
+        archive = SessionArchive(path)
+        meta.update(archive.meta)
+        yield from archive.iter_raw_events(t_start_us, t_end_us)
+        return
+
+    yield from _in_range(_iter_plain_events(path, member, meta, chunk_chars), t_start_us, t_end_us)
+
+
+def _iter_plain_events(path: Path, member: Optional[str], meta: Dict[str, Any], chunk_chars: int) -> Iterator[Dict[str, Any]]:
+    if path.is_dir():
+        for segment in sorted(path.glob("events_*.jsonl")):
+            with segment.open("r", encoding="utf-8") as text:
+                yield from _iter_jsonl(text)
+        return
+
+    with open_session_text(path, member) as text:
+        if _is_jsonl(path, member):
+            yield from _iter_jsonl(text)
+        else:
+            yield from _walk_session_object(_JsonStream(text, chunk_chars), meta)
+
+
+def iter_session_events(
+    path: Any,
+    member: Optional[str] = None,
+    meta_out: Optional[Dict[str, Any]] = None,
+    t_start_us: Optional[int] = None,
+    t_end_us: Optional[int] = None,
+) -> Iterator[SessionEvent]:
+    """Yield SessionEvent records in file order."""
+    for ev in iter_raw_events(path, member, meta_out, t_start_us=t_start_us, t_end_us=t_end_us):
+        yield session_event_from_dict(ev)
+
+
+def read_session_meta(path: Any, member: Optional[str] = None) -> Dict[str, Any]:
+    """Return the meta object, reading only up to the first event when meta comes first."""
+    meta: Dict[str, Any] = {}
+    for _ in iter_raw_events(path, member, meta):
+        break
+    return meta
+
+
+# -----------------------------------------------------------------------------
+# Column batches
+# -----------------------------------------------------------------------------
+
+def _make_batch(cols: Dict[str, List[Any]]) -> Dict[str, Any]:
+    if np is None:
+        return cols
+    out = {}
+    for name, values in cols.items():
+        dtype = BATCH_COLUMN_DTYPES.get(name, "U")
+        out[name] = np.asarray(values, dtype=str if dtype == "U" else dtype)
+    return out
+
+
+def iter_session_batches(
+    path: Any,
+    batch_size: int = DEFAULT_BATCH_EVENTS,
+    columns: Sequence[str] = DEFAULT_BATCH_COLUMNS,
+    member: Optional[str] = None,
+    meta_out: Optional[Dict[str, Any]] = None,
+    t_start_us: Optional[int] = None,
+    t_end_us: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield column batches of at most batch_size events.
+
+    Each batch maps column name -> NumPy array (lists when NumPy is missing).
+    """
+    unknown = [c for c in columns if c not in BATCH_COLUMN_DTYPES]
+    if unknown:
+        raise ValueError(f"unknown session columns: {unknown}")
+
+    batch_size = max(1, int(batch_size))
+    cols: Dict[str, List[Any]] = {c: [] for c in columns}
+    n = 0
+    for ev in iter_session_events(path, member, meta_out, t_start_us, t_end_us):
+        for c in columns:
+            cols[c].append(getattr(ev, c))
+        n += 1
+        if n >= batch_size:
+            yield _make_batch(cols)
+            cols = {c: [] for c in columns}
+            n = 0
+    if n:
+        yield _make_batch(cols)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize a recorded BLE session without loading it in memory.")
+    parser.add_argument("path", help="Session .json / .zip / .json.gz / .jsonl / .blesa or a *_parts directory")
+    parser.add_argument("--member", default=None, help="Zip member name (default: first .json)")
+    parser.add_argument("--from-us", type=int, default=None, help="Only events with ts >= this (epoch us)")
+    parser.add_argument("--to-us", type=int, default=None, help="Only events with ts <= this (epoch us)")
+    args = parser.parse_args()
+
+    meta: Dict[str, Any] = {}
+    scanners: Counter[str] = Counter()
+    macs = set()
+    n = 0
+    ts_min = None
+    ts_max = None
+    t0 = time.perf_counter()
+    for ev in iter_session_events(args.path, args.member, meta, args.from_us, args.to_us):
+        n += 1
+        scanners[ev.scanner] += 1
+        macs.add(ev.mac)
+        if ev.ts:
+            ts_min = ev.ts if ts_min is None else min(ts_min, ev.ts)
+            ts_max = ev.ts if ts_max is None else max(ts_max, ev.ts)
+    elapsed = time.perf_counter() - t0
+
+    print(f"Meta: {json.dumps(meta)}")
+    print(f"Events: {n} | MACs: {len(macs)} | read in {elapsed:.2f}s ({n / max(elapsed, 1e-9):,.0f} events/s)")
+    if ts_min is not None:
+        print(f"Duration: {(ts_max - ts_min) / 1e6:.1f}s")
+    for scanner, count in sorted(scanners.items()):
+        print(f"  scanner {scanner}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,435 @@
+"""
+session_writer.py
+
+Buffered background writer for live BLE sessions recorded by ble_popup.py.
+
+The dashboard used to open ble_log.csv once per streamed event and keep every
+event in a Python list until the window was closed. This module moves all disk
+IO to one background thread:
+
+- ingest threads only enqueue into a bounded queue (never block on disk);
+- the writer thread drains the queue in batches and appends them to
+  JSON-lines segment files and to the CSV log;
+- segments rotate by size and age, so a crash loses at most the last
+  unflushed batch and no single file grows without bound;
+- finalize() streams the segments into the MATLAB-compatible
+  {"meta": ..., "events": [...]} session file without loading them in RAM,
+  or into a columnar .blesa archive (session_archive.py) when the output
+  path ends in .blesa.
+
+pc_receiver.py uses the same writer for its optional durable event log
+(raw and peak events, group commit with a bounded fsync interval).
+
+A crashed session can be finalized later from its segment directory:
+
+    python session_writer.py finalize session_20260522_162550_parts session_20260522_162550.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from session_archive import ARCHIVE_SUFFIX, SessionArchiveWriter
+
+
+DEFAULT_MAX_QUEUE = 50_000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_S = 1.0
+DEFAULT_ROTATE_BYTES = 32 * 1024 * 1024
+DEFAULT_ROTATE_INTERVAL_S = 15 * 60.0
+DEFAULT_CSV_ROTATE_BYTES = 128 * 1024 * 1024
+
+SEGMENT_GLOB = "events_*.jsonl"
+
+_STOP = object()
+
+
+def parts_dir_for(session_path: Path) -> Path:
+    """Segment directory used for a session output path: session_X.json -> session_X_parts/."""
+    session_path = Path(session_path)
+    return session_path.with_name(session_path.stem + "_parts")
+
+
+def list_segments(parts_dir: Path) -> List[Path]:
+    return sorted(Path(parts_dir).glob(SEGMENT_GLOB))
+
+
+def iter_segment_lines(parts_dir: Path) -> Iterator[str]:
+    """Yield raw JSON event lines from all segments in order. A torn last line is skipped."""
+    for segment in list_segments(parts_dir):
+        with segment.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if not line.endswith("}"):
+                    # Partially written line from a crash.
+                    continue
+                yield line
+
+
+def finalize_events(events: Iterable[Any], output_path: Path, meta: Dict[str, Any]) -> int:
+    """
+    Stream events into a session file at output_path and return the count.
+
+    events are event dicts or already-encoded JSON lines. A .blesa output is
+    written as a columnar archive (session_archive.py); anything else becomes
+    {"meta": meta, "events": [...]} JSON. Memory use is one event at a time;
+    the file appears under its final name only when complete.
+    """
+    output_path = Path(output_path)
+    if output_path.suffix.lower() == ARCHIVE_SUFFIX:
+        with SessionArchiveWriter(output_path, meta) as writer:
+            for ev in events:
+                writer.append(json.loads(ev) if isinstance(ev, str) else ev)
+        return writer.n_events
+
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    n = 0
+    with tmp_path.open("w", encoding="utf-8") as out:
+        out.write('{"meta": ')
+        out.write(json.dumps(meta))
+        out.write(', "events": [')
+        for ev in events:
+            out.write("\n" if n == 0 else ",\n")
+            out.write(ev if isinstance(ev, str) else json.dumps(ev, separators=(",", ":")))
+            n += 1
+        out.write("\n]}\n")
+    os.replace(tmp_path, output_path)
+    return n
+
+
+def finalize_segments(parts_dir: Path, output_path: Path, meta: Dict[str, Any]) -> int:
+    """Stream segment lines into a session file (JSON or .blesa) at output_path."""
+    return finalize_events(iter_segment_lines(parts_dir), output_path, meta)
+
+
+class SessionWriter:
+    """
+    Bounded-queue background writer: JSON-lines segments plus an optional CSV log.
+
+    submit() / submit_many() are safe to call from any thread and never touch
+    the disk. When the queue is full the events are dropped and counted
+    instead of stalling the producer. Events that cannot be encoded or
+    written are counted in stats["failed"]; the first such error is printed.
+
+    Each batch is one group commit: written and flushed together. With
+    fsync_interval_s set, the segment is also fsynced at most that often
+    (0 = after every batch); otherwise durability is left to the OS.
+
+    parts_dir must not already hold segments: leftovers from a crashed run
+    raise FileExistsError rather than end up in this session.
+    """
+
+    def __init__(
+        self,
+        parts_dir: Path,
+        csv_log: Optional[str] = None,
+        csv_header: Optional[List[str]] = None,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S,
+        rotate_bytes: int = DEFAULT_ROTATE_BYTES,
+        rotate_interval_s: float = DEFAULT_ROTATE_INTERVAL_S,
+        csv_rotate_bytes: int = DEFAULT_CSV_ROTATE_BYTES,
+        fsync_interval_s: Optional[float] = None,
+    ) -> None:
+        self.parts_dir = Path(parts_dir)
+        self.csv_log = csv_log
+        self.csv_header = list(csv_header or [])
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = float(flush_interval_s)
+        self.rotate_bytes = int(rotate_bytes)
+        self.rotate_interval_s = float(rotate_interval_s)
+        self.csv_rotate_bytes = int(csv_rotate_bytes)
+        self.fsync_interval_s = fsync_interval_s
+        self._last_fsync_mono = time.monotonic()
+
+        # Segments left by an earlier (crashed) run would be finalized into
+        # this session; refuse instead of mixing them in.
+        stale = list_segments(self.parts_dir)
+        if stale:
+            raise FileExistsError(
+                f"{self.parts_dir} already holds {len(stale)} segment(s) from an earlier run; "
+                f"finalize them (python session_writer.py finalize {self.parts_dir} <output>) "
+                f"or remove the directory first"
+            )
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._segment = None
+        self._segment_path: Optional[Path] = None
+        self._segment_index = 0
+        self._segment_bytes = 0
+        self._segment_opened_mono = 0.0
+
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "batches": 0,
+            "segments": 0,
+            "csv_rotations": 0,
+            "fsyncs": 0,
+            "last_error": "",
+        }
+        self._stats_lock = threading.Lock()
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="session-writer", daemon=True)
+        self._thread.start()
+
+    # ---------------- producer side ----------------
+
+    def submit(self, event: Dict[str, Any], csv_row: Optional[List[Any]] = None) -> bool:
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((event, csv_row))
+        except queue.Full:
+            with self._stats_lock:
+                self.stats["dropped"] += 1
+            return False
+        with self._stats_lock:
+            self.stats["submitted"] += 1
+        return True
+
+    def submit_many(self, events: List[Dict[str, Any]]) -> bool:
+        """Enqueue a list of events as one queue item (one lock round-trip per call)."""
+        if self._closed or not events:
+            return False
+        try:
+            self._queue.put_nowait(events)
+        except queue.Full:
+            with self._stats_lock:
+                self.stats["dropped"] += len(events)
+            return False
+        with self._stats_lock:
+            self.stats["submitted"] += len(events)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            out = dict(self.stats)
+        out["queued"] = self._queue.qsize()
+        return out
+
+    # ---------------- writer thread ----------------
+
+    def _run(self) -> None:
+        batch: List[Any] = []
+        deadline = time.monotonic() + self.flush_interval_s
+        stopping = False
+
+        while not stopping:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    self._add_item(batch, item)
+                    # Drain without waiting up to one batch.
+                    while len(batch) < self.batch_size:
+                        item = self._queue.get_nowait()
+                        if item is _STOP:
+                            stopping = True
+                            break
+                        self._add_item(batch, item)
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write_batch(batch)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval_s
+
+        if batch:
+            self._write_batch(batch)
+        self._close_segment()
+
+    @staticmethod
+    def _add_item(batch: List[Any], item: Any) -> None:
+        if isinstance(item, list):
+            batch.extend((event, None) for event in item)
+        else:
+            batch.append(item)
+
+    def _write_batch(self, batch: List[Any]) -> None:
+        # Encode events one by one so a record json can't handle only loses itself.
+        encoded = []
+        for event, _ in batch:
+            try:
+                encoded.append(json.dumps(event, separators=(",", ":")) + "\n")
+            except Exception as e:
+                self._record_failure(1, f"unencodable event: {e}")
+        lines = "".join(encoded)
+
+        if lines:
+            start = self._segment_bytes
+            try:
+                self._maybe_rotate_segment()
+                start = self._segment_bytes
+                self._segment.write(lines)
+                self._segment.flush()
+                self._segment_bytes += len(lines)
+                if self.fsync_interval_s is not None:
+                    now = time.monotonic()
+                    if now - self._last_fsync_mono >= self.fsync_interval_s:
+                        os.fsync(self._segment.fileno())
+                        self._last_fsync_mono = now
+                        with self._stats_lock:
+                            self.stats["fsyncs"] += 1
+            except Exception as e:
+                # The batch may be half on disk: cut the segment back to its last
+                # complete line and start a new one for the next batch.
+                self._abandon_segment(start)
+                self._record_failure(len(encoded), f"segment write failed: {e}")
+                return
+
+        csv_rows = [row for _, row in batch if row is not None]
+        if self.csv_log and csv_rows:
+            try:
+                self._write_csv(csv_rows)
+            except Exception as e:
+                self._record_failure(0, f"csv write failed: {e}")
+
+        with self._stats_lock:
+            self.stats["written"] += len(encoded)
+            self.stats["batches"] += 1
+
+    def _record_failure(self, n_events: int, message: str) -> None:
+        with self._stats_lock:
+            self.stats["failed"] += n_events
+            first = not self.stats["last_error"]
+            self.stats["last_error"] = f"{datetime.now().isoformat(timespec='seconds')} {message}"
+        if first:
+            print(f"[SESSION WRITER] {message} (further errors only in stats['last_error'])")
+
+    def _maybe_rotate_segment(self) -> None:
+        now = time.monotonic()
+        if self._segment is not None:
+            too_big = self.rotate_bytes > 0 and self._segment_bytes >= self.rotate_bytes
+            too_old = self.rotate_interval_s > 0 and now - self._segment_opened_mono >= self.rotate_interval_s
+            if not (too_big or too_old):
+                return
+            self._close_segment()
+
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        self._segment_index += 1
+        path = self.parts_dir / f"events_{self._segment_index:05d}.jsonl"
+        self._segment = path.open("a", encoding="utf-8")
+        self._segment_path = path
+        self._segment_bytes = path.stat().st_size
+        self._segment_opened_mono = now
+        with self._stats_lock:
+            self.stats["segments"] += 1
+
+    def _close_segment(self) -> None:
+        if self._segment is None:
+            return
+        try:
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+        except Exception:
+            pass
+        self._segment.close()
+        self._segment = None
+
+    def _abandon_segment(self, good_bytes: int) -> None:
+        """Close the current segment after a failed write, truncated to good_bytes."""
+        if self._segment is None:
+            return
+        try:
+            self._segment.close()
+        except Exception:
+            pass
+        self._segment = None
+        try:
+            os.truncate(self._segment_path, good_bytes)
+        except Exception:
+            pass
+
+    def _write_csv(self, rows: List[List[Any]]) -> None:
+        path = Path(self.csv_log)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if self.csv_rotate_bytes > 0 and size >= self.csv_rotate_bytes:
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            os.replace(path, path.with_name(f"{path.stem}_{stamp}{path.suffix}"))
+            size = 0
+            with self._stats_lock:
+                self.stats["csv_rotations"] += 1
+
+        with path.open("a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if size == 0 and self.csv_header:
+                writer.writerow(self.csv_header)
+            writer.writerows(rows)
+
+    # ---------------- shutdown ----------------
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush everything queued and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def finalize(self, output_path: Path, meta: Dict[str, Any], keep_parts: bool = False) -> int:
+        """
+        Close the writer and stream all segments into the session JSON file.
+
+        Segments are removed afterwards unless keep_parts is set.
+        """
+        self.close()
+        meta = dict(meta)
+        stats = self.get_stats()
+        meta.setdefault("n_events", stats["written"])
+        meta.setdefault("dropped_events", stats["dropped"])
+        meta.setdefault("failed_events", stats["failed"])
+        n = finalize_segments(self.parts_dir, Path(output_path), meta)
+
+        if not keep_parts:
+            for segment in list_segments(self.parts_dir):
+                segment.unlink()
+            try:
+                self.parts_dir.rmdir()
+            except OSError:
+                pass
+        return n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Session segment tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fin = sub.add_parser("finalize", help="Build a session JSON from a segment directory (e.g. after a crash)")
+    fin.add_argument("parts_dir")
+    fin.add_argument("output")
+    fin.add_argument("--keep-parts", action="store_true")
+    args = parser.parse_args()
+
+    parts_dir = Path(args.parts_dir)
+    meta = {"recovered_from": str(parts_dir), "end": datetime.now().isoformat()}
+    n = finalize_segments(parts_dir, Path(args.output), meta)
+    if not args.keep_parts:
+        for segment in list_segments(parts_dir):
+            segment.unlink()
+    print(f"Wrote {n} events to {Path(args.output).resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+stage_metrics.py
+
+Low-overhead latency histograms for the receiver pipeline stages.
+
+LatencyHistogram is HDR-style: values are recorded in integer microseconds
+into log-linear buckets (SUB_BUCKETS / 2 linear buckets per power of two), so
+recording is a bit_length() and one list increment, memory is fixed, and any
+percentile is reported with a relative error below 2 / SUB_BUCKETS (~3 %).
+
+StageTimers is a named set of histograms with:
+    record(stage, seconds) / record_us(stage, us) / time(stage) context
+    summary()          cumulative count, mean and p50/p90/p99/max per stage
+    interval_summary() the same for values recorded since the previous call
+    prometheus_text()  Prometheus text exposition (histogram per stage)
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Values below SUB_BUCKETS are exact; above, each power of two is split into
+# SUB_BUCKETS / 2 linear buckets.
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_BITS = SUB_BUCKET_BITS - 1
+
+# Largest tracked value: 2^36 us (~19 h). Larger values land in the last bucket.
+MAX_VALUE_BITS = 36
+
+# Prometheus "le" bounds in seconds (100 us .. 60 s).
+PROMETHEUS_BOUNDS_SEC = (
+    0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0,
+)
+
+
+def _bucket_index(value_us: int) -> int:
+    if value_us < SUB_BUCKETS:
+        return max(0, value_us)
+    shift = value_us.bit_length() - SUB_BUCKET_BITS
+    return (shift << HALF_BITS) + (value_us >> shift)
+
+
+def _bucket_upper_us(index: int) -> int:
+    """Largest value that maps to bucket index (inclusive)."""
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index >> HALF_BITS) - 1
+    sub = index - (shift << HALF_BITS)
+    return ((sub + 1) << shift) - 1
+
+
+N_BUCKETS = _bucket_index((1 << MAX_VALUE_BITS) - 1) + 1
+
+
+# ----------------------------------------------------------------------------
+# Histogram
+# ----------------------------------------------------------------------------
+
+class LatencyHistogram:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counts: List[int] = [0] * N_BUCKETS
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record_us(self, value_us: int) -> None:
+        value_us = int(value_us)
+        idx = _bucket_index(value_us)
+        if idx >= N_BUCKETS:
+            idx = N_BUCKETS - 1
+        with self.lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total_us += value_us
+            if value_us > self.max_us:
+                self.max_us = value_us
+
+    def state(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "counts": list(self.counts),
+                "count": self.count,
+                "total_us": self.total_us,
+                "max_us": self.max_us,
+            }
+
+
+def _percentile_us(counts: Sequence[int], count: int, q: float) -> int:
+    if count <= 0:
+        return 0
+    rank = max(1, int(round(q * count)))
+    seen = 0
+    for idx, c in enumerate(counts):
+        if not c:
+            continue
+        seen += c
+        if seen >= rank:
+            return _bucket_upper_us(idx)
+    return _bucket_upper_us(len(counts) - 1)
+
+
+def summarize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    counts = state["counts"]
+    count = state["count"]
+    max_us = state["max_us"]
+
+    def pct_ms(q: float) -> float:
+        # Bucket upper bounds can overshoot the true maximum.
+        return round(min(_percentile_us(counts, count, q), max_us) / 1000.0, 3)
+
+    return {
+        "count": count,
+        "mean_ms": round(state["total_us"] / count / 1000.0, 3) if count else 0.0,
+        "p50_ms": pct_ms(0.50),
+        "p90_ms": pct_ms(0.90),
+        "p99_ms": pct_ms(0.99),
+        "max_ms": round(max_us / 1000.0, 3),
+    }
+
+
+def _state_delta(cur: Dict[str, Any], prev: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if prev is None:
+        return dict(cur)
+    counts = [a - b for a, b in zip(cur["counts"], prev["counts"])]
+    # max over an interval is not recoverable from cumulative state; use the
+    # upper bound of the highest non-empty bucket instead.
+    top = max((i for i, c in enumerate(counts) if c), default=None)
+    return {
+        "counts": counts,
+        "count": cur["count"] - prev["count"],
+        "total_us": cur["total_us"] - prev["total_us"],
+        "max_us": _bucket_upper_us(top) if top is not None else 0,
+    }
+
+
+# ----------------------------------------------------------------------------
+# Stage registry
+# ----------------------------------------------------------------------------
+
+class StageTimers:
+    """
+    Named latency histograms. Stages are created on first use; pass the
+    expected stage names up front to fix their report order.
+    """
+
+    def __init__(self, stages: Sequence[str] = (), enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, LatencyHistogram] = {name: LatencyHistogram() for name in stages}
+        self._last_states: Dict[str, Dict[str, Any]] = {}
+
+    def _histogram(self, stage: str) -> LatencyHistogram:
+        hist = self.histograms.get(stage)
+        if hist is None:
+            with self.lock:
+                hist = self.histograms.setdefault(stage, LatencyHistogram())
+        return hist
+
+    def record_us(self, stage: str, value_us: int) -> None:
+        if self.enabled:
+            self._histogram(stage).record_us(value_us)
+
+    def record(self, stage: str, seconds: float) -> None:
+        if self.enabled:
+            self._histogram(stage).record_us(int(seconds * 1_000_000))
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._histogram(stage).record_us((time.perf_counter_ns() - t0) // 1000)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {name: summarize_state(hist.state()) for name, hist in list(self.histograms.items())}
+
+    def interval_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage summary of the values recorded since the previous call."""
+        out = {}
+        for name, hist in list(self.histograms.items()):
+            cur = hist.state()
+            out[name] = summarize_state(_state_delta(cur, self._last_states.get(name)))
+            self._last_states[name] = cur
+        return out
+
+    def prometheus_text(self, metric: str = "ble_receiver_stage_latency_seconds") -> str:
+        lines = [
+            f"# HELP {metric} Receiver pipeline stage latency.",
+            f"# TYPE {metric} histogram",
+        ]
+        for name, hist in list(self.histograms.items()):
+            state = hist.state()
+            counts = state["counts"]
+            cumulative = 0
+            idx = 0
+            for bound in PROMETHEUS_BOUNDS_SEC:
+                bound_us = int(bound * 1_000_000)
+                while idx < len(counts) and _bucket_upper_us(idx) <= bound_us:
+                    cumulative += counts[idx]
+                    idx += 1
+                lines.append(f'{metric}_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {state["count"]}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {state["total_us"] / 1_000_000.0:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {state["count"]}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,53 @@
+"""
+test_localization_reload.py
+
+Regression test for build_localization_from_store(save=True, activate=False):
+the fingerprint file watcher must not reload (and so activate) the build that
+was just written to calibration_fingerprints.json.
+
+    python -m pytest test_localization_reload.py
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("zeroconf")
+
+import pc_receiver as pr
+
+
+def _payload(rssi: float) -> dict:
+    return {"blocks": {"1": {"block_id": "1", "mean": {"1": rssi, "2": -70.0, "3": -80.0}}}}
+
+
+def test_save_without_activate_is_not_reloaded_by_watcher(monkeypatch, tmp_path):
+    monkeypatch.setattr(pr, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(pr, "LOCALIZATION_FIELD_MAP_ENABLED", False)
+    monkeypatch.setattr(pr, "localization_state", dict(pr.localization_state, active=None, reloading=False))
+    monkeypatch.setattr(pr, "localization_versions", deque(maxlen=pr.LOCALIZATION_KEEP_VERSIONS))
+
+    fingerprints = tmp_path / pr.LOCALIZATION_FINGERPRINTS_JSON
+    fingerprints.write_text(pr.json.dumps(_payload(-60.0)), encoding="utf-8")
+    assert pr.load_localization_fingerprints()
+    active = pr.localization_state["active"]
+
+    store = SimpleNamespace(root=str(tmp_path / "store"), select=lambda *args: [{"session_id": "s1"}])
+    monkeypatch.setattr(pr, "get_calibration_store", lambda: store)
+    monkeypatch.setattr(pr, "build_fingerprints_from_store", lambda store, entries, previous: _payload(-50.0))
+    assert pr.build_localization_from_store({}, activate=False, save=True)
+    assert len(pr.localization_versions) == 2
+
+    reloads = []
+    monkeypatch.setattr(pr, "reload_localization_fingerprints_async", lambda filename: reloads.append(filename) or True)
+    pending = None
+    for _ in range(3):
+        pending = pr.poll_fingerprint_file(pr.LOCALIZATION_FINGERPRINTS_JSON, pending)
+
+    assert reloads == []
+    assert pr.localization_state["active"] is active
+    assert len(pr.localization_versions) == 2
@@ -0,0 +1,63 @@
+"""
+test_session_writer.py
+
+Regression tests for SessionWriter._write_batch(): a bad record or a failed
+segment write is counted and never leaves a torn line in the session.
+
+    python -m pytest test_session_writer.py
+"""
+
+from __future__ import annotations
+
+import json
+
+from session_writer import SessionWriter, finalize_segments
+
+
+def test_unencodable_event_only_drops_itself(tmp_path):
+    writer = SessionWriter(tmp_path / "parts", flush_interval_s=0.05)
+    writer.submit({"seq": 1})
+    writer.submit({"seq": 2, "bad": object()})
+    writer.submit({"seq": 3})
+    writer.close()
+
+    stats = writer.get_stats()
+    assert stats["written"] == 2
+    assert stats["failed"] == 1
+    assert "unencodable" in stats["last_error"]
+
+    out = tmp_path / "session.json"
+    assert finalize_segments(tmp_path / "parts", out, {}) == 2
+    assert [ev["seq"] for ev in json.loads(out.read_text())["events"]] == [1, 3]
+
+
+def test_failed_write_truncates_and_rotates_segment(tmp_path):
+    writer = SessionWriter(tmp_path / "parts", flush_interval_s=60.0)
+    writer.close()
+    writer._write_batch([({"seq": 1}, None)])
+    first = writer._segment_path
+
+    class TornFile:
+        def __init__(self, f):
+            self.f = f
+
+        def write(self, text):
+            self.f.write(text[: len(text) // 2])
+            self.f.flush()
+            raise OSError("disk full")
+
+        def __getattr__(self, name):
+            return getattr(self.f, name)
+
+    writer._segment = TornFile(writer._segment)
+    writer._write_batch([({"seq": 2, "pad": "x" * 40}, None), ({"seq": 3}, None)])
+    assert writer._segment is None
+    assert writer.get_stats()["failed"] == 2
+
+    writer._write_batch([({"seq": 4}, None)])
+    writer._close_segment()
+    assert writer._segment_path != first
+
+    out = tmp_path / "session.json"
+    assert finalize_segments(tmp_path / "parts", out, {}) == 2
+    assert [ev["seq"] for ev in json.loads(out.read_text())["events"]] == [1, 4]
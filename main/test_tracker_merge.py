@@ -0,0 +1,48 @@
+"""
+test_tracker_merge.py
+
+Regression test for DeviceTracker._merge_tracks_locked(): the kept track's
+identity summary must reflect the merge even when identity compaction is off.
+
+    python -m pytest test_tracker_merge.py
+"""
+
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("zeroconf")
+
+import pc_receiver as pr
+from bench_receiver import SimClock, SyntheticScene, _peak_windows
+
+
+def _tracker_with_tracks(clock: SimClock) -> "pr.DeviceTracker":
+    events = SyntheticScene(6, seed=3, rotate_s=30.0).events(20.0)
+    peaks = [(ev, pr.parse_payload(ev["payload"])) for w in _peak_windows(pr, events) for ev in pr.window_peaks(w)]
+    tracker = pr.DeviceTracker()
+    for ev, parsed in peaks:
+        clock.advance_to(ev["rx_ts_us"] / 1_000_000.0)
+        tracker.process_event(ev, parsed)
+    return tracker
+
+
+def test_merge_refreshes_identity_summary_without_compaction(monkeypatch):
+    clock = SimClock()
+    monkeypatch.setattr(pr, "monotonic_now", clock)
+    monkeypatch.setattr(pr, "IDENTITY_COMPACT_ENABLED", False)
+    tracker = _tracker_with_tracks(clock)
+
+    uids = sorted(tracker.tracks)
+    assert len(uids) >= 2
+    keep_uid, drop_uid = uids[0], uids[1]
+    keep = tracker.tracks[keep_uid]
+    before = keep.identity_summary()  # populate the cache
+
+    with tracker.lock.held("test"):
+        tracker._merge_tracks_locked(keep_uid, drop_uid, reason="test")
+
+    after = keep.identity_summary()
+    assert after == pr.identity_summary_from_track(keep)
+    assert after != before
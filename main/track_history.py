@@ -0,0 +1,152 @@
+"""
+track_history.py
+
+Bounded per-track histories (burst, motion-slice and interval history) with
+deque(maxlen=...) semantics but compact storage.
+
+An empty deque already allocates a 64-slot block (~760 bytes) and every item
+is a boxed Python object, so a DeviceTrack with eight history deques cost
+several KB before it saw a single burst. Here:
+    RingArray         numbers in one typed array ("d" for floats, "I" for
+                      counts); 4-8 bytes per item
+    ScannerMapRing    scanner -> value dicts (or scanner sets) as parallel
+                      scanner-id / value arrays plus one length per entry;
+                      iteration rebuilds the dicts in their original order
+    BoundedList       a list trimmed to maxlen, for the rare dict records
+                      (merge history, localization history)
+
+Appends drop the oldest entries once maxlen is exceeded. Histories hold at
+most a few dozen entries, so dropping from the front of an array is a short
+memmove.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, Optional, Set, Union
+
+from obs_window import ScannerIds
+
+
+class RingArray:
+    __slots__ = ("items", "maxlen")
+
+    def __init__(self, typecode: str, maxlen: int) -> None:
+        self.items = array(typecode)
+        self.maxlen = maxlen
+
+    def append(self, value: Union[int, float]) -> None:
+        items = self.items
+        items.append(value)
+        if len(items) > self.maxlen:
+            del items[0]
+
+    def extend(self, values: Iterable[Union[int, float]]) -> None:
+        items = self.items
+        items.extend(values)
+        excess = len(items) - self.maxlen
+        if excess > 0:
+            del items[:excess]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __bool__(self) -> bool:
+        return len(self.items) > 0
+
+    def __iter__(self) -> Iterator[Union[int, float]]:
+        return iter(self.items)
+
+    def __getitem__(self, index: int) -> Union[int, float]:
+        return self.items[index]
+
+
+class ScannerMapRing:
+    """
+    History of scanner -> float maps, or of scanner sets when with_values is
+    False. Scanner names are interned through the shared ScannerIds registry.
+    """
+
+    __slots__ = ("ids", "maxlen", "scanners", "values", "lengths")
+
+    def __init__(self, ids: ScannerIds, maxlen: int, with_values: bool = True) -> None:
+        self.ids = ids
+        self.maxlen = maxlen
+        self.scanners = array("H")
+        self.values: Optional[array] = array("d") if with_values else None
+        self.lengths = array("H")
+
+    def append(self, entry: Union[Dict[str, float], Set[str]]) -> None:
+        intern = self.ids.intern
+        if self.values is not None:
+            for scanner, value in entry.items():
+                self.scanners.append(intern(scanner))
+                self.values.append(value)
+        else:
+            for scanner in entry:
+                self.scanners.append(intern(scanner))
+        self.lengths.append(len(entry))
+        if len(self.lengths) > self.maxlen:
+            n = self.lengths[0]
+            del self.lengths[0]
+            del self.scanners[:n]
+            if self.values is not None:
+                del self.values[:n]
+
+    def extend(self, entries: Iterable[Union[Dict[str, float], Set[str]]]) -> None:
+        for entry in entries:
+            self.append(entry)
+
+    def _entry(self, start: int, n: int) -> Union[Dict[str, float], Set[str]]:
+        names = self.ids.names
+        scanners = self.scanners[start:start + n]
+        if self.values is None:
+            return {names[s] for s in scanners}
+        return {names[s]: v for s, v in zip(scanners, self.values[start:start + n])}
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def __bool__(self) -> bool:
+        return len(self.lengths) > 0
+
+    def __iter__(self) -> Iterator[Union[Dict[str, float], Set[str]]]:
+        start = 0
+        for n in self.lengths:
+            yield self._entry(start, n)
+            start += n
+
+    def __getitem__(self, index: int) -> Union[Dict[str, float], Set[str]]:
+        count = len(self.lengths)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("ScannerMapRing index out of range")
+        if index == count - 1:
+            n = self.lengths[index]
+            return self._entry(len(self.scanners) - n, n)
+        return self._entry(sum(self.lengths[:index]), self.lengths[index])
+
+
+class BoundedList(list):
+    """list that keeps only its newest maxlen items."""
+
+    __slots__ = ("maxlen",)
+
+    def __init__(self, maxlen: int, items: Iterable[Any] = ()) -> None:
+        super().__init__(items)
+        self.maxlen = maxlen
+        self._trim()
+
+    def _trim(self) -> None:
+        excess = len(self) - self.maxlen
+        if excess > 0:
+            del self[:excess]
+
+    def append(self, item: Any) -> None:
+        super().append(item)
+        self._trim()
+
+    def extend(self, items: Iterable[Any]) -> None:
+        super().extend(items)
+        self._trim()